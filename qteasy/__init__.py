@@ -91,7 +91,10 @@ QT_DATA_SOURCE = DataSource(
         port=QT_CONFIG['local_db_port'],
         user=QT_CONFIG['local_db_user'],
         password=QT_CONFIG['local_db_password'],
-        db_name=QT_CONFIG['local_db_name']
+        db_name=QT_CONFIG['local_db_name'],
+        pool_size=QT_CONFIG['local_db_pool_size'],
+        write_batch_size=QT_CONFIG['local_db_write_batch_size'],
+        dtype_profile=QT_CONFIG['local_data_dtype_profile'],
 )
 
 # 初始化默认交易日历
@@ -45,6 +45,116 @@ class ConfigDict(dict):
         return ConfigDict(**self)
 
 
+class ConfigSnapshot(ConfigDict):
+    """ 不可修改的参数字典，其中的参数值都已经过验证，用于在一次运行中使用的参数
+
+    参数快照不能被修改，需要调整参数时，使用with_overrides()生成一个新的参数快照，
+    新的参数快照中只有与原参数值不同的参数需要验证，其他参数直接使用原快照中的参数值
+
+    Methods
+    -------
+    with_overrides(**kwargs)
+        返回一个用kwargs覆盖部分参数的新参数快照
+    copy()
+        返回一个可修改的参数字典ConfigDict
+    """
+
+    # 所有参数快照共用的合法参数列表，在第一次验证参数时生成
+    _vkwargs = None
+    # 已经通过验证的可哈希参数值，相同的参数值不需要重复验证
+    _validated_values = set()
+    _max_validated_values = 1024
+
+    def __init__(self, *args, **kwargs):
+        """ 参数快照的初始化函数，构造方式与dict相同，不验证传入的参数值 """
+        dict.__init__(self, *args, **kwargs)
+        object.__setattr__(self, '__dict__', self)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f'ConfigSnapshot is read only, use with_overrides() to create a new snapshot '
+                        f'or copy() to create a mutable ConfigDict')
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def copy(self):
+        """ 返回一个可修改的参数字典
+
+        Returns
+        -------
+        config_copy : ConfigDict
+            与参数快照内容相同的参数字典
+        """
+        return ConfigDict(**self)
+
+    def with_overrides(self, **kwargs):
+        """ 用kwargs覆盖部分参数，返回一个新的参数快照，只验证与当前参数值不同的参数
+
+        Parameters
+        ----------
+        **kwargs:
+            需要覆盖的参数，参数名必须是内置参数
+
+        Returns
+        -------
+        snapshot : ConfigSnapshot
+            新的参数快照，如果所有参数值都与当前参数相同，返回参数快照本身
+
+        Raises
+        ------
+        KeyError: 参数名不是内置参数
+        ValueError: 参数值不符合参数的验证方法
+        """
+        vkwargs = ConfigSnapshot._vkwargs
+        if vkwargs is None:
+            vkwargs = ConfigSnapshot._vkwargs = _valid_qt_kwargs()
+        changed = {}
+        for key, value in kwargs.items():
+            value = _parse_string_kwargs(value, key, vkwargs)
+            if (key in self) and _same_config_value(self[key], value):
+                continue
+            try:
+                validated = (key, type(value), value) in ConfigSnapshot._validated_values
+            except TypeError:
+                # 不可哈希的参数值每次都需要验证
+                validated = False
+            if not validated:
+                _validate_key_and_value(key, value, raise_key_error=True, vkwargs=vkwargs)
+                _remember_validated_value(key, value)
+            changed[key] = value
+        if not changed:
+            return self
+        config = dict(self)
+        config.update(changed)
+        return ConfigSnapshot(config)
+
+
+def _same_config_value(current, value) -> bool:
+    """ 判断两个参数值是否相同，类型不同或无法比较的参数值视为不同 """
+    if current is value:
+        return True
+    if type(current) is not type(value):
+        return False
+    try:
+        return bool(current == value)
+    except Exception:
+        return False
+
+
+def _remember_validated_value(key, value) -> None:
+    """ 记录已经通过验证的参数值，记录数量超过上限时清空记录 """
+    validated_values = ConfigSnapshot._validated_values
+    if len(validated_values) >= ConfigSnapshot._max_validated_values:
+        validated_values.clear()
+    try:
+        validated_values.add((key, type(value), value))
+    except TypeError:
+        pass
+
+
 def _valid_qt_kwargs():
     """ 合法参数列表
 
@@ -208,6 +318,32 @@ def _valid_qt_kwargs():
              'text':      '实盘交易时监看实时价格的刷新频率，单位为秒，默认为5秒\n'
                           '该数值不能低于5秒'},
 
+        'live_strategy_workers':
+            {'Default':   4,
+             'Validator': lambda value: isinstance(value, int) and value >= 0,
+             'level':     4,
+             'text':      '实盘交易时同一时间运行多个交易策略时，用于并行生成交易信号的线程数量，大于等于0的整数\n'
+                          '为0或1时所有策略在主线程中依次运行，大于1时各个策略在线程池中并行运行，\n'
+                          '所有策略运行完成后再混合交易信号'},
+
+        'live_log_rotation':
+            {'Default':   'none',
+             'Validator': lambda value: isinstance(value, str) and
+                                        _validate_log_rotation(value),
+             'level':     4,
+             'text':      '实盘交易时系统日志和交易记录文件的分段规则，分段后的历史文件保存在同一文件夹中：\n'
+                          '"none"    - 不分段，所有记录写入同一个文件\n'
+                          '"daily"   - 每天的记录写入一个分段文件\n'
+                          '"monthly" - 每月的记录写入一个分段文件\n'
+                          '"10MB"    - 文件大小超过指定大小时分段，单位可以是KB、MB或GB'},
+
+        'live_trade_log_flush_interval':
+            {'Default':   0.,
+             'Validator': lambda value: isinstance(value, (int, float)) and value >= 0,
+             'level':     4,
+             'text':      '实盘交易时交易记录写入文件的时间间隔，单位为秒，大于等于0的浮点数\n'
+                          '交易记录先保存在内存缓冲区中，每隔指定时间写入一次文件，为0时每条记录立即写入文件'},
+
         'trade_batch_size':
             {'Default':   0.0,
              'Validator': lambda value: isinstance(value, (int, float)) and value >= 0,
@@ -322,14 +458,17 @@ def _valid_qt_kwargs():
              'Validator': lambda value: isinstance(value, str)
                                         and value.lower() in ['file',
                                                               'database',
-                                                              'db'],
+                                                              'db',
+                                                              'sqlite'],
              'level':     1,
              'text':      '确定本地历史数据存储方式，取值范围如下：\n'
                           'file     - 历史数据以本地文件的形式存储，\n'
                           '           文件格式在"local_data_file_type"属性中指定，包括csv/hdf等多种选项\n'
                           'database - 历史数据存储在一个mysql数据库中\n'
                           '           选择此选项时，需要在配置文件中配置数据库的连接信息\n'
-                          'db       - 等同于"database"'},
+                          'db       - 等同于"database"\n'
+                          'sqlite   - 历史数据存储在本地的sqlite数据库文件中，不需要数据库服务\n'
+                          '           数据库文件保存在"local_data_file_path"路径下'},
 
         'local_data_file_type':
             {'Default':   'csv',
@@ -350,6 +489,16 @@ def _valid_qt_kwargs():
              'level':     4,
              'text':      '确定本地历史数据文件存储路径'},
 
+        'local_data_dtype_profile':
+            {'Default':   'default',
+             'Validator': lambda value: isinstance(value, str)
+                                        and value.lower() in ['default', 'compact'],
+             'level':     4,
+             'text':      '确定读取和保存本地历史数据时使用的数据类型，取值范围如下：\n'
+                          'default  - 所有浮点数据使用float64类型\n'
+                          'compact  - 价格等数据使用float32类型，重复的字符串使用category类型，\n'
+                          '           内存占用和hdf/feather文件大小大约减少一半'},
+
         'local_db_host':
             {'Default':   'localhost',
              'Validator': lambda value: isinstance(value, str),
@@ -383,6 +532,20 @@ def _valid_qt_kwargs():
              'level':     4,
              'text':      '数据库的访问密码。建议通过配置文件配置数据库用户名和密码'},
 
+        'local_db_pool_size':
+            {'Default':   5,
+             'Validator': lambda value: isinstance(value, int) and value >= 1,
+             'level':     4,
+             'text':      '数据库连接池中最多同时保持的连接数量，所有数据库操作从连接池中借用连接，\n'
+                          '避免每次操作都重新建立连接'},
+
+        'local_db_write_batch_size':
+            {'Default':   10000,
+             'Validator': lambda value: isinstance(value, int) and value >= 1,
+             'level':     4,
+             'text':      '向数据库写入数据时每一批写入的最大记录数，每一批数据写入后单独提交，\n'
+                          '写入大量数据时分批写入并显示进度'},
+
         'sys_log_file_path':
             {'Default':   'syslog/',
              'Validator': lambda value: isinstance(value, str),
@@ -402,6 +565,17 @@ def _valid_qt_kwargs():
              'text':      '是否生成明细交易清单，以pd.DataFrame形式给出明细的每日交易清单\n'
                           '包括交易信号以及每一步骤的交易结果'},
 
+        'trade_log_file_type':
+            {'Default':   'csv',
+             'Validator': lambda value: isinstance(value, str)
+                                        and value.lower() in ['csv',
+                                                              'feather',
+                                                              'fth'],
+             'level':     4,
+             'text':      '回测明细交易清单文件的存储格式，取值范围如下：\n'
+                          'csv - 交易清单以csv形式存储，可以用Excel打开\n'
+                          'feather/fth - 交易清单以feather格式存储，文件更小，写入和读取速度更快'},
+
         'benchmark_asset':
             {'Default':   '000300.SH',  # TODO: 未来版本支持多个基准
              'Validator': lambda value: isinstance(value, str)
@@ -1137,7 +1311,7 @@ def _update_config_kwargs(config, kwargs, raise_if_key_not_existed=False):
     vkwargs = _valid_qt_kwargs()
     for key in kwargs.keys():
         value = _parse_string_kwargs(kwargs[key], key, vkwargs)
-        if _validate_key_and_value(key, value, raise_if_key_not_existed):
+        if _validate_key_and_value(key, value, raise_if_key_not_existed, vkwargs=vkwargs):
             config[key] = value
 
     return config
@@ -1225,7 +1399,7 @@ def _process_deprecated_keys(key):
     return key
 
 
-def _validate_key_and_value(key, value, raise_key_error=False, raise_value_error=True) -> bool:
+def _validate_key_and_value(key, value, raise_key_error=False, raise_value_error=True, vkwargs=None) -> bool:
     """ 给定一个参数, 根据参数的验证方法验证值的正确性
 
     验证通过返回True, 否则返回报错
@@ -1243,6 +1417,8 @@ def _validate_key_and_value(key, value, raise_key_error=False, raise_value_error
     raise_value_error: bool, default True
         当此参数为True时，如果value不符合参数的验证方法，会报错
         当此参数为False时，如果value不符合参数的验证方法，返回False
+    vkwargs: dict, optional
+        合法参数列表，验证多个参数时传入同一个合法参数列表，避免重复生成
 
     Returns
     -------
@@ -1255,7 +1431,8 @@ def _validate_key_and_value(key, value, raise_key_error=False, raise_value_error
     KeyError: 当key不存在且raise_if_key_not_existed为True时，会报错，否则返回False
     ValueError: 当value不符合参数的验证方法时，会报错
     """
-    vkwargs = _valid_qt_kwargs()
+    if vkwargs is None:
+        vkwargs = _valid_qt_kwargs()
 
     if (key not in vkwargs) and raise_key_error:
         err_msg = f'config_key: <{key}> is not a built-in parameter key, please check your input!'
@@ -1396,6 +1573,25 @@ def _validate_asset_pool(value):
     return True
 
 
+def _validate_log_rotation(value):
+    """ 检查确认value是一个合法的日志文件分段规则，包括'none'、'daily'、'monthly'或者文件大小如'10MB'
+
+    Parameters:
+    ----------
+    value: str
+
+    Returns:
+    -------
+    Boolean
+    """
+    from qteasy.live_log import parse_log_rotation
+    try:
+        parse_log_rotation(value)
+    except ValueError:
+        return False
+    return True
+
+
 def _is_datelike(value):
     """ return True if value is a date-like object
     """
@@ -1450,4 +1646,4 @@ def _kwarg_not_implemented(value):
     raise NotImplementedError('config_key NOT implemented.')
 
 
-QT_CONFIG = _initialize_config_kwargs({}, _valid_qt_kwargs())
\ No newline at end of file
+QT_CONFIG = _initialize_config_kwargs({}, _valid_qt_kwargs())
@@ -243,6 +243,65 @@ def _loop_step(signal_type: int,
     return cash_gained, cash_spent, amount_purchased, amount_sold, fee
 
 
+@njit(nogil=True, cache=True)
+def _fill_complete_hist(looped_pos: np.ndarray,
+                        exact_match: np.ndarray,
+                        amounts_matrix: np.ndarray,
+                        cashes: np.ndarray,
+                        fees: np.ndarray,
+                        prices: np.ndarray) -> tuple:
+    """ 将回测结果（仅包含操作日的记录）填充到完整的历史日期序列上，并计算每日的资产总价值
+
+    持仓数量和现金额按照最近一个操作日的记录向前填充，交易费用只记录在操作日当天，其余日期为0，
+    在第一个操作日之前的日期持仓和现金均为0
+
+    Parameters
+    ----------
+    looped_pos: np.ndarray
+        每一个操作日在完整历史日期序列中的位置（第一个不早于操作日的日期序号），升序排列
+    exact_match: np.ndarray
+        bool型数组，表示每一个操作日是否恰好存在于完整历史日期序列中
+    amounts_matrix: np.ndarray
+        操作日的持仓数量矩阵，shape为(操作日数量, 股票数量)
+    cashes: np.ndarray
+        操作日的持有现金
+    fees: np.ndarray
+        操作日的交易费用
+    prices: np.ndarray
+        用于计算资产价值的价格矩阵，shape为(股票数量, 完整历史日期数量)
+
+    Returns
+    -------
+    tuple: (full_amounts, full_cashes, full_fees, full_values)
+    """
+    share_count, date_count = prices.shape
+    looped_count = looped_pos.shape[0]
+    full_amounts = np.zeros(shape=(date_count, share_count))
+    full_cashes = np.zeros(shape=(date_count,))
+    full_fees = np.zeros(shape=(date_count,))
+    full_values = np.zeros(shape=(date_count,))
+    current = -1
+    k = 0
+    for d in range(date_count):
+        # 找到不晚于当前日期的最后一个操作日
+        while (k < looped_count) and (looped_pos[k] <= d):
+            current = k
+            if exact_match[k] and (looped_pos[k] == d):
+                full_fees[d] = fees[k]
+            k += 1
+        if current >= 0:
+            full_amounts[d, :] = amounts_matrix[current, :]
+            full_cashes[d] = cashes[current]
+        value = full_cashes[d]
+        for s in range(share_count):
+            stock_value = prices[s, d] * full_amounts[d, s]
+            if not np.isnan(stock_value):
+                value += stock_value
+        full_values[d] = value
+
+    return full_amounts, full_cashes, full_fees, full_values
+
+
 def _get_complete_hist(looped_value: pd.DataFrame,
                        h_list: HistoryPanel,
                        benchmark_list: pd.DataFrame,
@@ -277,31 +336,31 @@ def _get_complete_hist(looped_value: pd.DataFrame,
     except:
         raise IndexError('index 0 is out of bounds for axis 0 with size 0')
     looped_history = h_list.segment(start_date)  # 回测历史数据区间 = [开始日期:]
-    # 使用价格清单的索引值对资产总价值清单进行重新索引，重新索引时向前填充每日持仓额、现金额，使得新的
-    # 价值清单中新增的记录中的持仓额和现金额与最近的一个操作日保持一致，并消除nan值
-    hdates = looped_history.hdates
-    purchased_shares = looped_value[shares].reindex(hdates, method='ffill').fillna(0)
-    cashes = looped_value['cash'].reindex(hdates, method='ffill').fillna(0)
-    fees = looped_value['fee'].reindex(hdates).fillna(0)
-    looped_value = looped_value.reindex(hdates)
-    # 这里采用了一种看上去貌似比较奇怪的处理方式：
-    # 先为cashes、purchased_shares两个变量赋值，
-    # 然后再将上述两个变量赋值给looped_values的列中
-    # 这样看上去好像多此一举，为什么不能直接赋值，然而
-    # 经过测试，如果直接用下面的代码直接赋值，将无法起到
-    # 填充值的作用：
-    # looped_value.cash = looped_value.cash.reindex(dates, method='ffill')
-    looped_value[shares] = purchased_shares
-    looped_value.cash = cashes
-    looped_value.fee = looped_value['fee'].reindex(hdates).fillna(0)
-    looped_value['reference'] = benchmark_list.reindex(hdates).fillna(0)
-    # 重新计算整个清单中的资产总价值，生成pandas.Series对象，如果looped_history历史价格中包含多种价格，使用最后一种
-    decisive_prices = looped_history[-1].squeeze(axis=2).T
-    looped_value['value'] = (decisive_prices * looped_value[shares]).sum(axis=1) + looped_value['cash']
+    hdates = pd.DatetimeIndex(looped_history.hdates)
+    # 使用numpy数组完成向前填充和资产总价值的计算，只在最后一步生成DataFrame，避免反复reindex和赋值
+    # 这里不延迟生成DataFrame：optimization中的evaluate()在回测后立即以DataFrame的形式使用完整的
+    # 资产价值清单，延迟生成不会减少任何工作量
+    # 如果looped_history历史价格中包含多种价格，使用最后一种计算资产总价值
+    looped_dates = pd.DatetimeIndex(looped_value.index)
+    looped_pos = hdates.searchsorted(looped_dates)
+    exact_match = hdates[np.minimum(looped_pos, len(hdates) - 1)] == looped_dates
+    decisive_prices = looped_history.values[:, :, -1].astype('float')
+    full_amounts, full_cashes, full_fees, full_values = _fill_complete_hist(
+            looped_pos.astype('int64'),
+            np.asarray(exact_match, dtype='bool'),
+            looped_value[shares].to_numpy(dtype='float'),
+            looped_value['cash'].to_numpy(dtype='float'),
+            looped_value['fee'].to_numpy(dtype='float'),
+            decisive_prices,
+    )
+    complete_values = pd.DataFrame(np.column_stack((full_amounts, full_cashes, full_fees, full_values)),
+                                   index=hdates,
+                                   columns=list(shares) + ['cash', 'fee', 'value'])
+    complete_values['reference'] = benchmark_list.reindex(hdates).fillna(0)
     if with_price:  # 如果需要同时返回价格，则生成pandas.DataFrame对象，包含所有历史价格
         share_price_column_names = [name + '_p' for name in shares]
-        looped_value[share_price_column_names] = looped_history[shares]
-    return looped_value
+        complete_values[share_price_column_names] = decisive_prices.T
+    return complete_values
 
 
 def _merge_invest_dates(op_list: pd.DataFrame, invest: CashPlan) -> pd.DataFrame:
@@ -875,7 +934,8 @@ def process_loop_results(operator,
                          op_summary_matrix=None,
                          op_list_bt_indices=None,
                          trade_log=False,
-                         bt_price_priority_ohlc: str = 'OHLC'):
+                         bt_price_priority_ohlc: str = 'OHLC',
+                         trade_log_file_type: str = 'csv'):
     """ 接受apply_loop函数传回的计算结果，生成DataFrame型交易模拟结果数据，保存交易记录，并返回结果供下一步处理
 
     Parameters
@@ -894,6 +954,8 @@ def process_loop_results(operator,
         是否保存交易记录，默认为False
     bt_price_priority_ohlc: str, optional, default 'OHLC'
         交易记录中的价格优先级，可选'OHLC'、'HLOC'、'LOCH'、'LCOH'、'COHL'、'COLH'
+    trade_log_file_type: str, optional, default 'csv'
+        交易记录文件的存储格式，'csv'或'feather'/'fth'
 
     Returns
     -------
@@ -908,76 +970,167 @@ def process_loop_results(operator,
 
     price_types_in_priority = operator.get_bt_price_types_in_priority(priority=bt_price_priority_ohlc)
 
-    # 将向量化计算结果转化回DataFrame格式
-    value_history = pd.DataFrame(amounts_matrix, index=looped_dates,
-                                 columns=shares)
-    # 填充标量计算结果
-    value_history['cash'] = cashes
-    value_history['fee'] = fees
-    value_history['value'] = values
+    # 将向量化计算结果一次性转化回DataFrame格式
+    value_history = pd.DataFrame(
+            np.column_stack((np.asarray(amounts_matrix, dtype='float').reshape(len(looped_dates), len(shares)),
+                             cashes, fees, values)),
+            index=looped_dates,
+            columns=list(shares) + ['cash', 'fee', 'value'],
+    )
 
     # 生成trade_log，index为MultiIndex，因为每天的交易可能有多种价格
     if trade_log:
-        from .core import get_basic_info
-        # create complete trading log
         logger_core.info(f'generating complete trading log ...')
-        op_log_index = pd.MultiIndex.from_product(
-                [looped_dates,
-                 price_types_in_priority,
-                 ['0, trade signal',
-                  '1, price',
-                  '2, traded amounts',
-                  '3, cash changed',
-                  '4, trade cost',
-                  '5, own amounts',
-                  '6, available amounts',
-                  '7, summary']],
-                names=('date', 'trade_on', 'item')
+        _write_trade_logs(
+                op_log_matrix=op_log_matrix,
+                op_summary_matrix=op_summary_matrix,
+                looped_dates=looped_dates,
+                price_types=price_types_in_priority,
+                shares=shares,
+                file_type=trade_log_file_type,
         )
-        op_sum_index = pd.MultiIndex.from_product(
-                [looped_dates,
-                 price_types_in_priority,
-                 ['7, summary']],
-                names=('date', 'trade_on', 'item')
-        )
-        op_log_columns = [str(s) for s in shares]
-        op_log_df = pd.DataFrame(op_log_matrix, index=op_log_index, columns=op_log_columns)
-        op_summary_df = pd.DataFrame(op_summary_matrix,
-                                     index=['add. invest', 'own cash', 'available cash', 'value'],
-                                     columns=op_sum_index).T
-        log_file_path_name = os.path.join(qteasy.QT_TRADE_LOG_PATH, 'trade_log.csv')
-        op_summary_df.join(op_log_df, how='right', sort=False).to_csv(log_file_path_name, encoding='utf-8')
-
-        # 生成 trade log 摘要表 (a more concise and human-readable format of trading log
-        # create share trading logs:
-        logger_core.info(f'generating abstract trading log ...')
-        share_logs = []
-        for share in op_log_columns:
-            share_df = op_log_df[share].unstack()
-            share_df = share_df[share_df['2, traded amounts'] != 0]
-            share_df['code'] = share
-            try:
-                share_name = get_basic_info(share, printout=False)['name']
-            except Exception as e:
-                share_name = 'unknown'
-            share_df['name'] = share_name
-            share_logs.append(share_df)
-
-        re_columns = ['code',
-                      'name',
-                      '0, trade signal',
-                      '1, price',
-                      '2, traded amounts',
-                      '3, cash changed',
-                      '4, trade cost',
-                      '5, own amounts',
-                      '6, available amounts',
-                      '7, summary']
-        op_log_shares_abs = pd.concat(share_logs).reindex(columns=re_columns)
-        record_file_path_name = os.path.join(qteasy.QT_TRADE_LOG_PATH, 'trade_records.csv')
-        # TODO: 可以增加一个config属性来控制交易摘要表的生成规则：
-        #  如果how == 'left' 保留无交易日期的记录
-        #  如果how == 'right', 不显示无交易日期的记录
-        op_summary_df.join(op_log_shares_abs, how='right', sort=True).to_csv(record_file_path_name, encoding='utf-8')
 
     return value_history
+
+
+TRADE_LOG_ITEMS = ['0, trade signal',
+                   '1, price',
+                   '2, traded amounts',
+                   '3, cash changed',
+                   '4, trade cost',
+                   '5, own amounts',
+                   '6, available amounts',
+                   '7, summary']
+
+
+def trade_log_file_path_names(file_type: str = 'csv') -> tuple:
+    """ 获取回测交易记录文件和交易摘要文件的完整路径
+
+    Parameters
+    ----------
+    file_type: str, default 'csv'
+        交易记录文件的存储格式，'csv'或'feather'/'fth'
+
+    Returns
+    -------
+    tuple: (log_file_path_name, record_file_path_name)
+    """
+    ext = 'feather' if file_type.lower() in ['feather', 'fth'] else 'csv'
+    log_file_path_name = os.path.join(qteasy.QT_TRADE_LOG_PATH, f'trade_log.{ext}')
+    record_file_path_name = os.path.join(qteasy.QT_TRADE_LOG_PATH, f'trade_records.{ext}')
+    return log_file_path_name, record_file_path_name
+
+
+def read_trade_log_files(file_type: str = 'csv') -> tuple:
+    """ 读取回测交易记录文件和交易摘要文件，文件格式与_write_trade_logs()写入的格式相同
+
+    Parameters
+    ----------
+    file_type: str, default 'csv'
+        交易记录文件的存储格式，'csv'或'feather'/'fth'
+
+    Returns
+    -------
+    tuple: (trade_log, trade_records), 两个pd.DataFrame
+    """
+    log_file_path_name, record_file_path_name = trade_log_file_path_names(file_type)
+    if file_type.lower() in ['feather', 'fth']:
+        return pd.read_feather(log_file_path_name), pd.read_feather(record_file_path_name)
+    return pd.read_csv(log_file_path_name), pd.read_csv(record_file_path_name)
+
+
+def _write_trade_logs(op_log_matrix,
+                      op_summary_matrix,
+                      looped_dates: list,
+                      price_types: list,
+                      shares: list,
+                      file_type: str = 'csv') -> tuple:
+    """ 将apply_loop生成的交易记录数据写入交易记录文件和交易摘要文件
+
+    交易记录矩阵直接按照(日期, 交易价格, 记录项目, 股票)的形状整理为numpy数组，交易摘要表通过
+    一次筛选生成，不需要逐个股票unstack，证券名称也通过一次批量查询获得
+
+    Parameters
+    ----------
+    op_log_matrix: list of np.ndarray
+        交易记录矩阵，每个日期的每种交易价格对应TRADE_LOG_ITEMS中的八行数据
+    op_summary_matrix: tuple of lists
+        交易汇总数据，包括投入资金、持有现金、可用现金以及总资产
+    looped_dates: list
+        参与回测的日期
+    price_types: list
+        按优先级排列的交易价格类型
+    shares: list
+        股票代码
+    file_type: str, default 'csv'
+        交易记录文件的存储格式，'csv'或'feather'/'fth'，feather格式的文件更小，写入和读取更快
+
+    Returns
+    -------
+    tuple: (log_file_path_name, record_file_path_name)
+    """
+    from qteasy import logger_core
+    from .trading_util import get_symbol_names
+
+    share_count = len(shares)
+    item_count = len(TRADE_LOG_ITEMS)
+    op_log_columns = [str(s) for s in shares]
+    op_log_values = np.asarray(op_log_matrix, dtype='float').reshape(-1, item_count, share_count)
+    row_count = op_log_values.shape[0]
+
+    op_log_index = pd.MultiIndex.from_product(
+            [looped_dates, price_types, TRADE_LOG_ITEMS],
+            names=('date', 'trade_on', 'item')
+    )
+    op_sum_index = pd.MultiIndex.from_product(
+            [looped_dates, price_types, TRADE_LOG_ITEMS[-1:]],
+            names=('date', 'trade_on', 'item')
+    )
+    op_log_df = pd.DataFrame(op_log_values.reshape(-1, share_count), index=op_log_index, columns=op_log_columns)
+    op_summary_df = pd.DataFrame(np.asarray(op_summary_matrix, dtype='float').T,
+                                 index=op_sum_index,
+                                 columns=['add. invest', 'own cash', 'available cash', 'value'])
+    # 完整交易记录中的汇总数据只出现在'7, summary'行中
+    summary_on_log = np.full(shape=(row_count, item_count, op_summary_df.shape[1]), fill_value=np.nan)
+    summary_on_log[:, -1, :] = op_summary_df.values
+    summary_on_log = pd.DataFrame(summary_on_log.reshape(-1, op_summary_df.shape[1]),
+                                  index=op_log_index,
+                                  columns=op_summary_df.columns)
+    complete_log = pd.concat([summary_on_log, op_log_df], axis=1)
+
+    # 生成 trade log 摘要表 (a more concise and human-readable format of trading log)
+    logger_core.info(f'generating abstract trading log ...')
+    # 将交易记录整理为(股票, 日期/交易价格, 记录项目)的形状，一次性筛选出所有发生交易的记录
+    share_records = op_log_values.transpose(2, 0, 1).reshape(-1, item_count)
+    traded = share_records[:, 2] != 0
+    row_ids = np.tile(np.arange(row_count), share_count)[traded]
+    share_ids = np.repeat(np.arange(share_count), row_count)[traded]
+    # 交易摘要表按照日期、交易价格类型排序，同一日期同一价格类型的记录按照股票的顺序排列
+    record_dates = np.asarray(op_sum_index.get_level_values('date'))[row_ids]
+    record_trade_on = np.asarray(op_sum_index.get_level_values('trade_on'), dtype='str')[row_ids]
+    record_order = np.lexsort((share_ids, record_trade_on, record_dates))
+    row_ids = row_ids[record_order]
+    share_ids = share_ids[record_order]
+    share_records = share_records[traded][record_order]
+    try:
+        share_names = get_symbol_names(datasource=None, symbols=op_log_columns)
+        share_names = ['unknown' if name == 'N/A' else name for name in share_names]
+    except Exception as e:
+        logger_core.warning(f'failed to get names of shares for trade log: {e}')
+        share_names = ['unknown'] * share_count
+    abstract_log = pd.DataFrame(share_records, index=op_sum_index[row_ids], columns=TRADE_LOG_ITEMS)
+    abstract_log.insert(0, 'code', np.array(op_log_columns, dtype='object')[share_ids])
+    abstract_log.insert(1, 'name', np.array(share_names, dtype='object')[share_ids])
+    # TODO: 可以增加一个config属性来控制交易摘要表的生成规则：
+    #  如果保留无交易日期的记录，需要将op_summary_df中所有的行加入交易摘要表
+    trade_records = pd.concat([op_summary_df.iloc[row_ids], abstract_log], axis=1)
+
+    log_file_path_name, record_file_path_name = trade_log_file_path_names(file_type)
+    if file_type.lower() in ['feather', 'fth']:
+        complete_log.reset_index().to_feather(log_file_path_name)
+        trade_records.reset_index().to_feather(record_file_path_name)
+    else:
+        complete_log.to_csv(log_file_path_name, encoding='utf-8')
+        trade_records.to_csv(record_file_path_name, encoding='utf-8')
+
+    return log_file_path_name, record_file_path_name
@@ -15,7 +15,10 @@
 from queue import Queue
 from abc import abstractmethod, ABCMeta
 
+import numbers
 import numpy as np
+import pandas as pd
+import threading
 import time
 
 from qteasy import QT_CONFIG
@@ -77,6 +80,8 @@ class Broker(object):
         交易订单队列，每个交易订单都是一个list，包含多个交易订单
     result_queue: Queue
         交易结果队列，每个交易结果都是一个list，包含多个交易结果
+    price_feed: PriceFeed or None
+        实时价格来源，如果为None，由Trader在初始化时设置为Trader的price_feed
     status: str
         Broker的状态，可以是 'init', 'running', 'stopped', 'paused'
         - init: Broker刚刚创建，还没有开始运行
@@ -90,6 +95,10 @@ class Broker(object):
         交易所的初始化程序，可以
     run()
         Broker的主循环，从order_queue中获取交易订单并处理，获得交易结果并放入result_queue中
+    process_orders(orders)
+        处理主循环从order_queue中取出的一批交易订单，默认为每个订单启动一个线程调用transaction
+    now()
+        Broker的当前时间，如果price_feed有自己的时钟（回放价格），返回price_feed的时间
     transaction(symbol, order_qty, order_price, direction, position='long', order_type='market'): abstract method
         一个Generator方法。交易所处理交易订单并获取交易结果, 在子类中必须实现这个方法
         这个方法在接受交易订单后，会以generator形式返回订单的处理结果，直至订单处理完毕或出现错误
@@ -124,6 +133,7 @@ class Broker(object):
 
         self.time_zone = 'local'
         self.init_time = get_current_timezone_datetime(self.time_zone).strftime('%Y-%m-%d %H:%M:%S')
+        self.price_feed = None
 
         self.order_queue = Queue()
         self.result_queue = Queue()
@@ -162,11 +172,10 @@ class Broker(object):
 
     def run(self):
         """ Broker的主循环，从order_queue中获取交易订单并处理，获得交易结果并放入result_queue中
-        order_queue中的每一个交易订单都由transaction函数来处理并获取交易结果，transaction函数是
-        一个Generator，可以分批返回交易结果，直至订单处理完毕或出现错误。每一个transaction都会在单
-        独的线程中运行
+        每次循环取出order_queue中的全部交易订单，交给process_orders()处理，默认情况下每一个订单都由
+        transaction函数来处理并获取交易结果，transaction函数是一个Generator，可以分批返回交易结果，
+        直至订单处理完毕或出现错误。每一个transaction都会在单独的线程中运行
         """
-        from threading import Thread
         if not self.is_registered:
             raise RuntimeError(f'broker is not registered!')
         if self.debug:
@@ -195,14 +204,11 @@ class Broker(object):
                 if self.status == 'paused':
                     continue
 
-                # 如果order_queue为空，则不处理交易订单
-                if self.order_queue.empty():
-                    continue
-
-                # order_queue不为空，提取交易订单，在一个单独的thread中调用self._get_result()处理交易订单
-                order = self.order_queue.get()  # order is a dict, should be packed in a tuple
-                t = Thread(target=self._get_result, args=(order, ), daemon=True)
-                t.start()
+                # 提取order_queue中的全部交易订单，即使没有新的订单也调用process_orders()，以便处理未完成的订单
+                orders = []
+                while not self.order_queue.empty():
+                    orders.append(self.order_queue.get())  # order is a dict
+                self.process_orders(orders)
 
             except KeyboardInterrupt:
                 # 如果Broker被用户强制退出，处理尚未完成的交易订单
@@ -220,6 +226,74 @@ class Broker(object):
 
         return
 
+    def process_orders(self, orders) -> None:
+        """ 处理主循环从order_queue中取出的一批交易订单，为每个订单启动一个单独的thread，调用
+        self._get_result()处理交易订单。Override这个函数，以批量处理交易订单
+
+        Parameters
+        ----------
+        orders: list of dict
+            交易订单dict，可能为空list
+        """
+        for order in orders:
+            t = threading.Thread(target=self._get_result, args=(order, ), daemon=True)
+            t.start()
+
+    def now(self) -> pd.Timestamp:
+        """ Broker的当前时间，如果price_feed有自己的时钟，使用price_feed的时间，否则使用系统时间 """
+        if self.price_feed is not None:
+            feed_time = self.price_feed.now()
+            if feed_time is not None:
+                return feed_time
+        return get_current_timezone_datetime(self.time_zone)
+
+    def _make_raw_trade_result(self, order_id, result_type, qty, price, fee, execution_time) -> dict:
+        """ 将交易结果圆整到合适的精度，并组装为raw_trade_result
+
+        Parameters
+        ----------
+        order_id: int
+            订单ID
+        result_type: str
+            交易结果类型，'filled', 'partial-filled' 或 'canceled'
+        qty: float
+            成交/取消数量
+        price: float
+            成交价格
+        fee: float
+            交易费用
+        execution_time: pd.Timestamp
+            成交时间
+
+        Returns
+        -------
+        raw_trade_result: dict
+        """
+        # 圆整qty、filled_qty和fee
+        qty = round(float(qty), AMOUNT_DECIMAL_PLACES)
+        filled_price = round(float(price), CASH_DECIMAL_PLACES)
+        transaction_fee = round(float(fee), CASH_DECIMAL_PLACES)
+
+        filled_qty = 0
+        canceled_qty = 0
+        if result_type in ['filled', 'partial-filled']:
+            filled_qty = qty
+        elif result_type == 'canceled':
+            canceled_qty = qty
+        else:
+            raise ValueError(f'Unknown result_type: {result_type}, should be one of ["filled", "canceled"]')
+
+        return {
+            'order_id':        order_id,
+            'filled_qty':      filled_qty,
+            'price':           filled_price,
+            'transaction_fee': transaction_fee,
+            'execution_time':  execution_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'canceled_qty':    canceled_qty,
+            'delivery_amount': 0,
+            'delivery_status': 'ND',
+        }
+
     def send_message(self, message: str, new_line=True):
         """ 将消息放入broker的消息队列
         """
@@ -230,6 +304,23 @@ class Broker(object):
             message += '_R'
         self.broker_messages.put(message)
 
+    def submit_orders(self, orders) -> int:
+        """ 将一批交易订单放入order_queue，每个订单仍然单独处理并单独返回交易结果
+
+        Parameters
+        ----------
+        orders: list of dict
+            交易订单dict，格式与_get_result()接受的订单相同，如果订单中包含symbol和position，
+            broker在解析订单时不再从数据源中读取持仓信息
+
+        Returns
+        -------
+        int: 放入order_queue的订单数量
+        """
+        for order in orders:
+            self.order_queue.put(order)
+        return len(orders)
+
     def _submit_order(self, order):
         """
 
@@ -261,24 +352,41 @@ class Broker(object):
         price:
         direction:
         position:
+
+        Raises:
+        -------
+        ValueError: 如果订单的交易方向不是buy/sell，交易数量不是正数，价格不是数字，或者找不到订单的交易标的和持仓
         """
 
+        order_id = order.get('order_id')
         if self.debug:
-            self.send_message(f'_parse_order():\nsubmit order components of order(ID) {order["order_id"]}:\n'
-                              f'quantity:{order["qty"]}\norder_price={order["price"]}\n'
-                              f'order_direction={order["direction"]}\n')
-        pos_id = order['pos_id']
-        from qteasy.trade_recording import get_position_by_id
-        try:
-            position = get_position_by_id(pos_id=pos_id, data_source=self.data_source)
-        except RuntimeError as e:
-            raise RuntimeError(e)
-        symbol = position['symbol']
-        position = position['position']
-        qty = order['qty']
-        price = order['price']
-        direction = order['direction']
-        order_type = order['order_type']
+            self.send_message(f'_parse_order():\nsubmit order components of order(ID) {order_id}:\n'
+                              f'quantity:{order.get("qty")}\norder_price={order.get("price")}\n'
+                              f'order_direction={order.get("direction")}\n')
+        direction = order.get('direction')
+        if direction not in ('buy', 'sell'):
+            raise ValueError(f'invalid direction of order {order_id}: {direction}')
+        qty = order.get('qty')
+        if not isinstance(qty, numbers.Real) or not qty > 0:
+            raise ValueError(f'invalid quantity of order {order_id}: {qty}')
+        price = order.get('price')
+        if (price is not None) and not isinstance(price, numbers.Real):
+            raise ValueError(f'invalid price of order {order_id}: {price}')
+        symbol = order.get('symbol')
+        position = order.get('position')
+        if not (symbol and position):
+            # 订单中没有持仓信息时，根据pos_id从数据源中读取持仓
+            pos_id = order.get('pos_id')
+            if pos_id is None:
+                raise ValueError(f'order {order_id} has neither symbol and position nor pos_id')
+            from qteasy.trade_recording import get_position_by_id
+            try:
+                pos_record = get_position_by_id(pos_id=pos_id, data_source=self.data_source)
+            except RuntimeError as e:
+                raise ValueError(f'position (pos_id = {pos_id}) of order {order_id} can not be found: {e}')
+            symbol = pos_record['symbol']
+            position = pos_record['position']
+        order_type = order.get('order_type')
         return order_type, symbol, qty, price, direction, position
 
     def _get_result(self, order):
@@ -327,31 +435,14 @@ class Broker(object):
                 self.send_message(f'method: _get_result(): got transaction result for order(ID) {order["order_id"]}\n'
                                   f'result_type={result_type}, \nqty={qty}, \n'
                                   f'filled_price={filled_price}, \nfee={fee}')
-            # 圆整qty、filled_qty和fee
-            qty = round(qty, AMOUNT_DECIMAL_PLACES)
-            filled_price = round(filled_price, CASH_DECIMAL_PLACES)
-            transaction_fee = round(fee, CASH_DECIMAL_PLACES)
-
-            filled_qty = 0
-            canceled_qty = 0
-            if result_type in ['filled', 'partial-filled']:
-                filled_qty = qty
-            elif result_type == 'canceled':
-                canceled_qty = qty
-            else:
-                raise ValueError(f'Unknown result_type: {result_type}, should be one of ["filled", "canceled"]')
-
-            current_datetime = get_current_timezone_datetime(self.time_zone)
-            raw_trade_result = {
-                'order_id':        order['order_id'],
-                'filled_qty':      filled_qty,
-                'price':           filled_price,
-                'transaction_fee': transaction_fee,
-                'execution_time':  current_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                'canceled_qty':    canceled_qty,
-                'delivery_amount': 0,
-                'delivery_status': 'ND',
-            }
+            raw_trade_result = self._make_raw_trade_result(
+                    order_id=order['order_id'],
+                    result_type=result_type,
+                    qty=qty,
+                    price=filled_price,
+                    fee=fee,
+                    execution_time=self.now(),
+            )
 
             # 将trade_result放入result_queue
             if self.debug:
@@ -508,6 +599,12 @@ class SimulatorBroker(Broker):
         - 如果订单类型是限价单：若当前格低于叫买价，以当前价买入，若当前价高于叫卖价，以当前价卖出
     - 股票涨停时大概率买入交易失败，跌停时大概率卖出交易失败
     - 交易费率根据参数中的设置计算，包括固定费率、最低费用、滑点等
+
+    模拟交易所不会用sleep等待成交，所有的时间都是Broker的当前时间(虚拟时钟，参见now())：
+
+    - 收到的订单经过模拟的交易延迟(delay)后才能撮合，部分成交或不能成交的订单在retry_interval秒后再次撮合
+    - 每一轮撮合把所有可以撮合的订单放在一起，用同一个实时价格快照批量撮合
+    - 所有随机成交结果都由一个随机数生成器产生，给出seed时，相同的订单和价格总是产生相同的成交结果
     """
 
     def __init__(self,
@@ -523,6 +620,10 @@ class SimulatorBroker(Broker):
                  delay=1.0,
                  price_deviation=0.0,
                  probabilities=(0.9, 0.08, 0.02),
+                 seed=None,
+                 max_retries=10,
+                 retry_interval=1.0,
+                 price_feed=None,
                  data_source=None):
         """ 生成一个Broker对象
 
@@ -546,15 +647,27 @@ class SimulatorBroker(Broker):
             买入操作最小数量
         moq_sell: float, default 0.0
             卖出操作最小数量
-        delay: float, default 1.0
-            模拟交易延迟，单位为秒
+        delay: float, tuple of 2 floats or callable, default 1.0
+            模拟交易延迟，单位为秒，订单在收到后经过延迟时间才能撮合，可以是：
+            - float: 固定的延迟时间
+            - (low, high): 延迟时间在low与high之间均匀分布
+            - callable: 延迟模型，以随机数生成器为参数调用delay(rng)，返回延迟时间
         price_deviation: float, default 0.0
             模拟成交价格允许误差值。例如，当前价格100元，误差值为0.01，即允许价格误差为100*0.01 = 1元
             此时买入报价大于100-1元即可成交
             卖出报价小于100+1元即可成交
         probabilities: tuple of 3 floats, default (0.90, 0.08, 0.02)
             模拟完全成交、部分成交和未成交三种情况出现的概率
-
+        seed: int, optional
+            随机数生成器的种子，给出seed时模拟成交结果可以重现
+        max_retries: int, default 10
+            订单无法撮合（没有实时价格或价格不满足条件）时的最大重试次数，超过后订单被取消
+        retry_interval: float, default 1.0
+            无法撮合或部分成交的订单再次撮合前等待的时间，单位为秒
+        price_feed: PriceFeed, optional
+            实时价格来源，如果为None，使用Trader的price_feed，单独使用时从eastmoney获取实时价格
+        data_source: DataSource, optional
+            交易所的数据源
         """
         super(SimulatorBroker, self).__init__(data_source=data_source)
         self.broker_name = 'SimulatorBroker'
@@ -567,126 +680,279 @@ class SimulatorBroker(Broker):
         self.slipage = slipage
         self.moq_buy = moq_buy
         self.moq_sell = moq_sell
+        if not (isinstance(delay, (int, float)) or callable(delay) or
+                (isinstance(delay, (tuple, list)) and len(delay) == 2)):
+            raise TypeError(f'delay should be a number, a tuple of (low, high) or a callable, got {delay} instead')
         self.delay = delay
         self.price_deviation = price_deviation
         self.probabilities = probabilities
+        self.seed = seed
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.price_feed = price_feed
+        self._rng = np.random.default_rng(seed)
+        self._pending_orders = []
+        self._pending_lock = threading.RLock()
 
-    def transaction(self, symbol, order_qty, order_price, direction, position='long', order_type='market'):
-        """ 读取实时价格模拟成交结果
+    @property
+    def pending_orders(self) -> list:
+        """ 已经收到但尚未处理完毕的订单 """
+        with self._pending_lock:
+            return [pending['order'] for pending in self._pending_orders]
+
+    def _get_latency(self) -> float:
+        """ 根据延迟模型生成一个订单的交易延迟，单位为秒 """
+        if callable(self.delay):
+            return float(self.delay(self._rng))
+        if isinstance(self.delay, (tuple, list)):
+            low, high = self.delay
+            return float(self._rng.uniform(low, high))
+        return float(self.delay)
+
+    def _get_quotes(self, symbols) -> pd.DataFrame:
+        """ 从price_feed获取symbols的实时价格快照，获取失败时返回空DataFrame """
+        if self.price_feed is None:
+            from .price_feed import LivePriceFeed
+            self.price_feed = LivePriceFeed(parallel=False)
+        try:
+            return self.price_feed.fetch_quotes(symbols)
+        except Exception as e:
+            self.send_message(f'live prices of {symbols} can not be acquired at the moment: {e}')
+            return pd.DataFrame()
+
+    def _match(self, symbols, order_qty, order_price, directions, order_types, quotes):
+        """ 用同一个实时价格快照批量撮合一组订单
+
+        Parameters
+        ----------
+        symbols: list of str
+            订单的交易标的
+        order_qty: np.ndarray
+            订单尚未成交的数量
+        order_price: np.ndarray
+            订单报价
+        directions: np.ndarray of str
+            订单方向，'buy' 或 'sell'
+        order_types: np.ndarray of str
+            订单类型，'market' 或 'limit'
+        quotes: pd.DataFrame
+            以symbol为index的实时价格快照，至少包含close列，可以包含pre_close列
+
+        Returns
+        -------
+        tuple of 4 np.ndarray: (result_types, qty, price, fee)
+            result_types中'filled', 'partial-filled', 'canceled'为撮合结果，'retry'表示本轮无法撮合，
+            交易方向无效的订单结果为'canceled'
         """
+        count = len(symbols)
+        quotes = quotes.reindex(index=symbols, columns=['close', 'pre_close'])
+        live_price = quotes['close'].to_numpy(dtype='float')
+        # 没有昨收价时无法判断涨跌停，按照没有涨跌处理
+        change = np.nan_to_num(live_price / quotes['pre_close'].to_numpy(dtype='float') - 1, nan=0.0)
+        has_price = live_price > 0  # nan为False
+        price_deviation = live_price * self.price_deviation
+        is_buy = directions == 'buy'
+        is_sell = directions == 'sell'
+        # 交易方向无效的订单无法撮合，直接取消
+        invalid = ~(is_buy | is_sell)
+
+        # 如果当前价高于挂卖价(允许误差由price_deviation控制)，大概率成交或部分成交
+        sell_ok = has_price & is_sell & (live_price >= order_price - price_deviation)
+        # 如果当前价低于挂买价(允许误差由price_deviation控制), 大概率成交或部分成交
+        buy_ok = has_price & is_buy & (live_price <= order_price + price_deviation)
+        # 如果挂单类型为市价单且不受涨跌停限制, 大概率成交或部分成交
+        market_ok = has_price & (order_types == 'market') & (-0.098 < change) & (change < 0.098)
+        matched = sell_ok | buy_ok | market_ok
+
+        # 每个订单的成交概率，接近跌停的卖单和接近涨停的买单非常大概率被取消
+        probabilities = np.tile(np.asarray(self.probabilities, dtype='float'), (count, 1))
+        price_limited = (sell_ok & (np.abs(change + 0.1) <= 0.001)) | (buy_ok & (np.abs(change - 0.1) <= 0.001))
+        probabilities[price_limited] = (0.01, 0.01, 0.98)
+        # 0: filled, 1: partial-filled, 2: canceled
+        result_codes = (self._rng.random((count, 1)) >= np.cumsum(probabilities, axis=1)[:, :2]).sum(axis=1)
+        # 模拟交易所的部分成交比例
+        filled_proportion = np.array([0.25, 0.5, 0.75])[
+            (self._rng.random((count, 1)) >= np.cumsum([0.3, 0.5])).sum(axis=1)
+        ]
+
+        qty = np.where(result_codes == 1, order_qty * filled_proportion, order_qty)
+        moq = np.where(is_buy, self.moq_buy, self.moq_sell)
+        has_moq = (moq > 0) & (result_codes < 2)
+        if has_moq.any():
+            safe_moq = np.where(has_moq, moq, 1.)
+            moq_qty = np.trunc(qty / safe_moq) * safe_moq
+            # 如果成交数量小于moq，但是剩余数量大于moq，那么成交数量就是moq
+            moq_qty = np.where((moq_qty < safe_moq) & (order_qty > safe_moq), safe_moq, moq_qty)
+            # 如果成交数量小于moq，且剩余数量也小于moq，那么成交数量就是剩余数量
+            all_remaining = (moq_qty < safe_moq) & (order_qty <= safe_moq)
+            moq_qty = np.where(all_remaining, order_qty, moq_qty)
+            qty = np.where(has_moq, moq_qty, qty)
+            result_codes = np.where(has_moq & all_remaining, 0, result_codes)
+
+        # 计算交易费用，根据买入/卖出费率计算，固定费用不为0时使用固定费用
+        fee_rate = np.where(is_buy, self.fee_rate_buy, self.fee_rate_sell)
+        fee_min = np.where(is_buy, self.fee_min_buy, self.fee_min_sell)
+        fee_fix = np.where(is_buy, self.fee_fix_buy, self.fee_fix_sell)
+        fee = np.where(fee_fix == 0, np.maximum(qty * live_price * fee_rate, fee_min), fee_fix)
+        # 模拟交易滑点, 交易数量越大，对交易费用产生的影响越大
+        if self.slipage > 0:
+            fee = fee * (1 + self.slipage * (qty / 100) ** 2)
+
+        result_codes = np.where(invalid, 2, result_codes)
+        result_types = np.array(['filled', 'partial-filled', 'canceled'], dtype=object)[result_codes]
+        canceled = result_codes == 2
+        # 成交价格为当前价格，取消的订单成交价格和交易费用为0，取消全部剩余数量
+        price = np.where(canceled, 0., live_price)
+        fee = np.where(canceled, 0., fee)
+        qty = np.where(canceled, order_qty, qty)
+
+        result_types[~matched & ~invalid] = 'retry'
+        return result_types, qty, price, fee
+
+    def process_orders(self, orders) -> None:
+        """ 把新收到的订单加入未完成订单，并撮合所有到期的未完成订单，无效的订单直接取消 """
+        now = self.now()
+        with self._pending_lock:
+            for order in orders:
+                try:
+                    order_type, symbol, qty, price, direction, position = self._parse_order(order)
+                except Exception as e:
+                    self._cancel_invalid_order(order, e, now)
+                    continue
+                self._pending_orders.append({
+                    'order':        order,
+                    'order_type':   order_type,
+                    'symbol':       symbol,
+                    'remaining':    qty,
+                    'price':        price,
+                    'direction':    direction,
+                    'retries_left': self.max_retries,
+                    'ready_time':   now + pd.Timedelta(seconds=self._get_latency()),
+                })
+        self.match_orders(now=now)
+
+    def _cancel_invalid_order(self, order, error, now) -> None:
+        """ 无法解析的订单不进入未完成订单，直接生成取消全部数量的交易结果 """
+        order_id = order.get('order_id') if isinstance(order, dict) else None
+        qty = order.get('qty') if isinstance(order, dict) else None
+        self.send_message(f'order {order_id} is canceled because it is invalid: {error}')
+        if order_id is None:
+            return
+        canceled_qty = qty if isinstance(qty, numbers.Real) and qty > 0 else 0.
+        self.result_queue.put(self._make_raw_trade_result(
+                order_id=order_id,
+                result_type='canceled',
+                qty=canceled_qty,
+                price=0.,
+                fee=0.,
+                execution_time=now,
+        ))
+
+    def match_orders(self, now=None) -> list:
+        """ 撮合所有到期的未完成订单，将交易结果放入result_queue
 
-        total_filled = 0
+        Parameters
+        ----------
+        now: pd.Timestamp, optional
+            撮合时间，默认为Broker的当前时间，ready_time不晚于撮合时间的订单参与撮合
 
-        while True:
+        Returns
+        -------
+        raw_trade_results: list of dict
+            本轮撮合产生的交易结果
+        """
+        if now is None:
+            now = self.now()
+        with self._pending_lock:
+            ready = [pending for pending in self._pending_orders if pending['ready_time'] <= now]
+            if not ready:
+                return []
+            symbols = [pending['symbol'] for pending in ready]
+            quotes = self._get_quotes(list(dict.fromkeys(symbols)))
+            result_types, qty, price, fee = self._match(
+                    symbols=symbols,
+                    order_qty=np.array([pending['remaining'] for pending in ready], dtype='float'),
+                    order_price=np.array([pending['price'] for pending in ready], dtype='float'),
+                    directions=np.array([pending['direction'] for pending in ready]),
+                    order_types=np.array([pending['order_type'] for pending in ready]),
+                    quotes=quotes,
+            )
+            retry_time = now + pd.Timedelta(seconds=self.retry_interval)
+            raw_trade_results = []
+            for pending, result_type, filled_qty, filled_price, transaction_fee in \
+                    zip(ready, result_types, qty, price, fee):
+                order_id = pending['order']['order_id']
+                if result_type == 'retry':
+                    pending['retries_left'] -= 1
+                    if pending['retries_left'] > 0:
+                        pending['ready_time'] = retry_time
+                        continue
+                    # 重试超过max_retries，直接cancel订单
+                    self.send_message(f'order {order_id} will be canceled because max retries exceeded')
+                    result_type, filled_qty, filled_price, transaction_fee = 'canceled', pending['remaining'], 0., 0.
+                raw_trade_result = self._make_raw_trade_result(
+                        order_id=order_id,
+                        result_type=result_type,
+                        qty=filled_qty,
+                        price=filled_price,
+                        fee=transaction_fee,
+                        execution_time=now,
+                )
+                raw_trade_results.append(raw_trade_result)
+                self.result_queue.put(raw_trade_result)
+                pending['remaining'] -= filled_qty
+                pending['ready_time'] = retry_time
+            self._pending_orders = [pending for pending in self._pending_orders
+                                    if round(pending['remaining'], AMOUNT_DECIMAL_PLACES) > 0]
+        if self.debug:
+            self.send_message(f'matched {len(ready)} orders at {now}, got {len(raw_trade_results)} results')
+        return raw_trade_results
 
-            import time
+    def log_out_broker(self):
+        """ 关闭前提示尚未处理完毕的订单 """
+        pending_orders = self.pending_orders
+        if pending_orders:
+            print(f'Un-finished orders: {pending_orders}')
 
-            if total_filled >= order_qty:  # 订单完全成交，退出
-                break
+    def transaction(self, symbol, order_qty, order_price, direction, position='long', order_type='market'):
+        """ 读取实时价格模拟成交结果，无法撮合时等待retry_interval秒后重试，最多尝试max_retries次
+        """
+
+        total_filled = 0
+        retries_left = self.max_retries
+
+        while total_filled < order_qty:
 
             if self.status == 'stopped':  # 当broker停止时，退出
                 break
 
             if self.status == 'paused':  # 当broker暂停时，稍后重试
+                time.sleep(0.05)
                 continue
 
-            # 获取当前实时价格
-            retry = 10  # 重试次数为10次（秒）
-            from .emfuncs import stock_live_kline_price
-            live_prices = stock_live_kline_price(symbol, freq='D', verbose=True, parallel=False)
-            if not live_prices.empty:
-                live_prices['close'] = live_prices['close'].astype('float')
-                change = (live_prices['close'] / live_prices['pre_close'] - 1).iloc[-1]
-                live_price = live_prices.close.iloc[-1]
-                price_deviation = live_price * self.price_deviation
-            else:  # 实时价格获取不成功，稍后重试
-                self.send_message(f'live price of {symbol} can not be acquired at the moment, '
-                                  f'order will not be processed, retries left: {retry}')
-                retry -= 1
-                live_price = 0
-                change = 0
-                price_deviation = 0
-                if retry > 0:
-                    time.sleep(1)  # 延迟1秒重试
+            remaining = order_qty - total_filled
+            result_types, qty, price, fee = self._match(
+                    symbols=[symbol],
+                    order_qty=np.array([remaining], dtype='float'),
+                    order_price=np.array([order_price], dtype='float'),
+                    directions=np.array([direction]),
+                    order_types=np.array([order_type]),
+                    quotes=self._get_quotes([symbol]),
+            )
+            result_type = result_types[0]
+            if result_type == 'retry':
+                retries_left -= 1
+                if retries_left > 0:
+                    time.sleep(self.retry_interval)  # 等待retry_interval秒后重试
                     continue
-            # 重试超过max_retry，直接cancel订单
-            if retry <= 0:
                 self.send_message(f'order will be canceled because max retries exceeded')
-                result_type = 'canceled'
-            # 如果当前价高于挂卖价(允许误差由price_deviation控制)，大概率成交或部分成交
-            elif (live_price >= order_price - price_deviation) and (direction == 'sell'):
-                result_type = np.random.choice(['filled', 'partial-filled', 'canceled'], p=self.probabilities)
-                # 如果change非常接近-10%(跌停)，则非常大概率canceled
-                if abs(change + 0.1) <= 0.001:
-                    self.send_message(f'order will be probably canceled because -10% sell-limit')
-                    result_type = np.random.choice(['filled', 'partial-filled', 'canceled'], p=(0.01, 0.01, 0.98))
-            # 如果当前价低于挂买价(允许误差由price_deviation控制), 大概率成交或部分成交
-            elif (live_price <= order_price + price_deviation) and (direction == 'buy'):
-                result_type = np.random.choice(['filled', 'partial-filled', 'canceled'], p=self.probabilities)
-                # 如果change非常接近+10%(涨停)，则非常大概率canceled
-                if abs(change - 0.1) <= 0.001:
-                    self.send_message(f'order will be probably canceled because +10% buy-limit')
-                    result_type = np.random.choice(['filled', 'partial-filled', 'canceled'], p=(0.01, 0.01, 0.98))
-            # 如果挂单类型为市价单且不受张跌停限制, 大概率成交或部分成交
-            elif (order_type == 'market') and (-0.098 < change < 0.098):
-                # 市价单，只要不涨停跌停即可市价成交
-                result_type = np.random.choice(['filled', 'partial-filled', 'canceled'], p=self.probabilities)
-            # 所有条件均不满足，稍后重试
-            else:
-                if self.debug:
-                    self.send_message(f'current price does not satisfy quoted, retries left: {retry}')
-                retry -= 1
-                time.sleep(1)  # 延迟1秒重试
-                continue
-
-            # 成交类型为成交或部分成交，计算成交数量及交易费用
-            if result_type in ['filled', 'partial-filled']:
-                # 部分成交及全部成交，计算成交数量
-                filled_proportion = 1
-                if result_type == 'partial-filled':
-                    filled_proportion = np.random.choice([0.25, 0.5, 0.75], p=[0.3, 0.5, 0.2])  # 模拟交易所的部分成交
-                remain_qty = order_qty - total_filled
-                qty = remain_qty * filled_proportion
-                if self.moq_buy > 0:
-                    qty = np.trunc(qty / self.moq_buy) * self.moq_buy
-                    if (qty < self.moq_buy) and (remain_qty > self.moq_buy):
-                        qty = self.moq_buy  # 如果成交数量小于moq，但是剩余数量大于moq，那么成交数量就是moq
-                    elif (qty < self.moq_buy) and (remain_qty <= self.moq_buy):
-                        qty = remain_qty  # 如果成交数量小于moq，且剩余数量也小于moq，那么成交数量就是剩余数量
-                        result_type = 'filled'
-                # 如果确认成交，成交价格为当前价格
-                order_price = live_price
-                # 计算交易费用，根据买入/卖出费率计算
-                if direction == 'buy':
-                    transaction_fee = \
-                        max(qty * order_price * self.fee_rate_buy, self.fee_min_buy) \
-                            if self.fee_fix_buy == 0 \
-                            else self.fee_fix_buy
-                elif direction == 'sell':
-                    transaction_fee = \
-                        max(qty * order_price * self.fee_rate_sell, self.fee_min_sell) \
-                            if self.fee_fix_sell == 0 \
-                            else self.fee_min_sell
-                else:
-                    raise RuntimeError(f'invalid direction: {direction}')
-                # 模拟交易滑点, 交易数量越大，对交易费用产生的影响越大
-                if self.slipage > 0:
-                    transaction_fee *= (1 + self.slipage * (qty / 100) ** 2)
-
-            # 成交类型为取消，成交数量为0，成交价格为0，交易费用为0
-            elif result_type in ['canceled']:  # result_type == 'canceled'
-                transaction_fee = 0
-                order_price = 0
-                qty = order_qty - total_filled
-            # 不能成交，稍后重试
-            else:
-                time.sleep(1)  # 延迟1秒重试
-                continue
+                yield 'canceled', remaining, 0., 0.
+                break
 
-            order_result = (result_type, qty, order_price, transaction_fee)
+            order_result = (result_type, float(qty[0]), float(price[0]), float(fee[0]))
             yield order_result
 
-            total_filled += qty
+            total_filled += qty[0]
 
 
 class NotImplementedBroker(Broker):
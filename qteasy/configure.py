@@ -14,7 +14,7 @@ import os
 import warnings
 
 from qteasy._arg_validators import QT_CONFIG
-from qteasy._arg_validators import ConfigDict
+from qteasy._arg_validators import ConfigDict, ConfigSnapshot
 from qteasy._arg_validators import _update_config_kwargs, _vkwargs_to_text
 from qteasy.utilfuncs import str_to_list, is_float_like, is_integer_like
 
@@ -26,6 +26,9 @@ QT_START_UP_FILE_INTRO = '# **********************************\n' \
                          '# example:\n' \
                          '# local_data_source = database\n\n'
 
+# QT_CONFIG的参数快照，QT_CONFIG被修改后重新生成
+_QT_CONFIG_SNAPSHOT = None
+
 
 def configure(config=None, reset=False, only_built_in_keys=True, **kwargs) -> None:
     """ 配置qteasy的运行参数QT_CONFIG
@@ -100,6 +103,43 @@ def set_config(config=None, reset=False, only_built_in_keys=True, **kwargs) -> N
     return configure(config=config, reset=reset, only_built_in_keys=only_built_in_keys, **kwargs)
 
 
+def config_snapshot(config=None) -> ConfigSnapshot:
+    """ 返回参数的不可修改快照，快照中的参数值已经验证过，使用with_overrides()覆盖参数时只验证修改的参数
+
+    QT_CONFIG的快照被缓存，只要QT_CONFIG中的参数没有被修改，多次调用返回同一个快照
+
+    Parameters
+    ----------
+    config: ConfigDict, optional
+        需要生成快照的参数字典，默认为None，此时生成QT_CONFIG的快照
+
+    Returns
+    -------
+    snapshot: ConfigSnapshot
+        参数快照
+
+    Examples
+    --------
+    >>> snapshot = config_snapshot()
+    >>> run_config = snapshot.with_overrides(mode=1, invest_start='20200101')
+    >>> run_config['invest_start']
+    '20200101'
+    """
+    global _QT_CONFIG_SNAPSHOT
+    if isinstance(config, ConfigSnapshot):
+        return config
+    if config is not None:
+        if not isinstance(config, ConfigDict):
+            raise TypeError(f'config should be a ConfigDict, got {type(config)} instead.')
+        return ConfigSnapshot(config)
+    snapshot = _QT_CONFIG_SNAPSHOT
+    # QT_CONFIG中的参数值与快照中的参数值完全相同(是同一个对象)时，直接使用缓存的快照
+    if (snapshot is None) or (len(snapshot) != len(QT_CONFIG)) or \
+            any(QT_CONFIG.get(key, snapshot) is not value for key, value in snapshot.items()):
+        snapshot = _QT_CONFIG_SNAPSHOT = ConfigSnapshot(QT_CONFIG)
+    return snapshot
+
+
 def configuration(config_key=None, level=0, up_to=0, default=True, verbose=False) -> None:
     """ 显示qt当前的配置变量，
 
@@ -24,7 +24,7 @@ from .qt_operator import Operator
 from .visual import _plot_loop_result, _loop_report_str, _print_test_result
 from .visual import _plot_test_result
 from ._arg_validators import QT_CONFIG, ConfigDict
-from .configure import configure
+from .configure import configure, config_snapshot
 from .optimization import _evaluate_all_parameters, _evaluate_one_parameter
 
 
@@ -342,7 +342,8 @@ def get_basic_info(code_or_name: str, asset_types=None, match_full_name=False, p
 
     if matched_count == 1 and not printout:
         # 返回唯一信息字典
-        a_type = list(asset_best_matched.keys())[0]
+        a_type = [at for at in asset_best_matched.keys() if at != 'count'][0]
+        asset_codes = list(asset_best_matched[a_type].keys())
         basics = asset_type_basics[a_type][info_columns[a_type]]
         return basics.loc[asset_codes[0]].to_dict()
 
@@ -684,6 +685,8 @@ def refill_data_source(*, data_source=None, **kwargs) -> None:
      chunk_size: int, default: 100
          保存数据到本地时，为了减少文件/数据库读取次数，将下载的数据累计一定数量后
          再批量保存到本地，chunk_size即批量，默认值100
+     rollup: Bool, default: False
+         是否在下载完成后用1分钟K线和日K线数据合并生成低频K线数据表(如5分钟K线、周K线等)
 
     Returns
     -------
@@ -1710,10 +1713,9 @@ def run(operator, **kwargs):
                             5: _search_pso,
                             6: _search_aco
                             }
-    # 如果函数调用时用户给出了关键字参数(**kwargs），将关键字参数赋值给一个临时配置参数对象，
-    # 覆盖QT_CONFIG的设置，但是仅本次运行有效
-    config = ConfigDict(**QT_CONFIG)
-    configure(config=config, **kwargs)
+    # 如果函数调用时用户给出了关键字参数(**kwargs），在QT_CONFIG的参数快照上覆盖这些参数，生成一个
+    # 仅本次运行有效的参数快照，只有与QT_CONFIG不同的参数需要验证
+    config = config_snapshot().with_overrides(**kwargs)
 
     # 赋值给参考数据和运行模式
     benchmark_data_type = config['benchmark_asset']
@@ -1809,7 +1811,7 @@ def run(operator, **kwargs):
         np_version = np.__version__
         if np_version >= '1.22' and how == 2:
             import warnings
-            config['parallel'] = False if config['parallel'] else config['parallel']
+            config = config.with_overrides(parallel=False)
             msg = f'Performance Warning: the optimization algorithm 2-incremental is much slower than ' \
                   f'expected when numpy version is higher than 1.21 in parallel computing mode, ' \
                   f'the parallel computing is disabled to avoid performance degradation.'
@@ -8,22 +8,29 @@
 #   Local historical data management.
 # ======================================
 import os
+import datetime
+import decimal
 from os import path
 import pandas as pd
 import numpy as np
 import warnings
 
-from concurrent.futures import as_completed, ThreadPoolExecutor
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from contextlib import contextmanager
+from numba import njit
 
 from .utilfuncs import progress_bar, sec_to_duration, nearest_market_trade_day, input_to_list
 from .utilfuncs import is_market_trade_day, str_to_list, regulate_date_format
 from .utilfuncs import _wildcard_match, _partial_lev_ratio, _lev_ratio, human_file_size, human_units
 from .utilfuncs import freq_dither, pandas_freq_alias_version_conversion
+from .price_feed import LastPriceStore
 
 AVAILABLE_DATA_FILE_TYPES = ['csv', 'hdf', 'hdf5', 'feather', 'fth']
 AVAILABLE_CHANNELS = ['df', 'csv', 'excel', 'tushare']
 ADJUSTABLE_PRICE_TYPES = ['open', 'high', 'low', 'close']
+# 老版本的sqlite中一条SQL语句最多只能绑定999个变量
+SQLITE_MAX_VARIABLES = 999
 TABLE_USAGES = ['sys', 'cal', 'basics', 'data', 'adj', 'events', 'comp', 'report', 'mins']
 
 '''
@@ -2371,6 +2378,980 @@ class MissingDataWarning(Warning):
     pass
 
 
+class TokenBucket:
+    """ 令牌桶限速器，用于限制同一个数据下载渠道的访问频率
+
+    令牌桶以rate的速度（每秒令牌数）补充令牌，最多容纳capacity个令牌，每次访问前需要获取
+    一个令牌，令牌不足时阻塞等待，直到有足够的令牌为止。多个下载线程可以共享同一个令牌桶
+
+    Parameters
+    ----------
+    rate: float
+        每秒补充的令牌数量，即长期平均的最大访问频率
+    capacity: int, default 1
+        令牌桶的容量，即允许的最大突发访问次数
+    clock: callable, optional
+        返回当前时间（秒）的函数，默认为time.monotonic，用于测试时替换
+    sleep: callable, optional
+        等待函数，默认为time.sleep，用于测试时替换
+
+    Examples
+    --------
+    >>> bucket = TokenBucket(rate=500 / 60, capacity=500)  # 每分钟最多500次访问
+    >>> bucket.acquire()
+    0.0
+    """
+
+    def __init__(self, rate: float, capacity: int = 1, clock=None, sleep=None):
+        import time
+        import threading
+        if rate <= 0:
+            raise ValueError(f'rate should be larger than 0, got {rate} instead')
+        if capacity < 1:
+            raise ValueError(f'capacity should be larger than or equal to 1, got {capacity} instead')
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = time.monotonic if clock is None else clock
+        self._sleep = time.sleep if sleep is None else sleep
+        self._tokens = float(capacity)
+        self._last = self._clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: int = 1) -> float:
+        """ 获取令牌，令牌不足时等待，返回等待的总时间（秒）"""
+        waited = 0.
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+class RefillScheduler:
+    """ 历史数据下载调度器，同时下载多个数据表的数据，并将下载的数据分批写入本地数据源
+
+    - 所有数据表的下载任务提交到同一个线程池中并发下载，不同的表之间不需要互相等待
+    - 下载线程将下载的数据放入一个有界队列，由唯一的写入线程从队列中取出数据，同一个表的所有下载数据
+      在该表全部下载完成后合并，一次写入数据源，避免反复重写整个数据表。缓存的数据总量超过上限时，
+      提前写入缓存数据最多的表，内存占用不会无限增长。给出flush_count时，每个表缓存的下载次数达到
+      flush_count后即写入一批数据，中断时最多丢失flush_count次下载
+    - 每个下载渠道可以设置一个TokenBucket限速器，所有下载线程共享限速器
+    - 下载进度保存在一个检查点文件中，只有写入数据源之后的任务才会被记为已完成，中断后重新
+      运行时可以跳过已完成的任务，下载全部成功后删除检查点文件
+
+    Parameters
+    ----------
+    datasource: DataSource
+        数据写入的数据源
+    fetcher: callable, optional
+        数据下载函数，签名为fetcher(table, **kwargs) -> pd.DataFrame，默认通过tushare API下载，
+        测试时可以替换为任意函数
+    rate_limiters: dict, optional
+        {channel: TokenBucket}，每个下载渠道的限速器
+    max_workers: int, optional
+        并发下载的线程数，为None时由ThreadPoolExecutor决定，为1时在当前线程中顺序下载
+    max_buffer_bytes: int, default 256MB
+        所有数据表缓存的下载数据的内存占用上限(bytes)，超过上限时提前写入缓存数据最多的表
+    flush_count: int, optional
+        每个数据表最多缓存的下载次数，达到后写入一批数据并保存检查点，为None或0时每个表下载完成后写入一次
+    queue_size: int, default 100
+        下载数据队列的最大长度，队列已满时下载线程等待写入线程取出数据
+    checkpoint_file: str, optional
+        检查点文件的完整路径，为None时不保存检查点
+    channel: str, default 'tushare'
+        数据下载渠道
+    """
+
+    def __init__(self, datasource, fetcher=None, rate_limiters=None, max_workers=None,
+                 max_buffer_bytes=256 * 1024 ** 2, queue_size=100, checkpoint_file=None, channel='tushare',
+                 flush_count=None):
+        self.datasource = datasource
+        self.fetcher = _fetch_table_data_from_tushare if fetcher is None else fetcher
+        self.rate_limiters = {} if rate_limiters is None else rate_limiters
+        self.max_workers = max_workers
+        self.max_buffer_bytes = max_buffer_bytes if max_buffer_bytes > 0 else 256 * 1024 ** 2
+        self.flush_count = flush_count if (flush_count is not None) and (flush_count > 0) else None
+        self.queue_size = queue_size if queue_size > 0 else 100
+        self.checkpoint_file = checkpoint_file
+        self.channel = channel
+        self.completed_tasks = self._load_checkpoint()
+        self.failed_tasks = {}
+        self.write_counts = {}
+
+    @staticmethod
+    def task_key(table: str, kwargs: dict) -> str:
+        """ 生成下载任务的唯一标识，用于在检查点中记录已完成的任务"""
+        import json
+        return f'{table}|{json.dumps(kwargs, sort_keys=True, default=str)}'
+
+    def _load_checkpoint(self) -> set:
+        """ 读取检查点文件中已经完成的任务"""
+        import json
+        if (self.checkpoint_file is None) or (not os.path.exists(self.checkpoint_file)):
+            return set()
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                return set(json.load(f)['completed'])
+        except Exception as e:
+            warnings.warn(f'failed reading refill checkpoint {self.checkpoint_file}: {e}, will start over')
+            return set()
+
+    def _save_checkpoint(self) -> None:
+        """ 将已经完成的任务写入检查点文件，先写入临时文件再替换，避免中断时损坏检查点文件"""
+        import json
+        if self.checkpoint_file is None:
+            return
+        temp_file = self.checkpoint_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'completed': sorted(self.completed_tasks)}, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def clear_checkpoint(self) -> None:
+        """ 删除检查点文件"""
+        if (self.checkpoint_file is not None) and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def _fetch(self, table: str, kwargs: dict) -> pd.DataFrame:
+        """ 在限速器允许的情况下下载一次数据"""
+        limiter = self.rate_limiters.get(self.channel)
+        if limiter is not None:
+            limiter.acquire()
+        return self.fetcher(table, **kwargs)
+
+    def run(self, table_tasks: dict) -> dict:
+        """ 下载所有数据表的数据并写入数据源
+
+        下载线程将数据放入有界队列，当前线程作为唯一的写入线程，每次取出队列中所有的数据，
+        每个表全部下载完成后合并写入一次，缓存数据超过max_buffer_bytes时提前写入缓存最多的表
+
+        Parameters
+        ----------
+        table_tasks: dict
+            {table: [kwargs, ...]}，每个数据表的所有下载参数
+
+        Returns
+        -------
+        dict: {table: rows_written}，每个数据表写入的数据行数
+        """
+        import time
+        import queue
+        import threading
+        tasks = []
+        skipped = 0
+        for table, all_kwargs in table_tasks.items():
+            for kwargs in all_kwargs:
+                key = self.task_key(table, kwargs)
+                if key in self.completed_tasks:
+                    skipped += 1
+                    continue
+                tasks.append((table, kwargs, key))
+        total = len(tasks)
+        remaining = {table: 0 for table in table_tasks}
+        for table, _, _ in tasks:
+            remaining[table] += 1
+        buffers = {table: [] for table in table_tasks}
+        buffered_keys = {table: [] for table in table_tasks}
+        buffered_bytes = {table: 0 for table in table_tasks}
+        written = {table: 0 for table in table_tasks}
+        for table in table_tasks:
+            self.write_counts.setdefault(table, 0)
+        if skipped > 0:
+            print(f'resuming data refill from checkpoint, {skipped} completed downloads skipped')
+        for table in table_tasks:
+            if remaining[table] == 0:
+                progress_bar(1, 1, f'<{table}> all data already downloaded\n')
+
+        completed = 0
+        st = time.time()
+
+        def flush(table):
+            # 先写入数据，再将这一批下载任务记入检查点
+            if buffers[table]:
+                dnld_data = pd.concat(buffers[table])
+                written[table] += self.datasource.update_table_data(table, dnld_data)
+                self.write_counts[table] += 1
+            self.completed_tasks.update(buffered_keys[table])
+            buffers[table] = []
+            buffered_keys[table] = []
+            buffered_bytes[table] = 0
+            self._save_checkpoint()
+
+        def collect(table, kwargs, key, df=None, error=None):
+            nonlocal completed
+            completed += 1
+            remaining[table] -= 1
+            if error is not None:
+                self.failed_tasks[key] = error
+            else:
+                buffers[table].append(df)
+                buffered_keys[table].append(key)
+                if df is not None:
+                    buffered_bytes[table] += int(df.memory_usage(index=True).sum())
+            time_elapsed = time.time() - st
+            time_remain = sec_to_duration((total - completed) * time_elapsed / completed,
+                                          estimation=True, short_form=False)
+            progress_bar(completed, total, f'<{table}:{list(kwargs.values())[0] if kwargs else None}>'
+                                           f'{sum(written.values())}wrtn/{time_remain} left')
+
+        def write(tables):
+            # 缓存数据超过上限时，提前写入缓存数据最多的表，直到缓存数据低于上限
+            while sum(buffered_bytes.values()) > self.max_buffer_bytes:
+                flush(max(buffered_bytes, key=buffered_bytes.get))
+            for table in tables:
+                if remaining[table] > 0:
+                    # 缓存的下载次数达到flush_count时写入一批数据
+                    if (self.flush_count is not None) and (len(buffered_keys[table]) >= self.flush_count):
+                        flush(table)
+                    continue
+                flush(table)
+                table_failed = [k for k in self.failed_tasks if k.startswith(f'{table}|')]
+                strftime_elapsed = sec_to_duration(time.time() - st, estimation=True, short_form=True)
+                progress_bar(completed, total, f'<{table}> {written[table]}wrtn in {strftime_elapsed}\n')
+                if table_failed:
+                    msg = f'\n{len(table_failed)} downloads failed for table [{table}], e.g. ' \
+                          f'{table_failed[0]}: {self.failed_tasks[table_failed[0]]}\n' \
+                          f'{written[table]} rows written, re-run refill with "resume=True" to download the rest.'
+                    warnings.warn(msg)
+
+        if total == 0:
+            return written
+        progress_bar(0, total, f'estimating time left...')
+        try:
+            if self.max_workers == 1:
+                for table, kwargs, key in tasks:
+                    try:
+                        df = self._fetch(table, kwargs)
+                    except Exception as e:
+                        collect(table, kwargs, key, error=e)
+                    else:
+                        collect(table, kwargs, key, df=df)
+                    write([table])
+            else:
+                results = queue.Queue(maxsize=self.queue_size)
+                stopped = threading.Event()
+
+                def fetch_and_put(table, kwargs, key):
+                    try:
+                        item = (table, kwargs, key, self._fetch(table, kwargs), None)
+                    except Exception as e:
+                        item = (table, kwargs, key, None, e)
+                    # 队列已满时等待写入线程取出数据，写入线程中断后放弃等待
+                    while not stopped.is_set():
+                        try:
+                            results.put(item, timeout=0.1)
+                            return
+                        except queue.Full:
+                            continue
+
+                worker = ThreadPoolExecutor(max_workers=self.max_workers)
+                futures = []
+                try:
+                    for table, kwargs, key in tasks:
+                        futures.append(worker.submit(fetch_and_put, table, kwargs, key))
+                    while completed < total:
+                        # 取出队列中所有已下载的数据，全部下载完成的表写入一次
+                        items = [results.get()]
+                        while True:
+                            try:
+                                items.append(results.get_nowait())
+                            except queue.Empty:
+                                break
+                        touched = []
+                        for table, kwargs, key, df, error in items:
+                            collect(table, kwargs, key, df=df, error=error)
+                            if table not in touched:
+                                touched.append(table)
+                        write(touched)
+                except BaseException:
+                    # 中断时取消尚未开始的下载任务，不再等待所有任务完成
+                    stopped.set()
+                    for f in futures:
+                        f.cancel()
+                    raise
+                finally:
+                    stopped.set()
+                    worker.shutdown(wait=True)
+        finally:
+            # 中断时将已经下载的数据写入数据源，并记录检查点
+            for table in table_tasks:
+                if buffers[table]:
+                    flush(table)
+        return written
+
+
+def _fetch_table_data_from_tushare(table, **kwargs) -> pd.DataFrame:
+    """ 通过TABLE_MASTERS中定义的tushare API下载数据表的数据
+
+    这里如果直接使用DataSource.fetch_history_table_data会导致多线程下载时程序无法运行，原因不明，
+    目前通过TABLE_MASTERS获取tushare接口名称，并通过acquire_data直接通过tushare的API获取数据
+    """
+    from .tsfuncs import acquire_data
+    api_name = TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('tushare')]
+    return acquire_data(api_name, **kwargs)
+
+
+class ConnectionPool:
+    """ 线程安全的数据库连接池，由DataSource持有，所有数据库操作从连接池中借用连接，用完后归还
+
+    - 连接在归还后保持打开，下次借用时直接使用，避免每次数据库操作都重新建立TCP连接并认证
+    - 同时借出的连接数量不超过max_size，连接全部借出时，等待其他线程归还连接
+    - 借出空闲时间超过ping_interval秒的连接之前，先ping数据库检查连接是否有效，无效的连接被丢弃
+      并重新建立连接，已经断开的连接在归还时被丢弃
+
+    Parameters
+    ----------
+    connect: callable
+        建立一个新连接的函数，无参数，返回一个数据库连接对象，如functools.partial(pymysql.connect, ...)
+        测试时可以替换为任意兼容的连接函数
+    max_size: int, default 5
+        连接池中最多同时存在的连接数量
+    ping_interval: float, default 60
+        连接空闲超过该秒数后，借出前检查连接是否有效，为0时每次借出前都检查
+    timeout: float, default 30
+        所有连接都被借出时，等待其他线程归还连接的最长秒数，超时后抛出TimeoutError，为None时一直等待，
+        同一个线程在持有连接时再借用连接，连接数量不足时会一直等待，因此不建议设置为None
+    clock: callable, optional
+        返回当前时间（秒）的函数，默认为time.monotonic
+
+    Examples
+    --------
+    >>> pool = ConnectionPool(connect=lambda: pymysql.connect(host='localhost', user='user', password='pass'))
+    >>> with pool.connection() as con:
+    ...     cursor = con.cursor()
+    ...     cursor.execute('SELECT 1')
+    """
+
+    def __init__(self, connect, max_size=5, ping_interval=60, timeout=30, clock=None):
+        import time
+        import threading
+        if not callable(connect):
+            raise TypeError(f'connect should be a callable, got {type(connect)} instead')
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError(f'max_size should be a positive integer, got {max_size} instead')
+        self._connect = connect
+        self.max_size = max_size
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._clock = time.monotonic if clock is None else clock
+        self._idle = []  # [(connection, last_used_time), ...]，后进先出，优先使用最近使用过的连接
+        self._size = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        """ 连接池中已经建立的连接数量，包括借出的和空闲的连接"""
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        """ 连接池中空闲的连接数量"""
+        return len(self._idle)
+
+    def acquire(self, timeout=None):
+        """ 从连接池中借出一个连接，没有空闲连接且连接数量未达上限时建立新连接
+
+        Parameters
+        ----------
+        timeout: float, optional
+            等待空闲连接的最长秒数，为None时使用连接池的timeout设置
+
+        Returns
+        -------
+        connection: 数据库连接对象
+
+        Raises
+        ------
+        TimeoutError: 超时仍没有可用的连接
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    con, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    con, last_used = None, None
+                    break
+                remaining = None if deadline is None else deadline - self._clock()
+                if (remaining is not None) and (remaining <= 0):
+                    raise TimeoutError(f'no database connection available in {timeout} seconds, '
+                                       f'all {self.max_size} connections are in use')
+                self._cond.wait(timeout=remaining)
+
+        if con is not None:
+            if self._clock() - last_used < self.ping_interval:
+                return con
+            try:
+                con.ping(reconnect=True)
+                return con
+            except Exception:
+                # 连接已经失效，关闭后重新建立连接，占用的连接数量不变
+                self._close_quietly(con)
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, con, discard=False) -> None:
+        """ 将借出的连接归还连接池，已经断开的连接或discard为True时关闭连接
+
+        Parameters
+        ----------
+        con: 数据库连接对象
+            通过acquire()借出的连接
+        discard: bool, default False
+            是否关闭该连接而不是放回连接池
+        """
+        if discard or (not getattr(con, 'open', True)):
+            self._close_quietly(con)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((con, self._clock()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """ 以with语句借用一个连接，退出with语句时自动归还"""
+        con = self.acquire(timeout=timeout)
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+    def close_all(self) -> None:
+        """ 关闭所有空闲连接，借出的连接在归还时仍然可以放回连接池"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for con, _ in idle:
+            self._close_quietly(con)
+
+    @staticmethod
+    def _close_quietly(con) -> None:
+        try:
+            con.close()
+        except Exception:
+            pass
+
+
+ROLLUP_MINUTES = {'5min': 5, '15min': 15, '30min': 30, 'h': 60}
+
+
+def _get_rollup_targets(base_table):
+    """ 获取可以由base_table中的数据合并生成的数据表
+
+    1分钟K线表可以合并生成同一资产类型的5/15/30/60分钟K线表，日K线表可以合并生成周K线表和月K线表
+
+    Parameters
+    ----------
+    base_table: str
+        基础数据表名称
+
+    Returns
+    -------
+    list of str: 可以由基础数据表合并生成的数据表，如果没有这样的数据表，返回空列表
+    """
+    if base_table not in TABLE_MASTERS:
+        return []
+    schema_idx = TABLE_MASTER_COLUMNS.index('schema')
+    asset_idx = TABLE_MASTER_COLUMNS.index('asset_type')
+    freq_idx = TABLE_MASTER_COLUMNS.index('freq')
+    base = TABLE_MASTERS[base_table]
+    if (base[schema_idx], base[freq_idx]) == ('min_bars', '1min'):
+        target_freqs = list(ROLLUP_MINUTES)
+    elif (base[schema_idx], base[freq_idx]) == ('bars', 'd'):
+        target_freqs = ['w', 'm']
+    else:
+        return []
+    return [table for table, master in TABLE_MASTERS.items() if
+            (master[schema_idx] == base[schema_idx]) and
+            (master[asset_idx] == base[asset_idx]) and
+            (master[freq_idx] in target_freqs)]
+
+
+def _get_date_pk(table):
+    """ 获取数据表primary key中的日期或时间列的名称
+
+    Parameters
+    ----------
+    table: str
+        数据表名称
+
+    Returns
+    -------
+    str or None: 日期列的名称，如果primary key中没有日期列，返回None
+    """
+    columns, dtypes, primary_key, pk_dtypes = get_built_in_table_schema(table)
+    date_pks = [pk for pk, dtype in zip(primary_key, pk_dtypes) if dtype in ['date', 'datetime']]
+    return date_pks[0] if date_pks else None
+
+
+def _rollup_bars(df, freq, sessions=(('09:30:00', '11:30:00'), ('13:00:00', '15:00:00'))):
+    """ 将以(证券代码, 日期时间)为MultiIndex的K线数据合并为低频K线数据
+
+    分钟K线按照交易时段分组，每个K线的时间为K线结束的时间，例如5分钟K线09:35包含09:31至09:35之间的
+    1分钟K线，开盘时的09:30 K线合并到第一根K线中。周K线和月K线的日期为该周或该月最后一个交易日
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        以(证券代码, 日期时间)为MultiIndex的K线数据，包含open/high/low/close/vol/amount等列
+    freq: str, {'5min', '15min', '30min', 'h', 'w', 'm'}
+        合并后的K线频率
+    sessions: tuple of (str, str)
+        每个交易时段的开始和结束时间，仅用于合并分钟K线
+
+    Returns
+    -------
+    pd.DataFrame: 与输入数据列相同的合并后的K线数据
+    """
+    if df.empty:
+        return df
+    df = df.sort_index()
+    codes = df.index.get_level_values(0)
+    times = df.index.get_level_values(1)
+    if freq in ['w', 'm']:
+        # 周K线和月K线按照自然周(周五结束)或自然月分组，日期为组内最后一个交易日
+        keys = times.to_period('W-FRI' if freq == 'w' else 'M')
+    elif freq in ROLLUP_MINUTES:
+        minutes = ROLLUP_MINUTES[freq]
+        values = times.values
+        days = values.astype('datetime64[D]')
+        time_of_day = (values - days) / np.timedelta64(1, 'm')
+        starts = np.array([pd.Timedelta(start).total_seconds() / 60 for start, _ in sessions])
+        ends = np.array([pd.Timedelta(end).total_seconds() / 60 for _, end in sessions])
+        # 每个K线属于结束时间不早于K线时间的第一个交易时段
+        session = np.searchsorted(ends[:-1], time_of_day, side='left')
+        session_start, session_end = starts[session], ends[session]
+        bins = np.maximum(np.ceil((time_of_day - session_start) / minutes), 1)
+        bar_end = np.minimum(session_start + bins * minutes, session_end)
+        keys = pd.DatetimeIndex(days + (bar_end * 60).astype('timedelta64[s]'))
+    else:
+        raise ValueError(f'bars can not be rolled up to freq {freq}')
+
+    aggregations = {'open':      'first',
+                    'high':      'max',
+                    'low':       'min',
+                    'close':     'last',
+                    'pre_close': 'first',
+                    'vol':       'sum',
+                    'amount':    'sum'}
+    aggregations = {col: method for col, method in aggregations.items() if col in df.columns}
+    data = df[list(aggregations)].copy()
+    data['_label'] = times
+    aggregations['_label'] = 'max'
+    res = data.groupby([codes.values, keys], sort=True).agg(aggregations)
+    if freq in ['w', 'm']:
+        res.index = pd.MultiIndex.from_arrays([res.index.get_level_values(0), res['_label']])
+    res.index.names = df.index.names
+    res = res.drop(columns='_label')
+    if 'pre_close' in res.columns:
+        res['change'] = res['close'] - res['pre_close']
+        res['pct_chg'] = res['change'] / res['pre_close'] * 100
+    return res.reindex(columns=df.columns)
+
+
+def _pivot_dtype(dtypes):
+    """ 根据多个数据表中同一列数据的类型，确定合并后数组的数据类型及缺失值
+
+    所有数据均为float32时(使用compact数据类型)保持float32类型，其他数字类型使用float64，
+    日期时间类型使用datetime64[ns]，其余类型使用object
+    """
+    kinds = {dtype.kind for dtype in dtypes}
+    if kinds <= set('iufb'):
+        if all(dtype == np.float32 for dtype in dtypes):
+            return np.dtype('float32'), np.nan
+        return np.dtype('float64'), np.nan
+    if kinds == {'M'}:
+        return np.dtype('datetime64[ns]'), np.datetime64('NaT')
+    return np.dtype(object), np.nan
+
+
+class _HistoryPivot:
+    """ 将分块读取的同一个数据表中的数据逐块填充到以日期为行、证券代码为列的数组中
+
+    每一块数据都是以(证券代码, 日期)为MultiIndex的DataFrame，填充到数组中以后即可丢弃，不需要
+    将所有数据块合并为一个DataFrame。出现新的日期或证券代码时扩大数组，数组的列数按倍数扩大，
+    以减少复制数组的次数
+
+    Parameters
+    ----------
+    columns: list of str
+        需要提取的数据列
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.index_names = [None, None]
+        self.dates = np.array([], dtype='datetime64[ns]')
+        self.codes = {}  # 证券代码: 所在列的位置
+        self.present = np.zeros((0, 0), dtype=bool)  # 标记数据表中存在记录的位置
+        self.values = {}  # 数据列名: 以日期为行、证券代码为列的数组
+
+    @property
+    def empty(self):
+        return len(self.codes) == 0
+
+    def add(self, chunk):
+        """ 将一块数据填充到数组中"""
+        if chunk.empty:
+            return
+        self.index_names = list(chunk.index.names)
+        codes = chunk.index.get_level_values(0).values
+        dates = chunk.index.get_level_values(1).values
+        for code in pd.unique(codes):
+            self.codes.setdefault(code, len(self.codes))
+        all_dates = np.union1d(self.dates, dates)
+        n_cols = self.present.shape[1]
+        if (len(all_dates) > len(self.dates)) or (len(self.codes) > n_cols):
+            if len(self.codes) > n_cols:
+                n_cols = max(len(self.codes), 2 * n_cols)
+            old_rows = np.searchsorted(all_dates, self.dates)
+            shape = (len(all_dates), n_cols)
+            self.present = self._resized(self.present, old_rows, shape, False)
+            for col, arr in self.values.items():
+                self.values[col] = self._resized(arr, old_rows, shape, _pivot_dtype([arr.dtype])[1])
+            self.dates = all_dates
+        rows = np.searchsorted(self.dates, dates)
+        cols = pd.Index(list(self.codes)).get_indexer(codes)
+        self.present[rows, cols] = True
+        for col in self.columns:
+            if col not in chunk.columns:
+                continue
+            values = chunk[col].to_numpy()
+            arr = self.values.get(col)
+            dtype, fill_value = _pivot_dtype([values.dtype] if arr is None else [arr.dtype, values.dtype])
+            if arr is None:
+                arr = np.full(self.present.shape, fill_value, dtype=dtype)
+            elif arr.dtype != dtype:
+                arr = arr.astype(dtype)
+            arr[rows, cols] = values
+            self.values[col] = arr
+
+    @staticmethod
+    def _resized(arr, old_rows, shape, fill_value):
+        """ 将数组扩大为shape，原有的数据复制到old_rows行"""
+        res = np.full(shape, fill_value, dtype=arr.dtype)
+        res[old_rows, :arr.shape[1]] = arr
+        return res
+
+    def tail(self, row_count):
+        """ 每个证券只保留最后row_count行数据，删除不再包含任何数据的日期"""
+        n_cols = len(self.codes)
+        present = self.present[:, :n_cols]
+        counts = present[::-1].cumsum(axis=0)[::-1]
+        dropped = present & (counts > row_count)
+        present &= ~dropped
+        for arr in self.values.values():
+            arr[:, :n_cols][dropped] = _pivot_dtype([arr.dtype])[1]
+        rows = present.any(axis=1)
+        self.dates = self.dates[rows]
+        self.present = self.present[rows]
+        for col in self.values:
+            self.values[col] = self.values[col][rows]
+
+
+def _merge_history_pivots(pivots, htype, shares=None):
+    """ 将多个数据表中同一列数据合并为以日期为index，证券代码为列的DataFrame
+
+    所有数据表中的日期合并后排序，数据直接从每个数据表的数组填充到预先分配的数组中。如果同一个
+    证券的数据出现在多个数据表中，只使用第一个数据表中的数据
+
+    Parameters
+    ----------
+    pivots: list of _HistoryPivot
+        按照优先顺序排列的数据表，不包含htype列的数据表被忽略
+    htype: str
+        需要提取的数据列
+    shares: list of str, optional
+        输出的列，如果为None，按照证券代码在数据表中出现的顺序输出所有证券
+
+    Returns
+    -------
+    tuple: (pd.DataFrame, list of str)
+        合并后的数据，以及在多个数据表中出现而被丢弃的证券代码
+    """
+    pivots = [pivot for pivot in pivots if (htype in pivot.values) and (not pivot.empty)]
+    if not pivots:
+        return pd.DataFrame(columns=shares), []
+
+    all_dates = np.unique(np.concatenate([pivot.dates for pivot in pivots]))
+    # 每个证券只使用第一个包含该证券的数据表中的数据
+    owners = {}
+    for i, pivot in enumerate(pivots):
+        for code in sorted(pivot.codes):
+            owners.setdefault(code, i)
+    conflicts = sorted({code for i, pivot in enumerate(pivots) for code in pivot.codes if owners[code] != i})
+    columns = list(owners) if shares is None else list(shares)
+
+    dtype, fill_value = _pivot_dtype([pivot.values[htype].dtype for pivot in pivots])
+    result = np.full((len(all_dates), len(columns)), fill_value, dtype=dtype)
+    col_index = pd.Index(columns)
+    for i, pivot in enumerate(pivots):
+        owned = [code for code in pivot.codes if owners[code] == i]
+        source_cols = np.array([pivot.codes[code] for code in owned], dtype=int)
+        target_cols = col_index.get_indexer(owned)
+        mask = target_cols >= 0
+        rows = np.searchsorted(all_dates, pivot.dates)
+        result[np.ix_(rows, target_cols[mask])] = pivot.values[htype][:, source_cols[mask]]
+
+    index = pd.Index(all_dates, name=pivots[0].index_names[1])
+    columns = pd.Index(columns, name=pivots[0].index_names[0])
+    return pd.DataFrame(result, index=index, columns=columns), conflicts
+
+
+def _pivot_history_data(sources, htype, shares=None):
+    """ 将多个以(证券代码, 日期)为MultiIndex的数据表中的同一列数据合并为以日期为index，证券代码为列的DataFrame
+
+    如果同一个证券的数据出现在多个数据表中，只使用第一个数据表中的数据
+
+    Parameters
+    ----------
+    sources: list of pd.DataFrame
+        以(证券代码, 日期)为MultiIndex的数据表，均包含htype列
+    htype: str
+        需要提取的数据列
+    shares: list of str, optional
+        输出的列，如果为None，按照证券代码在数据表中出现的顺序输出所有证券
+
+    Returns
+    -------
+    tuple: (pd.DataFrame, list of str)
+        合并后的数据，以及在多个数据表中出现而被丢弃的证券代码
+    """
+    pivots = []
+    for df in sources:
+        pivot = _HistoryPivot([htype])
+        pivot.add(df)
+        pivots.append(pivot)
+    return _merge_history_pivots(pivots, htype, shares=shares)
+
+
+def _adj_factor_matrix(dates, factor_dates, factor_values):
+    """ 根据除权除息日和复权因子，计算每个日期每个证券适用的复权因子
+
+    将证券序号和日期合并为一个整数键后，通过一次searchsorted找到每个日期之前最近的除权除息日，
+    第一个除权除息日之前的日期复权因子为1.0
+
+    Parameters
+    ----------
+    dates: np.ndarray of datetime64[D], shape (n_dates,)
+        需要复权的数据的日期，必须是升序排列
+    factor_dates: list of np.ndarray of datetime64[D]
+        每个证券的除权除息日，升序排列
+    factor_values: list of np.ndarray of float
+        每个证券从除权除息日开始生效的复权因子
+
+    Returns
+    -------
+    np.ndarray, shape (n_dates, n_shares)
+    """
+    n_shares = len(factor_dates)
+    lengths = np.array([len(d) for d in factor_dates], dtype='int64')
+    if lengths.sum() == 0:
+        return np.ones((len(dates), n_shares))
+    days = dates.astype('int64')
+    f_days = np.concatenate(factor_dates).astype('int64')
+    f_values = np.concatenate(factor_values)
+    base = min(days.min(), f_days.min())
+    span = max(days.max(), f_days.max()) - base + 1
+    share_ids = np.arange(n_shares, dtype='int64')
+    f_keys = np.repeat(share_ids, lengths) * span + (f_days - base)
+    keys = share_ids[np.newaxis, :] * span + (days - base)[:, np.newaxis]
+    pos = np.searchsorted(f_keys, keys, side='right') - 1
+    # 找到的位置必须属于同一个证券，否则说明该日期之前没有复权因子
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    valid = pos >= starts[np.newaxis, :]
+    return np.where(valid, f_values[np.clip(pos, 0, None)], 1.0)
+
+
+DTYPE_PROFILES = ['default', 'compact']
+
+
+def _apply_dtype_profile(df, table, profile, categories=True):
+    """ 根据数据类型方案转换数据表的数据类型
+
+    compact方案中，数据表定义中类型为float的数据列转换为float32类型，与数据库中的float类型精度相同，
+    重复出现的字符串数据转换为category类型。主键在MultiIndex中已经以整数编码保存，不需要转换。
+    系统数据表的数据类型不转换。default方案中，float32类型的数据转换为float64类型
+
+    从csv文件和数据库中读取数据时，float列已经通过_read_dtypes()直接读取为float32类型，这里只转换
+    其他途径得到的float64数据(如default方案下保存的hdf/feather文件)
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        数据表中的数据
+    table: str
+        数据表名称
+    profile: str, {'default', 'compact'}
+        数据类型方案
+    categories: bool, default True
+        是否将字符串数据转换为category类型，保存为hdf文件时不能使用category类型
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if df.empty or (table not in TABLE_MASTERS):
+        return df
+    if profile == 'default':
+        # 使用compact方案保存的文件中可能有float32类型的数据，default方案读取时转换为float64
+        conversions = {col: 'float64' for col, dtype in df.dtypes.items() if dtype == np.float32}
+        return df.astype(conversions) if conversions else df
+    if TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('table_usage')] == 'sys':
+        return df
+    columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
+    conversions = {}
+    for col, dtype in zip(columns, dtypes):
+        if col not in df.columns:
+            continue
+        if (dtype == 'float') and (df[col].dtype == np.float64):
+            conversions[col] = 'float32'
+        elif categories and (dtype[:7] == 'varchar') and (df[col].dtype == object) and \
+                (df[col].nunique() <= len(df) // 2):
+            conversions[col] = 'category'
+    return df.astype(conversions) if conversions else df
+
+
+def _read_dtypes(table, profile):
+    """ 读取数据表时直接使用的数据类型
+
+    compact方案中，数据表定义中类型为float的数据列在读取时直接转换为float32类型，不需要先读取为
+    float64类型再转换。系统数据表以及default方案不指定数据类型
+
+    Parameters
+    ----------
+    table: str
+        数据表名称
+    profile: str, {'default', 'compact'}
+        数据类型方案
+
+    Returns
+    -------
+    dict: {column: dtype}
+    """
+    if (profile != 'compact') or (table not in TABLE_MASTERS):
+        return {}
+    if TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('table_usage')] == 'sys':
+        return {}
+    columns, dtypes = get_built_in_table_schema(table, with_primary_keys=False)
+    return {col: 'float32' for col, dtype in zip(columns, dtypes) if dtype == 'float'}
+
+
+def _records_to_frame(rows, names, dtypes=None):
+    """ 将数据库查询结果转换为DataFrame，dtypes中给出的列直接从查询结果生成指定类型的数组
+
+    Parameters
+    ----------
+    rows: sequence of tuple
+        数据库查询结果
+    names: list of str
+        查询结果的列名
+    dtypes: dict, optional
+        {column: dtype}，不在查询结果中的列被忽略，NULL值转换为NaN
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    positions = {name: names.index(name) for name in (dtypes or {}) if name in names}
+    df = pd.DataFrame.from_records(rows, columns=names, exclude=list(positions))
+    for name, pos in sorted(positions.items(), key=lambda item: item[1]):
+        values = np.fromiter((np.nan if row[pos] is None else row[pos] for row in rows),
+                             dtype=dtypes[name], count=len(rows))
+        df.insert(pos, name, values)
+    return df
+
+
+def _catalog_value(value):
+    """ 将数据表目录中的值转换为可以保存为json的python数据类型"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return pd.Timestamp(value).strftime('%Y%m%d')
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def _table_catalog_entry(df):
+    """ 从以primary key为index的数据表全部数据中统计数据表目录信息，不包括数据表的大小和修改时间"""
+    coverage = {}
+    if not df.empty:
+        for pk in df.index.names:
+            values = df.index.get_level_values(pk).unique()
+            if isinstance(values, pd.DatetimeIndex):
+                values = values.strftime('%Y%m%d')
+            coverage[pk] = [_catalog_value(values.min()), _catalog_value(values.max()), len(values)]
+    return {'rows': len(df), 'coverage': coverage}
+
+
+def _sqlite_connect(db_file):
+    """ 建立一个sqlite数据库连接，连接由连接池管理，同一时间只被一个线程使用，因此允许跨线程使用
+
+    使用WAL日志模式，写入数据时不阻塞其他连接读取数据
+    """
+    import sqlite3
+    con = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    return con
+
+
+def _sqlite_column_type(dtype):
+    """ 将数据表定义中的mysql数据类型转换为sqlite数据类型
+
+    日期和时间类型以ISO格式的字符串保存，字符串的顺序与日期的顺序相同，因此可以直接进行范围查询
+    """
+    dtype = dtype.split('(')[0].lower()
+    if dtype in ['int', 'tinyint', 'bigint']:
+        return 'INTEGER'
+    if dtype in ['float', 'double']:
+        return 'REAL'
+    return 'TEXT'
+
+
+def _sqlite_date_format(dtype):
+    """ 返回日期或时间类型的数据在sqlite中保存的字符串格式，其他数据类型返回None"""
+    dtype = dtype.split('(')[0].lower()
+    if dtype == 'date':
+        return '%Y-%m-%d'
+    if dtype == 'datetime':
+        return '%Y-%m-%d %H:%M:%S'
+    return None
+
+
+def _sqlite_date_strings(series, date_format):
+    """ 将日期时间数据转换为sqlite中保存的ISO格式字符串，无法识别的日期为None"""
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        if pd.api.types.is_numeric_dtype(series):
+            # 数字形式的日期如20230101，不能直接用to_datetime转换，否则会被识别为时间戳
+            series = pd.to_datetime(series.astype('Int64').astype(str), format='%Y%m%d', errors='coerce')
+        else:
+            series = pd.to_datetime(series, errors='coerce')
+    strings = series.dt.strftime(date_format)
+    return strings.where(series.notna(), None)
+
+
 # noinspection SqlDialectInspection #,PyTypeChecker,PyPackageRequirements
 class DataSource:
     """ DataSource 对象管理存储在本地的历史数据文件或数据库.
@@ -2416,7 +3397,10 @@ class DataSource:
                  port: int = 3306,
                  user: str = None,
                  password: str = None,
-                 db_name: str = 'qt_db'):
+                 db_name: str = 'qt_db',
+                 pool_size: int = 5,
+                 write_batch_size: int = 10000,
+                 dtype_profile: str = 'default'):
         """ 创建一个DataSource 对象
 
         创建对象时确定本地数据存储方式，确定文件存储位置、文件类型，或者建立数据库的连接
@@ -2427,13 +3411,15 @@ class DataSource:
             数据源类型:
             - db/database: 数据存储在mysql数据库中
             - file: 数据存储在本地文件中
+            - sqlite: 数据存储在本地的嵌入式sqlite数据库文件中，不需要数据库服务，数据表建立
+              主键索引，读取数据时通过索引进行范围查询，写入数据时直接插入或更新记录
         file_type: str, {'csv', 'hdf', 'hdf5', 'feather', 'fth'}, Default: csv
             如果数据源为file时，数据文件类型：
             - csv: 简单的纯文本文件格式，可以用Excel打开，但是占用空间大，读取速度慢
             - hdf/hdf5: 基于pytables的数据表文件，速度较快，需要安装pytables
             - feather/fth: 轻量级数据文件，速度较快，占用空间小，需要安装pyarrow
         file_loc: str, Default: data/
-            用于存储本地数据文件的路径
+            用于存储本地数据文件的路径，数据源为sqlite时，数据库文件也保存在该路径下
         host: str, default: localhost
             如果数据源为database时，数据库的host
         port: int, Default: 3306
@@ -2444,6 +3430,17 @@ class DataSource:
             如果数据源为database时，数据库的passwrod
         db_name: str, Default: 'qt_db'
             如果数据源为database时，数据库的名称，默认值qt_db
+            如果数据源为sqlite时，数据库文件的名称为db_name.sqlite
+        pool_size: int, Default: 5
+            如果数据源为database时，连接池中最多同时保持的数据库连接数量
+        write_batch_size: int, Default: 10000
+            如果数据源为database时，写入数据时每一批写入的最大记录数，每一批数据写入后单独提交
+        dtype_profile: str, {'default', 'compact'}, Default: 'default'
+            读取和保存数据时使用的数据类型:
+            - default: 所有浮点数据使用float64类型
+            - compact: 数据表定义中为float的数据列(如价格)使用float32类型，double类型(如成交量、成交额)
+              保持float64，重复出现的字符串数据使用category类型，hdf和feather文件中的数据也使用float32
+              类型保存，内存占用和读写数据量大约减少一半
 
         Raises
         ------
@@ -2458,9 +3455,27 @@ class DataSource:
         """
         if not isinstance(source_type, str):
             raise TypeError(f'source type should be a string, got {type(source_type)} instead.')
-        if source_type.lower() not in ['file', 'database', 'db']:
+        if source_type.lower() not in ['file', 'database', 'db', 'sqlite']:
             raise ValueError(f'invalid source_type')
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise ValueError(f'pool_size should be a positive integer, got {pool_size} instead')
+        if not isinstance(write_batch_size, int) or write_batch_size < 1:
+            raise ValueError(f'write_batch_size should be a positive integer, got {write_batch_size} instead')
+        self.write_batch_size = write_batch_size
+        if isinstance(dtype_profile, str):
+            dtype_profile = dtype_profile.lower()
+        if dtype_profile not in DTYPE_PROFILES:
+            raise ValueError(f'dtype_profile should be one of {DTYPE_PROFILES}, got {dtype_profile} instead')
+        self.dtype_profile = dtype_profile
         self._table_list = set()
+        import threading
+        self._table_catalog = None
+        self._catalog_lock = threading.RLock()
+        self._adj_factor_cache = {}
+        self._adj_factor_lock = threading.Lock()
+        self._last_prices = LastPriceStore()
+        self._last_price_tried = set()
+        self._sys_table_listeners = {}
 
         if source_type.lower() in ['db', 'database']:
             # optional packages to be imported
@@ -2503,6 +3518,12 @@ class DataSource:
                 self.__password__ = password
 
                 con.close()
+                # 所有的数据库操作都从连接池中借用连接
+                self._connection_pool = ConnectionPool(
+                        connect=partial(pymysql.connect, host=host, port=port, user=user,
+                                        password=password, db=db_name),
+                        max_size=pool_size,
+                )
 
             except Exception as e:
                 msg = f'Mysql connection failed: {str(e)}\n' \
@@ -2556,6 +3577,33 @@ class DataSource:
             self.db_name = None
             self.__user__ = None
             self.__password__ = None
+            self._connection_pool = None
+
+        if source_type.lower() == 'sqlite':
+            from qteasy import QT_ROOT_PATH
+            self.file_path = path.join(QT_ROOT_PATH, file_loc)
+            try:
+                os.makedirs(self.file_path, exist_ok=True)
+            except Exception:
+                err = SystemError(f'Failed creating data directory \'{file_loc}\' in qt root path, '
+                                  f'please check your input.')
+                raise err
+            self.source_type = 'sqlite'
+            self.file_type = None
+            self.file_loc = file_loc
+            self.db_name = db_name
+            self.db_file = path.join(self.file_path, db_name + '.sqlite')
+            self.connection_type = f'sqlite://qt_root/{file_loc}{db_name}.sqlite'
+            self.host = None
+            self.port = None
+            self.__user__ = None
+            self.__password__ = None
+            # sqlite连接不会因为超时断开，不需要ping检查连接
+            self._connection_pool = ConnectionPool(
+                    connect=partial(_sqlite_connect, self.db_file),
+                    max_size=pool_size,
+                    ping_interval=float('inf'),
+            )
 
     @property
     def tables(self):
@@ -2567,6 +3615,8 @@ class DataSource:
             return f'DataSource(\'db\', \'{self.host}\', {self.port})'
         elif self.source_type == 'file':
             return f'DataSource(\'file\', \'{self.file_type}\', \'{self.file_loc}\')'
+        elif self.source_type == 'sqlite':
+            return f'DataSource(\'sqlite\', \'{self.file_loc}\', \'{self.db_name}\')'
         else:
             return
 
@@ -2646,8 +3696,8 @@ class DataSource:
     # 文件操作层函数，只操作文件，不修改数据
     def get_file_path_name(self, file_name):
         """获取完整文件路径名"""
-        if self.source_type == 'db':
-            err = RuntimeError('can not check file system while source type is "db"')
+        if self.source_type != 'file':
+            err = RuntimeError(f'can not check file system while source type is "{self.source_type}"')
             raise err
         if not isinstance(file_name, str):
             err = TypeError(f'file_name name must be a string, {file_name} is not a valid input!')
@@ -2682,6 +3732,8 @@ class DataSource:
         str: file_name 如果数据保存成功，返回完整文件路径名称
         """
         file_path_name = self.get_file_path_name(file_name)
+        if self.file_type in ['fth', 'hdf']:
+            df = _apply_dtype_profile(df, file_name, self.dtype_profile, categories=False)
         if self.file_type == 'csv':
             df.to_csv(file_path_name, encoding='utf-8')
         elif self.file_type == 'fth':
@@ -2737,7 +3789,8 @@ class DataSource:
         if self.file_type == 'csv':
             # 这里针对csv文件进行了优化，通过分块读取文件，避免当文件过大时导致读取异常
             try:
-                df_reader = pd.read_csv(file_path_name, chunksize=chunk_size)
+                df_reader = pd.read_csv(file_path_name, chunksize=chunk_size,
+                                        dtype=_read_dtypes(file_name, self.dtype_profile) or None)
             except Exception as e:
                 err = RuntimeError(f'{e}, file reading error encountered.')
                 raise err
@@ -2939,6 +3992,22 @@ class DataSource:
             return len(df)
 
     # 数据库操作层函数，只操作具体的数据表，不操作数据
+    @contextmanager
+    def _borrowed_connection(self, con=None):
+        """ 以with语句借用连接池中的连接，给出con时直接使用调用者已经持有的连接
+
+        同一个线程在持有连接时再从连接池中借用连接，连接池较小时会因为等待自己归还连接而超时，
+        因此在持有连接时调用其他数据库操作，应该将持有的连接传入
+        """
+        if con is not None:
+            yield con
+            return
+        con = self._connection_pool.acquire()
+        try:
+            yield con
+        finally:
+            self._connection_pool.release(con)
+
     def read_database(self, db_table, share_like_pk=None, shares=None, date_like_pk=None, start=None, end=None):
         """ 从一张数据库表中读取数据，读取时根据share(ts_code)和dates筛选
             具体筛选的字段通过share_like_pk和date_like_pk两个字段给出
@@ -2966,31 +4035,110 @@ class DataSource:
         """
         if not self.db_table_exists(db_table):
             return pd.DataFrame()
-        ts_code_filter = ''
-        has_ts_code_filter = False
-        date_filter = ''
-        has_date_filter = False
-        if shares is not None:
-            has_ts_code_filter = True
-            share_count = len(shares)
-            if share_count > 1:
-                ts_code_filter = f'{share_like_pk} in {tuple(shares)}'
-            else:
-                ts_code_filter = f'{share_like_pk} = "{shares[0]}"'
-        if (start is not None) and (end is not None):
-            # assert start and end are date-like
-            has_date_filter = True
-            date_filter = f'{date_like_pk} BETWEEN "{start}" AND "{end}"'
-
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        sql = f'SELECT * ' \
+        sql = self._read_database_sql(db_table, share_like_pk, shares, date_like_pk, start, end)
+        con = self._connection_pool.acquire()
+        try:
+            cursor = con.cursor()
+            cursor.execute(sql)
+            con.commit()
+
+            data = cursor.fetchall()
+            # return data in forms of DataFrame with correct column names
+            df = _records_to_frame(data, [i[0] for i in cursor.description],
+                                   dtypes=_read_dtypes(db_table, self.dtype_profile))
+
+            return df
+        except Exception as e:
+            raise RuntimeError(f'{e}, error in reading data from database with sql:\n"{sql}"')
+        finally:
+            self._connection_pool.release(con)
+
+    def read_database_chunks(self, db_table, share_like_pk=None, shares=None, date_like_pk=None, start=None,
+                             end=None, columns=None, chunk_size=50000):
+        """ 以流的方式从一张数据库表中分块读取数据，读取时根据share(ts_code)和dates筛选
+
+        使用不缓存结果的服务器端游标(SSCursor)读取数据，每次从服务器取出chunk_size行数据并转换为
+        DataFrame，不需要在内存中同时保存全部查询结果的tuple和DataFrame，减少读取大量数据时的内存
+        占用，并且可以在读取到第一块数据后立即开始处理
+
+        Parameters
+        ----------
+        db_table: str
+            需要读取数据的数据表
+        share_like_pk: str
+            用于筛选证券代码的字段名，当这个参数给出时，必须给出shares参数
+        shares: list of str,
+            如果给出shares，则按照"WHERE share_like_pk IN shares"筛选
+        date_like_pk: str
+            用于筛选日期的主键字段名，当这个参数给出时，必须给出start和end参数
+        start: datetime like,
+            如果给出start同时又给出end，按照"WHERE date_like_pk BETWEEN start AND end"的条件筛选
+        end: datetime like,
+            当没有给出start时，单独给出end无效
+        columns: list of str, optional
+            需要读取的字段，为None时读取所有字段
+        chunk_size: int, default 50000
+            每次读取的数据行数
+
+        Yields
+        ------
+        DataFrame，每次读取的一块数据
+        """
+        import pymysql
+        sql = self._read_database_sql(db_table, share_like_pk, shares, date_like_pk, start, end, columns)
+        read_dtypes = _read_dtypes(db_table, self.dtype_profile)
+        # 读取过程中一直持有同一个连接，检查数据表是否存在时也使用这个连接
+        con = self._connection_pool.acquire()
+        cursor = None
+        exhausted = False
+        try:
+            if not self.db_table_exists(db_table, con=con):
+                exhausted = True
+                return
+            cursor = con.cursor(pymysql.cursors.SSCursor)
+            try:
+                cursor.execute(sql)
+                names = [i[0] for i in cursor.description]
+            except Exception as e:
+                raise RuntimeError(f'{e}, error in reading data from database with sql:\n"{sql}"')
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    exhausted = True
+                    break
+                yield _records_to_frame(rows, names, dtypes=read_dtypes)
+        finally:
+            if exhausted:
+                if cursor is not None:
+                    cursor.close()
+                con.commit()
+                self._connection_pool.release(con)
+            else:
+                # 没有读取完的查询结果仍然留在连接中，关闭连接，而不是读出剩余的全部数据
+                self._connection_pool.release(con, discard=True)
+
+    @staticmethod
+    def _read_database_sql(db_table, share_like_pk=None, shares=None, date_like_pk=None, start=None, end=None,
+                           columns=None):
+        """ 生成按照share(ts_code)和dates筛选数据的SQL查询语句，columns为None时读取所有字段"""
+        ts_code_filter = ''
+        has_ts_code_filter = False
+        date_filter = ''
+        has_date_filter = False
+        if shares is not None:
+            has_ts_code_filter = True
+            share_count = len(shares)
+            if share_count > 1:
+                ts_code_filter = f'{share_like_pk} in {tuple(shares)}'
+            else:
+                ts_code_filter = f'{share_like_pk} = "{shares[0]}"'
+        if (start is not None) and (end is not None):
+            # assert start and end are date-like
+            has_date_filter = True
+            date_filter = f'{date_like_pk} BETWEEN "{start}" AND "{end}"'
+
+        selected = '*' if columns is None else ', '.join(f'`{col}`' for col in columns)
+        sql = f'SELECT {selected} ' \
               f'FROM {db_table}\n'
         if not (has_ts_code_filter or has_date_filter):
             # No WHERE clause
@@ -3005,23 +4153,9 @@ class DataSource:
         elif not has_ts_code_filter and has_date_filter:
             # only one WHERE clause for date
             sql += f'WHERE {date_filter}'
-        sql += ''
-        try:
-            cursor = con.cursor()
-            cursor.execute(sql)
-            con.commit()
+        return sql
 
-            data = cursor.fetchall()
-            # return data in forms of DataFrame with correct column names
-            df = pd.DataFrame(data, columns=[i[0] for i in cursor.description])
-
-            return df
-        except Exception as e:
-            raise RuntimeError(f'{e}, error in reading data from database with sql:\n"{sql}"')
-        finally:
-            con.close()
-
-    def write_database(self, df, db_table):
+    def write_database(self, df, db_table, batch_size=None):
         """ 将DataFrame中的数据添加到数据库表末尾，如果表不存在，则
         新建一张数据库表，并设置primary_key（如果给出）
 
@@ -3033,6 +4167,8 @@ class DataSource:
             需要添加的DataFrame
         db_table: str
             需要添加数据的数据库表
+        batch_size: int, optional
+            每一批写入的最大记录数，默认使用self.write_batch_size
 
         Returns
         -------
@@ -3043,71 +4179,50 @@ class DataSource:
         调用update_database()执行任务，设置参数ignore_duplicate=True
         """
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        # if table does not exist, create a new table without primary key info
-        if not self.db_table_exists(db_table):
-            dtype_mapping = {'object': 'varchar(255)',
-                             'datetime64[ns]': 'datetime',
-                             'int64': 'int',
-                             'float32': 'float',
-                             'float64': 'double',
-                             }
-            columns = df.columns
-            dtypes = df.dtypes.tolist()
-            dtypes = [dtype_mapping.get(str(dtype.name), 'varchar(255)') for dtype in dtypes]
-
-            sql = f"CREATE TABLE IF NOT EXISTS `{db_table}` (\n"
-            fields = []
-            for col, dtype in zip(columns, dtypes):
-                fields.append(f"`{col}` {dtype}\n")
-            sql += f"{', '.join(fields)});"
-            try:
-                cursor = con.cursor()
-                cursor.execute(sql)
-                con.commit()
-            except Exception as e:
-                con.rollback()
-                raise RuntimeError(f'db table {db_table} does not exist and can not be created:\n'
-                                   f'Exception:\n{e}\n'
-                                   f'SQL:\n{sql}')
-
-        tbl_columns = tuple(self.get_db_table_schema(db_table).keys())
-        if (len(df.columns) != len(tbl_columns)) or (any(i_d != i_t for i_d, i_t in zip(df.columns, tbl_columns))):
-            raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(tbl_columns)}')
-        df = df.where(pd.notna(df), None)  # where-fill None in dataframe result in filling np.nan since pandas v2.0
-        pd_version = pd.__version__
-        if pd_version >= '2.0':
-            df.replace(np.nan, None, inplace=True)
-        df_tuple = tuple(df.itertuples(index=False, name=None))
-        sql = f"INSERT IGNORE INTO "
-        sql += f"`{db_table}` ("
-        for col in tbl_columns[:-1]:
-            sql += f"`{col}`, "
-        sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
-        for val in tbl_columns[:-1]:
-            sql += "%s, "
-        sql += "%s)\n"
-        try:
-            cursor = con.cursor()
-            rows_affected = cursor.executemany(sql, df_tuple)
-            con.commit()
-            return rows_affected
-        except Exception as e:
-            con.rollback()
-            raise RuntimeError(f'Error during inserting data to table {db_table} with following sql:\n'
-                               f'Exception:\n{e}\n'
-                               f'SQL:\n{sql} \nwith parameters (first 10 shown):\n{df_tuple[:10]}')
-        finally:
-            con.close()
+        # 在同一个连接中完成检查、建表和写入，不会在持有连接时再从连接池中借用连接
+        with self._borrowed_connection() as con:
+            # if table does not exist, create a new table without primary key info
+            if not self.db_table_exists(db_table, con=con):
+                dtype_mapping = {'object': 'varchar(255)',
+                                 'datetime64[ns]': 'datetime',
+                                 'int64': 'int',
+                                 'float32': 'float',
+                                 'float64': 'double',
+                                 }
+                columns = df.columns
+                dtypes = df.dtypes.tolist()
+                dtypes = [dtype_mapping.get(str(dtype.name), 'varchar(255)') for dtype in dtypes]
+
+                sql = f"CREATE TABLE IF NOT EXISTS `{db_table}` (\n"
+                fields = []
+                for col, dtype in zip(columns, dtypes):
+                    fields.append(f"`{col}` {dtype}\n")
+                sql += f"{', '.join(fields)});"
+                try:
+                    cursor = con.cursor()
+                    cursor.execute(sql)
+                    con.commit()
+                except Exception as e:
+                    con.rollback()
+                    raise RuntimeError(f'db table {db_table} does not exist and can not be created:\n'
+                                       f'Exception:\n{e}\n'
+                                       f'SQL:\n{sql}')
+
+            tbl_columns = tuple(self.get_db_table_schema(db_table, con=con).keys())
+            if (len(df.columns) != len(tbl_columns)) or \
+                    (any(i_d != i_t for i_d, i_t in zip(df.columns, tbl_columns))):
+                raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(tbl_columns)}')
+            sql = f"INSERT IGNORE INTO "
+            sql += f"`{db_table}` ("
+            for col in tbl_columns[:-1]:
+                sql += f"`{col}`, "
+            sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
+            for val in tbl_columns[:-1]:
+                sql += "%s, "
+            sql += "%s)\n"
+            return self._execute_database_batches(sql, df, db_table, batch_size, con=con)
 
-    def update_database(self, df, db_table, primary_key):
+    def update_database(self, df, db_table, primary_key, batch_size=None):
         """ 用DataFrame中的数据更新数据表中的数据记录
 
         假定df的列与db_table的列相同且顺序也相同
@@ -3122,59 +4237,83 @@ class DataSource:
             需要更新的数据表
         primary_key: tuple
             数据表的primary_key，必须定义在数据表中，如果数据库表没有primary_key，将append所有数据
+        batch_size: int, optional
+            每一批写入的最大记录数，默认使用self.write_batch_size
 
         Returns
         -------
         int: rows affected
         """
-        tbl_columns = tuple(self.get_db_table_schema(db_table).keys())
-        update_cols = [item for item in tbl_columns if item not in primary_key]
-        if (len(df.columns) != len(tbl_columns)) or (any(i_d != i_t for i_d, i_t in zip(df.columns, tbl_columns))):
-            raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(tbl_columns)}')
-        df = df.where(pd.notna(df), None)  # fill None in Dataframe will result in filling Nan since pandas v2.0
-        pd_version = pd.__version__
-        if pd_version >= '2.0':
-            df.replace(np.nan, None, inplace=True)
-            # TODO, 在某些情况下将数据写入数据库时仍然会发生'nan can't be written to mysql'的错误
-            #  这个问题需要进一步解，复现代码如下：
-            #  op=qt.Operator('dma')
-            #  op.run(mode=0, live_trade_account_id=1, asset_type='IDX')
-
-        df_tuple = tuple(df.itertuples(index=False, name=None))
-        sql = f"INSERT INTO "
-        sql += f"`{db_table}` ("
-        for col in tbl_columns[:-1]:
-            sql += f"`{col}`, "
-        sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
-        for val in tbl_columns[:-1]:
-            sql += "%s, "
-        sql += "%s)\n" \
-               "ON DUPLICATE KEY UPDATE\n"
-        for col in update_cols[:-1]:
-            sql += f"`{col}`=VALUES(`{col}`),\n"
-        sql += f"`{update_cols[-1]}`=VALUES(`{update_cols[-1]}`)"
+        with self._borrowed_connection() as con:
+            tbl_columns = tuple(self.get_db_table_schema(db_table, con=con).keys())
+            update_cols = [item for item in tbl_columns if item not in primary_key]
+            if (len(df.columns) != len(tbl_columns)) or \
+                    (any(i_d != i_t for i_d, i_t in zip(df.columns, tbl_columns))):
+                raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(tbl_columns)}')
+            sql = f"INSERT INTO "
+            sql += f"`{db_table}` ("
+            for col in tbl_columns[:-1]:
+                sql += f"`{col}`, "
+            sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
+            for val in tbl_columns[:-1]:
+                sql += "%s, "
+            sql += "%s)\n" \
+                   "ON DUPLICATE KEY UPDATE\n"
+            for col in update_cols[:-1]:
+                sql += f"`{col}`=VALUES(`{col}`),\n"
+            sql += f"`{update_cols[-1]}`=VALUES(`{update_cols[-1]}`)"
+            return self._execute_database_batches(sql, df, db_table, batch_size, con=con)
+
+    def _execute_database_batches(self, sql, df, db_table, batch_size=None, con=None):
+        """ 将DataFrame中的数据分批写入数据库，每一批数据单独提交
+
+        pymysql的executemany会将同一批数据合并为多行VALUES的INSERT语句，分批写入避免一次生成过大的
+        SQL语句和参数，且某一批数据写入失败时，已经提交的数据不会被回滚。由于写入语句为INSERT IGNORE或
+        ON DUPLICATE KEY UPDATE，写入失败后重新写入全部数据是安全的
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        try:
+        Parameters
+        ----------
+        sql: str
+            带有%s占位符的INSERT语句
+        df: pd.DataFrame
+            需要写入的数据，列的顺序必须与sql中的字段顺序相同
+        db_table: str
+            写入的数据表名，用于显示进度及错误信息
+        batch_size: int, optional
+            每一批写入的最大记录数，默认使用self.write_batch_size
+        con: 数据库连接, optional
+            调用者已经持有的连接，给出时使用该连接，不再从连接池中借用连接
+
+        Returns
+        -------
+        int: rows affected
+        """
+        if batch_size is None:
+            batch_size = self.write_batch_size
+        total = len(df)
+        show_progress = total > batch_size
+        rows_affected = 0
+        with self._borrowed_connection(con) as con:
             cursor = con.cursor()
-            rows_affected = cursor.executemany(sql, df_tuple)
-            con.commit()
+            for start in range(0, total, batch_size):
+                batch = df.iloc[start:start + batch_size]
+                # where-fill None in dataframe result in filling np.nan since pandas v2.0
+                batch = batch.astype(object).where(pd.notna(batch), None)
+                batch_tuple = list(batch.itertuples(index=False, name=None))
+                try:
+                    rows_affected += cursor.executemany(sql, batch_tuple)
+                    con.commit()
+                except Exception as e:
+                    con.rollback()
+                    raise RuntimeError(f'Error during writing data to table {db_table} with following sql:\n'
+                                       f'Exception:\n{e}\n'
+                                       f'{start} of {total} rows are written before error\n'
+                                       f'SQL:\n{sql} \nwith parameters (first 10 shown):\n{batch_tuple[:10]}')
+                if show_progress:
+                    progress_bar(min(start + batch_size, total), total, f'writing to <{db_table}>')
+            if show_progress:
+                print('')
             return rows_affected
-        except Exception as e:
-            con.rollback()
-            msg = f'Error during updating data to table {db_table} with following sql:\n' \
-                    f'Exception:\n{e}\n' \
-                    f'SQL:\n{sql} \nwith parameters (first 10 shown):\n{df_tuple[:10]}'
-            raise RuntimeError(msg)
-        finally:
-            con.close()
 
     def delete_database_records(self, db_table, primary_key, record_ids):
         """ 从数据库表中删除数据
@@ -3206,14 +4345,7 @@ class DataSource:
         elif len(record_ids) == 1:
             sql += f"`{primary_key}` = {record_ids[0]}"
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
+        con = self._connection_pool.acquire()
         try:
             cursor = con.cursor()
             rows_affected = cursor.execute(sql)
@@ -3225,6 +4357,8 @@ class DataSource:
                     f'Exception:\n{e}\n' \
                     f'SQL:\n{sql}'
             raise RuntimeError(msg)
+        finally:
+            self._connection_pool.release(con)
 
     def get_db_table_coverage(self, db_table, column):
         """ 检查数据库表关键列的内容，去重后返回该列的内容清单
@@ -3245,14 +4379,7 @@ class DataSource:
         sql = f'SELECT DISTINCT `{column}`' \
               f'FROM `{db_table}`' \
               f'ORDER BY `{column}`'
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
+        con = self._connection_pool.acquire()
         cursor = con.cursor()
         try:
             cursor.execute(sql)
@@ -3267,7 +4394,7 @@ class DataSource:
                                f'Error during querying data from db_table {db_table} with following sql:\n'
                                f'SQL:\n{sql} \n')
         finally:
-            con.close()
+            self._connection_pool.release(con)
 
     def get_db_table_minmax(self, db_table, column, with_count=False):
         """ 检查数据库表关键列的内容，获取最小值和最大值和总数量
@@ -3294,14 +4421,7 @@ class DataSource:
             add_sql = ''
         sql = f'SELECT MIN(`{column}`), MAX(`{column}`){add_sql} '
         sql += f'FROM `{db_table}`'
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
+        con = self._connection_pool.acquire()
         cursor = con.cursor()
         try:
             cursor.execute(sql)
@@ -3317,15 +4437,17 @@ class DataSource:
                                f'Error during querying data from db_table {db_table} with following sql:\n'
                                f'SQL:\n{sql} \n')
         finally:
-            con.close()
+            self._connection_pool.release(con)
 
-    def db_table_exists(self, db_table):
+    def db_table_exists(self, db_table, con=None):
         """ 检查数据库中是否存在db_table这张表
 
         Parameters
         ----------
         db_table: str
             数据表名
+        con: 数据库连接, optional
+            调用者已经持有的连接，给出时使用该连接，不再从连接池中借用连接
 
         Returns
         -------
@@ -3333,27 +4455,18 @@ class DataSource:
         """
         if self.source_type == 'file':
             raise RuntimeError('can not connect to database while source type is "file"')
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        cursor = con.cursor()
         sql = f"SHOW TABLES LIKE '{db_table}'"
-        try:
-            cursor.execute(sql)
-            con.commit()
-            res = cursor.fetchall()
-            return len(res) > 0
-        except Exception as e:
-            raise RuntimeError(f'Exception:\n{e}\n'
-                               f'Error during querying data from db_table {db_table} with following sql:\n'
-                               f'SQL:\n{sql} \n')
-        finally:
-            con.close()
+        with self._borrowed_connection(con) as con:
+            cursor = con.cursor()
+            try:
+                cursor.execute(sql)
+                con.commit()
+                res = cursor.fetchall()
+                return len(res) > 0
+            except Exception as e:
+                raise RuntimeError(f'Exception:\n{e}\n'
+                                   f'Error during querying data from db_table {db_table} with following sql:\n'
+                                   f'SQL:\n{sql} \n')
 
     def new_db_table(self, db_table, columns, dtypes, primary_key, auto_increment_id=False):
         """ 在数据库中新建一个数据表(如果该表不存在)，并且确保数据表的schema与设置相同,
@@ -3379,14 +4492,7 @@ class DataSource:
         if self.source_type != 'db':
             raise TypeError(f'Datasource is not connected to a database')
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
+        con = self._connection_pool.acquire()
         cursor = con.cursor()
         sql = f"CREATE TABLE IF NOT EXISTS `{db_table}` (\n"
         for col_name, dtype in zip(columns, dtypes):
@@ -3410,125 +4516,444 @@ class DataSource:
             con.rollback()
             print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
         finally:
-            con.close()
+            self._connection_pool.release(con)
 
-    def get_db_table_schema(self, db_table):
+    def get_db_table_schema(self, db_table, con=None):
         """ 获取数据库表的列名称和数据类型
 
         Parameters
         ----------
         db_table: str
             需要获取列名的数据库表
+        con: 数据库连接, optional
+            调用者已经持有的连接，给出时使用该连接，不再从连接池中借用连接
 
         Returns
         -------
             dict: 一个包含列名和数据类型的Dict: {column1: dtype1, column2: dtype2, ...}
         """
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        cursor = con.cursor()
-
         sql = f"SELECT COLUMN_NAME, DATA_TYPE " \
               f"FROM INFORMATION_SCHEMA.COLUMNS " \
               f"WHERE TABLE_SCHEMA = Database() " \
               f"AND table_name = '{db_table}'" \
               f"ORDER BY ordinal_position;"
+        with self._borrowed_connection(con) as con:
+            cursor = con.cursor()
+            try:
+                cursor.execute(sql)
+                con.commit()
+                results = cursor.fetchall()
+                # 为了方便，将cur_columns和new_columns分别包装成一个字典
+                columns = {}
+                for col, typ in results:
+                    columns[col] = typ
+                return columns
+            except Exception as e:
+                con.rollback()
+                print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
+
+    def drop_db_table(self, db_table):
+        """ 修改优化db_table的schema，建立index，从而提升数据库的查询速度提升效能
+
+        Parameters
+        ----------
+        db_table: str
+            数据表名
+
+        Returns
+        -------
+        None
+        """
+        if self.source_type != 'db':
+            raise TypeError(f'Datasource is not connected to a database')
+        if not isinstance(db_table, str):
+            raise TypeError(f'db_table name should be a string, got {type(db_table)} instead')
+
+        con = self._connection_pool.acquire()
+        cursor = con.cursor()
+        sql = f"DROP TABLE IF EXISTS {db_table};"
         try:
             cursor.execute(sql)
             con.commit()
-            results = cursor.fetchall()
-            # 为了方便，将cur_columns和new_columns分别包装成一个字典
-            columns = {}
-            for col, typ in results:
-                columns[col] = typ
-            return columns
         except Exception as e:
             con.rollback()
             print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
         finally:
-            con.close()
+            self._connection_pool.release(con)
+
+    def get_db_table_size(self, db_table):
+        """ 获取数据库表的占用磁盘空间
+
+        Parameters
+        ----------
+        db_table: str
+            数据库表名称
+
+        Returns
+        -------
+        rows: int
+        """
+        if not self.db_table_exists(db_table):
+            return -1
+
+        con = self._connection_pool.acquire()
+        cursor = con.cursor()
+        sql = "SELECT table_rows, data_length + index_length " \
+              "FROM INFORMATION_SCHEMA.tables " \
+              "WHERE table_schema = %s " \
+              "AND table_name = %s;"
+        try:
+            cursor.execute(sql, (self.db_name, db_table))
+            con.commit()
+            rows, size = cursor.fetchall()[0]
+            return rows, size
+        except Exception as e:
+            con.rollback()
+            print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
+        finally:
+            self._connection_pool.release(con)
+
+    # 嵌入式数据库(sqlite)操作层函数，只操作具体的数据表，不操作数据
+    def sqlite_table_exists(self, table, con=None):
+        """ 检查sqlite数据库中是否存在table这张表
+
+        Parameters
+        ----------
+        table: str
+            数据表名
+        con: sqlite3.Connection, optional
+            调用者已经持有的连接，给出时使用该连接，不再从连接池中借用连接
+
+        Returns
+        -------
+        bool
+        """
+        if self.source_type != 'sqlite':
+            raise RuntimeError(f'can not connect to sqlite database while source type is "{self.source_type}"')
+        with self._borrowed_connection(con) as con:
+            res = con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (table,)).fetchall()
+            return len(res) > 0
+
+    def new_sqlite_table(self, table, columns, dtypes, primary_key):
+        """ 在sqlite数据库中新建一个数据表(如果该表不存在)，建立主键索引，如果主键包含多个字段，
+            为其余的主键字段分别建立索引，便于按证券代码或日期进行范围查询
+
+        Parameters
+        ----------
+        table: str
+            数据表名
+        columns: list of str
+            数据表的所有字段名
+        dtypes: list of str
+            数据表所有字段的数据类型，使用数据表定义中的mysql数据类型
+        primary_key: list of str
+            数据表的所有primary_key
+
+        Returns
+        -------
+        None
+        """
+        fields = [f'"{col}" {_sqlite_column_type(dtype)}' +
+                  (' NOT NULL' if col in primary_key else '')
+                  for col, dtype in zip(columns, dtypes)]
+        sql = f'CREATE TABLE IF NOT EXISTS "{table}" (\n' + ',\n'.join(fields)
+        if primary_key:
+            sql += ',\nPRIMARY KEY ("' + '", "'.join(primary_key) + '")'
+        sql += '\n);'
+        con = self._connection_pool.acquire()
+        try:
+            con.execute(sql)
+            for key in primary_key[1:]:
+                con.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{key}" ON "{table}" ("{key}")')
+            con.commit()
+        except Exception as e:
+            con.rollback()
+            raise RuntimeError(f'{e}, error in creating sqlite table {table} with sql:\n"{sql}"')
+        finally:
+            self._connection_pool.release(con)
+
+    def read_sqlite(self, table, share_like_pk=None, shares=None, date_like_pk=None, start=None, end=None):
+        """ 从sqlite数据库表中读取数据，通过主键索引筛选证券代码和日期范围
+
+        Parameters
+        ----------
+        table: str
+            需要读取数据的数据表
+        share_like_pk: str
+            用于筛选证券代码的字段名，不同的表中字段名可能不同，用这个字段筛选不同的证券、如股票、基金、指数等
+            当这个参数给出时，必须给出shares参数
+        shares: list of str
+            需要筛选的证券代码
+        date_like_pk: str
+            用于筛选日期的主键字段名，不同的表中字段名可能不同，用这个字段筛选需要的记录的时间段
+            当这个参数给出时，必须给出start和end参数
+        start: datetime like,
+            用于筛选日期的起始日期
+        end: datetime like,
+            用于筛选日期的结束日期
+
+        Returns
+        -------
+        DataFrame，从数据库中读取的DataFrame，日期时间类型的字段被转换为datetime
+        """
+        chunks = list(self.read_sqlite_chunks(table, share_like_pk, shares, date_like_pk, start, end))
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+    def read_sqlite_chunks(self, table, share_like_pk=None, shares=None, date_like_pk=None, start=None, end=None,
+                           columns=None, chunk_size=50000):
+        """ 以流的方式从sqlite数据库表中分块读取数据，参数与read_sqlite()相同
+
+        Parameters
+        ----------
+        columns: list of str, optional
+            需要读取的字段，为None时读取所有字段
+        chunk_size: int, default 50000
+            每次读取的数据行数
+
+        Yields
+        ------
+        DataFrame，每次读取的一块数据，日期时间类型的字段被转换为datetime
+        """
+        table_columns, dtypes = get_built_in_table_schema(table, with_primary_keys=False)
+        date_conditions = []
+        date_params = []
+        if (date_like_pk is not None) and (start is not None) and (end is not None):
+            date_format = _sqlite_date_format(dtypes[table_columns.index(date_like_pk)])
+            date_conditions.append(f'"{date_like_pk}" BETWEEN ? AND ?')
+            date_params.extend([pd.to_datetime(start).strftime(date_format),
+                                pd.to_datetime(end).strftime(date_format)])
+        selected = '*' if columns is None else ', '.join(f'"{col}"' for col in columns)
+        # 证券代码过多时分组查询，每条SQL语句绑定的变量数量不超过SQLITE_MAX_VARIABLES
+        share_groups = [None]
+        if (share_like_pk is not None) and (shares is not None):
+            shares = list(shares)
+            group_size = SQLITE_MAX_VARIABLES - len(date_params)
+            share_groups = [shares[i:i + group_size] for i in range(0, len(shares), group_size)] or [[]]
+        queries = []
+        for share_group in share_groups:
+            conditions = list(date_conditions)
+            params = list(date_params)
+            if share_group is not None:
+                conditions.insert(0, f'"{share_like_pk}" IN ({", ".join("?" * len(share_group))})')
+                params[:0] = share_group
+            sql = f'SELECT {selected} FROM "{table}"'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            queries.append((sql, params))
+        col_dtypes = dict(zip(table_columns, dtypes))
+        read_dtypes = _read_dtypes(table, self.dtype_profile)
+        # 读取过程中一直持有同一个连接，检查数据表是否存在时也使用这个连接
+        con = self._connection_pool.acquire()
+        cursor = con.cursor()
+        try:
+            if not self.sqlite_table_exists(table, con=con):
+                return
+            # 按数字比较pandas主版本号，字符串比较会把'10.0'判断为小于'2.0'
+            pandas_major = int(pd.__version__.split('.')[0])
+            date_parse_format = 'ISO8601' if pandas_major >= 2 else None
+            for sql, params in queries:
+                try:
+                    cursor.execute(sql, params)
+                    names = [i[0] for i in cursor.description]
+                except Exception as e:
+                    raise RuntimeError(f'{e}, error in reading data from sqlite database with sql:\n"{sql}"')
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    df = _records_to_frame(rows, names, dtypes=read_dtypes)
+                    for col in names:
+                        if col in read_dtypes:
+                            continue
+                        dtype = col_dtypes[col]
+                        if _sqlite_date_format(dtype) is not None:
+                            df[col] = pd.to_datetime(df[col], format=date_parse_format)
+                        elif (_sqlite_column_type(dtype) == 'REAL') and (df[col].dtype == object):
+                            # 全部为NULL的浮点数列读取后为object类型
+                            df[col] = df[col].astype(float)
+                    yield df
+        finally:
+            cursor.close()
+            self._connection_pool.release(con)
+
+    def write_sqlite(self, df, table, on_duplicate='ignore'):
+        """ 将DataFrame中的数据写入sqlite数据库表，主键重复的记录根据on_duplicate忽略或更新
+
+        假定df的列与table的schema相同且顺序也相同
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            需要写入的DataFrame
+        table: str
+            需要写入数据的数据库表
+        on_duplicate: str, {'ignore', 'update'}
+            - ignore: 主键重复时保留数据表中的记录
+            - update: 主键重复时使用df中的数据更新数据表中的记录
+
+        Returns
+        -------
+        int: 写入的记录数
+        """
+        columns, dtypes = get_built_in_table_schema(table, with_primary_keys=False)
+        if list(df.columns) != list(columns):
+            raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(columns)}')
+        if on_duplicate == 'ignore':
+            sql = 'INSERT OR IGNORE'
+        elif on_duplicate == 'update':
+            sql = 'INSERT OR REPLACE'
+        else:  # for unexpected cases
+            raise KeyError(f'Invalid process mode on duplication: {on_duplicate}')
+        sql += f' INTO "{table}" ("' + '", "'.join(columns) + '")\n' \
+               f'VALUES ({", ".join("?" * len(columns))})'
+
+        values = {}
+        for col, dtype in zip(columns, dtypes):
+            date_format = _sqlite_date_format(dtype)
+            if date_format is not None:
+                values[col] = _sqlite_date_strings(df[col], date_format).astype(object)
+            else:
+                values[col] = df[col].astype(object).where(pd.notna(df[col]), None)
+        # numpy数据类型需要转换为python数据类型才能写入sqlite
+        rows = [tuple(v.item() if isinstance(v, np.generic) else v for v in row)
+                for row in zip(*(values[col] for col in columns))]
+        con = self._connection_pool.acquire()
+        try:
+            changes = con.total_changes
+            con.executemany(sql, rows)
+            con.commit()
+            return con.total_changes - changes
+        except Exception as e:
+            con.rollback()
+            raise RuntimeError(f'Error during inserting data to sqlite table {table} with following sql:\n'
+                               f'Exception:\n{e}\n'
+                               f'SQL:\n{sql} \nwith parameters (first 10 shown):\n{rows[:10]}')
+        finally:
+            self._connection_pool.release(con)
+
+    def delete_sqlite_records(self, table, primary_key, record_ids):
+        """ 从sqlite数据库表中删除主键值为record_ids的记录
+
+        Parameters
+        ----------
+        table: str
+            数据表名
+        primary_key: str
+            数据表的主键名称
+        record_ids: list of str or tuple of str
+            需要删除的记录的主键值
+
+        Returns
+        -------
+        int: rows affected
+        """
+        if not record_ids:
+            return 0
+        sql = f'DELETE FROM "{table}" WHERE "{primary_key}" IN ({", ".join("?" * len(record_ids))})'
+        con = self._connection_pool.acquire()
+        try:
+            rows_affected = con.execute(sql, list(record_ids)).rowcount
+            con.commit()
+            return rows_affected
+        except Exception as e:
+            con.rollback()
+            raise RuntimeError(f'Error during deleting data from sqlite table {table} with following sql:\n'
+                               f'Exception:\n{e}\n'
+                               f'SQL:\n{sql}')
+        finally:
+            self._connection_pool.release(con)
 
-    def drop_db_table(self, db_table):
-        """ 修改优化db_table的schema，建立index，从而提升数据库的查询速度提升效能
+    def get_sqlite_table_coverage(self, table, column, min_max_only=False, with_count=False):
+        """ 通过索引获取sqlite数据库表某一列去重后的内容，或者最小值、最大值
 
         Parameters
         ----------
-        db_table: str
+        table: str
             数据表名
+        column: str
+            数据表的字段名
+        min_max_only: bool, default False
+            为True时仅返回最小值和最大值
+        with_count: bool, default False
+            min_max_only为True时，是否同时返回去重后的数量
 
         Returns
         -------
-        None
+        list, 日期类型的数据以YYYYMMDD格式的字符串返回
         """
-        if self.source_type != 'db':
-            raise TypeError(f'Datasource is not connected to a database')
-        if not isinstance(db_table, str):
-            raise TypeError(f'db_table name should be a string, got {type(db_table)} instead')
-
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        cursor = con.cursor()
-        sql = f"DROP TABLE IF EXISTS {db_table};"
+        if not self.sqlite_table_exists(table):
+            return list()
+        if min_max_only:
+            count_sql = f', COUNT(DISTINCT "{column}")' if with_count else ''
+            sql = f'SELECT MIN("{column}"), MAX("{column}"){count_sql} FROM "{table}"'
+        else:
+            sql = f'SELECT DISTINCT "{column}" FROM "{table}" ORDER BY "{column}"'
+        con = self._connection_pool.acquire()
         try:
-            cursor.execute(sql)
-            con.commit()
-        except Exception as e:
-            con.rollback()
-            print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
+            res = con.execute(sql).fetchall()
         finally:
-            con.close()
+            self._connection_pool.release(con)
+        res = list(res[0]) if min_max_only else [item[0] for item in res]
+        columns, dtypes = get_built_in_table_schema(table, with_primary_keys=False)
+        if res and (res[0] is None):
+            return list()
+        if (column in columns) and (_sqlite_date_format(dtypes[columns.index(column)]) is not None) and res:
+            if min_max_only:
+                res[:2] = list(pd.to_datetime(res[:2]).strftime('%Y%m%d'))
+            else:
+                res = list(pd.to_datetime(res).strftime('%Y%m%d'))
+        return res
 
-    def get_db_table_size(self, db_table):
-        """ 获取数据库表的占用磁盘空间
+    def get_sqlite_table_size(self, table):
+        """ 获取sqlite数据库表的记录数以及数据表和索引占用的磁盘空间
 
         Parameters
         ----------
-        db_table: str
-            数据库表名称
+        table: str
+            数据表名称
 
         Returns
         -------
-        rows: int
+        tuple: (rows, size)，数据表不存在时返回(-1, -1)
         """
-        if not self.db_table_exists(db_table):
-            return -1
+        if not self.sqlite_table_exists(table):
+            return -1, -1
+        con = self._connection_pool.acquire()
+        try:
+            rows = con.execute(f'SELECT COUNT(*) FROM "{table}"').fetchall()[0][0]
+            try:
+                size = con.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                                   "(SELECT name FROM sqlite_master WHERE tbl_name = ?)",
+                                   (table,)).fetchall()[0][0]
+            except Exception:
+                # 某些sqlite版本没有编译dbstat虚拟表，此时无法获取单个数据表的大小
+                size = os.path.getsize(self.db_file)
+        finally:
+            self._connection_pool.release(con)
+        return rows, 0 if size is None else size
 
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
-        cursor = con.cursor()
-        sql = "SELECT table_rows, data_length + index_length " \
-              "FROM INFORMATION_SCHEMA.tables " \
-              "WHERE table_schema = %s " \
-              "AND table_name = %s;"
+    def drop_sqlite_table(self, table):
+        """ 删除sqlite数据库中的数据表及其索引
+
+        Parameters
+        ----------
+        table: str
+            数据表名
+
+        Returns
+        -------
+        None
+        """
+        con = self._connection_pool.acquire()
         try:
-            cursor.execute(sql, (self.db_name, db_table))
+            con.execute(f'DROP TABLE IF EXISTS "{table}"')
             con.commit()
-            rows, size = cursor.fetchall()[0]
-            return rows, size
-        except Exception as e:
-            con.rollback()
-            print(f'error encountered during executing sql: \n{sql}\n error codes: \n{e}')
         finally:
-            con.close()
+            self._connection_pool.release(con)
 
     # ==============
     # (逻辑)数据表操作层函数，只在逻辑表层面读取或写入数据，调用文件操作函数或数据库函数存储数据
@@ -3547,6 +4972,8 @@ class DataSource:
             return self.db_table_exists(db_table=table)
         elif self.source_type == 'file':
             return self.file_exists(table)
+        elif self.source_type == 'sqlite':
+            return self.sqlite_table_exists(table)
         else:
             raise KeyError(f'invalid source_type: {self.source_type}')
 
@@ -3576,40 +5003,8 @@ class DataSource:
         #  没有问题，但是如果数据存储在文件中，需要优化存储和读取过程
         #  ，以便提高效率。目前优化了csv文件的读取，通过分块读取提高
         #  csv文件的读取效率，其他文件系统的读取还需要进一步优化
-        if not isinstance(table, str):
-            raise TypeError(f'table name should be a string, got {type(table)} instead.')
-        if table not in TABLE_MASTERS.keys():
-            raise KeyError(f'Invalid table name: {table}.')
-
-        if shares is not None:
-            assert isinstance(shares, (str, list))
-            if isinstance(shares, str):
-                shares = str_to_list(shares)
-
-        if (start is not None) and (end is not None):
-            start = regulate_date_format(start)
-            end = regulate_date_format(end)
-            assert pd.to_datetime(start) <= pd.to_datetime(end)
-
+        shares, start, end, share_like_pk, date_like_pk = self._get_table_filter(table, shares, start, end)
         columns, dtypes, primary_key, pk_dtypes = get_built_in_table_schema(table)
-        # 识别primary key中的证券代码列名和日期类型列名，确认是否需要筛选证券代码及日期
-        share_like_pk = None
-        date_like_pk = None
-        if shares is not None:
-            try:
-                varchar_like_dtype = [item for item in pk_dtypes if item[:7] == 'varchar'][0]
-                share_like_pk = primary_key[pk_dtypes.index(varchar_like_dtype)]
-            except:
-                warnings.warn(f'can not find share-like primary key in the table {table}!\n'
-                              f'passed argument shares will be ignored!', RuntimeWarning)
-        # 识别Primary key中的，并确认是否需要筛选日期型pk
-        if (start is not None) and (end is not None):
-            try:
-                date_like_dtype = [item for item in pk_dtypes if item in ['date', 'datetime']][0]
-                date_like_pk = primary_key[pk_dtypes.index(date_like_dtype)]
-            except Exception as e:
-                warnings.warn(f'{e}\ncan not find date-like primary key in the table {table}!\n'
-                              f'passed start({start}) and end({end}) arguments will be ignored!', RuntimeWarning)
 
         if self.source_type == 'file':
             # 读取table数据, 从本地文件中读取的DataFrame已经设置好了primary_key index
@@ -3654,10 +5049,126 @@ class DataSource:
             if df.empty:
                 return df
             set_primary_key_index(df, primary_key, pk_dtypes)
+        elif self.source_type == 'sqlite':
+            # 读取sqlite数据库表，通过主键索引筛选shares/start/end，只读取需要的数据
+            df = self.read_sqlite(table=table,
+                                  share_like_pk=share_like_pk,
+                                  shares=shares,
+                                  date_like_pk=date_like_pk,
+                                  start=start,
+                                  end=end)
+            if df.empty:
+                return df
+            set_primary_key_index(df, primary_key, pk_dtypes)
         else:  # for unexpected cases:
             raise TypeError(f'Invalid value DataSource.source_type: {self.source_type}')
 
-        return df
+        return _apply_dtype_profile(df, table, self.dtype_profile)
+
+    def read_table_data_chunks(self, table, shares=None, start=None, end=None, columns=None, chunk_size=50000):
+        """ 以流的方式分块读取本地数据表中的数据，每一块数据的格式与read_table_data()相同
+
+        数据源为数据库时，使用服务器端游标分块读取数据，并且只读取主键和columns中的字段，
+        不需要同时在内存中保存全部查询结果，数据源为文件时，一次读取全部数据
+
+        compact方案中，数据源为数据库时分块数据的字符串列不转换为category类型，如果需要，
+        应该在合并所有分块数据后再转换
+
+        Parameters
+        ----------
+        table: str
+            数据表名称
+        shares: list，
+            ts_code筛选条件，为空时给出所有记录
+        start: str，
+            YYYYMMDD格式日期，为空时不筛选
+        end: str，
+            YYYYMMDD格式日期，当start不为空时有效，筛选日期范围
+        columns: list of str, optional
+            需要读取的数据列(不含主键)，为None时读取所有的列
+        chunk_size: int, default 50000
+            数据源为数据库时，每一块数据的最大行数
+
+        Yields
+        ------
+        pd.DataFrame: 以primary key为index的数据
+        """
+        shares, start, end, share_like_pk, date_like_pk = self._get_table_filter(table, shares, start, end)
+        table_columns, dtypes, primary_key, pk_dtypes = get_built_in_table_schema(table)
+        selected = None
+        if columns is not None:
+            columns = [col for col in columns if (col in table_columns) and (col not in primary_key)]
+            selected = primary_key + columns
+        if share_like_pk is None:
+            shares = None
+        if date_like_pk is None:
+            start = None
+            end = None
+
+        if self.source_type == 'db':
+            chunks = self.read_database_chunks(table, share_like_pk=share_like_pk, shares=shares,
+                                               date_like_pk=date_like_pk, start=start, end=end,
+                                               columns=selected, chunk_size=chunk_size)
+        elif self.source_type == 'sqlite':
+            chunks = self.read_sqlite_chunks(table, share_like_pk=share_like_pk, shares=shares,
+                                             date_like_pk=date_like_pk, start=start, end=end,
+                                             columns=selected, chunk_size=chunk_size)
+        else:
+            # 文件数据源只能读取整个文件后再筛选，一次给出全部数据
+            df = self.read_table_data(table, shares=shares, start=start, end=end)
+            if not df.empty:
+                yield df if columns is None else df[columns]
+            return
+        for chunk in chunks:
+            set_primary_key_index(chunk, primary_key, pk_dtypes)
+            # 每一块数据的category类别不同，合并后会变回object类型，因此分块数据中不转换category类型
+            yield _apply_dtype_profile(chunk, table, self.dtype_profile, categories=False)
+
+    @staticmethod
+    def _get_table_filter(table, shares=None, start=None, end=None):
+        """ 检查读取数据表时的筛选参数，识别primary key中的证券代码列名和日期类型列名
+
+        Returns
+        -------
+        tuple: (shares, start, end, share_like_pk, date_like_pk)
+            share_like_pk或date_like_pk为None时，不需要筛选证券代码或日期
+        """
+        if not isinstance(table, str):
+            raise TypeError(f'table name should be a string, got {type(table)} instead.')
+        if table not in TABLE_MASTERS.keys():
+            raise KeyError(f'Invalid table name: {table}.')
+
+        if shares is not None:
+            assert isinstance(shares, (str, list))
+            if isinstance(shares, str):
+                shares = str_to_list(shares)
+
+        if (start is not None) and (end is not None):
+            start = regulate_date_format(start)
+            end = regulate_date_format(end)
+            assert pd.to_datetime(start) <= pd.to_datetime(end)
+
+        columns, dtypes, primary_key, pk_dtypes = get_built_in_table_schema(table)
+        # 识别primary key中的证券代码列名和日期类型列名，确认是否需要筛选证券代码及日期
+        share_like_pk = None
+        date_like_pk = None
+        if shares is not None:
+            try:
+                varchar_like_dtype = [item for item in pk_dtypes if item[:7] == 'varchar'][0]
+                share_like_pk = primary_key[pk_dtypes.index(varchar_like_dtype)]
+            except:
+                warnings.warn(f'can not find share-like primary key in the table {table}!\n'
+                              f'passed argument shares will be ignored!', RuntimeWarning)
+        # 识别Primary key中的，并确认是否需要筛选日期型pk
+        if (start is not None) and (end is not None):
+            try:
+                date_like_dtype = [item for item in pk_dtypes if item in ['date', 'datetime']][0]
+                date_like_pk = primary_key[pk_dtypes.index(date_like_dtype)]
+            except Exception as e:
+                warnings.warn(f'{e}\ncan not find date-like primary key in the table {table}!\n'
+                              f'passed start({start}) and end({end}) arguments will be ignored!', RuntimeWarning)
+
+        return shares, start, end, share_like_pk, date_like_pk
 
     def export_table_data(self, table, file_name=None, file_path=None, shares=None, start=None, end=None):
         """ 将数据表中的数据读取出来之后导出到一个文件中，便于用户使用过程中小规模转移数据或察看数据
@@ -3727,7 +5238,7 @@ class DataSource:
         table: str
             本地数据表名，
         on_duplicate: str
-            重复数据处理方式(仅当mode==db的时候有效)
+            重复数据处理方式(仅当mode==db或sqlite的时候有效)
             -ignore: 默认方式，将全部数据写入数据库表的末尾
             -update: 将数据写入数据库表中，如果遇到重复的pk则修改表中的内容
 
@@ -3762,7 +5273,15 @@ class DataSource:
                 rows_affected = self.update_database(df, db_table=table, primary_key=primary_key)
             else:  # for unexpected cases
                 raise KeyError(f'Invalid process mode on duplication: {on_duplicate}')
+        elif self.source_type == 'sqlite':
+            df = set_primary_key_frame(df, primary_key=primary_key, pk_dtypes=pk_dtype)
+            if not self.sqlite_table_exists(table):
+                self.new_sqlite_table(table, columns=columns, dtypes=dtypes, primary_key=primary_key)
+            rows_affected = self.write_sqlite(df, table=table, on_duplicate=on_duplicate)
         self._table_list.add(table)
+        self._adj_factor_cache.pop(table, None)
+        # 写入的数据为文件中的全部数据，直接用于更新数据表目录，数据库只写入了部分数据，重新统计
+        self._update_table_catalog(table, df if self.source_type == 'file' else None)
         return rows_affected
 
     def fetch_history_table_data(self, table, channel='tushare', df=None, f_name=None, **kwargs):
@@ -3948,6 +5467,7 @@ class DataSource:
             1，检查下载后的数据表的列名是否与数据表的定义相同，删除多余的列
             2，如果datasource type是"db"，删除下载数据中与本地数据重复的部分，仅保留新增数据
             3，如果datasource type是"file"，将下载的数据与本地数据合并并去重
+            4，如果datasource type是"sqlite"，直接根据主键插入或更新数据库中的记录
             返回处理完毕的dataFrame
 
         Parameters
@@ -4013,18 +5533,154 @@ class DataSource:
                 raise KeyError(f'Invalid merge type, got "{merge_type}"')
             rows_affected = self.write_table_data(pd.concat([local_data, dnld_data]), table=table)
         elif self.source_type == 'db':
-            # 如果source_type == 'db'，不需要合并数据，当merge_type == 'update'时，甚至不需要下载
-            # 本地数据
-            if merge_type == 'ignore':
-                dnld_data_range = get_primary_key_range(dnld_data, primary_key=primary_keys, pk_dtypes=pk_dtypes)
-                local_data = self.read_table_data(table, **dnld_data_range)
-                set_primary_key_index(dnld_data, primary_key=primary_keys, pk_dtypes=pk_dtypes)
-                dnld_data = dnld_data[~dnld_data.index.isin(local_data.index)]
+            # 如果source_type == 'db'，不需要合并数据，也不需要读取本地数据，由数据库根据主键处理重复的记录：
+            # merge_type == 'ignore'时使用INSERT IGNORE，merge_type == 'update'时使用ON DUPLICATE KEY UPDATE
             dnld_data = set_primary_key_frame(dnld_data, primary_key=primary_keys, pk_dtypes=pk_dtypes)
             rows_affected = self.write_table_data(df=dnld_data, table=table, on_duplicate=merge_type)
+        elif self.source_type == 'sqlite':
+            # 如果source_type == 'sqlite'，由数据库根据主键直接插入或更新记录，不需要读取本地数据
+            rows_affected = self.write_table_data(df=dnld_data, table=table, on_duplicate=merge_type)
         else:  # unexpected case
             raise KeyError(f'invalid data source type')
+        # 只用新写入的数据更新最新已知价格，文件数据源写入的是合并后的全部数据
+        self._record_last_prices(dnld_data, table)
+
+        return rows_affected
+
+    def rollup_table_data(self, base_table, targets=None, start=None, end=None):
+        """ 将基础数据表中的K线数据合并为低频K线，写入对应的低频K线数据表，读取低频数据时不需要重新合并
+
+        1分钟K线表(如stock_1min)可以合并为5/15/30/60分钟K线表，日K线表(如stock_daily)可以合并为周K线和
+        月K线表。给出start/end时，只重新合并该时间段所在的完整周期的数据，用于在基础数据更新后增量更新。
+        没有给出start/end时，已经合并的数据不再重新生成，每个数据表只从已有数据的最后一个周期开始合并
+
+        Parameters
+        ----------
+        base_table: str
+            基础数据表名称
+        targets: str or list of str, optional
+            需要生成的低频K线数据表，默认生成所有可以由基础数据表合并生成的数据表
+        start: str, optional
+            YYYYMMDD格式的开始日期
+        end: str, optional
+            YYYYMMDD格式的结束日期
+
+        Returns
+        -------
+        dict: {target_table: rows_affected}
+
+        Raises
+        ------
+        KeyError
+            基础数据表不能合并生成targets中的数据表时
+        """
+        from qteasy import QT_CONFIG
+        all_targets = _get_rollup_targets(base_table)
+        if targets is None:
+            targets = all_targets
+        elif isinstance(targets, str):
+            targets = str_to_list(targets)
+        invalid_targets = [table for table in targets if table not in all_targets]
+        if (not all_targets) or invalid_targets:
+            raise KeyError(f'table {base_table} can not be rolled up to {invalid_targets or targets}, '
+                           f'valid targets are {all_targets}')
+        if not targets:
+            return {}
+
+        table_master = get_table_master()
+        freqs = [table_master.loc[table, 'freq'] for table in targets]
+        periods = ['M' if freq == 'm' else ('W-FRI' if freq == 'w' else 'D') for freq in freqs]
+        if (start is None) and (end is None):
+            # 没有给出时间段时，每个数据表从已有的最后一个周期开始重新合并，已经合并的数据不再重复生成
+            base_coverage = self.get_table_data_coverage(base_table, _get_date_pk(base_table),
+                                                         min_max_only=True)
+            if not base_coverage:
+                return {table: 0 for table in targets}
+            end = pd.to_datetime(base_coverage[1])
+            starts = []
+            for table in targets:
+                coverage = self.get_table_data_coverage(table, _get_date_pk(table), min_max_only=True)
+                starts.append(pd.to_datetime(coverage[1] if coverage else base_coverage[0]))
+        else:
+            start = pd.to_datetime(start if start is not None else '19900101')
+            end = pd.to_datetime(end if end is not None else 'today')
+            starts = [start] * len(targets)
+        # 开始日期和结束日期扩展到完整的周期，确保周期内的全部数据都被重新合并
+        target_starts = [start.to_period(period).start_time for start, period in zip(starts, periods)]
+        target_ends = [end.to_period(period).end_time for period in periods]
+        # 文件数据源只能按日期筛选，因此读取到结束日期的下一天，再去掉超出周期的数据
+        base_data = self.read_table_data(base_table, start=min(target_starts).strftime('%Y%m%d'),
+                                         end=(max(target_ends) + pd.Timedelta(days=1)).strftime('%Y%m%d'))
+        if base_data.empty:
+            # 时间段内没有基础数据，不需要合并
+            return {table: 0 for table in targets}
+        base_dates = base_data.index.get_level_values(1)
+
+        sessions = ((QT_CONFIG['market_open_time_am'], QT_CONFIG['market_close_time_am']),
+                    (QT_CONFIG['market_open_time_pm'], QT_CONFIG['market_close_time_pm']))
+        rows_affected = {}
+        for table, freq, target_start, target_end in zip(targets, freqs, target_starts, target_ends):
+            target_data = base_data.loc[(base_dates >= target_start) & (base_dates <= target_end)]
+            bars = _rollup_bars(target_data, freq, sessions=sessions)
+            if bars.empty:
+                rows_affected[table] = 0
+                continue
+            # 周期内数据增加时K线的标签日期可能改变，先删除重新合并的周期内原有的K线
+            self._delete_table_period(table, target_start, target_end)
+            columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
+            bars = set_primary_key_frame(bars, primary_key=primary_keys, pk_dtypes=pk_dtypes)
+            rows_affected[table] = self.update_table_data(table, bars, merge_type='update')
+        return rows_affected
+
+    def _delete_table_period(self, table, start, end):
+        """ 删除数据表中日期在start和end之间(含)的所有记录
+
+        Parameters
+        ----------
+        table: str
+            数据表名称，primary key中必须包含日期或时间列
+        start: pd.Timestamp
+            开始日期时间
+        end: pd.Timestamp
+            结束日期时间
+
+        Returns
+        -------
+        int: 删除的记录数
+        """
+        date_pk = _get_date_pk(table)
+        if not self.table_data_exists(table):
+            return 0
+        if self.source_type == 'file':
+            local_data = self.read_table_data(table)
+            if local_data.empty:
+                return 0
+            dates = local_data.index.get_level_values(date_pk)
+            deleted = (dates >= start) & (dates <= end)
+            if deleted.any():
+                self.write_table_data(local_data.loc[~deleted].copy(), table=table)
+            return int(deleted.sum())
 
+        if self.source_type == 'db':
+            sql = f"DELETE FROM `{table}` WHERE `{date_pk}` BETWEEN %s AND %s"
+            date_format = '%Y-%m-%d %H:%M:%S'
+        else:
+            sql = f'DELETE FROM "{table}" WHERE "{date_pk}" BETWEEN ? AND ?'
+            table_columns, dtypes = get_built_in_table_schema(table, with_primary_keys=False)
+            date_format = _sqlite_date_format(dtypes[table_columns.index(date_pk)])
+        args = (start.strftime(date_format), end.strftime(date_format))
+        with self._borrowed_connection() as con:
+            try:
+                cursor = con.cursor()
+                cursor.execute(sql, args)
+                rows_affected = cursor.rowcount
+                con.commit()
+            except Exception as e:
+                con.rollback()
+                raise RuntimeError(f'Error during deleting data from table {table} with following sql:\n'
+                                   f'Exception:\n{e}\n'
+                                   f'SQL:\n{sql}')
+        self._update_table_catalog(table)
         return rows_affected
 
     def drop_table_data(self, table):
@@ -4043,7 +5699,11 @@ class DataSource:
             self.drop_db_table(db_table=table)
         elif self.source_type == 'file':
             self.drop_file(file_name=table)
+        elif self.source_type == 'sqlite':
+            self.drop_sqlite_table(table)
         self._table_list.difference_update([table])
+        self._adj_factor_cache.pop(table, None)
+        self._update_table_catalog(table, dropped=True)
         return None
 
     def get_table_data_coverage(self, table, column, min_max_only=False):
@@ -4059,6 +5719,7 @@ class DataSource:
             为True时不需要返回整个数据列，仅返回最大值和最小值
             如果仅返回最大值和和最小值，返回值为一个包含两个元素的列表，
             第一个元素是最小值，第二个是最大值，第三个是总数量
+            主键列的最大值、最小值和总数量直接从数据表目录中读取，不需要读取数据表
 
         Returns
         -------
@@ -4087,6 +5748,12 @@ class DataSource:
         Out:
         ['000001.SZ', '873593.BJ']
         """
+        if min_max_only and self._is_cataloged(table):
+            entry = self.get_table_catalog(table)
+            if entry is None:
+                return list()
+            if column in entry['coverage']:
+                return list(entry['coverage'][column])
         if self.source_type == 'db':
             if min_max_only:
                 return self.get_db_table_minmax(table, column)
@@ -4095,6 +5762,8 @@ class DataSource:
         elif self.source_type == 'file':
             columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
             return self.get_file_table_coverage(table, column, primary_keys, pk_dtypes, min_max_only)
+        elif self.source_type == 'sqlite':
+            return self.get_sqlite_table_coverage(table, column, min_max_only)
         else:
             raise TypeError(f'Invalid source type: {self.source_type}')
 
@@ -4115,12 +5784,17 @@ class DataSource:
         tuple (size, rows): tuple of int or str:
 
         """
-        if self.source_type == 'file':
+        if self._is_cataloged(table):
+            entry = self.get_table_catalog(table)
+            size, rows = (-1, -1) if entry is None else (entry['size'], entry['rows'])
+        elif self.source_type == 'file':
             size = self.get_file_size(table)
             rows = self.get_file_rows(table)
             # rows = 'unknown'
         elif self.source_type == 'db':
             rows, size = self.get_db_table_size(table)
+        elif self.source_type == 'sqlite':
+            rows, size = self.get_sqlite_table_size(table)
         else:
             raise RuntimeError(f'unknown source type: {self.source_type}')
         if size == -1:
@@ -4244,6 +5918,165 @@ class DataSource:
                 pk_max2
                 )
 
+    # ==============
+    # 数据表目录，保存每个数据表的数据量、主键覆盖范围以及最后修改时间，避免每次查询时重新读取数据表
+    # ==============
+    @property
+    def table_catalog_file(self):
+        """ 数据表目录文件的完整路径，文件数据源和sqlite数据源保存在数据文件夹中，数据库数据源保存在系统日志文件夹中"""
+        if self.source_type == 'file':
+            return path.join(self.file_path, '_table_catalog.json')
+        if self.source_type == 'sqlite':
+            return path.join(self.file_path, f'{self.db_name}_table_catalog.json')
+        from qteasy import QT_SYS_LOG_PATH
+        return path.join(QT_SYS_LOG_PATH, f'table_catalog_{self.db_name}@{self.host}_{self.port}.json')
+
+    def get_table_catalog(self, table, refresh=False):
+        """ 从数据表目录中获取数据表的元数据，如果目录中没有该表的信息或信息已经过期，重新统计并保存
+
+        文件数据源的数据表文件在目录更新之后被修改过(如被其他程序修改)时，目录信息视为过期
+
+        Parameters
+        ----------
+        table: str
+            数据表名称，不包括系统数据表
+        refresh: bool, default False
+            为True时忽略目录中已有的信息，重新统计数据表
+
+        Returns
+        -------
+        dict or None: 数据表不存在时返回None，否则返回一个dict:
+            {'rows': 数据行数,
+             'size': 占用磁盘空间(bytes),
+             'modified': 最后修改时间(timestamp),
+             'coverage': {primary_key: [最小值, 最大值, 去重后数量]}}
+        """
+        if not self._is_cataloged(table):
+            raise KeyError(f'table {table} is not a data table, system tables are not included in the catalog')
+        with self._catalog_lock:
+            catalog = self._load_table_catalog()
+            entry = catalog.get(table)
+        if (entry is not None) and (not refresh) and (self.source_type == 'file'):
+            file_path_name = self.get_file_path_name(table)
+            if (not path.exists(file_path_name)) or (path.getmtime(file_path_name) != entry['modified']):
+                entry = None
+        if (entry is None) or refresh:
+            entry = self._build_table_catalog_entry(table)
+            with self._catalog_lock:
+                if entry is None:
+                    # 目录中本来没有该表时不需要保存目录文件
+                    if self._table_catalog.pop(table, None) is None:
+                        return None
+                else:
+                    self._table_catalog[table] = entry
+                self._save_table_catalog()
+        return entry
+
+    def refresh_table_catalog(self, tables=None):
+        """ 重新统计数据表并更新数据表目录，在数据表被其他程序修改后使用
+
+        Parameters
+        ----------
+        tables: str or list of str, optional
+            需要更新的数据表，为None时更新所有数据表
+        """
+        if tables is None:
+            tables = [table for table in TABLE_MASTERS if self._is_cataloged(table)]
+        elif isinstance(tables, str):
+            tables = str_to_list(tables)
+        for table in tables:
+            self.get_table_catalog(table, refresh=True)
+
+    @staticmethod
+    def _is_cataloged(table):
+        """ 系统数据表频繁写入且数据量小，不记录在数据表目录中"""
+        return (table in TABLE_MASTERS) and (TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('table_usage')] != 'sys')
+
+    def _load_table_catalog(self) -> dict:
+        """ 读取数据表目录文件，目录只在第一次使用时读取，此后保存在内存中"""
+        import json
+        if self._table_catalog is not None:
+            return self._table_catalog
+        self._table_catalog = {}
+        catalog_file = self.table_catalog_file
+        if path.exists(catalog_file):
+            try:
+                with open(catalog_file, 'r') as f:
+                    self._table_catalog = json.load(f)
+            except Exception as e:
+                warnings.warn(f'failed reading table catalog {catalog_file}: {e}, catalog will be rebuilt')
+        return self._table_catalog
+
+    def _save_table_catalog(self) -> None:
+        """ 保存数据表目录，先写入临时文件再替换，避免写入中断时损坏目录文件"""
+        import json
+        catalog_file = self.table_catalog_file
+        try:
+            os.makedirs(path.dirname(catalog_file), exist_ok=True)
+            temp_file = catalog_file + '.tmp'
+            with open(temp_file, 'w') as f:
+                json.dump(self._table_catalog, f)
+            os.replace(temp_file, catalog_file)
+        except Exception as e:
+            warnings.warn(f'failed saving table catalog {catalog_file}: {e}')
+
+    def _update_table_catalog(self, table, df=None, dropped=False) -> None:
+        """ 在数据写入或删除数据表后更新数据表目录
+
+        Parameters
+        ----------
+        table: str
+            数据表名称
+        df: pd.DataFrame, optional
+            以primary key为index的数据表的全部数据，给出时直接用df统计数据表，否则从目录中
+            删除该表的信息，下次查询时重新统计
+        dropped: bool, default False
+            数据表已经被删除
+        """
+        if not self._is_cataloged(table):
+            return
+        entry = None
+        if (df is not None) and (not dropped):
+            entry = _table_catalog_entry(df)
+            file_path_name = self.get_file_path_name(table)
+            entry['size'] = path.getsize(file_path_name)
+            entry['modified'] = path.getmtime(file_path_name)
+        with self._catalog_lock:
+            catalog = self._load_table_catalog()
+            if entry is None:
+                if catalog.pop(table, None) is None:
+                    return
+            else:
+                catalog[table] = entry
+            self._save_table_catalog()
+
+    def _build_table_catalog_entry(self, table):
+        """ 读取数据表，统计数据表的元数据，数据表不存在时返回None"""
+        import time
+        if not self.table_data_exists(table):
+            return None
+        columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
+        if self.source_type == 'file':
+            # 只读取一次文件，同时统计所有的主键
+            df = self.read_file(table, primary_keys, pk_dtypes)
+            entry = _table_catalog_entry(df)
+            file_path_name = self.get_file_path_name(table)
+            entry['size'] = self.get_file_size(table)
+            entry['modified'] = path.getmtime(file_path_name)
+            return entry
+        if self.source_type == 'sqlite':
+            rows, size = self.get_sqlite_table_size(table)
+            coverage = {pk: self.get_sqlite_table_coverage(table, pk, min_max_only=True, with_count=True)
+                        for pk in primary_keys}
+        else:
+            rows, size = self.get_db_table_size(table)
+            coverage = {pk: self.get_db_table_minmax(table, pk, with_count=True) for pk in primary_keys}
+        coverage = {pk: [_catalog_value(v) for v in cov] for pk, cov in coverage.items() if cov}
+        return {'rows':     int(rows),
+                'size':     int(size),
+                'modified': time.time(),
+                'coverage': coverage}
+
     # ==============
     # 系统操作表操作函数，专门用于操作sys_operations表，记录系统操作信息，数据格式简化
     # ==============
@@ -4278,14 +6111,7 @@ class DataSource:
                                   auto_increment_id=True)
                 return 0
 
-            import pymysql
-            con = pymysql.connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.__user__,
-                    password=self.__password__,
-                    db=self.db_name,
-            )
+            con = self._connection_pool.acquire()
             cursor = con.cursor()
             columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table, with_primary_keys=True)
             primary_key = primary_keys[0]
@@ -4299,21 +6125,31 @@ class DataSource:
                 raise RuntimeError(
                     f'{e}, An error occurred when getting last record_id for table {table} with SQL:\n{sql}')
             finally:
-                con.close()
+                self._connection_pool.release(con)
+
+        elif self.source_type == 'sqlite':
+            columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table, with_primary_keys=True)
+            last_id = self.get_sqlite_table_coverage(table, primary_keys[0], min_max_only=True)
+            if (not last_id) or (last_id[1] is None):
+                return 0
+            return int(last_id[1])
 
         else:  # for other unexpected cases
             pass
         pass
 
-    def read_sys_table_data(self, table, **kwargs) -> pd.DataFrame:
+    def read_sys_table_data(self, table, *, record_ids=None, **kwargs) -> pd.DataFrame:
         """读取系统操作表的数据，包括读取所有记录，以及根据给定的条件读取记录
 
         返回的数据类型为pd.DataFrame，如果给出kwargs，返回根据条件筛选后的数据
+        如果给出record_ids，则在读取时按主键筛选，只读取这些记录，而不读取整个数据表
 
         Parameters
         ----------
         table: str
             需要读取的数据表名称
+        record_ids: list of int, optional
+            需要读取的记录的ID，为None时读取所有记录
         kwargs: dict
             筛选数据的条件，包括用作筛选条件的字典如: {account_id = 123}
 
@@ -4331,14 +6167,25 @@ class DataSource:
             err = KeyError(f'kwargs not valid: {[k for k in kwargs if k not in columns]}')
             raise err
 
-        # 读取数据，如果给出id，则只读取一条数据，否则读取所有数据
+        # 读取数据，如果给出record_ids，则只读取这些记录，否则读取所有数据
+        id_filter = {}
+        if record_ids is not None:
+            record_ids = [int(record_id) for record_id in record_ids]
+            if len(record_ids) == 0:
+                return pd.DataFrame()
+            id_filter = {'share_like_pk': p_keys[0], 'shares': record_ids}
         if self.source_type == 'db':
-            res_df = self.read_database(table)
+            res_df = self.read_database(table, **id_filter)
             if res_df.empty:
                 return res_df
             set_primary_key_index(res_df, primary_key=p_keys, pk_dtypes=pk_dtypes)
         elif self.source_type == 'file':
-            res_df = self.read_file(table, p_keys, pk_dtypes)
+            res_df = self.read_file(table, p_keys, pk_dtypes, **id_filter)
+        elif self.source_type == 'sqlite':
+            res_df = self.read_sqlite(table, **id_filter)
+            if res_df.empty:
+                return res_df
+            set_primary_key_index(res_df, primary_key=p_keys, pk_dtypes=pk_dtypes)
         else:  # for other unexpected cases
             return pd.DataFrame()
 
@@ -4447,6 +6294,7 @@ class DataSource:
         df_data = pd.DataFrame(table_data, index=[record_id])
         df_data.index.name = p_keys[0]
         self.update_table_data(table, df_data, merge_type='update')
+        self._notify_sys_table_listeners(table, {record_id: table_data})
         return record_id
 
     def insert_sys_table_data(self, table:str, **data) -> int:
@@ -4538,10 +6386,106 @@ class DataSource:
 
         # 插入数据
         self.update_table_data(table, df, merge_type='update')
+        self._notify_sys_table_listeners(table, {record_id: dict(data)})
         # TODO: 这里为什么要用'ignore'而不是'update'? 现在改为'update'，
         #  test_database和test_trading测试都能通过，后续完整测试
         return record_id
 
+    def insert_sys_table_records(self, table: str, records: list) -> list:
+        """ 批量插入系统操作表的数据，所有记录在一次写入操作中完成
+
+        与insert_sys_table_data()相同，记录的ID自动生成，每一条记录都必须给出完整的数据字段
+
+        Parameters
+        ----------
+        table: str
+            需要插入数据的数据表名称
+        records: list of dict
+            需要插入的数据，每个dict的key必须与数据表的数据字段相同，否则会抛出异常
+
+        Returns
+        -------
+        record_ids: list of int
+            插入的记录ID，顺序与records一致
+
+        Raises
+        ------
+        KeyError: 当某条记录给出的字段不完整或者有不可用的字段时
+        """
+
+        ensure_sys_table(table)
+        if len(records) == 0:
+            return []
+
+        columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
+        data_columns = [col for col in columns if col not in primary_keys]
+        for data in records:
+            if any(k not in data_columns for k in data.keys()) or any(k not in data.keys() for k in data_columns):
+                err = KeyError(f'Input data keys must be the same as the table data columns, '
+                               f'got {list(data.keys())} vs {data_columns}')
+                raise err
+
+        last_id = self.get_sys_table_last_id(table)
+        first_id = last_id + 1 if last_id is not None else 1
+        record_ids = list(range(first_id, first_id + len(records)))
+        df = pd.DataFrame(records, index=record_ids)
+        df = df.reindex(columns=columns)
+        df.index.name = primary_keys[0]
+
+        self.update_table_data(table, df, merge_type='update')
+        self._notify_sys_table_listeners(table, dict(zip(record_ids, records)))
+        return record_ids
+
+    def update_sys_table_records(self, table: str, record_ids: (list, tuple), **data) -> list:
+        """ 批量更新系统操作表中的多条记录，所有记录在一次写入操作中完成
+
+        data中每个字段的值可以是一个标量，此时所有记录的该字段都更新为同一个值，也可以是一个
+        与record_ids长度相同的list，此时逐条更新记录的该字段
+
+        Parameters
+        ----------
+        table: str
+            需要更新的数据表名称
+        record_ids: list of int or tuple of int
+            需要更新的记录的ID
+        data: dict
+            需要更新的数据，如: status = 'submitted'
+
+        Returns
+        -------
+        record_ids: list of int
+            更新的记录ID
+
+        Raises
+        ------
+        KeyError: 当给出的某个id不存在时
+        KeyError: 当给出的字段不存在时
+        """
+
+        ensure_sys_table(table)
+        record_ids = list(record_ids)
+        if len(record_ids) == 0:
+            return []
+
+        columns, dtypes, p_keys, pk_dtypes = get_built_in_table_schema(table)
+        data_columns = [col for col in columns if col not in p_keys]
+        if any(k not in data_columns for k in data.keys()):
+            raise KeyError(f'kwargs not valid: {[k for k in data.keys() if k not in data_columns]}')
+
+        table_data = self.read_sys_table_data(table, record_ids=record_ids)
+        missing_ids = [record_id for record_id in record_ids if record_id not in table_data.index]
+        if missing_ids:
+            raise KeyError(f'record_id({missing_ids}) not found in table {table}')
+
+        df_data = table_data.loc[record_ids].copy()
+        for col, value in data.items():
+            df_data[col] = value
+        df_data.index.name = p_keys[0]
+        self.update_table_data(table, df_data, merge_type='update')
+        if self._sys_table_listeners.get(table):
+            self._notify_sys_table_listeners(table, df_data.to_dict(orient='index'))
+        return record_ids
+
     def delete_sys_table_data(self, table: str, record_ids: (list, tuple)) -> int:
         """ 删除系统数据表中的某些记录，被删除的记录的ID使用列表或tuple传入
 
@@ -4586,15 +6530,169 @@ class DataSource:
             res = self.delete_database_records(table, primary_key=primary_key, record_ids=record_ids)
         elif self.source_type == 'file':
             res = self.delete_file_records(table, primary_key=primary_key, record_ids=record_ids)
+        elif self.source_type == 'sqlite':
+            res = self.delete_sqlite_records(table, primary_key=primary_key, record_ids=record_ids)
         else:
             err = RuntimeError(f'invalid source type: {self.source_type}')
             raise err
 
+        self._notify_sys_table_listeners(table, dict.fromkeys(record_ids))
         return res
 
+    def add_sys_table_listener(self, table: str, listener) -> None:
+        """ 注册系统数据表的写入监听函数
+
+        每次通过update_sys_table_data()、insert_sys_table_data()等方法成功写入系统数据表后，
+        以listener(records)的形式调用监听函数，records是一个dict，键为写入的记录ID，值为写入后的
+        完整记录(dict)，被删除的记录的值为None。监听函数可以直接用写入的数据更新自己的缓存，不需要
+        重新读取数据表
+
+        Parameters
+        ----------
+        table: str
+            系统数据表名称
+        listener: callable
+            监听函数，签名为listener(records) -> None
+
+        Returns
+        -------
+        None
+        """
+        ensure_sys_table(table)
+        if not callable(listener):
+            raise TypeError(f'listener should be callable, got {type(listener)} instead')
+        self._sys_table_listeners.setdefault(table, []).append(listener)
+
+    def remove_sys_table_listener(self, table: str, listener) -> None:
+        """ 删除系统数据表的写入监听函数，监听函数不存在时不做任何操作"""
+        listeners = self._sys_table_listeners.get(table, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def _notify_sys_table_listeners(self, table, records) -> None:
+        """ 将写入系统数据表的记录传递给所有的监听函数"""
+        for listener in list(self._sys_table_listeners.get(table, [])):
+            listener(records)
+
     # ==============
     # 顶层函数，包括用于组合HistoryPanel的数据获取接口函数，以及自动或手动下载本地数据的操作函数
     # ==============
+    def get_adj_factors(self, table, shares):
+        """ 获取证券的复权因子，复权因子以紧凑的数组形式缓存，只保存复权因子发生变化的日期(除权除息日)
+
+        缓存中没有的证券从复权因子表中读取全部历史复权因子后加入缓存，复权因子表写入或删除后缓存被清除
+
+        Parameters
+        ----------
+        table: str
+            复权因子表的名称，如'stock_adj_factor'
+        shares: list of str
+            证券代码
+
+        Returns
+        -------
+        dict: {share: (dates, factors)}
+            dates为datetime64[D]类型的除权除息日数组，factors为从该日期开始生效的复权因子，
+            没有复权因子的证券的两个数组均为空
+        """
+        with self._adj_factor_lock:
+            cache = self._adj_factor_cache.setdefault(table, {})
+            missing = [share for share in shares if share not in cache]
+        if missing:
+            adj_df = self.read_table_data(table, shares=missing)
+            loaded = {share: (np.array([], dtype='datetime64[D]'), np.array([], dtype='float64'))
+                      for share in missing}
+            if not adj_df.empty:
+                adj_df = adj_df['adj_factor'].sort_index()
+                codes = adj_df.index.get_level_values(0).values
+                dates = adj_df.index.get_level_values(1).values.astype('datetime64[D]')
+                values = adj_df.values.astype('float64')
+                # 只保留每个证券第一个复权因子以及复权因子发生变化的记录
+                changed = np.ones(len(values), dtype=bool)
+                changed[1:] = (codes[1:] != codes[:-1]) | (values[1:] != values[:-1])
+                codes, dates, values = codes[changed], dates[changed], values[changed]
+                bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+                for i, j in zip(bounds[:-1], bounds[1:]):
+                    loaded[codes[i]] = (dates[i:j], values[i:j])
+            with self._adj_factor_lock:
+                cache.update(loaded)
+        with self._adj_factor_lock:
+            return {share: cache[share] for share in shares}
+
+    @property
+    def last_prices(self):
+        """ 最新已知价格存储，保存写入K线数据表以及实盘交易时获取的每个证券的最新价格 """
+        return self._last_prices
+
+    def _record_last_prices(self, df, table) -> None:
+        """ 向K线数据表写入数据后，用新写入数据的收盘价更新最新已知价格 """
+        table_master = TABLE_MASTERS[table]
+        if table_master[TABLE_MASTER_COLUMNS.index('schema')] not in ['bars', 'min_bars']:
+            return
+        freq = table_master[TABLE_MASTER_COLUMNS.index('freq')]
+        try:
+            self._last_prices.update_bars(freq, df)
+        except Exception as e:
+            warnings.warn(f'failed recording last prices from table {table}: {e}')
+        # 数据表中写入了新的数据，此前没有读取到价格的证券可以再次从该数据表中读取
+        self._last_price_tried = {(tbl, share) for tbl, share in self._last_price_tried if tbl != table}
+
+    def get_last_prices(self, shares, freq='d', asset_type='E') -> pd.Series:
+        """ 获取证券的最新已知价格，用于在没有实时价格时估算持仓市值
+
+        价格从最新已知价格存储中读取，存储中没有的证券从对应频率的K线数据表中读取数据表目录中最后
+        一个月的数据，每个证券只从同一个数据表中读取一次，直到该数据表中写入新的数据，此后最新价格随K线
+        数据写入以及实盘价格获取更新
+
+        Parameters
+        ----------
+        shares: str or list of str
+            证券代码
+        freq: str, default 'd'
+            存储中没有价格时，用于读取价格的K线数据频率
+        asset_type: str, default 'E'
+            证券的资产类型
+
+        Returns
+        -------
+        pd.Series: 以证券代码为index的最新价格，返回所有频率中时间最新的价格，无法获取价格的证券为NaN
+        """
+        if isinstance(shares, str):
+            shares = str_to_list(shares)
+        missing = [share for share in shares if share not in self._last_prices]
+        if missing:
+            self._seed_last_prices(missing, freq=freq, asset_type=asset_type)
+        return self._last_prices.get(shares)
+
+    def _seed_last_prices(self, shares, freq='d', asset_type='E') -> None:
+        """ 从K线数据表中读取证券的最新价格，已经读取过的证券在数据表写入新数据之前不再从同一个数据表中读取 """
+        tables = htype_to_table_col('close', freq=freq, asset_type=asset_type, soft_freq=True)
+        for table in tables:
+            shares_to_read = [share for share in shares if (table, share) not in self._last_price_tried]
+            if not shares_to_read:
+                continue
+            try:
+                catalog = self.get_table_catalog(table)
+                if (catalog is None) or (not catalog['coverage']):
+                    continue
+                # 数据表的最后一个primary key为日期或时间，只读取最后一个月的数据
+                last_date = pd.to_datetime(str(list(catalog['coverage'].values())[-1][1]))
+                start = (last_date - pd.Timedelta(days=31)).strftime('%Y%m%d')
+                end = (last_date + pd.Timedelta(days=1)).strftime('%Y%m%d')
+            except Exception as e:
+                # 无法确定数据表的日期范围时跳过该数据表，避免读取整个数据表
+                warnings.warn(f'failed reading catalog of table {table}, last prices are not read: {e}')
+                continue
+            try:
+                bars = self.read_table_data(table, shares=shares_to_read, start=start, end=end)
+            except Exception as e:
+                warnings.warn(f'failed reading last prices from table {table}: {e}')
+                continue
+            freq_of_table = TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('freq')]
+            self._last_prices.update_bars(freq_of_table, bars)
+            # 成功读取后，没有读取到价格的证券也被标记，数据表中写入新数据之前不再重复读取
+            self._last_price_tried.update((table, share) for share in shares_to_read)
+
     def get_history_data(self, shares=None, symbols=None, htypes=None, freq='d', start=None, end=None, row_count=100,
                          asset_type='any', adj='none'):
         """ 根据给出的参数从不同的本地数据表中获取数据，并打包成一系列的DataFrame，以便组装成
@@ -4671,52 +6769,27 @@ class DataSource:
                 asset_type=asset_type,
                 soft_freq=True
         )
-        table_data_acquired = {}
-        table_data_columns = {}
+        table_pivots = []
         if (start is not None) or (end is not None):
             # 如果指定了start或end，则忽略row_count参数, 但是如果row_count为None，则默认为-1, 读取所有数据
             row_count = 0 if row_count is not None else -1
-        # 逐个读取相关数据表，删除名称与数据类型不同的，保存到一个字典中，这个字典的键为表名，值为读取的DataFrame
+        # 逐个读取相关数据表，只读取需要的列，每一块数据填充到以日期为行、证券代码为列的数组中后即被丢弃
         for tbl, columns in tables_to_read.items():
-            df = self.read_table_data(tbl, shares=shares, start=start, end=end)
-            if not df.empty:
-                cols_to_drop = [col for col in df.columns if col not in columns]
-                df.drop(columns=cols_to_drop, inplace=True)
-                if row_count > 0:
-                    # 读取每一个ts_code的最后row_count行数据
-                    df = df.groupby('ts_code').tail(row_count)
-            table_data_acquired[tbl] = df
-            table_data_columns[tbl] = df.columns
-        # 从读取的数据表中提取数据，生成单个数据类型的dataframe，并把各个dataframe合并起来
-        # 在df_by_htypes中预先存储了多个空DataFrame，用于逐个合并相关的历史数据
-        df_by_htypes = {k: v for k, v in zip(htypes, [pd.DataFrame()] * len(htypes))}
-        for htyp in htypes:
-            for tbl in tables_to_read:
-                if htyp in table_data_columns[tbl]:
-                    df = table_data_acquired[tbl]
-                    # 从本地读取的DF中的数据是按multi_index的形式stack起来的，因此需要unstack，成为多列、单index的数据
-                    if not df.empty:
-                        htyp_series = df[htyp]
-                        new_df = htyp_series.unstack(level=0)
-                        old_df = df_by_htypes[htyp]
-                        # 使用两种方法实现df的合并，分别是merge()和join()
-                        # df_by_htypes[htyp] = old_df.merge(new_df,
-                        #                                   how='outer',
-                        #                                   left_index=True,
-                        #                                   right_index=True,
-                        #                                   suffixes=('', '_y'))
-                        df_by_htypes[htyp] = old_df.join(new_df,
-                                                         how='outer',
-                                                         rsuffix='_y')
-
-        # 如果在历史数据合并后发现列名称冲突，发出警告信息，并删除后添加的列
+            pivot = _HistoryPivot(columns)
+            for chunk in self.read_table_data_chunks(tbl, shares=shares, start=start, end=end, columns=columns):
+                pivot.add(chunk)
+            if (row_count > 0) and (not pivot.empty):
+                # 读取每一个ts_code的最后row_count行数据
+                pivot.tail(row_count)
+            table_pivots.append(pivot)
+        # 每个数据类型的数据直接从所有相关数据表的数组中填充到一个(日期, 证券)的数组中
+        # 如果同一个证券的同一种数据出现在多个数据表中，使用第一个数据表中的数据，发出警告信息
+        df_by_htypes = {}
         conflict_cols = ''
         for htyp in htypes:
-            df_columns = df_by_htypes[htyp].columns.to_list()
-            col_with_suffix = [col for col in df_columns if col[-2:] == '_y']
-            if len(col_with_suffix) > 0:
-                df_by_htypes[htyp].drop(columns=col_with_suffix, inplace=True)
-                conflict_cols += f'd-type {htyp} conflicts in {list(set(col[:-2] for col in col_with_suffix))};\n'
+            df_by_htypes[htyp], conflicts = _merge_history_pivots(table_pivots, htyp, shares=shares)
+            if conflicts:
+                conflict_cols += f'd-type {htyp} conflicts in {conflicts};\n'
         if conflict_cols != '':
             warnings.warn(f'\nConflict data encountered, some types of data are loaded from multiple tables, '
                           f'conflicting data might be discarded:\n'
@@ -4735,47 +6808,40 @@ class DataSource:
                                f'**kwargs)')
             raise err
         # 如果需要复权数据，计算复权价格
-        adj_factors = {}
         if adj.lower() not in ['none', 'n']:
-            # 下载复权因子
+            # 从缓存中读取复权因子，缓存中没有的证券从复权因子表中读取
             adj_tables_to_read = table_master.loc[(table_master.table_usage == 'adj') &
                                                   table_master.asset_type.isin(asset_type)].index.to_list()
-            for tbl in adj_tables_to_read:
-                adj_df = self.read_table_data(tbl, shares=shares, start=start, end=end)
-                if not adj_df.empty:
-                    adj_df = adj_df['adj_factor'].unstack(level=0)
-                adj_factors[tbl] = adj_df
-            # 如果adj table不为空但无法读取adj因子，则报错
-            if adj_tables_to_read and (not adj_factors):
-                err = ValueError(f'Failed reading price adjust factor data. call "qt.get_table_info()" to '
-                                 f'check local source data availability')
-                raise err
-
-        if adj_factors:
-            # 根据复权因子更新所有可复权数据
             prices_to_adjust = [item for item in htypes if item in ADJUSTABLE_PRICE_TYPES]
             for htyp in prices_to_adjust:
                 price_df = df_by_htypes[htyp]
-                all_ts_codes = price_df.columns
-                combined_factors = 1.0
-                # 后复权价 = 当日最新价 × 当日复权因子
-                for af in adj_factors:
-                    combined_factors *= adj_factors[af].reindex(columns=all_ts_codes, index=price_df.index).fillna(1.0)
-                # 得到合并后的复权因子，如果数据的频率为日级(包括周、月)，直接相乘即可
-                #  但如果数据的频率是分钟级，则需要将复权因子也扩展到分钟级，才能相乘
-                if freq in ['min', '1min', '5min', '15min', '30min', 'h']:
-                    expanded_factors = combined_factors.reindex(price_df.index.date)
-                    expanded_factors.index = price_df.index
-                    price_df *= expanded_factors
-                else:
-                    price_df *= combined_factors
+                if price_df.empty:
+                    continue
+                all_ts_codes = price_df.columns.to_list()
+                # 后复权价 = 当日最新价 × 当日复权因子，不同复权因子表中的复权因子相乘得到合并后的复权因子
+                # 复权因子按日期查找，因此分钟级数据也可以直接使用当日的复权因子，复权因子表中没有记录的
+                # 日期使用此前最近一个除权除息日的复权因子
+                price_dates = price_df.index.values.astype('datetime64[D]')
+                combined_factors = np.ones(price_df.shape)
+                for tbl in adj_tables_to_read:
+                    try:
+                        factors = self.get_adj_factors(tbl, shares=all_ts_codes)
+                    except Exception as e:
+                        # 如果adj table不为空但无法读取adj因子，则报错
+                        err = ValueError(f'Failed reading price adjust factor data. call "qt.get_table_info()" to '
+                                         f'check local source data availability')
+                        raise err from e
+                    combined_factors *= _adj_factor_matrix(
+                            price_dates,
+                            [factors[code][0] for code in all_ts_codes],
+                            [factors[code][1] for code in all_ts_codes],
+                    )
+                adjusted = price_df.values * combined_factors
                 # 前复权价 = 当日复权价 ÷ 最新复权因子
                 if adj.lower() in ['forward', 'fw', 'f'] and len(combined_factors) > 1:
-                    price_df /= combined_factors.iloc[-1]
+                    adjusted /= combined_factors[-1]
+                df_by_htypes[htyp] = pd.DataFrame(adjusted, index=price_df.index, columns=price_df.columns)
 
-        # 最后整理数据，确保每一个htype的数据框的columns与shares相同
-        for htyp, df in df_by_htypes.items():
-            df_by_htypes[htyp] = df.reindex(columns=shares)
         # print(f'[DEBUG]: in database.py get_history_data() got db_by_htypes:\n{df_by_htypes}')
         return df_by_htypes
 
@@ -4839,7 +6905,7 @@ class DataSource:
                             end_date=None, list_arg_filter=None, symbols=None, merge_type='update',
                             reversed_par_seq=False, parallel=True, process_count=None, chunk_size=100,
                             download_batch_size=0, download_batch_interval=0, refresh_trade_calendar=False,
-                            log=False) -> None:
+                            log=False, rate_limit=0, resume=False, fetcher=None, rollup=False) -> None:
         """ 批量下载历史数据并保存到本地数据仓库
 
         Parameters
@@ -4901,26 +6967,39 @@ class DataSource:
             - True:  逆序参数下载数据
             - False: 顺序参数下载数据
         parallel: Bool, Default True
-            是否启用多线程下载数据
+            是否启用多线程下载数据，启用时同一阶段的所有数据表并发下载
             - True:  启用多线程下载数据
             - False: 禁用多线程下载
         process_count: int
             启用多线程下载时，同时开启的线程数，默认值为设备的CPU核心数
-        chunk_size: int
-            保存数据到本地时，为了减少文件/数据库读取次数，将下载的数据累计一定数量后
-            再批量保存到本地，chunk_size即批量，默认值100
+        chunk_size: int, default 100
+            保存数据到本地时，为了减少文件/数据库读取次数，将下载的数据累计一定数量后再批量保存到本地，
+            每个数据表累计chunk_size次下载后保存一批数据并记录下载进度，为0时每个数据表全部下载完成后
+            一次保存，缓存的数据过多时提前保存
         download_batch_size: int, default 0
             为了降低下载数据时的网络请求频率，可以在完成一批数据下载后，暂停一段时间再继续下载
-            该参数指定了每次暂停之前最多可以下载的次数，该参数只有在parallel=False时有效
+            该参数指定了每次暂停之前最多可以下载的次数
             如果为0，则不暂停，一次性下载所有数据
         download_batch_interval: int, default 0
             为了降低下载数据时的网络请求频率，可以在完成一批数据下载后，暂停一段时间再继续下载
-            该参数指定了每次暂停的时间，单位为秒，该参数只有在parallel=False时有效
+            该参数指定了每次暂停的时间，单位为秒
             如果<=0，则不暂停，立即开始下一批数据下载
         refresh_trade_calendar: Bool, Default False
             是否强制刷新交易日历，如果为True，将下载最新的交易日历数据，如果为False，仅在交易日历数据不足时下载
         log: Bool, Default False
             是否记录数据下载日志
+        rate_limit: int, Default 0
+            每分钟最多访问数据下载API的次数，所有下载线程共享这一限制，如果>0，则忽略
+            download_batch_size和download_batch_interval参数，如果为0，则不限制访问频率
+        resume: Bool, Default False
+            是否从上次中断的位置继续下载，如果为True，下载进度会保存在检查点文件中，以同样的参数再次运行时
+            跳过已经完成的下载，全部下载成功后删除检查点文件
+        fetcher: callable, optional
+            数据下载函数，签名为fetcher(table, **kwargs) -> pd.DataFrame，默认通过tushare API下载数据
+        rollup: Bool, Default False
+            是否在下载完成后，用下载的1分钟K线和日K线数据合并生成低频K线数据表(如5分钟K线、周K线等)，
+            只合并下载时间段内的数据，没有给出下载时间段时，只合并低频K线数据表中已有数据之后的数据，
+            同时被下载的低频K线数据表不会被合并数据覆盖
 
         Returns
         -------
@@ -4928,7 +7007,6 @@ class DataSource:
 
         """
 
-        from .tsfuncs import acquire_data
         # 1 参数合法性检查 TODO: 参数检查在core.py中完成，这里只需要调用即可
         if (tables is None) and (dtypes is None):
             raise KeyError(f'tables and dtypes can not both be None.')
@@ -4949,11 +7027,9 @@ class DataSource:
         if isinstance(dtypes, str):
             dtypes = str_to_list(dtypes)
 
-        if chunk_size <= 0:
-            chunk_size = 100
-
+        # 只有同时给出每批下载次数和暂停时间时才限制下载频率，否则不暂停，一次性下载所有数据
         if download_batch_size <= 0:
-            download_batch_size = 999999999999  # 一个很大的数，保证不会暂停下载
+            download_batch_size = 0
 
         if download_batch_interval <= 0:
             download_batch_interval = 0
@@ -5042,194 +7118,212 @@ class DataSource:
                     except:
                         tables_to_refill.add('trade_calendar')
 
-        # 开始逐个下载清单中的表数据
-        table_count = 0
-        import time
-        for table in table_master.index:
-            # 逐个下载数据并写入本地数据表中
-            if table not in tables_to_refill:
+        # 生成下载调度器，所有的表共享同一个限速器，同一阶段的表并发下载
+        rate_limiters = {}
+        if rate_limit > 0:
+            rate_limiters['tushare'] = TokenBucket(rate=rate_limit / 60., capacity=rate_limit)
+        elif (download_batch_size > 0) and (download_batch_interval > 0):
+            rate_limiters['tushare'] = TokenBucket(rate=download_batch_size / download_batch_interval,
+                                                   capacity=download_batch_size)
+        checkpoint_file = None
+        if resume:
+            checkpoint_file = self._refill_checkpoint_file_name(
+                    tables=sorted(tables_to_refill),
+                    start_date=start_date,
+                    end_date=end_date,
+                    list_arg_filter=list_arg_filter,
+                    symbols=symbols if code_start is None else [code_start, code_end],
+                    merge_type=merge_type,
+            )
+        scheduler = RefillScheduler(
+                datasource=self,
+                fetcher=fetcher,
+                rate_limiters=rate_limiters,
+                max_workers=process_count if parallel else 1,
+                checkpoint_file=checkpoint_file,
+                flush_count=chunk_size,
+        )
+
+        # 交易日历以及其他表下载参数所依赖的表（如stock_basic）需要在第一阶段下载，其余的表在第二阶段并发下载
+        first_stage_tables = set()
+        for table in tables_to_refill:
+            cur_table = table_master.loc[table]
+            if cur_table.fill_arg_type == 'table_index':
+                first_stage_tables.add(cur_table.arg_rng)
+        if 'trade_calendar' in tables_to_refill:
+            first_stage_tables.add('trade_calendar')
+        first_stage_tables.intersection_update(tables_to_refill)
+        stages = [
+            [table for table in table_master.index if table in first_stage_tables],
+            [table for table in table_master.index if (table in tables_to_refill) and
+             (table not in first_stage_tables)],
+        ]
+        for stage_tables in stages:
+            if not stage_tables:
                 continue
-            table_count += 1
-            cur_table_info = table_master.loc[table]
-            # 3 生成数据下载参数序列
-            arg_name = cur_table_info.fill_arg_name
-            fill_type = cur_table_info.fill_arg_type
-            freq = cur_table_info.freq
-
-            # 开始生成所有的参数，参数的生成取决于fill_arg_type
-            if (start_date is None) and (fill_type in ['datetime', 'trade_date']):
-                start = cur_table_info.arg_rng
-            else:
-                start = start_date
-            if start is not None:
-                start = pd.to_datetime(start).strftime('%Y%m%d')
-            if end_date is None:
-                end = 'today'
-            else:
-                end = end_date
-            end = pd.to_datetime(end).strftime('%Y%m%d')
-            allow_start_end = (cur_table_info.arg_allow_start_end.lower() == 'y')
-            start_end_chunk_size = 0
-            if cur_table_info.start_end_chunk_size != '':
-                start_end_chunk_size = int(cur_table_info.start_end_chunk_size)
-            additional_args = {}
-            chunked_additional_args = []
-            start_end_chunk_multiplier = 1
-            # 生成start和end参数，如果需要的话
-            if allow_start_end:
-                additional_args = {'start': start, 'end': end}
-            if start_end_chunk_size > 0:
-                start_end_chunk_lbounds = list(pd.date_range(start=start,
-                                                             end=end,
-                                                             freq=f'{start_end_chunk_size}d'
-                                                             ).strftime('%Y%m%d'))
-                start_end_chunk_rbounds = start_end_chunk_lbounds[1:]
-                # 取到的日线或更低频率数据是包括右边界的，去掉右边界可以得到更精确的结果
-                # 但是这样做可能没有意义
-                if freq.upper() in ['D', 'W', 'M']:
-                    prev_day = pd.Timedelta(1, 'd')
-                    start_end_chunk_rbounds = pd.to_datetime(start_end_chunk_lbounds[1:]) - prev_day
-                    start_end_chunk_rbounds = list(start_end_chunk_rbounds.strftime('%Y%m%d'))
-
-                start_end_chunk_rbounds.append(end)
-                chunked_additional_args = [{'start': s, 'end': e} for s, e in
-                                           zip(start_end_chunk_lbounds, start_end_chunk_rbounds)]
-                start_end_chunk_multiplier = len(chunked_additional_args)
-            # 生成其他参数，根据不同的fill_type生成不同的参数序列
-            if fill_type in ['datetime', 'trade_date']:
-                # 根据start_date和end_date生成数据获取区间
-                additional_args = {}  # 使用日期作为关键参数，不再需要additional_args
-                arg_coverage = pd.date_range(start=start, end=end, freq=freq)
-                if fill_type == 'trade_date':
-                    if freq.lower() in ['m', 'w', 'w-Fri']:
-                        # 当生成的日期不连续时，或要求生成交易日序列时，需要找到最近的交易日
-                        arg_coverage = map(nearest_market_trade_day, arg_coverage)
-                    if freq == 'd':
-                        arg_coverage = (date for date in arg_coverage if is_market_trade_day(date))
-                arg_coverage = list(pd.to_datetime(list(arg_coverage)).strftime('%Y%m%d'))
-            elif fill_type == 'list':
-                # 如果参数是一个列表，直接使用这个列表作为参数序列，除非给出了list_arg_filter
-                arg_coverage = str_to_list(cur_table_info.arg_rng) if list_arg_filter is None else list_arg_filter
-            elif fill_type == 'table_index':
-                suffix = str_to_list(cur_table_info.arg_allowed_code_suffix)
-                source_table = self.read_table_data(cur_table_info.arg_rng)
-                arg_coverage = source_table.index.to_list()
-                if code_start is not None:
-                    arg_coverage = [code for code in arg_coverage if (code_start <= code.split('.')[0] <= code_end)]
-                if symbols is not None:
-                    arg_coverage = [code for code in arg_coverage if code.split('.')[0] in symbols]
-                if suffix:
-                    arg_coverage = [code for code in arg_coverage if code.split('.')[1] in suffix]
-            else:
-                arg_coverage = []
-
-            # 处理数据下载参数序列，剔除已经存在的数据key
-            if self.table_data_exists(table) and merge_type.lower() == 'ignore':
-                # 当数据已经存在，且合并模式为"忽略新数据"时，从计划下载的数据范围中剔除已经存在的部分
-                already_existed = self.get_table_data_coverage(table, arg_name)
-                arg_coverage = [arg for arg in arg_coverage if arg not in already_existed]
-
-            # 生成所有的参数, 开始循环下载并更新数据
-            if reversed_par_seq:
-                arg_coverage.reverse()
-            if chunked_additional_args:
-                import itertools
-                all_kwargs = ({arg_name: val, **add_arg} for val, add_arg in
-                              itertools.product(arg_coverage, chunked_additional_args))
-            else:
-                all_kwargs = ({arg_name: val, **additional_args} for val in arg_coverage)
-
-            completed = 0
-            total = len(list(arg_coverage)) * start_end_chunk_multiplier
-            total_written = 0
-            st = time.time()
-            dnld_data = pd.DataFrame()
-            time_elapsed = 0
-            rows_affected = 0
-            try:
-                # 清单中的第一张表不使用parallel下载
-                if parallel and table_count != 1:
-                    with ThreadPoolExecutor(max_workers=process_count) as worker:
-                        '''
-                        这里如果直接使用fetch_history_table_data会导致程序无法运行，原因不明，目前只能默认通过tushare接口获取数据
-                        通过TABLE_MASTERS获取tushare接口名称，并通过acquire_data直接通过tushare的API获取数据
-                        '''
-                        api_name = TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('tushare')]
-                        futures = {}
-                        submitted = 0
-                        for kw in all_kwargs:
-                            futures.update({worker.submit(acquire_data, api_name, **kw): kw})
-                            submitted += 1
-                            if (download_batch_interval != 0) and (submitted % download_batch_size == 0):
-                                progress_bar(submitted, total, f'<{table}>: Submitting tasks, '
-                                                               f'Pausing for {download_batch_interval} sec...')
-                                time.sleep(download_batch_interval)
-                        # futures = {worker.submit(acquire_data, api_name, **kw): kw
-                        #            for kw in all_kwargs}
-                        progress_bar(0, total, f'<{table}>: estimating time left...')
-                        for f in as_completed(futures):
-                            df = f.result()
-                            cur_kwargs = futures[f]
-                            completed += 1
-                            if completed % chunk_size:
-                                dnld_data = pd.concat([dnld_data, df])
-                            else:
-                                dnld_data = pd.concat([dnld_data, df])
-                                rows_affected = self.update_table_data(table, dnld_data)
-                                dnld_data = pd.DataFrame()
-                            total_written += rows_affected
-                            time_elapsed = time.time() - st
-                            time_remain = sec_to_duration((total - completed) * time_elapsed / completed,
-                                                          estimation=True, short_form=False)
-                            progress_bar(completed, total, f'<{table}:{list(cur_kwargs.values())[0]}>'
-                                                           f'{total_written}wrtn/{time_remain} left')
-
-                        total_written += self.update_table_data(table, dnld_data)
-                else:
-                    progress_bar(0, total, f'<{table}> estimating time left...')
-                    for kwargs in all_kwargs:
-                        df = self.fetch_history_table_data(table, channel='tushare', **kwargs)
-                        completed += 1
-                        if completed % chunk_size:
-                            dnld_data = pd.concat([dnld_data, df])
-                        else:
-                            dnld_data = pd.concat([dnld_data, df])
-                            rows_affected = self.update_table_data(table, dnld_data)
-                            dnld_data = pd.DataFrame()
-                        total_written += rows_affected
-                        time_elapsed = time.time() - st
-                        time_remain = sec_to_duration(
-                                (total - completed) * time_elapsed / completed,
-                                estimation=True,
-                                short_form=False
-                        )
-
-                        if (download_batch_interval != 0) and (completed % download_batch_size == 0):
-                            progress_bar(completed, total, f'<{table}:{list(kwargs.values())[0]}>'
-                                                           f'{total_written}wrtn/Pausing for '
-                                                           f'{download_batch_interval} sec...')
-                            time.sleep(download_batch_interval)
-                        else:
-                            progress_bar(completed, total, f'<{table}:{list(kwargs.values())[0]}>'
-                                                           f'{total_written}wrtn/{time_remain} left')
-                    total_written += self.update_table_data(table, dnld_data)
-                strftime_elapsed = sec_to_duration(
-                        time_elapsed,
-                        estimation=True,
-                        short_form=True
+            table_tasks = {}
+            for table in stage_tables:
+                table_tasks[table] = self._get_refill_table_kwargs(
+                        table=table,
+                        start_date=start_date,
+                        end_date=end_date,
+                        list_arg_filter=list_arg_filter,
+                        symbols=symbols,
+                        code_start=code_start,
+                        code_end=code_end,
+                        merge_type=merge_type,
+                        reversed_par_seq=reversed_par_seq,
                 )
-                if len(arg_coverage) > 1:
-                    progress_bar(total, total, f'<{table}:{arg_coverage[0]}-{arg_coverage[-1]}>'
-                                               f'{total_written}wrtn in {strftime_elapsed}\n')
-                else:
-                    progress_bar(total, total, f'[{table}:None>'
-                                               f'{total_written}wrtn in {strftime_elapsed}\n')
-            except Exception as e:
-                total_written += self.update_table_data(table, dnld_data)
-                msg = f'\n{str(e)}: \ndownload process interrupted at [{table}]:' \
-                              f'<{arg_coverage[0]}>-<{arg_coverage[completed - 1]}>\n' \
-                              f'{total_written} rows downloaded, will proceed with next table!'
-                warnings.warn(msg)
+            scheduler.run(table_tasks)
+
+        if not scheduler.failed_tasks:
+            scheduler.clear_checkpoint()
+
+        if rollup:
+            for table in [table for table in table_master.index if table in tables_to_refill]:
+                targets = [target for target in _get_rollup_targets(table) if target not in tables_to_refill]
+                if targets:
+                    self.rollup_table_data(table, targets=targets, start=start_date, end=end_date)
+
+    def _refill_checkpoint_file_name(self, **refill_args) -> str:
+        """ 根据数据下载参数生成检查点文件的完整路径，同样的下载参数对应同一个检查点文件
+
+        Parameters
+        ----------
+        **refill_args:
+            refill_local_source的下载参数
+
+        Returns
+        -------
+        str: 检查点文件的完整路径
+        """
+        import json
+        import hashlib
+        from qteasy import QT_SYS_LOG_PATH
+        signature = json.dumps(refill_args, sort_keys=True, default=str)
+        signature = hashlib.md5(signature.encode('utf-8')).hexdigest()[:16]
+        checkpoint_path = self.file_path if self.source_type == 'file' else QT_SYS_LOG_PATH
+        return path.join(checkpoint_path, f'refill_checkpoint_{signature}.json')
+
+    def _get_refill_table_kwargs(self, table, start_date=None, end_date=None, list_arg_filter=None, symbols=None,
+                                 code_start=None, code_end=None, merge_type='update',
+                                 reversed_par_seq=False) -> list:
+        """ 根据TABLE_MASTERS中定义的数据表下载参数，生成一张数据表所需的所有下载参数
+
+        Parameters
+        ----------
+        table: str
+            数据表名称
+        start_date: str YYYYMMDD, optional
+            数据下载的开始日期
+        end_date: str YYYYMMDD, optional
+            数据下载的结束日期
+        list_arg_filter: list of str, optional
+            限定下载数据时的筛选参数
+        symbols: list of str, optional
+            限定下载数据的证券代码
+        code_start: str, optional
+            限定下载数据的证券代码范围起点
+        code_end: str, optional
+            限定下载数据的证券代码范围终点
+        merge_type: str, Default update
+            数据混合方式，为'ignore'时剔除本地已经存在的数据
+        reversed_par_seq: Bool, Default False
+            是否逆序参数下载数据
+
+        Returns
+        -------
+        list of dict: 所有的下载参数
+        """
+        table_master = get_table_master()
+        cur_table_info = table_master.loc[table]
+        # 3 生成数据下载参数序列
+        arg_name = cur_table_info.fill_arg_name
+        fill_type = cur_table_info.fill_arg_type
+        freq = cur_table_info.freq
+
+        # 开始生成所有的参数，参数的生成取决于fill_arg_type
+        if (start_date is None) and (fill_type in ['datetime', 'trade_date']):
+            start = cur_table_info.arg_rng
+        else:
+            start = start_date
+        if start is not None:
+            start = pd.to_datetime(start).strftime('%Y%m%d')
+        if end_date is None:
+            end = 'today'
+        else:
+            end = end_date
+        end = pd.to_datetime(end).strftime('%Y%m%d')
+        allow_start_end = (cur_table_info.arg_allow_start_end.lower() == 'y')
+        start_end_chunk_size = 0
+        if cur_table_info.start_end_chunk_size != '':
+            start_end_chunk_size = int(cur_table_info.start_end_chunk_size)
+        additional_args = {}
+        chunked_additional_args = []
+        # 生成start和end参数，如果需要的话
+        if allow_start_end:
+            additional_args = {'start': start, 'end': end}
+        if start_end_chunk_size > 0:
+            start_end_chunk_lbounds = list(pd.date_range(start=start,
+                                                         end=end,
+                                                         freq=f'{start_end_chunk_size}d'
+                                                         ).strftime('%Y%m%d'))
+            start_end_chunk_rbounds = start_end_chunk_lbounds[1:]
+            # 取到的日线或更低频率数据是包括右边界的，去掉右边界可以得到更精确的结果
+            # 但是这样做可能没有意义
+            if freq.upper() in ['D', 'W', 'M']:
+                prev_day = pd.Timedelta(1, 'd')
+                start_end_chunk_rbounds = pd.to_datetime(start_end_chunk_lbounds[1:]) - prev_day
+                start_end_chunk_rbounds = list(start_end_chunk_rbounds.strftime('%Y%m%d'))
+
+            start_end_chunk_rbounds.append(end)
+            chunked_additional_args = [{'start': s, 'end': e} for s, e in
+                                       zip(start_end_chunk_lbounds, start_end_chunk_rbounds)]
+        # 生成其他参数，根据不同的fill_type生成不同的参数序列
+        if fill_type in ['datetime', 'trade_date']:
+            # 根据start_date和end_date生成数据获取区间
+            additional_args = {}  # 使用日期作为关键参数，不再需要additional_args
+            arg_coverage = pd.date_range(start=start, end=end, freq=freq)
+            if fill_type == 'trade_date':
+                if freq.lower() in ['m', 'w', 'w-Fri']:
+                    # 当生成的日期不连续时，或要求生成交易日序列时，需要找到最近的交易日
+                    arg_coverage = map(nearest_market_trade_day, arg_coverage)
+                if freq == 'd':
+                    arg_coverage = (date for date in arg_coverage if is_market_trade_day(date))
+            arg_coverage = list(pd.to_datetime(list(arg_coverage)).strftime('%Y%m%d'))
+        elif fill_type == 'list':
+            # 如果参数是一个列表，直接使用这个列表作为参数序列，除非给出了list_arg_filter
+            arg_coverage = str_to_list(cur_table_info.arg_rng) if list_arg_filter is None else list_arg_filter
+        elif fill_type == 'table_index':
+            suffix = str_to_list(cur_table_info.arg_allowed_code_suffix)
+            source_table = self.read_table_data(cur_table_info.arg_rng)
+            arg_coverage = source_table.index.to_list()
+            if code_start is not None:
+                arg_coverage = [code for code in arg_coverage if (code_start <= code.split('.')[0] <= code_end)]
+            if symbols is not None:
+                arg_coverage = [code for code in arg_coverage if code.split('.')[0] in symbols]
+            if suffix:
+                arg_coverage = [code for code in arg_coverage if code.split('.')[1] in suffix]
+        else:
+            arg_coverage = []
+
+        # 处理数据下载参数序列，剔除已经存在的数据key
+        if self.table_data_exists(table) and merge_type.lower() == 'ignore':
+            # 当数据已经存在，且合并模式为"忽略新数据"时，从计划下载的数据范围中剔除已经存在的部分
+            already_existed = self.get_table_data_coverage(table, arg_name)
+            arg_coverage = [arg for arg in arg_coverage if arg not in already_existed]
+
+        # 生成所有的参数, 开始循环下载并更新数据
+        if reversed_par_seq:
+            arg_coverage.reverse()
+        if chunked_additional_args:
+            import itertools
+            all_kwargs = [{arg_name: val, **add_arg} for val, add_arg in
+                          itertools.product(arg_coverage, chunked_additional_args)]
+        else:
+            all_kwargs = [{arg_name: val, **additional_args} for val in arg_coverage]
+
+        return all_kwargs
 
     def get_all_basic_table_data(self, refresh_cache=False, raise_error=True):
         """ 一个快速获取所有basic数据表的函数，通常情况缓存处理以加快速度
@@ -5251,6 +7345,31 @@ class DataSource:
             self._get_all_basic_table_data.cache_clear()
         return self._get_all_basic_table_data(raise_error=raise_error)
 
+    def get_symbol_index(self, refresh_cache=False):
+        """ 获取基于所有basic数据表建立的证券代码及名称检索索引
+
+        索引只在basic数据表缓存更新后重新建立一次，之后的查找都直接使用索引，不再读取数据表
+
+        Parameters
+        ----------
+        refresh_cache: Bool, Default False
+            如果为True，则清空basic数据表缓存，重新读取数据表并建立索引
+
+        Returns
+        -------
+        SymbolIndex
+        """
+        from .utilfuncs import SymbolIndex, AVAILABLE_ASSET_TYPES
+        basic_tables = self.get_all_basic_table_data(refresh_cache=refresh_cache, raise_error=False)
+        symbol_index = getattr(self, '_symbol_index', None)
+        # basic数据表缓存更新后，缓存中的DataFrame对象也随之更新，此时需要重新建立索引
+        if (symbol_index is None) or (symbol_index[0] is not basic_tables):
+            df_s, df_i, df_f, df_ft, df_o = basic_tables
+            index = SymbolIndex(dict(zip(AVAILABLE_ASSET_TYPES, [df_s, df_i, df_ft, df_f, df_o])))
+            symbol_index = (basic_tables, index)
+            self._symbol_index = symbol_index
+        return symbol_index[1]
+
     @lru_cache(maxsize=1)
     def _get_all_basic_table_data(self, raise_error=True):
         """ 获取所有basic数据表
@@ -5303,7 +7422,7 @@ class DataSource:
 
     def reconnect(self):
         """ 当数据库超时或其他原因丢失连接时，Ping数据库检查状态，
-            如果可行的话，重新连接数据库
+            如果可行的话，重新连接数据库，失效的连接将从连接池中移除
 
         Returns
         -------
@@ -5312,23 +7431,20 @@ class DataSource:
         """
         if self.source_type != 'db':
             return True
-        import pymysql
-        con = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.__user__,
-                password=self.__password__,
-                db=self.db_name,
-        )
+        try:
+            con = self._connection_pool.acquire()
+        except Exception as e:
+            print(f'{e} on {self.connection_type}, please check your connection')
+            return False
         try:
             con.ping(reconnect=True)
             con.ping()  # check if connection is still alive
+            self._connection_pool.release(con)
             return True
         except Exception as e:
             print(f'{e} on {self.connection_type}, please check your connection')
+            self._connection_pool.release(con, discard=True)
             return False
-        finally:
-            con.close()
 
 
 # 以下是通用dataframe操作函数
@@ -5383,6 +7499,178 @@ def set_primary_key_index(df, primary_key, pk_dtypes):
     return None
 
 
+RESAMPLE_KERNEL_METHODS = {
+    'last':    0,
+    'close':   0,
+    'first':   1,
+    'open':    1,
+    'max':     2,
+    'high':    2,
+    'min':     3,
+    'low':     3,
+    'avg':     4,
+    'mean':    4,
+    'sum':     5,
+    'total':   5,
+}
+
+
+def _resampled_time_index(start, end, target_freq, b_days_only, trade_time_only, **kwargs):
+    """ 生成降频或升频后的数据的时间序列，根据设置去除非工作日或非交易时段
+
+    Parameters
+    ----------
+    start: pd.Timestamp
+        时间序列的开始时间
+    end: pd.Timestamp
+        时间序列的结束时间
+    target_freq: str
+        时间序列的频率
+    b_days_only: bool
+        是否仅包含工作日
+    trade_time_only: bool
+        是否仅包含交易时段
+    **kwargs:
+        用于生成trade_time_index的参数
+
+    Returns
+    -------
+    pd.DatetimeIndex
+    """
+    if b_days_only:
+        if target_freq == 'D':
+            target_freq = 'B'
+
+    # 如果要求去掉非交易时段的数据
+    from qteasy.trading_util import _trade_time_index
+    if trade_time_only:
+        return _trade_time_index(
+                start=start,
+                end=end,
+                freq=target_freq,
+                trade_days_only=b_days_only,
+                **kwargs
+        )
+    return pd.date_range(start=start, end=end, freq=target_freq)
+
+
+@njit(nogil=True, cache=True)
+def _resample_kernel(values, bin_ids, n_bins, method):
+    """ 将按时间排序的数据按照bin_ids分组合并，一次完成所有列的计算，忽略NaN值
+
+    Parameters
+    ----------
+    values: np.ndarray, shape (n_rows, n_columns)
+        按时间排序的数据
+    bin_ids: np.ndarray of int, shape (n_rows,)
+        每一行数据所属的分组，小于0的行被忽略
+    n_bins: int
+        分组的数量
+    method: int
+        合并方法，0: last, 1: first, 2: max, 3: min, 4: mean, 5: sum
+
+    Returns
+    -------
+    tuple of np.ndarray: (合并后的数据, 每个分组每一列中非NaN值的数量，仅在mean和sum方法下计算)
+    """
+    n_rows, n_cols = values.shape
+    res = np.full((n_bins, n_cols), np.nan)
+    counts = np.zeros((n_bins, n_cols), dtype=np.int64)
+    # 每一种方法使用单独的循环，values按行连续存储，逐行将数据合并到所属分组中
+    for i in range(n_rows):
+        b = bin_ids[i]
+        if b < 0:
+            continue
+        row = values[i]
+        out = res[b]
+        cnt = counts[b]
+        if method == 0:
+            for j in range(n_cols):
+                if not np.isnan(row[j]):
+                    out[j] = row[j]
+        elif method == 1:
+            for j in range(n_cols):
+                if np.isnan(out[j]):
+                    out[j] = row[j]
+        elif method == 2:
+            for j in range(n_cols):
+                if np.isnan(out[j]) or (row[j] > out[j]):
+                    out[j] = row[j]
+        elif method == 3:
+            for j in range(n_cols):
+                if np.isnan(out[j]) or (row[j] < out[j]):
+                    out[j] = row[j]
+        else:
+            for j in range(n_cols):
+                if not np.isnan(row[j]):
+                    out[j] = row[j] if cnt[j] == 0 else out[j] + row[j]
+                    cnt[j] += 1
+    if method == 4:
+        for b in range(n_bins):
+            for j in range(n_cols):
+                if counts[b, j] > 0:
+                    res[b, j] /= counts[b, j]
+    return res, counts
+
+
+def _resample_data_by_kernel(hist_data, target_freq, method, b_days_only, trade_time_only,
+                             forced_start=None, forced_end=None, **kwargs):
+    """ 按照固定长度的频率(分钟/小时/日)对数据降频，结果与pandas的resample后reindex相同
+
+    与pandas相同，每个分组从第一个数据当日零点开始，每个分组包含开始时间，不包含结束时间，以开始时间为标签。
+    每一行数据直接对应到最终的时间序列上的位置，不在最终时间序列上的分组被丢弃
+
+    Parameters
+    ----------
+    hist_data: pd.DataFrame
+        index为日期/时间的数值型数据
+    target_freq: str
+        固定长度的目标频率，如'15min'，'h'，'D'
+    method: str
+        合并方法，必须是RESAMPLE_KERNEL_METHODS中的方法
+    b_days_only: bool
+        是否仅包含工作日
+    trade_time_only: bool
+        是否仅包含交易时段
+    forced_start: str, Datetime like, optional
+        强制开始日期
+    forced_end: str, Datetime like, optional
+        强制结束日期
+    **kwargs:
+        用于生成trade_time_index的参数
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if not hist_data.index.is_monotonic_increasing:
+        hist_data = hist_data.sort_index()
+    times = hist_data.index.values.astype('datetime64[ns]').astype('int64')
+    width = pd.tseries.frequencies.to_offset(target_freq).nanos
+    origin = times[0] - times[0] % (24 * 3600 * 10 ** 9)
+    labels = origin + (times - origin) // width * width
+    first_label, last_label = pd.Timestamp(labels[0]), pd.Timestamp(labels[-1])
+
+    start = first_label if forced_start is None else pd.to_datetime(forced_start)
+    end = last_label if forced_end is None else pd.to_datetime(forced_end)
+    expanded_index = _resampled_time_index(start, end, target_freq, b_days_only, trade_time_only, **kwargs)
+    grid = expanded_index.values.astype('datetime64[ns]').astype('int64')
+    # 找到每个分组在最终时间序列上的位置，不在时间序列上的分组标记为-1
+    positions = np.searchsorted(grid, labels)
+    found = positions < len(grid)
+    found[found] = grid[positions[found]] == labels[found]
+    bin_ids = np.where(found, positions, -1)
+
+    method_code = RESAMPLE_KERNEL_METHODS[method]
+    values = np.ascontiguousarray(hist_data.values, dtype='float64')
+    res, counts = _resample_kernel(values, bin_ids, len(grid), method_code)
+    if method_code == 5:
+        # 与pandas相同，数据范围内没有数据的分组的总和为0
+        in_range = (grid >= labels[0]) & (grid <= labels[-1])
+        res[in_range[:, np.newaxis] & (counts == 0)] = 0.
+    return pd.DataFrame(res, index=expanded_index, columns=hist_data.columns)
+
+
 def _resample_data(hist_data, target_freq,
                    method='last',
                    b_days_only=True,
@@ -5501,6 +7789,21 @@ def _resample_data(hist_data, target_freq,
     # 新版本pandas修改了部分freq alias，为了确保向后兼容，确保freq_aliases与pandas版本匹配
     target_freq = pandas_freq_alias_version_conversion(target_freq)
 
+    # 固定长度的频率(分钟/小时/日)使用numba编译的函数一次完成所有列的降频计算
+    if (method in RESAMPLE_KERNEL_METHODS) and \
+            isinstance(pd.tseries.frequencies.to_offset(target_freq), pd.offsets.Tick) and \
+            all(dtype.kind in 'iufb' for dtype in hist_data.dtypes):
+        return _resample_data_by_kernel(
+                hist_data,
+                target_freq=target_freq,
+                method=method,
+                b_days_only=b_days_only,
+                trade_time_only=trade_time_only,
+                forced_start=forced_start,
+                forced_end=forced_end,
+                **kwargs
+        )
+
     resampled = hist_data.resample(target_freq)
     if method in ['last', 'close']:
         resampled = resampled.last()
@@ -5547,22 +7850,7 @@ def _resample_data(hist_data, target_freq,
     # 了周五，这样可能会导致错误的结果
     # 因此解决方案是，仍然按照'D'频率来resample，然后再通过reindex将非交易日的数据去除
     # 不过仅对freq为'D'的频率如此操作
-    if b_days_only:
-        if target_freq == 'D':
-            target_freq = 'B'
-
-    # 如果要求去掉非交易时段的数据
-    from qteasy.trading_util import _trade_time_index
-    if trade_time_only:
-        expanded_index = _trade_time_index(
-                start=start,
-                end=end,
-                freq=target_freq,
-                trade_days_only=b_days_only,
-                **kwargs
-        )
-    else:
-        expanded_index = pd.date_range(start=start, end=end, freq=target_freq)
+    expanded_index = _resampled_time_index(start, end, target_freq, b_days_only, trade_time_only, **kwargs)
     resampled = resampled.reindex(index=expanded_index)
     # 如果在数据开始或末尾增加了空数据（因为forced start/forced end），需要根据情况填充
     if (expanded_index[-1] > resampled_index[-1]) or (expanded_index[0] < resampled_index[0]):
@@ -2029,7 +2029,8 @@ def from_multi_index_dataframe(df: pd.DataFrame):
     raise NotImplementedError
 
 
-def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None):
+def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None,
+                     dtype='float64'):
     """ 将多个dataframe组合成一个HistoryPanel.
 
     Parameters
@@ -2077,6 +2078,8 @@ def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=Non
         多余的DataFrame数据会被丢弃
     fill_value:
         多余的位置用fill_value填充
+    dtype: str, {'float64', 'float32'}, Default 'float64'
+        生成的HistoryPanel的数据类型，使用float32可以减少一半的内存占用
 
     Returns
     -------
@@ -2172,7 +2175,7 @@ def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=Non
     combined_shares_dict = dict(zip(combined_shares, range(share_count)))
     combined_index.sort()
     # 生成并复制数据
-    res_values = np.zeros(shape=(share_count, index_count, htype_count))
+    res_values = np.zeros(shape=(share_count, index_count, htype_count), dtype=dtype)
     res_values.fill(fill_value)
     for df_id in range(len(dfs)):
         extended_df = dfs[df_id].reindex(combined_index)
@@ -2508,8 +2511,10 @@ def get_history_panel(
         if drop_nan:
             all_dfs[htyp] = all_dfs[htyp].dropna(how='all')
 
+    # 使用compact数据类型的数据源生成float32类型的HistoryPanel
+    dtype = 'float32' if ds.dtype_profile == 'compact' else 'float64'
     if shares:
-        result_hp = stack_dataframes(all_dfs, dataframe_as='htypes', htypes=htypes, shares=shares)
+        result_hp = stack_dataframes(all_dfs, dataframe_as='htypes', htypes=htypes, shares=shares, dtype=dtype)
     else:
-        result_hp = stack_dataframes(all_dfs, dataframe_as='htypes', htypes=htypes)
+        result_hp = stack_dataframes(all_dfs, dataframe_as='htypes', htypes=htypes, dtype=dtype)
     return result_hp
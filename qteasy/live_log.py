@@ -0,0 +1,532 @@
+# coding=utf-8
+# ======================================
+# File:     live_log.py
+# Author:   Jackie PENG
+# Contact:  jackie.pengzhao@gmail.com
+# Created:  2026-10-19
+# Desc:
+#   Buffered and segmented log files
+# for live trading. trade logs are
+# indexed by row offsets and datetime
+# so that the last N rows or rows in
+# a date range can be read without
+# parsing the whole log history
+# ======================================
+
+import csv
+import glob
+import io
+import logging
+import os
+import re
+import threading
+import time
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 按照日期分段时，日期格式与分段周期的对应关系
+LOG_ROTATION_PERIODS = {
+    'daily':   '%Y%m%d',
+    'monthly': '%Y%m',
+}
+# 按照文件大小分段时，文件大小单位
+LOG_SIZE_UNITS = {
+    'kb': 1024,
+    'mb': 1024 ** 2,
+    'gb': 1024 ** 3,
+}
+# 分段文件的行偏移索引文件后缀
+SEGMENT_INDEX_SUFFIX = '.idx.npy'
+# 日志文件中datetime字符串的长度，格式为"%Y-%m-%d %H:%M:%S"
+LOG_DATETIME_LENGTH = 19
+
+
+def parse_log_rotation(rotation) -> tuple:
+    """ 解析日志文件的分段规则
+
+    Parameters
+    ----------
+    rotation: str
+        日志文件分段规则:
+        - 'none':       不分段，所有日志写入同一个文件
+        - 'daily':      每天的日志写入一个分段文件
+        - 'monthly':    每月的日志写入一个分段文件
+        - '10MB':       文件大小超过指定大小时分段，单位可以为KB、MB或GB
+
+    Returns
+    -------
+    tuple: (max_bytes, period_format)
+        max_bytes: int, 日志文件的最大字节数，0表示不按大小分段
+        period_format: str or None, 分段周期的日期格式，None表示不按日期分段
+
+    Raises
+    ------
+    ValueError: 分段规则无法识别时
+    """
+    rotation = str(rotation).strip().lower()
+    if rotation in ('none', ''):
+        return 0, None
+    if rotation in LOG_ROTATION_PERIODS:
+        return 0, LOG_ROTATION_PERIODS[rotation]
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*(kb|mb|gb)', rotation)
+    if match is None:
+        raise ValueError(f'invalid log rotation: {rotation}, should be "none", "daily", "monthly" '
+                         f'or a file size like "10MB"')
+    max_bytes = int(float(match.group(1)) * LOG_SIZE_UNITS[match.group(2)])
+    if max_bytes <= 0:
+        raise ValueError(f'invalid log rotation: {rotation}, file size should be larger than 0')
+    return max_bytes, None
+
+
+def log_segment_files(file_path: str) -> list:
+    """ 按照时间先后顺序列出日志文件已经分段的所有文件，不包括当前正在写入的文件
+
+    分段文件与日志文件在同一个文件夹中，文件名为"{文件名}.{序号:04d}{扩展名}"
+
+    Parameters
+    ----------
+    file_path: str
+        当前日志文件的路径
+
+    Returns
+    -------
+    segments: list of str
+    """
+    stem, ext = os.path.splitext(file_path)
+    return sorted(glob.glob(glob.escape(stem) + '.[0-9][0-9][0-9][0-9]' + glob.escape(ext)))
+
+
+def remove_log_files(file_path: str) -> None:
+    """ 删除日志文件及其所有分段文件和分段索引文件
+
+    Parameters
+    ----------
+    file_path: str
+        当前日志文件的路径
+
+    Returns
+    -------
+    None
+    """
+    for segment in log_segment_files(file_path):
+        os.remove(segment)
+        if os.path.exists(segment + SEGMENT_INDEX_SUFFIX):
+            os.remove(segment + SEGMENT_INDEX_SUFFIX)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def _rotate_file(file_path: str) -> str:
+    """ 将当前日志文件重命名为下一个分段文件，返回分段文件的路径 """
+    stem, ext = os.path.splitext(file_path)
+    segments = log_segment_files(file_path)
+    seq = int(segments[-1][len(stem) + 1:len(stem) + 5]) + 1 if segments else 1
+    segment = f'{stem}.{seq:04d}{ext}'
+    os.replace(file_path, segment)
+    return segment
+
+
+def read_last_lines(file_path: str, row_count: int, block_size: int = 65536) -> list:
+    """ 从文件末尾向前按块读取文件的最后row_count行文本，读取量与row_count成正比，与文件大小无关
+
+    Parameters
+    ----------
+    file_path: str
+        文本文件路径
+    row_count: int
+        读取的行数
+    block_size: int, default 65536
+        每次向前读取的字节数
+
+    Returns
+    -------
+    lines: list of str
+        文件的最后row_count行，每行保留行尾的换行符
+    """
+    if row_count <= 0:
+        return []
+    with open(file_path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b''
+        # 多读取一个换行符，以确保第一行是完整的
+        while position > 0 and data.count(b'\n', 0, len(data) - 1) < row_count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+    return lines[-row_count:]
+
+
+def read_log_tail(file_path: str, row_count: int) -> list:
+    """ 读取日志文件的最后row_count行，当前文件不足row_count行时，继续从分段文件中读取
+
+    Parameters
+    ----------
+    file_path: str
+        当前日志文件的路径
+    row_count: int
+        读取的行数
+
+    Returns
+    -------
+    lines: list of str
+    """
+    lines = read_last_lines(file_path, row_count) if os.path.exists(file_path) else []
+    for segment in reversed(log_segment_files(file_path)):
+        if len(lines) >= row_count:
+            break
+        lines = read_last_lines(segment, row_count - len(lines)) + lines
+    return lines
+
+
+def _period_key(timestamp, period_format):
+    """ 返回时间戳所在的分段周期 """
+    return datetime.fromtimestamp(timestamp).strftime(period_format)
+
+
+class SegmentedFileHandler(logging.FileHandler):
+    """ 按照分段规则自动分段的日志文件handler，用于系统日志
+
+    日志文件超过指定大小，或者写入的日志与文件中已有日志不在同一个日期周期时，将当前
+    日志文件重命名为分段文件，并打开新的日志文件继续写入
+    """
+
+    def __init__(self, filename, rotation='none', encoding='utf-8'):
+        self.max_bytes, self.period_format = parse_log_rotation(rotation)
+        super(SegmentedFileHandler, self).__init__(filename, mode='a', encoding=encoding, delay=False)
+        self._period = None
+        if self.period_format is not None:
+            has_content = os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0
+            timestamp = os.path.getmtime(self.baseFilename) if has_content else time.time()
+            self._period = _period_key(timestamp, self.period_format)
+
+    def _should_rotate(self, record) -> bool:
+        """ 判断写入record之前是否需要分段 """
+        if self.stream is None:
+            return False
+        size = self.stream.tell()
+        if size == 0:
+            if self.period_format is not None:
+                self._period = _period_key(record.created, self.period_format)
+            return False
+        if self.period_format is not None:
+            period = _period_key(record.created, self.period_format)
+            if period != self._period:
+                self._period = period
+                return True
+        if self.max_bytes > 0:
+            message = self.format(record) + self.terminator
+            return size + len(message.encode(self.encoding or 'utf-8')) > self.max_bytes
+        return False
+
+    def emit(self, record):
+        try:
+            if self._should_rotate(record):
+                self.acquire()
+                try:
+                    self.stream.close()
+                    self.stream = None
+                    _rotate_file(self.baseFilename)
+                    self.stream = self._open()
+                finally:
+                    self.release()
+        except Exception:
+            self.handleError(record)
+            return
+        super(SegmentedFileHandler, self).emit(record)
+
+
+class TradeLogFile(object):
+    """ 带有缓冲区、分段和行偏移索引的csv交易日志文件
+
+    日志写入时先保存在内存缓冲区中，每隔flush_interval秒写入一次文件，flush_interval为0时
+    每次写入立即写入文件。日志文件的格式与csv.DictWriter写出的格式完全相同，可以直接用
+    Excel或pd.read_csv()打开。
+
+    打开文件时建立每一行的字节偏移量及日志时间的索引，此后每次写入时更新索引。文件分段后，
+    分段文件的索引保存在同名的.idx.npy文件中。读取最后N行或某一时间段内的日志时，只需要
+    读取相应的字节范围，读取时间与日志文件的大小无关。索引按换行符建立，因此日志数据中不能
+    包含换行符。
+
+    Parameters
+    ----------
+    file_path: str
+        日志文件路径，文件必须已经存在，且第一行为header
+    headers: list of str
+        日志文件的header，第一列必须是datetime
+    rotation: str, default 'none'
+        日志文件分段规则，参见parse_log_rotation()
+    flush_interval: float, default 0.
+        缓冲区写入文件的时间间隔，单位为秒
+    """
+
+    def __init__(self, file_path: str, headers: list, rotation='none', flush_interval=0.):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f'trade log file {file_path} does not exist')
+        self.file_path = file_path
+        self.headers = list(headers)
+        self.max_bytes, self.period_format = parse_log_rotation(rotation)
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._segment_indices = {}
+        # 当前日志文件的索引保存在预先分配的数组中，容量不足时加倍，读取时直接使用数组的切片
+        self._offsets = np.empty(0, dtype='int64')
+        self._times = np.empty(0, dtype='int64')
+        self._index_count = 0
+        self._size = 0
+        self._file = None
+        self._open()
+
+    def __repr__(self):
+        return f'TradeLogFile({self.file_path!r}, rows={self.row_count})'
+
+    @property
+    def is_open(self) -> bool:
+        """ 日志文件是否已经打开，且没有被外部删除或替换 """
+        if self._file is None:
+            return False
+        try:
+            return os.stat(self.file_path).st_ino == os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return False
+
+    @property
+    def row_count(self) -> int:
+        """ 日志的总行数，包括所有分段文件中的日志，不包括header """
+        with self._lock:
+            segment_rows = sum(len(self._segment_index(segment)[0]) for segment in log_segment_files(self.file_path))
+            return segment_rows + self._index_count
+
+    # ========== 写入日志 ==========
+    def write(self, row: list) -> None:
+        """ 写入一行日志，row中的数据按照headers的顺序排列，第一个数据必须为日志时间字符串
+
+        Parameters
+        ----------
+        row: list
+            一行日志数据，None写入为空字符串，数据中不能包含换行符
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError: 日志数据中包含换行符
+        """
+        if any(('\n' in item) or ('\r' in item) for item in row if isinstance(item, str)):
+            raise ValueError(f'trade log row should not contain line breaks, got {row}')
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        line = buffer.getvalue().encode('utf-8')
+        row_time = self._parse_time(row[0])
+
+        with self._lock:
+            if self._should_rotate(row_time, len(line)):
+                self._rotate()
+            count = self._index_count
+            if count > 0:
+                # 保证时间索引单调不减，以便使用二分查找
+                row_time = max(row_time, int(self._times[count - 1]))
+            if count == len(self._offsets):
+                self._offsets = np.resize(self._offsets, max(2 * count, 1024))
+                self._times = np.resize(self._times, max(2 * count, 1024))
+            self._offsets[count] = self._size
+            self._times[count] = row_time
+            self._index_count = count + 1
+            self._size += len(line)
+            self._buffer.append(line)
+            if (self.flush_interval <= 0) or (time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def flush(self) -> None:
+        """ 将缓冲区中的日志写入文件 """
+        with self._lock:
+            if self._buffer and (self._file is not None):
+                self._file.write(b''.join(self._buffer))
+                self._file.flush()
+                self._buffer.clear()
+            self._last_flush = time.monotonic()
+
+    def maybe_flush(self) -> None:
+        """ 如果距离上次写入文件的时间超过了flush_interval，将缓冲区中的日志写入文件 """
+        if self._buffer and (time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """ 写入缓冲区中的所有日志并关闭文件 """
+        with self._lock:
+            self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ========== 读取日志 ==========
+    def tail(self, row_count: int) -> pd.DataFrame:
+        """ 读取最后row_count行日志，日志不足row_count行时，读取全部日志
+
+        Parameters
+        ----------
+        row_count: int
+            读取的行数
+
+        Returns
+        -------
+        trade_log: pd.DataFrame
+        """
+        with self._lock:
+            self.flush()
+            chunks = []
+            remaining = row_count
+            for path in reversed(self._log_files()):
+                if remaining <= 0:
+                    break
+                offsets, times, size = self._file_index(path)
+                first = max(len(offsets) - remaining, 0)
+                chunks.insert(0, self._read_bytes(path, offsets, first, len(offsets), size))
+                remaining -= len(offsets) - first
+        return self._parse_rows(chunks)
+
+    def read(self, start=None, end=None) -> pd.DataFrame:
+        """ 读取日志时间在start和end之间的日志，start和end都为None时读取全部日志
+
+        Parameters
+        ----------
+        start: str or datetime-like, optional
+            开始时间，包括start
+        end: str or datetime-like, optional
+            结束时间，包括end，如果end不包含时间部分，则包括end当天的全部日志
+
+        Returns
+        -------
+        trade_log: pd.DataFrame
+        """
+        start = None if start is None else self._parse_time(pd.Timestamp(start))
+        if end is not None:
+            end = pd.Timestamp(end)
+            if end == end.normalize():
+                end = end + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            end = self._parse_time(end)
+        with self._lock:
+            self.flush()
+            chunks = []
+            for path in self._log_files():
+                offsets, times, size = self._file_index(path)
+                if len(offsets) == 0:
+                    continue
+                first = 0 if start is None else np.searchsorted(times, start, side='left')
+                last = len(offsets) if end is None else np.searchsorted(times, end, side='right')
+                if first < last:
+                    chunks.append(self._read_bytes(path, offsets, first, last, size))
+        return self._parse_rows(chunks)
+
+    # ========== 内部方法 ==========
+    @staticmethod
+    def _parse_time(value) -> int:
+        """ 将日志时间转换为整数秒数，用于建立时间索引，无法解析的时间返回-1 """
+        try:
+            return int(np.datetime64(value, 's').astype('int64'))
+        except (ValueError, TypeError):
+            return -1
+
+    def _open(self) -> None:
+        """ 打开当前日志文件，扫描一次文件内容建立行偏移和时间索引 """
+        with open(self.file_path, 'rb') as f:
+            data = f.read()
+        self._offsets, self._times = self._build_index(data)
+        self._index_count = len(self._offsets)
+        self._size = len(data)
+        self._file = open(self.file_path, 'ab')
+
+    def _build_index(self, data: bytes) -> tuple:
+        """ 建立文件内容的行偏移索引和时间索引，跳过第一行header
+
+        日志时间无法解析时使用前一行的时间，保证时间索引单调不减
+        """
+        line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+        if len(line_ends) == 0:
+            return np.array([], dtype='int64'), np.array([], dtype='int64')
+        offsets = line_ends[:-1] + 1 if line_ends[-1] == len(data) - 1 else line_ends + 1
+        offsets = offsets.astype('int64')
+        times = np.array([self._parse_time(data[offset:offset + LOG_DATETIME_LENGTH].decode('utf-8', 'replace'))
+                          for offset in offsets], dtype='int64')
+        times = np.maximum.accumulate(times) if len(times) > 0 else times
+        return offsets, times
+
+    def _should_rotate(self, row_time: int, line_size: int) -> bool:
+        """ 判断写入新的日志之前是否需要分段 """
+        if self._index_count == 0:
+            return False
+        if self.period_format is not None:
+            last_period = pd.Timestamp(int(self._times[self._index_count - 1]), unit='s').strftime(self.period_format)
+            if (row_time >= 0) and (pd.Timestamp(row_time, unit='s').strftime(self.period_format) != last_period):
+                return True
+        if self.max_bytes > 0:
+            return self._size + line_size > self.max_bytes
+        return False
+
+    def _rotate(self) -> None:
+        """ 将当前日志文件重命名为分段文件并保存分段文件索引，然后创建新的日志文件 """
+        self.close()
+        segment = _rotate_file(self.file_path)
+        count = self._index_count
+        index = np.array([self._offsets[:count], self._times[:count]], dtype='int64')
+        np.save(segment + SEGMENT_INDEX_SUFFIX, index)
+        self._segment_indices[segment] = (index[0], index[1], self._size)
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(self.headers)
+        with open(self.file_path, 'wb') as f:
+            f.write(buffer.getvalue().encode('utf-8'))
+        self._open()
+
+    def _log_files(self) -> list:
+        """ 按时间顺序列出所有分段文件及当前日志文件 """
+        return log_segment_files(self.file_path) + [self.file_path]
+
+    def _segment_index(self, segment: str) -> tuple:
+        """ 读取分段文件的索引，索引文件不存在时扫描分段文件建立索引并保存 """
+        if segment not in self._segment_indices:
+            index_file = segment + SEGMENT_INDEX_SUFFIX
+            size = os.path.getsize(segment)
+            if os.path.exists(index_file):
+                offsets, times = np.load(index_file)
+            else:
+                with open(segment, 'rb') as f:
+                    offsets, times = self._build_index(f.read())
+                np.save(index_file, np.array([offsets, times], dtype='int64'))
+            self._segment_indices[segment] = (offsets, times, size)
+        return self._segment_indices[segment]
+
+    def _file_index(self, path: str) -> tuple:
+        """ 返回文件的行偏移索引、时间索引和文件大小 """
+        if path == self.file_path:
+            count = self._index_count
+            return self._offsets[:count], self._times[:count], self._size
+        return self._segment_index(path)
+
+    @staticmethod
+    def _read_bytes(path: str, offsets, first: int, last: int, size: int) -> bytes:
+        """ 读取文件中第first行到第last行(不包括last)的字节内容 """
+        if first >= last:
+            return b''
+        start = offsets[first]
+        end = offsets[last] if last < len(offsets) else size
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _parse_rows(self, chunks: list) -> pd.DataFrame:
+        """ 将读取的字节内容解析为DataFrame，数据类型与pd.read_csv()读取整个文件相同 """
+        data = b''.join(chunks)
+        if not data:
+            return pd.DataFrame(columns=self.headers)
+        return pd.read_csv(io.BytesIO(data), header=None, names=self.headers)
@@ -16,7 +16,7 @@ import math
 
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from .backtest import apply_loop, process_loop_results, _get_complete_hist
+from .backtest import apply_loop, process_loop_results, _get_complete_hist, read_trade_log_files
 from .history import HistoryPanel, stack_dataframes
 from .utilfuncs import sec_to_duration, progress_bar
 from .utilfuncs import next_market_trade_day
@@ -356,7 +356,8 @@ def _evaluate_one_parameter(par,
                 op_summary_matrix=op_summary_matrix,
                 op_list_bt_indices=op_list_bt_indices,
                 trade_log=log_backtest,
-                bt_price_priority_ohlc='OHLC'
+                bt_price_priority_ohlc='OHLC',
+                trade_log_file_type=config.trade_log_file_type,
         )
         # TODO: 将_get_complete_hist() 与 process_loop_results()合并
         complete_values = _get_complete_hist(
@@ -378,12 +379,10 @@ def _evaluate_one_parameter(par,
     loop_run_time = et - st
     res_dict.update(perf)
     res_dict['loop_run_time'] = loop_run_time
-    import os
-    from qteasy import QT_TRADE_LOG_PATH
-    log_file_path_name = os.path.join(QT_TRADE_LOG_PATH, 'trade_log.csv')
-    res_dict['trade_log'] = pd.read_csv(log_file_path_name) if log_backtest else None
-    log_file_path_name = os.path.join(QT_TRADE_LOG_PATH, 'trade_records.csv')
-    res_dict['trade_record'] = pd.read_csv(log_file_path_name) if log_backtest else None
+    if log_backtest:
+        res_dict['trade_log'], res_dict['trade_record'] = read_trade_log_files(config.trade_log_file_type)
+    else:
+        res_dict['trade_log'], res_dict['trade_record'] = None, None
     res_dict['complete_history'] = complete_values
     return res_dict
 
@@ -0,0 +1,703 @@
+# coding=utf-8
+# ======================================
+# File:     price_feed.py
+# Author:   Jackie PENG
+# Contact:  jackie.pengzhao@gmail.com
+# Created:  2026-10-19
+# Desc:
+#   class PriceFeed for trader and
+# brokers to subscribe to live quotes.
+# quotes are either pulled from live
+# price channels or replayed from
+# recorded bars at accelerated speed,
+# and the last known price store used
+# to value positions without live price
+# ======================================
+
+import os
+import threading
+import time
+
+from abc import abstractmethod, ABCMeta
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .utilfuncs import str_to_list
+
+# 报价簿中每个symbol的最新报价包含的数据列，与stock_live_kline_price(verbose=True)的输出一致
+QUOTE_COLUMNS = ['trade_time', 'name', 'pre_close', 'open', 'close', 'high', 'low', 'vol', 'amount']
+# 回放数据中必须包含的数据列
+BAR_COLUMNS = ['trade_time', 'symbol', 'open', 'high', 'low', 'close', 'vol', 'amount']
+
+
+class QuoteBook(object):
+    """ 内存中的报价簿，保存每个symbol的最新报价，以及最近若干个报价的历史记录
+
+    报价簿可以直接用新的报价替换旧的报价(update)，也可以用分钟K线逐根合成当日的日K线报价(merge_bars)，
+    每个symbol最多保存max_ticks个最近的历史报价，报价簿的读写都是线程安全的
+
+    Attributes:
+    -----------
+    max_ticks: int
+        每个symbol保存的最近历史报价的最大数量
+    """
+
+    def __init__(self, max_ticks=240):
+        """ 生成一个空的报价簿
+
+        Parameters
+        ----------
+        max_ticks: int, default 240
+            每个symbol保存的最近历史报价的最大数量，默认保存一个交易日的分钟报价
+        """
+        if not isinstance(max_ticks, int) or max_ticks <= 0:
+            raise ValueError(f'max_ticks should be a positive integer, got {max_ticks} instead')
+        self.max_ticks = max_ticks
+        self._quotes = {}
+        self._ticks = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._quotes)
+
+    def __contains__(self, symbol):
+        return symbol in self._quotes
+
+    @property
+    def symbols(self) -> list:
+        """ 报价簿中所有有报价的symbol """
+        with self._lock:
+            return list(self._quotes)
+
+    def clear(self) -> None:
+        """ 清空报价簿 """
+        with self._lock:
+            self._quotes.clear()
+            self._ticks.clear()
+
+    def update(self, quotes) -> list:
+        """ 用新的报价替换报价簿中的最新报价
+
+        Parameters
+        ----------
+        quotes: pd.DataFrame
+            以symbol为index的报价，列为QUOTE_COLUMNS中的全部或部分数据列
+
+        Returns
+        -------
+        symbols: list of str
+            报价被更新的symbol
+        """
+        quotes = quotes.reindex(columns=QUOTE_COLUMNS)
+        updated = []
+        with self._lock:
+            for symbol, quote in zip(quotes.index, quotes.to_dict('records')):
+                self._put(symbol, quote)
+                updated.append(symbol)
+        return updated
+
+    def merge_bars(self, bars) -> list:
+        """ 用一组分钟K线更新报价簿，把分钟K线合成为当日截至目前的日K线报价
+
+        同一个交易日内，开盘价为第一根K线的开盘价，最高价和最低价为所有K线的最高和最低价，收盘价为最新
+        K线的收盘价，成交量和成交额为累计值。出现新的交易日时重新开始合成，如果K线中没有pre_close，
+        使用上一个交易日的收盘价作为pre_close
+
+        Parameters
+        ----------
+        bars: pd.DataFrame
+            分钟K线数据，包含BAR_COLUMNS中的数据列，可以包含pre_close和name
+
+        Returns
+        -------
+        symbols: list of str
+            报价被更新的symbol
+        """
+        updated = []
+        with self._lock:
+            for bar in bars.to_dict('records'):
+                symbol = bar['symbol']
+                last = self._quotes.get(symbol)
+                trade_time = pd.Timestamp(bar['trade_time'])
+                pre_close = bar.get('pre_close', np.nan)
+                if (last is None) or (last['trade_time'].normalize() != trade_time.normalize()):
+                    # 新的交易日，重新开始合成日K线
+                    if pd.isna(pre_close) and (last is not None):
+                        pre_close = last['close']
+                    quote = {
+                        'trade_time': trade_time,
+                        'name':       bar.get('name', np.nan if last is None else last['name']),
+                        'pre_close':  pre_close,
+                        'open':       bar['open'],
+                        'close':      bar['close'],
+                        'high':       bar['high'],
+                        'low':        bar['low'],
+                        'vol':        bar['vol'],
+                        'amount':     bar['amount'],
+                    }
+                else:
+                    quote = {
+                        'trade_time': trade_time,
+                        'name':       last['name'],
+                        'pre_close':  last['pre_close'] if pd.isna(pre_close) else pre_close,
+                        'open':       last['open'],
+                        'close':      bar['close'],
+                        'high':       max(last['high'], bar['high']),
+                        'low':        min(last['low'], bar['low']),
+                        'vol':        last['vol'] + bar['vol'],
+                        'amount':     last['amount'] + bar['amount'],
+                    }
+                self._put(symbol, quote)
+                updated.append(symbol)
+        return updated
+
+    def _put(self, symbol, quote) -> None:
+        """ 写入一个symbol的最新报价，同时写入历史报价，超过max_ticks的历史报价被自动丢弃 """
+        self._quotes[symbol] = quote
+        ticks = self._ticks.get(symbol)
+        if ticks is None:
+            ticks = deque(maxlen=self.max_ticks)
+            self._ticks[symbol] = ticks
+        ticks.append(quote)
+
+    def snapshot(self, symbols=None) -> pd.DataFrame:
+        """ 获取报价簿中最新报价的快照
+
+        Parameters
+        ----------
+        symbols: str or list of str, optional
+            需要获取报价的symbol，如果为None，获取所有symbol的报价，没有报价的symbol不会出现在结果中
+
+        Returns
+        -------
+        quotes: pd.DataFrame
+            以symbol为index，列为QUOTE_COLUMNS的报价
+        """
+        with self._lock:
+            if symbols is None:
+                symbols = list(self._quotes)
+            elif isinstance(symbols, str):
+                symbols = str_to_list(symbols)
+            found = [symbol for symbol in symbols if symbol in self._quotes]
+            records = [self._quotes[symbol] for symbol in found]
+        quotes = pd.DataFrame(records, index=pd.Index(found, name='symbol'), columns=QUOTE_COLUMNS)
+        return quotes
+
+    def last_price(self, symbol) -> float:
+        """ 获取symbol的最新价格，如果没有报价，返回np.nan """
+        with self._lock:
+            quote = self._quotes.get(symbol)
+        return np.nan if quote is None else quote['close']
+
+    def history(self, symbol) -> pd.DataFrame:
+        """ 获取symbol保存在报价簿中的最近历史报价，最多max_ticks条
+
+        Returns
+        -------
+        ticks: pd.DataFrame
+            历史报价，列为QUOTE_COLUMNS，按时间先后排序
+        """
+        with self._lock:
+            ticks = list(self._ticks.get(symbol, []))
+        return pd.DataFrame(ticks, columns=QUOTE_COLUMNS)
+
+
+class LastPriceStore(object):
+    """ 按照数据频率保存每个symbol最新已知价格的存储，用于在没有实时价格时快速估算持仓市值
+
+    每个频率下每个symbol只保存时间最新的一个价格，用时间较早的价格更新时不会覆盖已有的价格。
+    读取时可以读取某个频率下的价格，也可以读取所有频率中时间最新的价格，存储的读写都是线程安全的
+    """
+
+    def __init__(self):
+        self._prices = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(set().union(*self._prices.values())) if self._prices else 0
+
+    def __contains__(self, symbol):
+        with self._lock:
+            return any(symbol in prices for prices in self._prices.values())
+
+    @property
+    def freqs(self) -> list:
+        """ 存储中已有价格的数据频率 """
+        with self._lock:
+            return list(self._prices)
+
+    def clear(self, freq=None) -> None:
+        """ 清空全部价格，或者清空某个频率的全部价格 """
+        with self._lock:
+            if freq is None:
+                self._prices.clear()
+            else:
+                self._prices.pop(freq, None)
+
+    def update(self, freq, symbols, prices, times=None) -> int:
+        """ 更新一组symbol在某个频率下的最新价格
+
+        Parameters
+        ----------
+        freq: str
+            价格的数据频率，例如'd'、'1min'，实时价格使用'live'
+        symbols: iterable of str
+            价格对应的symbol，同一个symbol可以出现多次，此时只使用时间最新的价格
+        prices: iterable of float
+            价格
+        times: iterable of datetime-like, optional
+            价格的时间，默认为当前时间，无法解析的时间视为当前时间
+
+        Returns
+        -------
+        updated: int
+            价格被更新的symbol数量
+        """
+        now = pd.Timestamp.now()
+        data = pd.DataFrame({'symbol': list(symbols), 'price': np.asarray(prices, dtype='float')})
+        if times is None:
+            data['time'] = now
+        else:
+            data['time'] = pd.to_datetime(pd.Series(list(times)), errors='coerce').fillna(now).values
+        data = data.dropna(subset=['price'])
+        if data.empty:
+            return 0
+        data = data.sort_values('time', kind='stable').drop_duplicates('symbol', keep='last')
+
+        updated = 0
+        with self._lock:
+            freq_prices = self._prices.setdefault(freq, {})
+            for symbol, price, time_ in zip(data['symbol'], data['price'], data['time']):
+                prev = freq_prices.get(symbol)
+                if (prev is None) or (time_ >= prev[0]):
+                    freq_prices[symbol] = (time_, price)
+                    updated += 1
+        return updated
+
+    def update_bars(self, freq, bars, price_column='close') -> int:
+        """ 用K线数据更新最新价格，K线数据的symbol和时间可以是数据列，也可以是index
+
+        Parameters
+        ----------
+        freq: str
+            K线的数据频率
+        bars: pd.DataFrame
+            K线数据，包含ts_code列以及trade_time或trade_date列
+        price_column: str, default 'close'
+            用作最新价格的数据列
+
+        Returns
+        -------
+        updated: int
+            价格被更新的symbol数量
+        """
+        if bars is None or bars.empty or (price_column not in bars.columns):
+            return 0
+        if 'ts_code' not in bars.columns:
+            bars = bars.reset_index()
+        time_column = 'trade_time' if 'trade_time' in bars.columns else 'trade_date'
+        if ('ts_code' not in bars.columns) or (time_column not in bars.columns):
+            return 0
+        return self.update(freq, bars['ts_code'], bars[price_column], bars[time_column])
+
+    def get(self, symbols, freq=None) -> pd.Series:
+        """ 读取一组symbol的最新价格
+
+        Parameters
+        ----------
+        symbols: str or list of str
+            需要读取价格的symbol
+        freq: str, optional
+            读取某个频率的价格，默认读取所有频率中时间最新的价格
+
+        Returns
+        -------
+        prices: pd.Series
+            以symbol为index的最新价格，没有价格的symbol为NaN
+        """
+        if isinstance(symbols, str):
+            symbols = str_to_list(symbols)
+        with self._lock:
+            if freq is None:
+                books = list(self._prices.values())
+            else:
+                books = [self._prices.get(freq, {})]
+            prices = []
+            for symbol in symbols:
+                latest = None
+                for book in books:
+                    item = book.get(symbol)
+                    if (item is not None) and ((latest is None) or (item[0] > latest[0])):
+                        latest = item
+                prices.append(np.nan if latest is None else latest[1])
+        return pd.Series(prices, index=list(symbols), dtype='float')
+
+    def last_price(self, symbol, freq=None) -> float:
+        """ 读取一个symbol的最新价格，没有价格时返回NaN """
+        return self.get([symbol], freq=freq).iloc[0]
+
+
+class PriceFeed(object):
+    """ PriceFeed是实时价格的来源，它维护一个报价簿，并把新的报价推送给订阅者
+
+    所有的PriceFeed都必须继承自PriceFeed，并实现fetch_quotes()方法，从不同的渠道获取报价
+
+    Attributes:
+    -----------
+    quote_book: QuoteBook
+        报价簿，保存所有symbol的最新报价
+    status: str
+        PriceFeed的状态，可以是 'init', 'running', 'stopped'
+
+    Methods:
+    --------
+    subscribe(symbols, callback=None):
+        订阅symbols的报价，有新的报价时调用callback(quotes)
+    unsubscribe(subscription_id):
+        取消订阅
+    publish(quotes, bars=False):
+        把新的报价写入报价簿，并推送给订阅者
+    get_quotes(symbols=None):
+        从报价簿中读取最新报价
+    fetch_quotes(symbols): abstract method
+        从报价来源获取最新报价，写入报价簿并返回
+    now():
+        报价来源的当前时间，实时报价返回None，表示使用系统时间
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, max_ticks=240):
+        """ 生成一个PriceFeed对象
+
+        Parameters
+        ----------
+        max_ticks: int, default 240
+            报价簿中每个symbol保存的最近历史报价的最大数量
+        """
+        self.feed_name = 'PriceFeed'
+        self.quote_book = QuoteBook(max_ticks=max_ticks)
+        self.status = 'init'
+        self._subscriptions = {}
+        self._next_subscription_id = 0
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return f'{self.feed_name}(status={self.status}, quotes={len(self.quote_book)})'
+
+    @property
+    def symbols(self) -> list:
+        """ 所有订阅者订阅的symbol """
+        with self._lock:
+            symbols = set()
+            for sub_symbols, _ in self._subscriptions.values():
+                symbols.update(sub_symbols)
+        return sorted(symbols)
+
+    def subscribe(self, symbols, callback=None) -> int:
+        """ 订阅symbols的报价
+
+        Parameters
+        ----------
+        symbols: str or list of str
+            订阅的symbol
+        callback: callable, optional
+            有新的报价时调用callback(quotes)，quotes是以symbol为index的DataFrame，只包含订阅的symbol
+
+        Returns
+        -------
+        subscription_id: int
+            订阅ID，用于取消订阅
+        """
+        if isinstance(symbols, str):
+            symbols = str_to_list(symbols)
+        if (callback is not None) and (not callable(callback)):
+            raise TypeError(f'callback should be callable, got {type(callback)} instead')
+        with self._lock:
+            subscription_id = self._next_subscription_id
+            self._next_subscription_id += 1
+            self._subscriptions[subscription_id] = (set(symbols), callback)
+        return subscription_id
+
+    def unsubscribe(self, subscription_id) -> None:
+        """ 取消订阅，如果订阅ID不存在则忽略 """
+        with self._lock:
+            self._subscriptions.pop(subscription_id, None)
+
+    def publish(self, quotes, bars=False) -> list:
+        """ 把新的报价写入报价簿，并推送给订阅了相关symbol的订阅者
+
+        Parameters
+        ----------
+        quotes: pd.DataFrame
+            新的报价，如果bars为False，是以symbol为index的报价，否则为包含symbol列的分钟K线
+        bars: bool, default False
+            如果为True，把quotes当作分钟K线合成到报价簿中
+
+        Returns
+        -------
+        symbols: list of str
+            报价被更新的symbol
+        """
+        if quotes is None or quotes.empty:
+            return []
+        if bars:
+            updated = self.quote_book.merge_bars(quotes)
+        else:
+            updated = self.quote_book.update(quotes)
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        updated_symbols = set(updated)
+        for sub_symbols, callback in subscriptions:
+            if callback is None:
+                continue
+            symbols = sub_symbols & updated_symbols
+            if symbols:
+                callback(self.quote_book.snapshot([symbol for symbol in updated if symbol in symbols]))
+        return updated
+
+    def get_quotes(self, symbols=None) -> pd.DataFrame:
+        """ 从报价簿中读取最新报价，不会从报价来源获取数据 """
+        return self.quote_book.snapshot(symbols)
+
+    def now(self):
+        """ 报价来源的当前时间，返回None时使用系统时间 """
+        return None
+
+    @abstractmethod
+    def fetch_quotes(self, symbols) -> pd.DataFrame:
+        """ 从报价来源获取symbols的最新报价，写入报价簿，并返回获取的报价
+
+        Parameters
+        ----------
+        symbols: str or list of str
+            需要获取报价的symbol
+
+        Returns
+        -------
+        quotes: pd.DataFrame
+            以symbol为index，列为QUOTE_COLUMNS的报价，获取失败时返回空DataFrame
+        """
+        pass
+
+
+class LivePriceFeed(PriceFeed):
+    """ 从eastmoney获取实时日K线报价的PriceFeed，每次调用fetch_quotes()时下载最新报价 """
+
+    def __init__(self, parallel=True, max_ticks=240):
+        """ 生成一个LivePriceFeed对象
+
+        Parameters
+        ----------
+        parallel: bool, default True
+            下载多个symbol的报价时是否使用多线程
+        max_ticks: int, default 240
+            报价簿中每个symbol保存的最近历史报价的最大数量
+        """
+        super(LivePriceFeed, self).__init__(max_ticks=max_ticks)
+        self.feed_name = 'LivePriceFeed'
+        self.parallel = parallel
+        self.status = 'running'
+
+    def fetch_quotes(self, symbols) -> pd.DataFrame:
+        """ 下载symbols的实时日K线报价，写入报价簿并返回下载的报价 """
+        from .emfuncs import stock_live_kline_price
+        live_prices = stock_live_kline_price(symbols, freq='D', verbose=True, parallel=self.parallel)
+        if live_prices.empty:
+            return pd.DataFrame(columns=QUOTE_COLUMNS)
+        live_prices = live_prices.reset_index().set_index('symbol')
+        # remove duplicated indices if any
+        live_prices = live_prices[~live_prices.index.duplicated(keep='first')]
+        live_prices = live_prices.reindex(columns=QUOTE_COLUMNS)
+        live_prices['close'] = live_prices['close'].astype('float')
+        self.publish(live_prices)
+        return live_prices
+
+
+class ReplayPriceFeed(PriceFeed):
+    """ 回放历史K线数据的PriceFeed，可以以speed倍速回放，用于在本地测试实盘交易流程
+
+    回放数据是一组分钟K线(或其他频率的K线)，按照K线的时间先后逐根回放，回放到的K线被合成为当日截至目前的
+    日K线报价写入报价簿。回放时间由一个回放时钟给出，回放时钟开始后以speed倍于系统时间的速度前进，也可以
+    不开始回放时钟，而用step()或advance_to()手动推进回放
+
+    Attributes:
+    -----------
+    speed: float
+        回放速度，回放时钟前进速度为系统时钟的speed倍
+    start_time: pd.Timestamp
+        回放开始时间
+    end_time: pd.Timestamp
+        回放数据中最后一根K线的时间
+    """
+
+    def __init__(self, data, speed=1.0, start_time=None, max_ticks=240):
+        """ 生成一个ReplayPriceFeed对象
+
+        Parameters
+        ----------
+        data: pd.DataFrame or str
+            回放数据，或者回放数据文件的路径(csv或feather格式)。回放数据必须包含BAR_COLUMNS中的数据列，
+            其中symbol列也可以为ts_code列，trade_time和symbol也可以是index
+        speed: float, default 1.0
+            回放速度
+        start_time: str or pd.Timestamp, optional
+            回放开始时间，默认为回放数据中第一根K线的时间，早于start_time的K线在开始时直接写入报价簿
+        max_ticks: int, default 240
+            报价簿中每个symbol保存的最近历史报价的最大数量
+        """
+        super(ReplayPriceFeed, self).__init__(max_ticks=max_ticks)
+        self.feed_name = 'ReplayPriceFeed'
+        if not isinstance(speed, (int, float)) or speed <= 0:
+            raise ValueError(f'speed should be a positive number, got {speed} instead')
+        self.speed = float(speed)
+
+        bars = self._read_bars(data)
+        self._bars = bars
+        # 回放数据已经按时间排序，所有不同的K线时间，以及每个时间的第一根K线在数据中的位置
+        times = bars['trade_time'].values
+        self._times, self._offsets = np.unique(times, return_index=True)
+        self._offsets = np.append(self._offsets, len(bars))
+        self._position = 0  # 下一个需要回放的K线时间在self._times中的位置
+
+        if start_time is None:
+            start_time = self._times[0] if len(self._times) > 0 else pd.Timestamp('today')
+        self.start_time = pd.Timestamp(start_time)
+        self.end_time = pd.Timestamp(self._times[-1]) if len(self._times) > 0 else self.start_time
+        self._current_time = self.start_time
+        self._clock_started_at = None
+        self._clock_thread = None
+
+        # 早于回放开始时间的K线直接写入报价簿
+        if (len(self._times) > 0) and (self.start_time > pd.Timestamp(self._times[0])):
+            self.advance_to(self.start_time - pd.Timedelta(microseconds=1))
+            self._current_time = self.start_time
+
+    @staticmethod
+    def _read_bars(data) -> pd.DataFrame:
+        """ 读取并整理回放数据，返回按trade_time和symbol排序的K线数据 """
+        if isinstance(data, str):
+            if not os.path.exists(data):
+                raise FileNotFoundError(f'replay data file {data} does not exist')
+            if data.lower().endswith(('.fth', '.feather')):
+                data = pd.read_feather(data)
+            else:
+                data = pd.read_csv(data)
+        if not isinstance(data, pd.DataFrame):
+            raise TypeError(f'data should be a DataFrame or a file path, got {type(data)} instead')
+        bars = data.reset_index() if any(name is not None for name in data.index.names) else data.copy()
+        if ('symbol' not in bars.columns) and ('ts_code' in bars.columns):
+            bars = bars.rename(columns={'ts_code': 'symbol'})
+        missing = [col for col in BAR_COLUMNS if col not in bars.columns]
+        if missing:
+            raise KeyError(f'replay data should contain columns {BAR_COLUMNS}, missing {missing}')
+        bars['trade_time'] = pd.to_datetime(bars['trade_time'])
+        bars = bars.sort_values(['trade_time', 'symbol'], kind='stable').reset_index(drop=True)
+        return bars
+
+    @property
+    def is_finished(self) -> bool:
+        """ 所有的K线都已经回放完毕 """
+        return self._position >= len(self._times)
+
+    def now(self) -> pd.Timestamp:
+        """ 回放时钟的当前时间，回放时钟开始后，时间以speed倍速前进 """
+        # 回放时钟可能在其他线程中被停止，只读取一次时钟开始时间
+        started_at = self._clock_started_at
+        if started_at is None:
+            return self._current_time
+        elapsed = (time.monotonic() - started_at) * self.speed
+        return self._current_time + pd.Timedelta(seconds=elapsed)
+
+    def advance_to(self, to_time) -> int:
+        """ 回放所有时间不晚于to_time的K线，并把回放时间设置为to_time
+
+        Parameters
+        ----------
+        to_time: str or pd.Timestamp
+            回放截止时间
+
+        Returns
+        -------
+        count: int
+            本次回放的K线数量
+        """
+        to_time = pd.Timestamp(to_time)
+        with self._lock:
+            end = int(np.searchsorted(self._times, to_time.to_datetime64(), side='right'))
+            count = 0
+            if end > self._position:
+                start_row = self._offsets[self._position]
+                end_row = self._offsets[end]
+                self._position = end
+                count = end_row - start_row
+                self.publish(self._bars.iloc[start_row:end_row], bars=True)
+            if self._clock_started_at is None:
+                self._current_time = max(self._current_time, to_time)
+        return count
+
+    def step(self):
+        """ 回放下一个时间的所有K线，并把回放时间设置为这个时间
+
+        Returns
+        -------
+        trade_time: pd.Timestamp or None
+            回放的K线时间，如果已经回放完毕，返回None
+        """
+        if self.is_finished:
+            return None
+        trade_time = pd.Timestamp(self._times[self._position])
+        self.advance_to(trade_time)
+        return trade_time
+
+    def start(self, threaded=True) -> None:
+        """ 开始回放时钟，回放时间从当前回放时间开始以speed倍速前进
+
+        Parameters
+        ----------
+        threaded: bool, default True
+            如果为True，在后台线程中按回放时钟推送K线，否则只在调用fetch_quotes()时回放到当前时间
+        """
+        with self._lock:
+            if self._clock_started_at is not None:
+                return
+            self._clock_started_at = time.monotonic()
+            self.status = 'running'
+            if threaded:
+                self._clock_thread = threading.Thread(target=self._replay_loop, daemon=True)
+                self._clock_thread.start()
+
+    def stop(self) -> None:
+        """ 停止回放时钟，回放时间停留在当前时间 """
+        with self._lock:
+            if self._clock_started_at is None:
+                return
+            self.status = 'stopped'
+            clock_thread = self._clock_thread
+        # 回放线程在回放K线时需要获取self._lock，因此在锁外等待回放线程结束，之后再停止回放时钟
+        if (clock_thread is not None) and (clock_thread is not threading.current_thread()):
+            clock_thread.join()
+        with self._lock:
+            if self._clock_started_at is None:
+                return
+            current_time = self.now()
+            self._clock_started_at = None
+            self._current_time = current_time
+            self._clock_thread = None
+
+    def _replay_loop(self) -> None:
+        """ 后台回放线程，在每根K线的回放时间到达时推送K线，回放完毕后自动停止 """
+        while self.status == 'running' and not self.is_finished:
+            next_time = pd.Timestamp(self._times[self._position])
+            wait = (next_time - self.now()).total_seconds() / self.speed
+            if wait > 0:
+                time.sleep(min(wait, 0.05))
+                continue
+            self.advance_to(self.now())
+
+    def fetch_quotes(self, symbols) -> pd.DataFrame:
+        """ 回放到回放时钟的当前时间，返回报价簿中symbols的最新报价 """
+        self.advance_to(self.now())
+        return self.quote_book.snapshot(symbols)
@@ -2022,7 +2022,7 @@ class Operator:
 
         return
 
-    def create_signal(self, trade_data=None, sample_idx=None, price_type_idx=None):
+    def create_signal(self, trade_data=None, sample_idx=None, price_type_idx=None, executor=None):
         """ 生成交易信号。
 
         遍历Operator对象中的strategy对象，调用它们的generate方法生成策略交易信号
@@ -2084,6 +2084,9 @@ class Operator:
             如果给出sample_idx，必须给出这个参数
             当给出一个price_type_idx时，不会激活所有的策略生成交易信号，而是只调用相关的策略生成
             一组信号
+        executor: concurrent.futures.Executor, optional
+            可选参数，如果给出，同一交易价格类型下需要运行的多个策略会被提交到executor中并行生成交易信号，
+            所有策略的信号生成完毕后，再在当前线程中依次混合交易信号。如果为None，所有策略依次运行
 
         Returns
         -------
@@ -2136,18 +2139,28 @@ class Operator:
                                            self.get_op_sample_indices_by_run_timing(
                                                    timing=timing
                                            )]
-            # 依次使用策略队列中的所有策略逐个生成交易信号
-            op_signals = [
-                stg.generate(hist_data=hd,
-                             ref_data=rd,
-                             trade_data=trade_data,
-                             data_idx=si) for
-                stg, hd, rd, si in
-                zip(relevant_strategies,
-                    relevant_hist_data,
-                    relevant_ref_data,
-                    relevant_sample_indices)
-            ]
+            strategy_args = list(zip(relevant_strategies,
+                                     relevant_hist_data,
+                                     relevant_ref_data,
+                                     relevant_sample_indices))
+            running_count = sum(si is not None for *_, si in strategy_args)
+            if (executor is not None) and (running_count > 1):
+                # 各个策略互相独立，同时将需要运行的策略提交到executor中并行生成交易信号，data_idx为None的策略不需要运行
+                futures = [
+                    None if si is None else
+                    executor.submit(stg.generate, hist_data=hd, ref_data=rd, trade_data=trade_data, data_idx=si)
+                    for stg, hd, rd, si in strategy_args
+                ]
+                op_signals = [None if future is None else future.result() for future in futures]
+            else:
+                # 依次使用策略队列中的所有策略逐个生成交易信号
+                op_signals = [
+                    stg.generate(hist_data=hd,
+                                 ref_data=rd,
+                                 trade_data=trade_data,
+                                 data_idx=si) for
+                    stg, hd, rd, si in strategy_args
+                ]
             if (signal_mode == 'stepwise') and (signal_type in ['ps', 'vs']):
                 # stepwise mode, 这时候如果idx不在sample_idx中，就使用全0信号
                 op_signals = [
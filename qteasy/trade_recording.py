@@ -317,10 +317,9 @@ def delete_account(account_id: int, data_source=None, keep_account_id=True) -> N
         data_source.delete_sys_table_data('sys_op_trade_results', record_ids=result_ids)
 
         # 删除log文件
-        if os.path.exists(sys_log_file):
-            os.remove(sys_log_file)
-        if os.path.exists(trade_log_file):
-            os.remove(trade_log_file)
+        from qteasy.live_log import remove_log_files
+        remove_log_files(sys_log_file)
+        remove_log_files(trade_log_file)
         if os.path.exists(break_point_file):
             os.remove(break_point_file)
 
@@ -486,6 +485,77 @@ def get_or_create_position(account_id: int, symbol: str, position_type: str, dat
     return position.index[0]
 
 
+def get_or_create_positions(account_id: int, symbols, position_types, data_source: DataSource = None) -> list:
+    """ 批量获取账户的持仓id，不存在的持仓会在一次写入操作中全部创建
+
+    与逐个调用get_or_create_position()的结果相同，但是账户的持仓只读取一次
+
+    Parameters
+    ----------
+    account_id: int
+        账户的id
+    symbols: list of str
+        交易标的的代码
+    position_types: list of str, {'long', 'short'}
+        持仓类型，与symbols一一对应
+    data_source: DataSource, optional
+        数据源的名称, 默认为None, 表示使用默认的数据源
+
+    Returns
+    -------
+    list of int: 持仓记录的id，与symbols一一对应
+    """
+
+    from qteasy import DataSource, QT_DATA_SOURCE
+    if data_source is None:
+        data_source = QT_DATA_SOURCE
+    if not isinstance(data_source, DataSource):
+        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+
+    if len(symbols) != len(position_types):
+        raise ValueError(f'symbols and position_types must have the same length, '
+                         f'got {len(symbols)} and {len(position_types)}')
+    # 检查account_id是否存在，如果不存在，则报错，否则创建的持仓记录将无法关联到账户
+    get_account(account_id, data_source=data_source)
+
+    for symbol, position_type in zip(symbols, position_types):
+        if not isinstance(symbol, str):
+            raise TypeError(f'symbol must be a str, got {type(symbol)} instead')
+        if position_type not in ('long', 'short'):
+            raise ValueError(f'position_type must be "long" or "short", got {position_type} instead')
+
+    positions = get_account_positions(account_id, data_source=data_source)
+    pos_ids = {}
+    if not positions.empty:
+        for pos_id, symbol, position_type in zip(positions.index, positions['symbol'], positions['position']):
+            key = (symbol, position_type)
+            if key in pos_ids:
+                raise RuntimeError(f'position record is duplicated for {symbol}@{position_type}')
+            pos_ids[key] = pos_id
+
+    # 一次性创建所有不存在的持仓
+    new_keys = list(dict.fromkeys(
+            (symbol, position_type) for symbol, position_type in zip(symbols, position_types)
+            if (symbol, position_type) not in pos_ids
+    ))
+    new_ids = data_source.insert_sys_table_records(
+            'sys_op_positions',
+            [
+                {
+                    'account_id':    account_id,
+                    'symbol':        symbol,
+                    'position':      position_type,
+                    'qty':           0,
+                    'available_qty': 0,
+                    'cost':          0,
+                } for symbol, position_type in new_keys
+            ],
+    )
+    pos_ids.update(zip(new_keys, new_ids))
+
+    return [pos_ids[(symbol, position_type)] for symbol, position_type in zip(symbols, position_types)]
+
+
 def update_position(position_id, data_source=None, **position_data):
     """ 更新账户的持仓，包括持仓的数量和可用数量，account_id, position和symbol不可修改
 
@@ -629,7 +699,7 @@ def get_account_cash_availabilities(account_id, data_source=None):
     return account['cash_amount'], account['available_cash'], account['total_invest']
 
 
-def get_account_position_availabilities(account_id, shares=None, data_source=None):
+def get_account_position_availabilities(account_id, shares=None, data_source=None, positions=None):
     """ 根据account_id读取账户的持仓，筛选出与shares相同的symbol的持仓，返回两个ndarray，分别为
     每一个share对应的持仓的数量和可用数量
 
@@ -641,6 +711,9 @@ def get_account_position_availabilities(account_id, shares=None, data_source=Non
         需要输出的持仓的symbol列表, 如果不给出shares，则返回所有持仓的数量和可用数量
     data_source: str, optional
         数据源的名称, 默认为None, 表示使用默认的数据源
+    positions: pandas.DataFrame, optional
+        已经读取的账户全部持仓，格式与get_account_positions()的返回值相同，如果给出，则直接
+        使用这些持仓而不再从数据源中读取，例如Trader在内存中维护的账户持仓
 
     Returns
     -------
@@ -652,7 +725,8 @@ def get_account_position_availabilities(account_id, shares=None, data_source=Non
     """
 
     # 根据account_id读取账户的全部持仓
-    positions = get_account_positions(account_id=account_id, data_source=data_source)
+    if positions is None:
+        positions = get_account_positions(account_id=account_id, data_source=data_source)
 
     if positions is None:
         return shares, np.zeros(len(shares)), np.zeros(len(shares))
@@ -716,7 +790,7 @@ def get_account_position_availabilities(account_id, shares=None, data_source=Non
     return result
 
 
-def get_account_position_details(account_id, shares=None, data_source=None):
+def get_account_position_details(account_id, shares=None, data_source=None, positions=None):
     """ 根据account_id读取账户的持仓，筛选出与shares相同的symbol的持仓，返回一个DataFrame，包含
     每一个share对应的持仓的symbol，position，qty和可用数量。
 
@@ -728,6 +802,8 @@ def get_account_position_details(account_id, shares=None, data_source=None):
         需要输出的持仓的symbol列表, 如果不给出shares，则返回所有持仓的数量和可用数量
     data_source: str, optional
         数据源的名称, 默认为None, 表示使用默认的数据源
+    positions: pandas.DataFrame, optional
+        已经读取的账户全部持仓，如果给出，则不再从数据源中读取
 
     Returns
     -------
@@ -739,7 +815,8 @@ def get_account_position_details(account_id, shares=None, data_source=None):
     symbols, amounts, available_amounts, costs = get_account_position_availabilities(
             account_id=account_id,
             shares=shares,
-            data_source=data_source
+            data_source=data_source,
+            positions=positions,
     )
     # 将symbol，position，qty和available_qty放入DataFrame并返回
     positions = pd.DataFrame(
@@ -783,10 +860,59 @@ def record_trade_order(order, data_source=None):
     if data_source is None:
         data_source = qt.QT_DATA_SOURCE
 
-    err = None
+    if not isinstance(data_source, qt.DataSource):
+        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+        raise err
+
+    _check_trade_order(order)
+
+    return data_source.insert_sys_table_data('sys_op_trade_orders', **order)
+
+
+def record_trade_orders(orders, data_source=None) -> list:
+    """ 将多个交易订单一次性写入数据库，所有订单在一次写入操作中完成
+
+    Parameters
+    ----------
+    orders: list of dict
+        标准形式的交易订单，每个订单的格式与record_trade_order()相同
+    data_source: str, optional
+        数据源的名称, 默认为None, 表示使用默认的数据源
+
+    Returns
+    -------
+    order_ids: list of int
+        写入数据库的交易订单的id，顺序与orders一致
+    """
+
+    import qteasy as qt
+    if data_source is None:
+        data_source = qt.QT_DATA_SOURCE
 
     if not isinstance(data_source, qt.DataSource):
         err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+        raise err
+
+    for order in orders:
+        _check_trade_order(order)
+
+    return data_source.insert_sys_table_records('sys_op_trade_orders', orders)
+
+
+def _check_trade_order(order) -> None:
+    """ 检查交易订单的格式和数据合法性，如果不合法则抛出异常
+
+    Parameters
+    ----------
+    order: dict
+        标准形式的交易订单，格式与record_trade_order()相同
+
+    Returns
+    -------
+    None
+    """
+
+    err = None
 
     # 检查交易信号的格式和数据合法性
     if not isinstance(order, dict):
@@ -809,8 +935,6 @@ def record_trade_order(order, data_source=None):
     if err is not None:
         raise err
 
-    return data_source.insert_sys_table_data('sys_op_trade_orders', **order)
-
 
 def read_trade_order(order_id, data_source=None) -> dict:
     """ 根据order_id从数据库中读取交易信号
@@ -1065,7 +1189,8 @@ def read_trade_order_detail(order_id, data_source=None) -> dict:
     return trade_order_detail
 
 
-def save_parsed_trade_orders(account_id, symbols, positions, directions, quantities, prices, data_source=None):
+def save_parsed_trade_orders(account_id, symbols, positions, directions, quantities, prices, data_source=None,
+                             order_type='market'):
     """ 根据parse_trade_signal的结果，将交易订单要素组装成完整的交易订单dict，并将交易信号保存到数据库
 
     Parameters
@@ -1084,6 +1209,8 @@ def save_parsed_trade_orders(account_id, symbols, positions, directions, quantit
         交易信号对应的股票价格
     data_source: str, optional
         交易信号对应的数据源, 默认为None, 使用默认数据源
+    order_type: str, default 'market'
+        交易订单的类型，market/limit
 
     Returns
     -------
@@ -1101,23 +1228,21 @@ def save_parsed_trade_orders(account_id, symbols, positions, directions, quantit
         err = ValueError('Length of symbols, positions, directions, quantities and prices must be the same')
         raise err
 
-    order_ids = []
-    # 逐个处理所有的交易信号要素
-    for sym, pos, dirc, qty, price in zip(symbols, positions, directions, quantities, prices):
-        # 获取pos_id, 如果pos_id不存在，则新建一个posiiton
-        pos_id = get_or_create_position(account_id, sym, pos, data_source=data_source)
-        # 生成交易信号dict
-        trade_order = {
+    # 获取所有订单的pos_id, 不存在的position一次性新建
+    pos_ids = get_or_create_positions(account_id, symbols, positions, data_source=data_source)
+    # 生成所有的交易信号dict，并一次性写入数据库
+    trade_orders = [
+        {
             'pos_id': pos_id,
             'direction': dirc,
-            'order_type': 'market',  # TODO: 交易信号的order_type应该是可配置的，增加其他配置选项
+            'order_type': order_type,
             'qty': qty,
             'price': price,
             'submitted_time': None,
             'status': 'created'
-        }
-        sig_id = record_trade_order(trade_order, data_source=data_source)
-        order_ids.append(sig_id)
+        } for pos_id, dirc, qty, price in zip(pos_ids, directions, quantities, prices)
+    ]
+    order_ids = record_trade_orders(trade_orders, data_source=data_source)
 
     return order_ids
 
@@ -11,14 +11,17 @@
 # trading orders and submit to class Broker
 # ======================================
 
+import bisect
 import logging
 import os
 import sys
+import threading
 import time
 
 import numpy as np
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
 from rich.text import Text
 
@@ -26,13 +29,17 @@ import qteasy
 from qteasy import ConfigDict, DataSource, Operator
 from qteasy.broker import Broker
 from qteasy.core import check_and_prepare_live_trade_data
+from qteasy.live_log import SegmentedFileHandler, TradeLogFile, log_segment_files, read_log_tail
+from qteasy.live_log import remove_log_files
+from qteasy.price_feed import LivePriceFeed, PriceFeed
 from qteasy.trade_recording import get_account, get_account_position_availabilities, get_account_position_details
 from qteasy.trade_recording import get_account_cash_availabilities, query_trade_orders, record_trade_order
+from qteasy.trade_recording import get_account_positions, save_parsed_trade_orders
 from qteasy.trade_recording import get_or_create_position, new_account, update_position
 from qteasy.trading_util import cancel_order, create_daily_task_schedule, get_position_by_id
 from qteasy.trading_util import get_last_trade_result_summary, get_symbol_names, process_account_delivery
 from qteasy.trading_util import parse_trade_signal, process_trade_result, submit_order, deliver_trade_result
-from qteasy.trading_util import calculate_cost_change
+from qteasy.trading_util import calculate_cost_change, submit_orders, task_time_to_seconds, find_changed_rows
 from qteasy.trading_util import break_point_file_path_name, sys_log_file_path_name, trade_log_file_path_name
 from qteasy.utilfuncs import TIME_FREQ_LEVELS, adjust_string_length, parse_freq_string, str_to_list
 from qteasy.utilfuncs import get_current_timezone_datetime
@@ -46,6 +53,39 @@ UNIT_TO_TABLE = {
     'min':   'stock_1min',
 }
 
+# 尚未完成的订单状态，Trader的内存账本中只保存这些状态的订单
+OPEN_ORDER_STATUSES = ('created', 'submitted', 'partial-filled')
+
+
+def _apply_written_records(df, records, belongs):
+    """ 将写入系统数据表的记录直接应用到内存中的记录表，不需要重新读取数据表
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        以记录ID为index的记录表
+    records: dict
+        {record_id: record}，record为写入后的完整记录，为None时表示该记录已被删除
+    belongs: callable
+        belongs(record) -> bool，判断一条不在df中的新记录是否应该加入df
+
+    Returns
+    -------
+    pd.DataFrame: 更新后的记录表，如果没有需要更新的记录，返回原来的df
+    """
+    removed = [record_id for record_id, record in records.items() if (record is None) and (record_id in df.index)]
+    written = {record_id: record for record_id, record in records.items()
+               if (record is not None) and ((record_id in df.index) or belongs(record))}
+    if (not removed) and (not written):
+        return df
+    result = df.drop(index=removed)
+    if written:
+        updates = pd.DataFrame.from_dict(written, orient='index')
+        updates.index.name = df.index.name
+        kept = result.loc[~result.index.isin(updates.index)]
+        result = updates if kept.empty else pd.concat([kept, updates]).sort_index()
+    return result
+
 
 class Trader(object):
     """ Trader是交易系统的核心，它负责调度交易任务，根据交易日历和策略规则生成交易订单并提交给Broker
@@ -64,6 +104,8 @@ class Trader(object):
         账户ID
     broker: Broker
         交易所对象，接受交易订单并返回交易结果
+    price_feed: PriceFeed
+        实时价格来源，提供实时价格，如果是回放价格，同时提供回放时钟作为交易系统的当前时间
     task_queue: list of tuples
         任务队列，每个任务是一个tuple，包含任务的执行时间和任务的名称
     task_daily_schedule: list of tuples
@@ -87,8 +129,17 @@ class Trader(object):
         添加任务到任务队列
     run_task(task) -> None
         执行任务
+    subscribe_events(callback, event_types) -> int
+        订阅持仓、订单、价格和交易记录的变动事件
     """
 
+    # Trader发布的数据变动事件类型，以及事件数据:
+    # - positions: list of str, 持仓数量、可用数量或成本发生变化的symbol
+    # - orders:    list of int, 新提交、成交、撤销或交割的订单ID
+    # - prices:    DataFrame, 价格发生变化的symbol的最新报价，index为symbol
+    # - trade_log: dict, 新写入交易记录文件的一行记录
+    EVENT_TYPES = ('positions', 'orders', 'prices', 'trade_log')
+
     trade_log_file_headers = [
         'datetime',  # 0, 交易或变动发生时间
         'reason',  # 1, 交易或变动的原因: order / delivery / manual
@@ -113,7 +164,7 @@ class Trader(object):
         'available_cash',  # 20, 变动后的可用现金
     ]
 
-    def __init__(self, account_id, operator, broker, config, datasource, debug=False):
+    def __init__(self, account_id, operator, broker, config, datasource, debug=False, price_feed=None):
         """ 初始化Trader
 
         Parameters
@@ -130,6 +181,9 @@ class Trader(object):
             数据源对象，从数据源获取数据
         debug: bool, default False
             是否打印debug信息
+        price_feed: PriceFeed, optional
+            实时价格来源，默认为LivePriceFeed，从eastmoney获取实时价格，如果给出ReplayPriceFeed，
+            交易系统的当前时间由回放时钟给出，可以在本地快速回放历史价格测试交易系统
         """
         err = None
         if not isinstance(account_id, int):
@@ -142,6 +196,10 @@ class Trader(object):
             err = TypeError(f'config must be dict, got {type(config)} instead')
         if not isinstance(datasource, DataSource):
             err = TypeError(f'datasource must be DataSource, got {type(datasource)} instead')
+        if price_feed is None:
+            price_feed = LivePriceFeed()
+        if not isinstance(price_feed, PriceFeed):
+            err = TypeError(f'price_feed must be PriceFeed, got {type(price_feed)} instead')
 
         if err:
             raise err
@@ -149,6 +207,10 @@ class Trader(object):
         self.account_id = account_id
         self._broker = broker
         self._operator = operator
+        self._price_feed = price_feed
+        if broker.price_feed is None:
+            # broker没有自己的价格来源时，与Trader使用相同的实时价格
+            broker.price_feed = price_feed
         self._config = ConfigDict()
         self._config.update(qteasy.QT_CONFIG.copy())
         self._config.update(config)
@@ -163,6 +225,7 @@ class Trader(object):
         self.task_queue = Queue()
         self.message_queue = Queue()
 
+        self._schedule_lock = threading.RLock()
         self.task_daily_schedule = []
         self.time_zone = config['time_zone']
         self.init_datetime = self.get_current_tz_datetime().strftime("%Y-%m-%d %H:%M:%S")
@@ -186,8 +249,20 @@ class Trader(object):
         self.watch_list = benchmark_list + self._asset_pool
 
         self.live_sys_logger = None
+        # 带有缓冲区和行偏移索引的交易日志文件，在首次写入或读取交易日志时打开
+        self._trade_log = None
 
         self.account = get_account(self.account_id, data_source=self._datasource)
+        # 账户现金、持仓和未完成订单的内存账本，在_start()时载入，此后数据源每次写入账户、持仓或
+        # 订单记录后，直接用写入的记录更新账本，账本载入前，账户现金和持仓直接从数据表中读取
+        self._account_state = None
+        self._account_state_lock = threading.RLock()
+        # 同一时间运行多个交易策略时用于并行生成交易信号的线程池，在首次需要时创建
+        self._strategy_executor = None
+        # 数据变动事件的订阅者，UI通过订阅事件只更新发生变化的数据
+        self._event_subscriptions = {}
+        self._next_event_subscription_id = 0
+        self._event_lock = threading.RLock()
 
         self.debug = debug
 
@@ -208,6 +283,23 @@ class Trader(object):
     def prev_status(self) -> str:
         return self._prev_status
 
+    @property
+    def task_daily_schedule(self) -> list:
+        """ 当日的任务日程，按任务执行时间排序的list，每个任务是一个tuple: (time_str, task, optional: args) """
+        return self._task_daily_schedule
+
+    @task_daily_schedule.setter
+    def task_daily_schedule(self, schedule) -> None:
+        """ 设置任务日程，将任务按执行时间排序，同时预先计算每个任务的执行时间（当日的秒数）
+
+        主循环中只需要比较第一个任务的执行时间即可确定是否有任务到期，不需要逐个解析所有任务的时间
+        """
+        task_seconds = [task_time_to_seconds(task[0]) for task in schedule]
+        order = sorted(range(len(schedule)), key=task_seconds.__getitem__)
+        with self._schedule_lock:
+            self._task_daily_schedule = [schedule[i] for i in order]
+            self._task_schedule_seconds = [task_seconds[i] for i in order]
+
     @property
     def operator(self) -> Operator:
         return self._operator
@@ -216,6 +308,10 @@ class Trader(object):
     def broker(self) -> Broker:
         return self._broker
 
+    @property
+    def price_feed(self) -> PriceFeed:
+        return self._price_feed
+
     @property
     def asset_pool(self) -> list:
         """ 账户的资产池，一个list，包含所有允许投资的股票代码 """
@@ -238,6 +334,9 @@ class Trader(object):
              total_invest: float, 账户的总投资额
             )
         """
+        with self._account_state_lock:
+            if self._account_state is not None:
+                return self._account_state['cash']
         return get_account_cash_availabilities(self.account_id, data_source=self._datasource)
 
     @property
@@ -254,7 +353,8 @@ class Trader(object):
         positions = get_account_position_details(
                 self.account_id,
                 shares=shares,
-                data_source=self._datasource
+                data_source=self._datasource,
+                positions=self._get_position_records(),
         )
         # 获取每个symbol的names
         positions = positions.T
@@ -280,23 +380,23 @@ class Trader(object):
         """
         positions = self.account_positions
 
-        # 获取每个symbol的最新价格，在交易日从self.live_price中获取，非交易日从datasource中获取，或者使用全nan填充，
+        # 获取每个symbol的最新价格，优先使用self.live_price，没有实时价格的symbol从datasource的最新已知价格中获取，
+        # 最新已知价格随实时价格获取以及K线数据写入更新，不需要读取历史数据
         if self.live_price is None:
-            today = self.get_current_tz_datetime()
+            current_prices = pd.Series(index=positions.index, data=np.nan)
+        else:
+            current_prices = self.live_price['close'].reindex(index=positions.index).astype('float')
+        if current_prices.isna().any():
+            missing = current_prices.index[current_prices.isna()].tolist()
             try:
-                current_prices = self._datasource.get_history_data(
-                        shares=positions.index.tolist(),
-                        htypes='close',
-                        asset_type='E',
+                last_prices = self._datasource.get_last_prices(
+                        missing,
                         freq=self.operator.op_data_freq,
-                        start=today - pd.Timedelta(days=7),
-                        end=today,
-                )['close'].iloc[-1]
+                        asset_type='E',
+                )
+                current_prices = current_prices.fillna(last_prices)
             except Exception as e:
                 self.send_message(f'Error in getting current prices: {e}', debug=True)
-                current_prices = pd.Series(index=positions.index, data=np.nan)
-        else:
-            current_prices = self.live_price['close'].reindex(index=positions.index).astype('float')
 
         positions['name'] = positions['name'].fillna('')
         positions['current_price'] = current_prices
@@ -350,7 +450,13 @@ class Trader(object):
 
     # ================== methods ==================
     def get_current_tz_datetime(self) -> pd.Timestamp:
-        """ 根据当前时区获取当前时间，如果指定时区等于当前时区，将当前时区设置为local，返回当前时间"""
+        """ 根据当前时区获取当前时间，如果指定时区等于当前时区，将当前时区设置为local，返回当前时间
+
+        如果price_feed提供了自己的时钟（例如回放历史价格时），返回price_feed的当前时间
+        """
+        feed_time = self._price_feed.now()
+        if feed_time is not None:
+            return feed_time
 
         tz_time = get_current_timezone_datetime(self.time_zone)
         # if tz_time is very close to local time, then set time_zone to local and return local time
@@ -431,6 +537,7 @@ class Trader(object):
                 sleep_interval = market_close_day_loop_interval if not \
                     self.is_trade_day else \
                     market_open_day_loop_interval
+                schedule_checked = False
                 # 检查任务队列，如果有任务，执行任务，否则添加任务到任务队列
                 if not self.task_queue.empty():
                     # 如果任务队列不为空，执行任务
@@ -466,6 +573,7 @@ class Trader(object):
                 current_date = current_date_time.date()
                 if self.status != 'paused':
                     self._add_task_from_schedule(current_time)
+                    schedule_checked = True
                 # 如果日期变化，检查是否是交易日，如果是交易日，更新日程
                 # TODO: move these operations to a task "change_date"
                 if current_date != pre_date:
@@ -485,6 +593,13 @@ class Trader(object):
                     self.send_message(message)
                     self.broker.broker_messages.task_done()
 
+                # 定期将缓冲区中的交易记录写入文件
+                if self._trade_log is not None:
+                    self._trade_log.maybe_flush()
+
+                # 如果下一个任务在本次休眠结束前到期，则只休眠到任务到期时为止
+                if schedule_checked and (0 < self.count_down_to_next_task < sleep_interval):
+                    sleep_interval = self.count_down_to_next_task
                 time.sleep(sleep_interval)
             else:
                 # process trader when trader is normally stopped
@@ -662,6 +777,73 @@ class Trader(object):
         # 其他情况下，发送原始消息到消息队列
         self.message_queue.put(message)
 
+    def subscribe_events(self, callback, event_types=None) -> int:
+        """ 订阅Trader的数据变动事件，事件发生时调用callback(event_type, data)
+
+        事件在产生事件的线程中同步推送，callback应该尽快返回，例如只将事件放入队列中由UI线程处理
+
+        Parameters
+        ----------
+        callback: callable
+            事件回调函数，参数为事件类型和事件数据，参见Trader.EVENT_TYPES
+        event_types: str or list of str, optional
+            订阅的事件类型，默认订阅所有事件
+
+        Returns
+        -------
+        subscription_id: int
+            订阅ID，用于取消订阅
+
+        Raises
+        ------
+        TypeError: callback不可调用时
+        ValueError: 事件类型不合法时
+        """
+        if not callable(callback):
+            raise TypeError(f'callback should be callable, got {type(callback)} instead')
+        if event_types is None:
+            event_types = self.EVENT_TYPES
+        elif isinstance(event_types, str):
+            event_types = str_to_list(event_types)
+        invalid_types = [event_type for event_type in event_types if event_type not in self.EVENT_TYPES]
+        if invalid_types:
+            raise ValueError(f'invalid event types: {invalid_types}, should be in {self.EVENT_TYPES}')
+        with self._event_lock:
+            subscription_id = self._next_event_subscription_id
+            self._next_event_subscription_id += 1
+            self._event_subscriptions[subscription_id] = (set(event_types), callback)
+        return subscription_id
+
+    def unsubscribe_events(self, subscription_id) -> None:
+        """ 取消订阅数据变动事件，如果订阅ID不存在则忽略 """
+        with self._event_lock:
+            self._event_subscriptions.pop(subscription_id, None)
+
+    def publish_event(self, event_type, data) -> None:
+        """ 推送数据变动事件给订阅了该事件的所有订阅者，订阅者抛出的异常不会影响Trader的运行
+
+        Parameters
+        ----------
+        event_type: str
+            事件类型，参见Trader.EVENT_TYPES
+        data: any
+            事件数据
+        """
+        with self._event_lock:
+            subscriptions = list(self._event_subscriptions.values())
+        for event_types, callback in subscriptions:
+            if event_type not in event_types:
+                continue
+            try:
+                callback(event_type, data)
+            except Exception as e:
+                self.send_message(f'error occurred in subscriber of {event_type} events: {e}', debug=True)
+
+    def _has_event_subscribers(self, event_type) -> bool:
+        """ 是否有订阅者订阅了event_type事件，没有订阅者时不需要计算事件数据 """
+        with self._event_lock:
+            return any(event_type in event_types for event_types, _ in self._event_subscriptions.values())
+
     def add_message_prefix(self, message: str, debug=False) -> str:
         """ 在消息前添加时间、状态等信息
 
@@ -727,13 +909,15 @@ class Trader(object):
         """
         raise NotImplementedError
 
-    def history_orders(self, with_trade_results=True):
+    def history_orders(self, with_trade_results=True, order_ids=None):
         """ 账户的历史订单详细信息
 
         Parameters
         ----------
         with_trade_results: bool, default False
             是否包含订单的成交结果
+        order_ids: list of int, optional
+            如果给出order_ids，只返回这些订单的详细信息，只读取这些订单的成交结果
 
         Returns
         -------
@@ -767,7 +951,11 @@ class Trader(object):
         """
         from qteasy.trade_recording import query_trade_orders, get_account_positions, read_trade_results_by_order_id
         orders = query_trade_orders(self.account_id, data_source=self._datasource)
-        positions = get_account_positions(self.account_id, data_source=self._datasource)
+        if order_ids is not None:
+            orders = orders.loc[orders.index.isin(order_ids)]
+        positions = self._get_position_records()
+        if positions is None:
+            positions = get_account_positions(self.account_id, data_source=self._datasource)
         order_details = orders.join(positions, on='pos_id', rsuffix='_p')
         order_details.drop(columns=['pos_id', 'account_id', 'qty_p', 'available_qty'], inplace=True)
         order_details = order_details.reindex(
@@ -808,6 +996,109 @@ class Trader(object):
             return pd.DataFrame()
         return stock_basic.reindex(index=asset_pool)
 
+    def reload_account_state(self) -> None:
+        """ 从数据表中重新载入账户的现金、持仓和未完成的订单，建立内存账本
+
+        账本载入后，account_cash、account_positions等属性直接从内存中读取，不再查询数据表。
+        Trader的数据源每次写入账户、持仓或订单记录后，直接用写入的记录更新账本(write-through)，
+        不需要重新读取数据表。如果账户数据被其他数据源对象或其他进程修改，需要调用本方法重新载入
+
+        Returns
+        -------
+        None
+        """
+        positions = get_account_positions(self.account_id, data_source=self._datasource)
+        orders = query_trade_orders(self.account_id, data_source=self._datasource)
+        with self._account_state_lock:
+            if self._account_state is None:
+                self._datasource.add_sys_table_listener('sys_op_live_accounts', self._on_account_written)
+                self._datasource.add_sys_table_listener('sys_op_positions', self._on_positions_written)
+                self._datasource.add_sys_table_listener('sys_op_trade_orders', self._on_orders_written)
+            self._account_state = {
+                'cash':      get_account_cash_availabilities(self.account_id, data_source=self._datasource),
+                'positions': positions,
+                'orders':    orders.loc[orders['status'].isin(OPEN_ORDER_STATUSES)],
+            }
+
+    def _release_account_state(self) -> None:
+        """ 停止更新内存账本，此后账户现金和持仓直接从数据表中读取"""
+        with self._account_state_lock:
+            if self._account_state is None:
+                return
+            self._datasource.remove_sys_table_listener('sys_op_live_accounts', self._on_account_written)
+            self._datasource.remove_sys_table_listener('sys_op_positions', self._on_positions_written)
+            self._datasource.remove_sys_table_listener('sys_op_trade_orders', self._on_orders_written)
+            self._account_state = None
+
+    def _on_account_written(self, records) -> None:
+        """ 账户记录写入数据表后，用写入的现金数据更新内存账本"""
+        record = records.get(self.account_id)
+        if record is None:
+            return
+        with self._account_state_lock:
+            if self._account_state is None:
+                return
+            self._account_state['cash'] = (record['cash_amount'], record['available_cash'], record['total_invest'])
+
+    def _on_positions_written(self, records) -> None:
+        """ 持仓记录写入数据表后，用写入的持仓记录更新内存账本，并推送持仓变动事件"""
+        changed_symbols = []
+        with self._account_state_lock:
+            if self._account_state is None:
+                return
+            prev_positions = self._account_state['positions']
+            positions = _apply_written_records(
+                    prev_positions,
+                    records,
+                    belongs=lambda record: record['account_id'] == self.account_id,
+            )
+            if positions is prev_positions:
+                return
+            self._account_state['positions'] = positions
+            if self._has_event_subscribers('positions'):
+                changed_symbols = self._changed_position_symbols(prev_positions, positions)
+        if changed_symbols:
+            self.publish_event('positions', changed_symbols)
+
+    def _on_orders_written(self, records) -> None:
+        """ 订单记录写入数据表后，用写入的订单记录更新内存账本中未完成的订单"""
+        with self._account_state_lock:
+            if self._account_state is None:
+                return
+            pos_ids = self._account_state['positions'].index
+            orders = _apply_written_records(
+                    self._account_state['orders'],
+                    records,
+                    belongs=lambda record: record['pos_id'] in pos_ids,
+            )
+            self._account_state['orders'] = orders.loc[orders['status'].isin(OPEN_ORDER_STATUSES)]
+
+    def _open_orders(self, status) -> pd.DataFrame:
+        """ 返回账户中状态为status的订单，账本载入后从内存中读取，否则从数据表中查询"""
+        with self._account_state_lock:
+            if self._account_state is not None:
+                orders = self._account_state['orders']
+                return orders.loc[orders['status'] == status]
+        return query_trade_orders(account_id=self.account_id, status=status, data_source=self._datasource)
+
+    @staticmethod
+    def _changed_position_symbols(prev_positions, positions) -> list:
+        """ 比较内存账本更新前后的持仓记录，返回持仓发生变化的symbol """
+        changed_ids = find_changed_rows(prev_positions, positions, columns=['symbol', 'qty', 'available_qty', 'cost'])
+        if not changed_ids:
+            return []
+        symbols = positions['symbol'].reindex(changed_ids)
+        if prev_positions is not None and not prev_positions.empty:
+            symbols = symbols.fillna(prev_positions['symbol'].reindex(changed_ids))
+        return list(dict.fromkeys(symbols.dropna()))
+
+    def _get_position_records(self):
+        """ 返回内存账本中的账户持仓记录，如果账本尚未载入，返回None """
+        with self._account_state_lock:
+            if self._account_state is None:
+                return None
+            return self._account_state['positions']
+
     def manual_change_cash(self, amount) -> None:
         """ 手动修改现金，根据amount的正负号，增加或减少现金
 
@@ -995,21 +1286,19 @@ class Trader(object):
         同时更新self.watched_prices
         """
         if self.watch_list:
-            from qteasy.emfuncs import stock_live_kline_price
             symbols = self.watch_list
-            live_prices = stock_live_kline_price(symbols, freq='D', verbose=True, parallel=False)
+            live_prices = self._price_feed.fetch_quotes(symbols)
             if not live_prices.empty:
-                live_prices.close = live_prices.close.astype(float)
                 live_prices['change'] = live_prices['close'] / live_prices['pre_close'] - 1
-                live_prices.set_index('symbol', inplace=True)
-                # remove duplicated indices if any
-                live_prices = live_prices[~live_prices.index.duplicated(keep='first')]
 
                 self.send_message('live prices acquired to update watched prices!', debug=True)
             else:
                 self.send_message('Failed to acquire live prices to update watch price string!', debug=True)
 
+            prev_prices = self.watched_prices
             self.watched_prices = live_prices
+            self._record_last_prices(live_prices)
+            self._publish_price_changes(prev_prices, live_prices)
 
         return self.watched_prices
 
@@ -1024,11 +1313,10 @@ class Trader(object):
             系统信息logger
         """
 
-        live_handler = logging.FileHandler(
+        live_handler = SegmentedFileHandler(
                 filename=sys_log_file_path_name(self.account_id, self.datasource),
-                mode='a',
+                rotation=self._config['live_log_rotation'],
                 encoding='utf-8',
-                delay=False,
         )
         logger_live = logging.getLogger('live')
         logger_live.addHandler(live_handler)
@@ -1083,8 +1371,11 @@ class Trader(object):
         import csv
         log_file_path_name = trade_log_file_path_name(self.account_id, self.datasource)
 
-        if os.path.exists(log_file_path_name):
-            os.remove(log_file_path_name)
+        if self._trade_log is not None:
+            self._trade_log.close()
+            self._trade_log = None
+        # 同时删除已经分段的历史交易记录文件
+        remove_log_files(log_file_path_name)
 
         with open(log_file_path_name, mode='w', encoding='utf-8') as f:
             writer = csv.writer(f)
@@ -1109,8 +1400,7 @@ class Trader(object):
             如果log文件不存在
 
         """
-        if not self.trade_log_file_is_valid:
-            raise FileNotFoundError('trade log file does not exist or is not valid')
+        trade_log = self._get_trade_log()
 
         base_log_content = {
             k: v for k, v in
@@ -1137,29 +1427,40 @@ class Trader(object):
                     continue
                 base_log_content[key] = f'{base_log_content[key]:.3f}'
 
-        import csv
-        file_name = trade_log_file_path_name(self.account_id, self.datasource)
-        with open(file_name, mode='a', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.trade_log_file_headers)
-            # append log_content to the end of the file
-            writer.writerow(base_log_content)
+        trade_log.write([base_log_content[key] for key in self.trade_log_file_headers])
+        self.publish_event('trade_log', base_log_content)
+
+    def read_trade_log(self, row_count: int = None, start=None, end=None) -> pd.DataFrame:
+        """ 读取trade_log记录文件的内容，包括已经分段的历史交易记录
 
-    def read_trade_log(self) -> pd.DataFrame:
-        """ 读取trade_log记录文件的全部内容
+        通过交易记录的行偏移索引读取，读取最后N行或某一时间段内的记录时，只读取相应的文件内容
+
+        Parameters
+        ----------
+        row_count: int, optional
+            如果给出row_count，则只读取最后row_count行记录
+        start: str or datetime-like, optional
+            读取记录的开始时间，包括start
+        end: str or datetime-like, optional
+            读取记录的结束时间，包括end，如果end只包含日期，则包括当天的全部记录
 
         Returns
         -------
         trade_log: pd.DataFrame
         """
-        if self.trade_log_file_is_valid:
-            df = pd.read_csv(trade_log_file_path_name(self.account_id, self.datasource))
-            return df
-        else:
+        if not self.trade_log_file_is_valid:
             return pd.DataFrame()
+        trade_log = self._get_trade_log()
+        if (row_count is not None) and (row_count > 0):
+            return trade_log.tail(row_count)
+        return trade_log.read(start=start, end=end)
 
     def read_sys_log(self, row_count: int = None) -> list:
         """ 从系统log文件中读取文本信息，保存在一个列表中，如果指定row_count = N，则读取倒数N行
 
+        读取倒数N行时从文件末尾向前读取，读取量与N成正比，与log文件大小无关，当前log文件
+        不足N行时，继续从已经分段的历史log文件中读取
+
         Parameters
         ----------
         row_count: int, optional
@@ -1174,18 +1475,58 @@ class Trader(object):
         log_file_path = sys_log_file_path_name(self.account_id, self.datasource)
         if not os.path.exists(log_file_path):
             return []
-        with open(log_file_path, 'r') as f:
-            # read last row_count lines from f
-            lines = f.readlines()
 
-            if row_count is None:
-                row_count = len(lines)
+        if (row_count is not None) and (row_count > 0):
+            return read_log_tail(log_file_path, row_count)
 
-            if row_count > 0:
-                lines = lines[-row_count:]
+        lines = []
+        for file_path in log_segment_files(log_file_path) + [log_file_path]:
+            with open(file_path, 'r') as f:
+                lines.extend(f.readlines())
 
         return lines
 
+    def _publish_price_changes(self, prev_prices, prices) -> None:
+        """ 比较价格更新前后的报价，推送价格发生变化的symbol的最新报价 """
+        if (prices is None) or prices.empty or (not self._has_event_subscribers('prices')):
+            return
+        prices = prices[~prices.index.duplicated(keep='last')]
+        if prev_prices is not None:
+            prev_prices = prev_prices[~prev_prices.index.duplicated(keep='last')]
+            # 被删除的symbol没有新的报价，不需要推送
+            changed = [symbol for symbol in find_changed_rows(prev_prices, prices) if symbol in prices.index]
+        else:
+            changed = prices.index.tolist()
+        if changed:
+            self.publish_event('prices', prices.loc[changed])
+
+    def _get_trade_log(self) -> TradeLogFile:
+        """ 返回已经打开的交易记录文件，如果尚未打开或文件已经被删除，重新检查并打开文件
+
+        Returns
+        -------
+        trade_log: TradeLogFile
+
+        Raises
+        ------
+        FileNotFoundError
+            如果log文件不存在或格式不正确
+        """
+        if (self._trade_log is not None) and self._trade_log.is_open:
+            return self._trade_log
+        if self._trade_log is not None:
+            self._trade_log.close()
+            self._trade_log = None
+        if not self.trade_log_file_is_valid:
+            raise FileNotFoundError('trade log file does not exist or is not valid')
+        self._trade_log = TradeLogFile(
+                trade_log_file_path_name(self.account_id, self.datasource),
+                headers=self.trade_log_file_headers,
+                rotation=self._config['live_log_rotation'],
+                flush_interval=self._config['live_trade_log_flush_interval'],
+        )
+        return self._trade_log
+
     def save_break_point(self) -> str:
         """ 保存工作断点
 
@@ -1283,14 +1624,76 @@ class Trader(object):
         }
 
         order_id = record_trade_order(trade_order, data_source=self._datasource)
-        # 提交交易订单
-        if submit_order(order_id=order_id, data_source=self._datasource) is not None:
+        # 提交交易订单，提交订单时冻结的可用现金或可用持仓由数据源写入后直接更新到内存账本
+        submitted = submit_order(order_id=order_id, data_source=self._datasource)
+        self.publish_event('orders', [order_id])
+        if submitted is not None:
             trade_order['order_id'] = order_id
 
             return trade_order
 
         return {}
 
+    def submit_trade_orders(self, symbols, positions, directions, order_type, quantities, prices) -> list:
+        """ 批量生成并提交订单，所有订单在一次写入中记录到数据库，并在一次写入中更新为submitted状态
+
+        Parameters
+        ----------
+        symbols: list of str
+            交易标的代码
+        positions: list of str
+            交易标的的持仓方向，long/short
+        directions: list of str
+            交易方向，buy/sell
+        order_type: str
+            订单类型，market/limit
+        quantities: list of float
+            订单数量
+        prices: list of float
+            订单价格
+
+        Returns
+        -------
+        trade_orders: list of dict
+            成功提交的订单信息，除了submit_trade_order()返回的订单信息外，还包括订单的symbol和position
+        """
+        if order_type is None:
+            order_type = 'market'
+        if len(symbols) == 0:
+            return []
+
+        order_ids = save_parsed_trade_orders(
+                account_id=self.account_id,
+                symbols=symbols,
+                positions=positions,
+                directions=directions,
+                quantities=quantities,
+                prices=prices,
+                data_source=self._datasource,
+                order_type=order_type,
+        )
+        # 提交交易订单
+        submitted_ids = submit_orders(order_ids=order_ids, data_source=self._datasource)
+        self.publish_event('orders', list(order_ids))
+
+        submitted_orders = []
+        for order_id, symbol, position, direction, qty, price in zip(
+                submitted_ids, symbols, positions, directions, quantities, prices):
+            if order_id is None:
+                continue
+            submitted_orders.append({
+                'order_id':   order_id,
+                'symbol':     symbol,
+                'position':   position,
+                'direction':  direction,
+                'order_type': order_type,
+                'qty':        qty,
+                'price':      price,
+                'status':     'submitted',
+            })
+
+        return submitted_orders
+
     def log_trade_result(self, full_trade_result) -> None:
         """ 根据返回的完整交易记录full_trade_result，生成交易记录
         trade_log和系统记录system_log，
@@ -1598,6 +2001,10 @@ class Trader(object):
         else:
             self.send_message('No break point found, will using default configurations...')
 
+        # 载入账户现金和持仓，建立内存账本
+        self.send_message('Loading account cash and positions...')
+        self.reload_account_state()
+
         # 初始化trader的状态，初始化任务计划
         self.status = 'sleeping'
         self.send_message('Checking trade day and initializing schedule...')
@@ -1618,6 +2025,13 @@ class Trader(object):
         self.send_message(f'Break point saved to {break_point_file_name}')
         self.send_message('Stopping Trader, the broker will be stopped as well...')
         self._broker.status = 'stopped'
+        if self._strategy_executor is not None:
+            self._strategy_executor.shutdown(wait=False)
+            self._strategy_executor = None
+        if self._trade_log is not None:
+            self._trade_log.close()
+            self._trade_log = None
+        self._release_account_state()
         self.status = 'stopped'
 
     def _sleep(self) -> None:
@@ -1646,6 +2060,24 @@ class Trader(object):
         msg = Text(f'Trader is resumed to previous status({self.status})', style='bold red')
         self.send_message(message=msg)
 
+    def _get_strategy_executor(self):
+        """ 获取用于并行运行交易策略的线程池，线程数量由配置参数live_strategy_workers确定
+
+        Returns
+        -------
+        executor: ThreadPoolExecutor or None
+            线程池，如果live_strategy_workers小于等于1，返回None，此时所有策略依次运行
+        """
+        max_workers = self._config['live_strategy_workers']
+        if max_workers <= 1:
+            return None
+        if self._strategy_executor is None:
+            self._strategy_executor = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix='qt_strategy',
+            )
+        return self._strategy_executor
+
     def _run_strategy(self, strategy_ids=None) -> int:
         """ 运行交易策略
 
@@ -1671,10 +2103,10 @@ class Trader(object):
         operator = self._operator
         signal_type = operator.signal_type
         shares = self.asset_pool
-        own_amounts = self.account_positions['qty']
-        available_amounts = self.account_positions['available_qty']
-        own_cash = self.account_cash[0]
-        available_cash = self.account_cash[1]
+        account_positions = self.account_positions
+        own_amounts = account_positions['qty']
+        available_amounts = account_positions['available_qty']
+        own_cash, available_cash, _ = self.account_cash
         config = self._config
         # window_length = self._operator.max_window_length
         #
@@ -1736,6 +2168,7 @@ class Trader(object):
                 account_id=self.account_id,
                 shares=shares,
                 data_source=self._datasource,
+                positions=self._get_position_records(),
         )
         # 当前价格是hist_op的最后一行, 如果需要用latest_data_cycle，最新的实时数据已经包含在hist_op中了
         timing_type = operator[strategy_ids[0]].strategy_timing
@@ -1758,10 +2191,13 @@ class Trader(object):
             raise KeyError(f'Operator can not work in live mode when its operation type is "batch", set '
                            f'"Operator.op_type = "step"')
         else:
+            # 同时运行多个策略时，各个策略在线程池中并行生成信号，再混合为最终的交易信号
+            executor = self._get_strategy_executor() if len(strategy_ids) > 1 else None
             op_signal = operator.create_signal(
                     trade_data=trade_data,
                     sample_idx=0,
-                    price_type_idx=0
+                    price_type_idx=0,
+                    executor=executor,
             )  # 生成交易清单
         self.send_message(f'ran strategy and created signal: {op_signal}', debug=True)
 
@@ -1786,41 +2222,34 @@ class Trader(object):
                           f'quantities: {quantities}\n'
                           f'current_prices: {quoted_prices}\n',
                           debug=True)
-        for sym, name, pos, d, qty, price, remark in zip(
-                symbols,
-                names,
-                positions,
-                directions,
-                quantities,
-                quoted_prices,
-                remarks,
-        ):
+        for remark in remarks:
             if remark:
                 self.send_message(remark)
-            if qty <= 0.001:
-                continue
-
-            trade_order = self.submit_trade_order(
-                    symbol=sym,
-                    position=pos,
-                    direction=d,
-                    order_type='market',
-                    qty=qty,
-                    price=price,
-            )
-
-            if trade_order:
-                order_id = trade_order['order_id']
-                self._broker.order_queue.put(trade_order)
-                # format the message depending on buy/sell orders
-                msg = Text(f'<NEW ORDER {order_id}>: <{name} - {sym}> ', style='bold')
-                if d == 'buy':  # red for buy
-                    msg.append(f'{d}-{pos} {qty} shares @ {price}', style='bold red')
-                else:  # green for sell
-                    msg.append(f'{d}-{pos} {qty} shares @ {price}', style='bold green')
-                # 记录已提交的交易数量
-                self.send_message(msg)
-                submitted_qty += 1
+        # 所有数量有效的订单一次性写入数据库并提交，再一起放入broker的订单队列
+        valid_orders = [i for i, qty in enumerate(quantities) if qty > 0.001]
+        trade_orders = self.submit_trade_orders(
+                symbols=[symbols[i] for i in valid_orders],
+                positions=[positions[i] for i in valid_orders],
+                directions=[directions[i] for i in valid_orders],
+                order_type='market',
+                quantities=[quantities[i] for i in valid_orders],
+                prices=[quoted_prices[i] for i in valid_orders],
+        )
+        self._broker.submit_orders(trade_orders)
+        order_names = dict(zip(symbols, names))
+        for trade_order in trade_orders:
+            order_id = trade_order['order_id']
+            sym, pos, d = trade_order['symbol'], trade_order['position'], trade_order['direction']
+            qty, price = trade_order['qty'], trade_order['price']
+            # format the message depending on buy/sell orders
+            msg = Text(f'<NEW ORDER {order_id}>: <{order_names[sym]} - {sym}> ', style='bold')
+            if d == 'buy':  # red for buy
+                msg.append(f'{d}-{pos} {qty} shares @ {price}', style='bold red')
+            else:  # green for sell
+                msg.append(f'{d}-{pos} {qty} shares @ {price}', style='bold green')
+            # 记录已提交的交易数量
+            self.send_message(msg)
+            submitted_qty += 1
 
         self.send_message(f'<RAN STRATEGY {tuple(strategy_ids)}>: {submitted_qty} orders submitted in total.')
         return submitted_qty
@@ -1848,6 +2277,7 @@ class Trader(object):
             # 交易结果处理, 更新账户和持仓信息, 如果交易结果导致错误，不会更新账户和持仓信息
             trade_result = process_trade_result(result, data_source=self._datasource)
             result_id = trade_result['result_id']
+            self.publish_event('orders', [result['order_id']])
 
         except Exception as e:
             self.send_message(f'{e} Error occurred during processing trade result, result will be ignored')
@@ -1872,6 +2302,7 @@ class Trader(object):
         # 记录交割结果到trade_log和system_log
         if deliver_result.get('delivery_status') != 'DL':
             return
+        self.publish_event('orders', [deliver_result['order_id']])
         self.log_cash_delivery(delivery_result=deliver_result)
         self.log_qty_delivery(delivery_result=deliver_result)
 
@@ -1914,6 +2345,9 @@ class Trader(object):
                 data_source=self._datasource,
                 config=self._config,
         )
+        delivered_ids = [res['order_id'] for res in delivery_results if res.get('delivery_status') == 'DL']
+        if delivered_ids:
+            self.publish_event('orders', delivered_ids)
 
         # 生成交割结果信息推送到信息队列
         for res in delivery_results:
@@ -1943,52 +2377,48 @@ class Trader(object):
         # TODO: 已经submitted的订单如果已经有了成交结果，只是尚未记录的，则不应该取消，
         #   此处应该检查broker的result_queue，如果有结果，则推迟执行post_close，直到
         #   result_queue中的结果全部处理完毕，或者超过一定时间
+        canceled_ids = []
         if not order_queue.empty():
             self.send_message('unprocessed orders found, these orders will be canceled')
             while not order_queue.empty():
                 order = order_queue.get()
                 order_id = order['order_id']
                 cancel_order(order_id, data_source=self._datasource)  # 生成订单取消记录，并记录到数据库
+                canceled_ids.append(order_id)
                 self.send_message(f'canceled unprocessed order: {order_id}')
                 order_queue.task_done()
         # 检查今日成交订单，确认是否有"部分成交"的订单，如果有，生成取消订单，取消尚未成交的部分
-        partially_filled_orders = query_trade_orders(
-                account_id=self.account_id,
-                status='partial-filled',
-                data_source=self._datasource,
-        )
+        partially_filled_orders = self._open_orders('partial-filled')
         self.send_message(f'Looking for partial-filled orders... {len(partially_filled_orders)} found!')
         for order_id in partially_filled_orders.index:
             # 对于所有没有完全成交的订单，生成取消订单，取消剩余的部分
             cancel_order(order_id=order_id, data_source=self._datasource)
+            canceled_ids.append(order_id)
             self.send_message(f'Canceled remaining qty of partial-filled order: {order_id}')
 
         # 检查未提交订单，确认是否有"created"的订单，如果有，生成取消订单
-        unsubmitted_orders = query_trade_orders(
-                account_id=self.account_id,
-                status='created',
-                data_source=self._datasource,
-        )
+        unsubmitted_orders = self._open_orders('created')
         self.send_message(f'Looking for Un-submitted orders... {len(unsubmitted_orders)} found!')
 
         for order_id in unsubmitted_orders.index:
             # 对于所有未成交的订单，生成取消订单
             cancel_order(order_id=order_id, data_source=self._datasource)
+            canceled_ids.append(order_id)
             self.send_message(f'Canceled un-submitted order: {order_id}')
 
         # 检查未成交订单，确认是否有"submitted"的订单，如果有，生成取消订单
-        unfilled_orders = query_trade_orders(
-                account_id=self.account_id,
-                status='submitted',
-                data_source=self._datasource,
-        )
+        unfilled_orders = self._open_orders('submitted')
         self.send_message(f'Looking for Unfilled orders...{len(unfilled_orders)} found!')
 
         for order_id in unfilled_orders.index:
             # 对于所有未成交的订单，生成取消订单
             cancel_order(order_id=order_id, data_source=self._datasource)
+            canceled_ids.append(order_id)
             self.send_message(f'Canceled unfilled order: {order_id}')
 
+        if canceled_ids:
+            self.publish_event('orders', canceled_ids)
+
     def _change_date(self) -> None:
         """ 改变日期，在日期改变（午夜）前执行的操作，包括：
 
@@ -2164,44 +2594,42 @@ class Trader(object):
         """
         if current_time is None:
             current_time = self.get_current_tz_datetime().time()  # 产生本地时间
-        task_added = False  # 是否添加了任务
-        next_task = 'None'
-        import datetime as dt
-        convenience_date = dt.datetime(2000, 1, 1)
-        current_datetime = dt.datetime.combine(convenience_date, current_time)
-        end_of_the_day = dt.datetime.combine(convenience_date, dt.time(23, 59, 59))
-        count_down_to_next_task = (end_of_the_day - current_datetime).total_seconds()  # 到下一个最近任务的倒计时，单位为秒
-        if count_down_to_next_task <= 0:
-            count_down_to_next_task = 1
-        # 对比当前时间和任务日程中的任务时间，如果任务时间小于等于当前时间，添加任务到任务队列并删除该任务
-        for idx, task in enumerate(self.task_daily_schedule):
-            task_time = pd.to_datetime(task[0], utc=True).time()
-            # 当task_time小于等于current_time时，添加task，同时删除该task
-            if task_time <= current_time:
-                task_tuple = self.task_daily_schedule.pop(idx)
-                self.send_message(f'adding task: {task_tuple} from agenda', debug=True)
-                if len(task_tuple) == 3:
-                    task = task_tuple[1:3]
-                elif len(task_tuple) == 2:
-                    task = task[1]
-                else:
-                    err = ValueError(f'Invalid task tuple: No task found in {task_tuple}')
-                    raise err
-
-                self.send_message(f'current time {current_time} >= task time {task_time}, '
-                                      f'adding task: {task} from agenda', debug=True)
-                self._add_task_to_queue(task)
-                task_added = True
-            # 计算count_down_to_next_task秒数
+        current_seconds = task_time_to_seconds(current_time)
+        with self._schedule_lock:
+            schedule = self._task_daily_schedule
+            task_seconds = self._task_schedule_seconds
+            # 任务日程已经按执行时间排序，第一个任务没有到期时，其余的任务也都没有到期
+            if task_seconds and (task_seconds[0] <= current_seconds):
+                # 任务时间小于等于当前时间的任务全部到期，从日程中取出
+                due_count = bisect.bisect_right(task_seconds, current_seconds)
+                due_tasks = schedule[:due_count]
+                del schedule[:due_count]
+                del task_seconds[:due_count]
+            else:
+                due_tasks = []
+            # 到下一个最近任务的倒计时，单位为秒，如果已经没有任务，则倒计时到当天结束
+            if schedule:
+                next_task = schedule[0]
+                count_down_to_next_task = task_seconds[0] - current_seconds
             else:
-                task_datetime = dt.datetime.combine(convenience_date, task_time)
-                count_down_sec = (task_datetime - current_datetime).total_seconds()
-                if count_down_sec < count_down_to_next_task:
-                    count_down_to_next_task = count_down_sec
-                    next_task = task
-        if not task_added:
-            self.next_task = next_task
-            self.count_down_to_next_task = count_down_to_next_task
+                next_task = 'None'
+                count_down_to_next_task = max(task_time_to_seconds('23:59:59') - current_seconds, 1)
+
+        for task_tuple in due_tasks:
+            self.send_message(f'adding task: {task_tuple} from agenda', debug=True)
+            if len(task_tuple) == 3:
+                task = task_tuple[1:3]
+            elif len(task_tuple) == 2:
+                task = task_tuple[1]
+            else:
+                err = ValueError(f'Invalid task tuple: No task found in {task_tuple}')
+                raise err
+
+            self.send_message(f'current time {current_time} >= task time {task_tuple[0]}, '
+                              f'adding task: {task} from agenda', debug=True)
+            self._add_task_to_queue(task)
+        self.next_task = next_task
+        self.count_down_to_next_task = count_down_to_next_task
 
     def _initialize_schedule(self, current_time=None) -> None:
         """ 初始化交易日的任务日程, 在任务清单中添加以下任务：
@@ -2239,6 +2667,12 @@ class Trader(object):
         mca = pd.to_datetime(self._config['market_close_time_am']).time()
         moc = pd.to_datetime(self._config['market_open_time_pm']).time()
         mcc = pd.to_datetime(self._config['market_close_time_pm']).time()
+        current_seconds = task_time_to_seconds(current_time)
+
+        def _tasks_due_after_now(keep_tasks):
+            return [task for task, task_seconds in zip(self._task_daily_schedule, self._task_schedule_seconds)
+                    if (task_seconds >= current_seconds) or (task[1] in keep_tasks)]
+
         if current_time < moa:
             # before market morning open, keep all tasks
             self.send_message('before market morning open, keeping all tasks', debug=True)
@@ -2246,35 +2680,21 @@ class Trader(object):
             # market open time, remove all task before current time except pre_open
             self.send_message('market open, removing all tasks before current time except pre_open and open_market',
                               debug=True)
-            self.task_daily_schedule = [task for task in self.task_daily_schedule if
-                                        (pd.to_datetime(task[0]).time() >= current_time) or
-                                        (task[1] in ['pre_open',
-                                                     'open_market'])]
+            self.task_daily_schedule = _tasks_due_after_now(['pre_open', 'open_market'])
         elif mca < current_time < moc:
             # before market afternoon open, remove all task before current time except pre_open, open_market and sleep
             self.send_message('before market afternoon open, removing all tasks before current time '
                               'except pre_open, open_market and sleep', debug=True)
-            self.task_daily_schedule = [task for task in self.task_daily_schedule if
-                                        (pd.to_datetime(task[0]).time() >= current_time) or
-                                        (task[1] in ['pre_open',
-                                                     'open_market',
-                                                     'close_market'])]
+            self.task_daily_schedule = _tasks_due_after_now(['pre_open', 'open_market', 'close_market'])
         elif moc < current_time < mcc:
             # market afternoon open, remove all task before current time except pre_open, open_market, sleep, and wakeup
             self.send_message('market afternoon open, removing all tasks before current time '
                               'except pre_open, open_market, sleep and wakeup', debug=True)
-            self.task_daily_schedule = [task for task in self.task_daily_schedule if
-                                        (pd.to_datetime(task[0]).time() >= current_time) or
-                                        (task[1] in ['pre_open',
-                                                     'open_market',
-                                                     'close_market'])]
+            self.task_daily_schedule = _tasks_due_after_now(['pre_open', 'open_market', 'close_market'])
         elif mcc < current_time:
             # after market close, remove all task before current time except pre_open and post_close
             self.send_message('market closed, removing all tasks before current time except post_close', debug=True)
-            self.task_daily_schedule = [task for task in self.task_daily_schedule if
-                                        (pd.to_datetime(task[0]).time() >= current_time) or
-                                        (task[1] in ['pre_open',
-                                                     'post_close'])]
+            self.task_daily_schedule = _tasks_due_after_now(['pre_open', 'post_close'])
         else:
             err = ValueError(f'Invalid current time: {current_time}')
             raise err
@@ -2284,18 +2704,26 @@ class Trader(object):
     def _update_live_price(self) -> None:
         """获取实时数据，并将实时数据更新到self.live_price中，此函数可能出现Timeout或运行失败"""
         self.send_message(f'Acquiring live price data', debug=True)
-        from qteasy.emfuncs import stock_live_kline_price
-        real_time_data = stock_live_kline_price(symbols=self.asset_pool)
+        real_time_data = self._price_feed.fetch_quotes(self.asset_pool)
         if real_time_data.empty:
             # empty data downloaded
             self.send_message(f'Something went wrong, failed to download live price data.', debug=True)
             return
-        real_time_data.set_index('symbol', inplace=True)
         # 将real_time_data 赋值给self.live_price
+        prev_prices = self.live_price
         self.live_price = real_time_data
+        self._record_last_prices(real_time_data)
+        self._publish_price_changes(prev_prices, real_time_data)
         self.send_message(f'acquired live price data, live prices updated!', debug=True)
         return
 
+    def _record_last_prices(self, quotes) -> None:
+        """将获取的实时价格记录到datasource的最新已知价格中，供没有实时价格时估算持仓市值"""
+        if (quotes is None) or quotes.empty or ('close' not in quotes.columns):
+            return
+        times = quotes['trade_time'] if 'trade_time' in quotes.columns else None
+        self._datasource.last_prices.update('live', quotes.index, quotes['close'], times)
+
     TASK_WHITELIST = {
         'stopped':  ['start'],
         'running':  ['stop', 'sleep', 'pause', 'run_strategy', 'process_result', 'pre_open',
@@ -23,7 +23,7 @@ import numpy as np
 import pandas as pd
 
 from cmd import Cmd
-from threading import Timer
+from threading import Timer, Lock
 from rich.text import Text
 
 from qteasy.trading_util import get_symbol_names
@@ -606,6 +606,10 @@ class TraderShell(Cmd):
         self._watch_list = self.trader.watch_list  # set default watch list
         self._watched_price_string = ' == Realtime prices can be displayed here. ' \
                                'Use "watch" command to add stocks to watch list. =='  # watched prices string
+        # 每个symbol的价格信息片段，收到价格变动事件时只重新生成价格发生变化的片段
+        self._watched_price_segments = {}
+        self._changed_watch_symbols = set()
+        self._watch_lock = Lock()
 
         self.argparsers = {}
 
@@ -631,12 +635,17 @@ class TraderShell(Cmd):
         """ toggle debug value"""
         self.trader.debug = not self.trader.debug
 
-    def format_watched_prices(self):
+    def format_watched_prices(self, symbols=None):
         """ 根据watch list返回清单中股票的信息：代码、名称、当前价格、涨跌幅
+
+        如果给出symbols，只重新生成这些股票的价格信息，其余股票使用此前生成的价格信息
+
+        Parameters
+        ----------
+        symbols: list of str, optional
+            价格发生变化的股票代码，默认重新生成所有股票的价格信息
         """
         watched_prices = self.trader.watched_prices
-        symbols = self._watch_list
-        watched_price_string = Text()
 
         if watched_prices is None:
             self._watched_price_string = ' == Live prices not available at the moment. =='
@@ -647,26 +656,44 @@ class TraderShell(Cmd):
             return
         # remove duplicated symbols in watched_prices and symbols
         watched_prices = watched_prices[~watched_prices.index.duplicated(keep='first')]
-        symbols = list(set(symbols))
+        watch_list = list(dict.fromkeys(self._watch_list))
 
-        # start to build watched price strings
-        for symbol in symbols:
-            if symbol in watched_prices.index:
-                change = watched_prices.loc[symbol, 'change']
-                watched_prices_seg = f' ={symbol[:-3]}{watched_prices.loc[symbol, "name"]}/' \
-                                     f'{watched_prices.loc[symbol, "close"]:.2f}/' \
-                                     f'{watched_prices.loc[symbol, "change"]:+.2%}'
-                if change > 0:
-                    watched_price_string.append(watched_prices_seg, style='bold red')
-                elif change < 0:
-                    watched_price_string.append(watched_prices_seg, style='bold green')
-                else:
-                    watched_price_string.append(watched_prices_seg)
+        if symbols is None:
+            self._watched_price_segments = {}
+        else:
+            for symbol in symbols:
+                self._watched_price_segments.pop(symbol, None)
 
-            else:
-                watched_price_string += f' ={symbol[:-3]}/--/---'
+        # start to build watched price strings, segments are only formatted for changed symbols
+        watched_price_string = Text()
+        for symbol in watch_list:
+            segment = self._watched_price_segments.get(symbol)
+            if segment is None:
+                segment = self._format_price_segment(symbol, watched_prices)
+                self._watched_price_segments[symbol] = segment
+            watched_price_string.append_text(segment)
         self._watched_price_string = watched_price_string
 
+    @staticmethod
+    def _format_price_segment(symbol, watched_prices) -> Text:
+        """ 生成一个股票的价格信息片段：代码、名称、当前价格、涨跌幅 """
+        if symbol not in watched_prices.index:
+            return Text(f' ={symbol[:-3]}/--/---')
+        change = watched_prices.loc[symbol, 'change']
+        watched_prices_seg = f' ={symbol[:-3]}{watched_prices.loc[symbol, "name"]}/' \
+                             f'{watched_prices.loc[symbol, "close"]:.2f}/' \
+                             f'{change:+.2%}'
+        if change > 0:
+            return Text(watched_prices_seg, style='bold red')
+        elif change < 0:
+            return Text(watched_prices_seg, style='bold green')
+        return Text(watched_prices_seg)
+
+    def _on_price_event(self, event_type, quotes) -> None:
+        """ 价格变动事件的回调函数，记录价格发生变化的股票，在shell主循环中更新价格信息 """
+        with self._watch_lock:
+            self._changed_watch_symbols.update(quotes.index)
+
     def filter_order_details(self,
                              order_details: pd.DataFrame,
                              *,
@@ -1251,6 +1278,8 @@ class TraderShell(Cmd):
         if args.clear:
             self._watch_list = []
 
+        # watch list改变后重新生成所有股票的价格信息
+        self.format_watched_prices()
         rich.print(f'current watch list: {self._watch_list}')
         if illegal_symbols:
             rich.print(f'Illegal symbols in arguments: {illegal_symbols}, input symbols in the form like "000651.SZ"')
@@ -2195,6 +2224,7 @@ class TraderShell(Cmd):
         from threading import Thread
 
         self.do_dashboard('')
+        self.trader.subscribe_events(self._on_price_event, event_types='prices')
         Thread(target=self.trader.run).start()
         Thread(target=self.trader.broker.run).start()
 
@@ -2247,8 +2277,13 @@ class TraderShell(Cmd):
                             t = Thread(target=self.trader.update_watched_prices, daemon=True)
                             t.start()
 
-                        self.format_watched_prices()
                         live_price_refresh_timer = 0
+                    # 只在收到价格变动事件后重新生成发生变化的价格信息
+                    with self._watch_lock:
+                        changed_symbols = self._changed_watch_symbols
+                        self._changed_watch_symbols = set()
+                    if changed_symbols:
+                        self.format_watched_prices(changed_symbols)
                 elif self.status == 'command':
                     # get user command input and do commands
                     sys.stdout.write('will enter interactive mode.\n')
@@ -11,7 +11,8 @@
 
 import time
 
-from threading import Thread
+from queue import Queue, Empty
+from threading import Thread, RLock
 
 from textual import work, on
 from textual.app import App, ComposeResult
@@ -20,6 +21,8 @@ from textual.screen import ModalScreen
 from textual.widgets import Header, Footer, Button, Static, RichLog, DataTable, TabbedContent, Tree, Digits
 from textual.widgets import TabPane, Label, Input
 
+import pandas as pd
+
 from rich.text import Text
 
 from .utilfuncs import sec_to_duration
@@ -46,7 +49,71 @@ class StrategyTree(Tree):
         return
 
 
-class HoldingTable(DataTable):
+class LiveTable(DataTable):
+    """A data table whose rows are identified by keys and patched in place.
+
+    Each row is identified by the value in its first column, e.g. the symbol or the order id.
+    When a row is updated, only the cells whose content or style has changed are redrawn,
+    so that the table can be refreshed frequently without rebuilding all rows.
+    """
+
+    df_columns = ()
+    headers = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._row_cells = {}
+
+    def add_keyed_columns(self) -> None:
+        """ Add columns with headers, columns are keyed by 'key' and df_columns."""
+        self.add_columns(*zip(self.headers, ('key',) + tuple(self.df_columns)))
+
+    def clear(self, columns: bool = False):
+        self._row_cells = {}
+        return super().clear(columns=columns)
+
+    @property
+    def row_keys(self) -> list:
+        """ Keys of all rows in the table."""
+        return list(self._row_cells)
+
+    def patch_row(self, key, cells) -> None:
+        """ Add a new row, or update the cells that have changed in an existing row.
+
+        Parameters
+        ----------
+        key : str or int
+            The key of the row, which is also displayed in the first column.
+        cells : list
+            The cells of the row, excluding the key.
+        """
+        key = str(key)
+        cells = [key] + list(cells)
+        prev_cells = self._row_cells.get(key)
+        if prev_cells is None:
+            self.add_row(*cells, key=key)
+        else:
+            for column_key, prev_cell, cell in zip(('key',) + tuple(self.df_columns), prev_cells, cells):
+                if _cell_signature(prev_cell) != _cell_signature(cell):
+                    self.update_cell(key, column_key, cell)
+        self._row_cells[key] = cells
+
+    def remove_rows(self, keys) -> None:
+        """ Remove rows with given keys, keys not in the table are ignored."""
+        for key in keys:
+            key = str(key)
+            if self._row_cells.pop(key, None) is not None:
+                self.remove_row(key)
+
+
+def _cell_signature(cell) -> tuple:
+    """ content and style of a cell, used to check if a cell needs to be redrawn."""
+    if isinstance(cell, Text):
+        return cell.plain, str(cell.style)
+    return str(cell), ''
+
+
+class HoldingTable(LiveTable):
     """A widget to display current holdings."""
 
     BINDINGS = [
@@ -62,6 +129,23 @@ class HoldingTable(DataTable):
                "Name", "Qty", "Available", "Price", "Cost",
                "Total Cost", "Value", "Profit", "Profit Ratio")
 
+    @staticmethod
+    def render_row(row) -> list:
+        """ Render the cells of a holding row from values in df_columns."""
+        row = list(row)
+        earning_rate = row[8]
+        for i in range(1, 8):
+            row[i] = f'{row[i]:.2f}'
+        row[8] = f"{earning_rate:.2%}"
+
+        if earning_rate > 0:
+            row_color = 'red'
+        elif earning_rate < 0:
+            row_color = 'green'
+        else:
+            row_color = ''
+        return [Text(str(cell), style=f"bold {row_color}") for cell in row]
+
     def action_buy_stock(self) -> None:
         """ Action to buy a stock."""
 
@@ -137,7 +221,7 @@ class HoldingTable(DataTable):
         return symbol, price, position
 
 
-class OrderTable(DataTable):
+class OrderTable(LiveTable):
     """A widget to display current holdings."""
 
     BINDINGS = [
@@ -156,6 +240,23 @@ class OrderTable(DataTable):
                "Submitted", "Status", "Filled Price", "Filled Qty", "Canceled Qty", "Fee",
                "Execution Time", "Delivery")
 
+    @staticmethod
+    def render_row(row) -> list:
+        """ Render the cells of an order row from values in df_columns."""
+        row = list(row)
+        row[4] = f'{row[4]:.2f}'
+
+        if row[7] == 'canceled':
+            row_color = 'gray'
+        elif row[2] == 'sell':
+            row_color = 'green'
+        elif row[2] == 'buy':
+            row_color = 'red'
+        else:
+            row_color = 'yellow'
+
+        return row[:3] + [Text(str(cell), style=f"bold {row_color}") for cell in row[3:]]
+
     def action_buy_stock(self) -> None:
         """ Action to buy a stock."""
 
@@ -230,7 +331,7 @@ class OrderTable(DataTable):
         return symbol, position
 
 
-class WatchTable(DataTable):
+class WatchTable(LiveTable):
     """A widget to display current holdings."""
 
     BINDINGS = [
@@ -248,6 +349,21 @@ class WatchTable(DataTable):
                "Name", "Price", "Last Close", "Open", "High",
                "Low", "Volume", "Amount", "Change")
 
+    @staticmethod
+    def render_row(row) -> list:
+        """ Render the cells of a watched price row from values in df_columns."""
+        row = list(row)
+        change = row[8]
+        row[8] = f"{change:.2%}"
+        if change > 0:
+            row_color = 'red'
+        elif change < 0:
+            row_color = 'green'
+        else:
+            row_color = ''
+
+        return row[:1] + [Text(str(cell), style=f"bold {row_color}") for cell in row[1:]]
+
     def action_add_symbol(self) -> None:
         """Action to add a symbol to watch list from a dialog."""
         def on_input(input_string):
@@ -352,7 +468,7 @@ class WatchTable(DataTable):
         return symbol, price
 
 
-class TradeLogTable(DataTable):
+class TradeLogTable(LiveTable):
     """A widget to display all trade logs."""
 
     BINDINGS = [
@@ -368,6 +484,25 @@ class TradeLogTable(DataTable):
                "Direction", "Qty", "Price", "Trade fee", "Holding",
                "Available", "Holding cost", "Own cash", "Available cash")
 
+    @staticmethod
+    def render_row(row) -> list:
+        """ Render the cells of a trade log row from values in df_columns."""
+        row = ['' if cell is None else cell for cell in row]
+        reason = row[1]
+        direction = row[5]
+        if reason == 'manual':
+            row_color = 'yellow'
+        elif reason == 'delivery':
+            row_color = 'blue'
+        elif direction == 'sell':
+            row_color = 'bold green'
+        elif direction == 'buy':
+            row_color = 'bold red'
+        else:
+            row_color = ''
+
+        return [Text(str(cell), style=row_color) for cell in row]
+
     def action_refresh_table(self) -> None:
         """ refresh table"""
         self.app.refresh_trade_log()
@@ -503,6 +638,11 @@ class TraderApp(App):
         self.trader = trader
         self.status:str = 'init'
         self.refresh_ui = True
+        # trader events are queued and processed in the trader event loop, tables are patched
+        # only where positions, orders, prices or trade logs have changed
+        self._trader_events = Queue()
+        self._table_lock = RLock()
+        self._holding_positions = None
 
     def trader_event_loop(self):
         """ Event loop for the trader. continually check message queue of trader and broker,
@@ -527,6 +667,9 @@ class TraderApp(App):
         self.refresh_operator_tree()
 
         cum_time_counter = 0
+        watch_time_counter = 0
+        watch_refresh_interval = self.trader.get_config(
+                'watched_price_refresh_interval')['watched_price_refresh_interval'] * 10
 
         while True:
             time.sleep(0.1)
@@ -548,11 +691,9 @@ class TraderApp(App):
                 msg = self.trader.message_queue.get()
                 system_log.write(msg)
 
-                if any(words in msg for words in ['RAN STRATEGY', 'RESULT', 'DELIVERY']):
-                    # if ran strategy or got result from broker, refresh UI
-                    self.refresh_order()
-                    self.refresh_holdings()
-                    self.refresh_trade_log()
+            # patch the tables with changes published by the trader
+            if self.refresh_ui:
+                self.process_trader_events()
 
             # check the message queue of the broker
             if not self.trader.broker.broker_messages.empty():
@@ -564,17 +705,22 @@ class TraderApp(App):
             else:
                 info_refresh_interval = 50  # every 5 seconds while running
 
-            # refresh the operator tree every interval
+            # acquire watched prices every interval, the watch list is patched by price events
+            watch_time_counter += 1
+            if watch_time_counter >= watch_refresh_interval:
+                if self.trader.is_market_open:
+                    self.acquire_watched_prices()
+                watch_time_counter = 0
+
             cum_time_counter += 1
+
+            # refresh the information panels and the operator tree every interval
             if cum_time_counter % info_refresh_interval == 0:
 
                 trader_info = self.trader.info(detail=True)
                 self.refresh_values(trader_info)
                 self.refresh_info_panels(trader_info)
                 self.refresh_operator_tree()
-                self.refresh_holdings()
-                self.refresh_watches()
-                self.refresh_trade_log()
                 cum_time_counter = 0
 
             if self.trader.status not in ['running', 'paused']:
@@ -584,101 +730,103 @@ class TraderApp(App):
 
     @work(exclusive=True, thread=True)
     def refresh_holdings(self):
-        """Refresh the holdings table."""
+        """Refresh all rows in the holdings table."""
         if not self.refresh_ui:
             return
-        # get the holdings from the trader
+        self.patch_holdings()
+
+    def patch_holdings(self, symbols=None):
+        """Update rows of given symbols in the holdings table, update all rows if symbols is None.
+
+        Rows of symbols that are no longer held are removed from the table.
+        """
         holdings = self.query_one(HoldingTable)
-        holdings.clear()
         pos = self.trader.account_position_info
-        if pos.empty:
-            return
         pos = pos.reindex(columns=holdings.df_columns)
-        list_tuples = list(pos.itertuples(name=None))
-
-        for row in list_tuples:
-            row = list(row)
-            earning_rate = row[9]
-            row[2] = f'{row[2]:.2f}'
-            row[3] = f'{row[3]:.2f}'
-            row[4] = f'{row[4]:.2f}'
-            row[5] = f'{row[5]:.2f}'
-            row[6] = f'{row[6]:.2f}'
-            row[7] = f'{row[7]:.2f}'
-            row[8] = f'{row[8]:.2f}'
-            row[9] = f"{earning_rate:.2%}"
-
-            if earning_rate > 0:
-                row_color = 'red'
-            elif earning_rate < 0:
-                row_color = 'green'
-            else:
-                row_color = ''
-            styled_row = [
-                Text(str(cell), style=f"bold {row_color}") for cell in row
-            ]
-            holdings.add_row(*styled_row)
+        pos = pos[~pos.index.duplicated(keep='first')]
+        with self._table_lock:
+            self._holding_positions = pos
+            if symbols is None:
+                symbols = holdings.row_keys + [symbol for symbol in pos.index if symbol not in holdings.row_keys]
+            holdings.remove_rows([symbol for symbol in symbols if symbol not in pos.index])
+            for symbol in symbols:
+                if symbol in pos.index:
+                    holdings.patch_row(symbol, holdings.render_row(pos.loc[symbol]))
+
+    def patch_holding_prices(self, quotes):
+        """Update current prices, values and profits in the holdings table with new quotes."""
+        holdings = self.query_one(HoldingTable)
+        with self._table_lock:
+            pos = self._holding_positions
+            if pos is None or pos.empty:
+                return
+            symbols = [symbol for symbol in quotes.index if symbol in pos.index]
+            if not symbols:
+                return
+            pos = pos.copy()
+            pos.loc[symbols, 'current_price'] = quotes.loc[symbols, 'close'].astype('float').values
+            pos['market_value'] = pos['qty'] * pos['current_price']
+            pos['profit'] = pos['market_value'] - pos['total_cost']
+            pos['profit_ratio'] = pos['profit'] / pos['total_cost']
+            self._holding_positions = pos
+            for symbol in symbols:
+                holdings.patch_row(symbol, holdings.render_row(pos.loc[symbol]))
 
     @work(exclusive=True, thread=True)
     def refresh_order(self):
-        """Refresh the order table."""
+        """Refresh all rows in the order table."""
         if not self.refresh_ui:
             return
+        self.patch_orders()
+
+    def patch_orders(self, order_ids=None):
+        """Update rows of given orders in the order table, update all orders if order_ids is None."""
         orders = self.query_one("#orders")
-        orders.clear()
-        order_list = self.trader.history_orders(with_trade_results=True)
-        if order_list.empty:
-            return
+        order_list = self.trader.history_orders(with_trade_results=True, order_ids=order_ids)
         order_list = order_list.reindex(columns=orders.df_columns)
-        list_tuples = list(order_list.itertuples(name=None))
-        for row in list_tuples:
-            row = list(row)
-            row[5] = f'{row[5]:.2f}'
-            
-            if row[8] == 'canceled':
-                row_color = 'gray'
-            elif row[3] == 'sell':
-                row_color = 'green'
-            elif row[3] == 'buy':
-                row_color = 'red'
-            else:
-                row_color = 'yellow'
-
-            styled_row = row[:4]
-            styled_row += [
-                Text(str(cell), style=f"bold {row_color}") for cell in row[4:]
-            ]
-            orders.add_row(*styled_row)
+        with self._table_lock:
+            if order_ids is None:
+                orders.remove_rows([key for key in orders.row_keys if int(key) not in order_list.index])
+            for order_id, row in zip(order_list.index, order_list.itertuples(index=False, name=None)):
+                orders.patch_row(order_id, orders.render_row(row))
 
     @work(exclusive=True, thread=True)
     def refresh_watches(self):
-        """Refresh the watch list."""
+        """Acquire watched prices and refresh all rows in the watch list."""
         if not self.refresh_ui:
             return
-        watches = self.query_one('#watches')
         watched_prices = self.trader.update_watched_prices()
-        watched_prices = watched_prices.reindex(columns=watches.df_columns)
-        watches.clear()
-        if watched_prices.empty:
+        if watched_prices is None:
             return
+        self.patch_watches(watched_prices, remove_unwatched=True)
 
-        list_tuples = list(watched_prices.itertuples(name=None))
-        for row in list_tuples:
-            row = list(row)
-            change = row[9]
-            row[9] = f"{change:.2%}"
-            if change > 0:
-                row_color = 'red'
-            elif change < 0:
-                row_color = 'green'
-            else:
-                row_color = ''
+    @work(exclusive=True, thread=True)
+    def acquire_watched_prices(self):
+        """Acquire watched prices, the watch list is patched when price events are received."""
+        self.trader.update_watched_prices()
 
-            styled_row = row[:2]
-            styled_row += [
-                Text(str(cell), style=f"bold {row_color}") for cell in row[2:]
-            ]
-            watches.add_row(*styled_row)
+    def patch_watches(self, quotes, remove_unwatched=False):
+        """Update rows of symbols in the watch list with new quotes.
+
+        Parameters
+        ----------
+        quotes : pd.DataFrame
+            Latest quotes indexed by symbols, symbols not in the watch list are ignored.
+        remove_unwatched : bool, default False
+            If True, remove rows of symbols that are no longer in the watch list.
+        """
+        watches = self.query_one('#watches')
+        watch_list = list(dict.fromkeys(self.trader.watch_list))
+        quotes = quotes[~quotes.index.duplicated(keep='last')]
+        quotes = quotes.loc[quotes.index.isin(watch_list)]
+        if 'change' not in quotes.columns:
+            quotes = quotes.assign(change=quotes['close'] / quotes['pre_close'] - 1)
+        quotes = quotes.reindex(columns=watches.df_columns)
+        with self._table_lock:
+            if remove_unwatched:
+                watches.remove_rows([key for key in watches.row_keys if key not in watch_list])
+            for symbol, row in zip(quotes.index, quotes.itertuples(index=False, name=None)):
+                watches.patch_row(symbol, watches.render_row(row))
 
     @work(exclusive=True, thread=True)
     def refresh_trade_log(self):
@@ -687,34 +835,58 @@ class TraderApp(App):
             return
         trade_log = self.query_one("#tradelog")
         t_log = self.trader.read_trade_log()
-        trade_log.clear()
-
-        if t_log.empty:
-            return
-        t_log = t_log.reindex(columns=trade_log.df_columns)
-        t_log.fillna('', inplace=True)
-        list_tuples = list(t_log.itertuples(name=None))
-        for row in list_tuples:
-
-            row = list(row)
-            reason = row[2]
-            direction = row[6]
-            if reason == 'manual':
-                row_color = 'yellow'
-            elif reason == 'delivery':
-                row_color = 'blue'
-            elif direction == 'sell':
-                row_color = 'bold green'
-            elif direction == 'buy':
-                row_color = 'bold red'
-            else:
-                row_color = ''
+        with self._table_lock:
+            trade_log.clear()
 
-            styled_row = [
-                Text(str(cell), style=row_color) for cell in row
-            ]
+            if t_log.empty:
+                return
+            t_log = t_log.reindex(columns=trade_log.df_columns)
+            t_log.fillna('', inplace=True)
+            for row_id, row in zip(t_log.index, t_log.itertuples(index=False, name=None)):
+                trade_log.patch_row(row_id, trade_log.render_row(row))
 
-            trade_log.add_row(*styled_row)
+    def append_trade_logs(self, log_rows):
+        """Append new rows written to the trade log file to the end of the trade log table."""
+        trade_log = self.query_one("#tradelog")
+        with self._table_lock:
+            for log_row in log_rows:
+                row = [log_row.get(column) for column in trade_log.df_columns]
+                trade_log.patch_row(len(trade_log.row_keys), trade_log.render_row(row))
+
+    def on_trader_event(self, event_type, data):
+        """Callback of trader events, events are queued and processed in the trader event loop."""
+        self._trader_events.put((event_type, data))
+
+    def process_trader_events(self):
+        """Process all queued trader events, merge events of the same type and patch the tables."""
+        symbols = {}
+        order_ids = {}
+        quotes = []
+        log_rows = []
+        while True:
+            try:
+                event_type, data = self._trader_events.get_nowait()
+            except Empty:
+                break
+            if event_type == 'positions':
+                symbols.update(dict.fromkeys(data))
+            elif event_type == 'orders':
+                order_ids.update(dict.fromkeys(data))
+            elif event_type == 'prices':
+                quotes.append(data)
+            elif event_type == 'trade_log':
+                log_rows.append(data)
+
+        if symbols:
+            self.patch_holdings(list(symbols))
+        if order_ids:
+            self.patch_orders(list(order_ids))
+        if quotes:
+            quotes = pd.concat(quotes)
+            self.patch_watches(quotes)
+            self.patch_holding_prices(quotes[~quotes.index.duplicated(keep='last')])
+        if log_rows:
+            self.append_trade_logs(log_rows)
 
     @work(exclusive=True, thread=True)
     def refresh_info_panels(self, trader_info):
@@ -867,18 +1039,21 @@ class TraderApp(App):
 
         # refresh all the data tables, adding columns and refreshing the data
         holdings = self.query_one("#holdings")
-        holdings.add_columns(*holdings.headers)
+        holdings.add_keyed_columns()
         self.refresh_holdings()
         orders = self.query_one("#orders")
-        orders.add_columns(*orders.headers)
+        orders.add_keyed_columns()
         self.refresh_order()
         watches = self.query_one("#watches")
-        watches.add_columns(*watches.headers)
+        watches.add_keyed_columns()
         self.refresh_watches()
         trade_log = self.query_one("#tradelog")
-        trade_log.add_columns(*trade_log.headers)
+        trade_log.add_keyed_columns()
         self.refresh_trade_log()
 
+        # subscribe to trader events before the trader is started
+        self.trader.subscribe_events(self.on_trader_event)
+
         system_log = self.query_one(SysLog)
         system_log.border_title = "System Log"
         # start the trader, broker and the trader event loop all in separate threads
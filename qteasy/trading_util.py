@@ -12,6 +12,7 @@
 # ======================================
 
 import os
+import datetime as dt
 import pandas as pd
 import numpy as np
 
@@ -114,11 +115,13 @@ def create_daily_task_schedule(operator, config=None):
             end_pm=market_close_time_pm,
             include_start_pm=False,
             include_end_pm=True,
-    ).strftime('%H:%M:%S').tolist()
+    )
     # 将实时价格的更新时间添加到任务日程，生成价格更新日程，因为价格更新的任务优先级更低，因此每个任务都推迟5秒执行
-    for t in run_time_index:
-        t = (pd.to_datetime(t) + pd.Timedelta(seconds=5)).strftime('%H:%M:%S')
-        task_agenda.append((t, 'acquire_live_price'))
+    run_time_index = (run_time_index + pd.Timedelta(seconds=5)).strftime('%H:%M:%S')
+    task_agenda.extend((t, 'acquire_live_price') for t in run_time_index)
+
+    # 同一时间运行的多个策略合并为同一个run_strategy任务，用dict按时间索引已经添加的任务
+    run_strategy_tasks = {}
 
     # 从Operator对象中读取交易策略，分析策略的strategy_run_timing和strategy_run_freq参数，生成任务日程
     for stg_id, stg in operator.get_strategy_id_pairs():
@@ -172,14 +175,14 @@ def create_daily_task_schedule(operator, config=None):
 
         # 将策略的运行时间添加到任务日程，生成任务日程
         for t in run_time_index:
-            if any(item for item in task_agenda if (item[0] == t) and (item[1] == 'run_strategy')):
+            if t in run_strategy_tasks:
                 # 如果同时发生的'run_stg'任务已经存在，则修改该任务，将stg_id添加到列表中
-                task_to_update = [item for item in task_agenda if (item[0] == t) and (item[1] == 'run_strategy')]
-                task_idx_to_update = task_agenda.index(task_to_update[0])
-                task_agenda[task_idx_to_update][2].append(stg_id)
+                run_strategy_tasks[t][2].append(stg_id)
             else:
                 # 否则，则直接添加任务
-                task_agenda.append((t, 'run_strategy', [stg_id]))
+                task = (t, 'run_strategy', [stg_id])
+                run_strategy_tasks[t] = task
+                task_agenda.append(task)
 
     # 对任务日程进行排序 （其实排序并不一定需要）
     task_agenda.sort(key=lambda x: x[0])
@@ -187,6 +190,39 @@ def create_daily_task_schedule(operator, config=None):
     return task_agenda
 
 
+def task_time_to_seconds(task_time) -> float:
+    """ 将任务日程中的任务时间转换为当天零点起的秒数，用于快速比较任务的执行时间
+
+    Parameters
+    ----------
+    task_time: str or datetime.time or datetime.datetime
+        任务时间，字符串格式为'HH:MM:SS'或'HH:MM'
+
+    Returns
+    -------
+    seconds: float
+        从当天零点开始计算的秒数
+
+    Examples
+    --------
+    >>> task_time_to_seconds('09:30:00')
+    34200.0
+    >>> task_time_to_seconds(dt.time(9, 30, 0, 500000))
+    34200.5
+    """
+    if isinstance(task_time, str):
+        try:
+            task_time = dt.time.fromisoformat(task_time)
+        except ValueError:
+            task_time = pd.to_datetime(task_time).time()
+    elif isinstance(task_time, dt.datetime):
+        task_time = task_time.time()
+    if not isinstance(task_time, dt.time):
+        raise TypeError(f'task_time should be a time string or a datetime.time, got {type(task_time)} instead')
+    return (task_time.hour * 3600 + task_time.minute * 60 + task_time.second +
+            task_time.microsecond / 1_000_000)
+
+
 # Utility functions for live trade
 def parse_trade_signal(signals,
                        signal_type,
@@ -476,7 +512,7 @@ def _signal_to_order_elements(shares,
                               moq_buy=0,
                               moq_sell=0,
                               allow_sell_short=False):
-    """ 逐个计算每一只资产的买入和卖出的数量，将parse_pt/ps/vs_signal函数计算出的交易信号逐项转化为
+    """ 计算每一只资产的买入和卖出的数量，将parse_pt/ps/vs_signal函数计算出的交易信号一次性转化为
     交易订单 trade_orders
 
     在生成交易信号时，需要考虑可用现金的总量以及可用资产的总量
@@ -524,112 +560,90 @@ def _signal_to_order_elements(shares,
         base_remark = f'Not enough available cash ({available_cash:.2f}), ' \
                       f'adjusted cash to spend to {available_to_plan_ratio:.1%}'
 
-    # 逐个计算每一只资产的买入和卖出的数量
-    symbols = []  # 股票代码
-    positions = []  # 持仓类型
-    directions = []  # 交易方向
-    quantities = []  # 交易数量
-    quoted_prices = []  # 交易报价
+    # 以向量方式一次性计算所有资产的买入和卖出数量，每只资产最多产生下面六类订单中的若干个：
+    # 0: 多头买入；1: 空头买入；2: 多头卖出；3: 多头可用持仓不足时的空头买入；
+    # 4: 空头卖出；5: 空头可用持仓不足时的多头买入
+    # 最终输出的订单按资产在shares中的顺序排列，同一资产的订单按上述类别顺序排列
+    prices = np.asarray(prices, dtype='float')
+    cash_to_spend = np.asarray(cash_to_spend, dtype='float')
+    amounts_to_sell = np.asarray(amounts_to_sell, dtype='float')
+    available_amounts = np.asarray(available_amounts, dtype='float')
+
+    def _round_to_moq(qty, moq):
+        if moq > 0:
+            return np.trunc(qty / moq) * moq
+        return qty
+
+    long_sell = amounts_to_sell < -0.001
+    long_short_of_stock = long_sell & (amounts_to_sell < -available_amounts)
+    short_sell = (amounts_to_sell > 0.001) & allow_sell_short
+    short_short_of_stock = short_sell & (amounts_to_sell > available_amounts)
+
+    order_kinds = [
+        (cash_to_spend > 0.001, 'long', 'buy'),
+        ((cash_to_spend < -0.001) & allow_sell_short, 'short', 'buy'),
+        (long_sell, 'long', 'sell'),
+        (long_short_of_stock & allow_sell_short, 'short', 'buy'),
+        (short_sell, 'short', 'sell'),
+        (short_short_of_stock, 'long', 'buy'),
+    ]
+    share_idx = []
+    kind_idx = []
+    kind_qty = []
+    for kind, (mask, _, _) in enumerate(order_kinds):
+        i = np.flatnonzero(mask)
+        if kind == 0:
+            qty = _round_to_moq(np.round(cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES), moq_buy)
+        elif kind == 1:
+            qty = _round_to_moq(np.round(-cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES), moq_buy)
+        elif kind == 2:
+            # 如果可用资产不足，则降低卖出的数量为可用数量，否则直接卖出
+            qty = np.where(long_short_of_stock[i],
+                           np.round(available_amounts[i], AMOUNT_DECIMAL_PLACES),
+                           np.round(-amounts_to_sell[i], AMOUNT_DECIMAL_PLACES))
+            qty = _round_to_moq(qty, moq_sell)
+        elif kind == 3:
+            qty = _round_to_moq(np.round(-amounts_to_sell[i] - available_amounts[i], AMOUNT_DECIMAL_PLACES),
+                                moq_sell)
+        elif kind == 4:
+            qty = np.where(short_short_of_stock[i],
+                           np.round(-available_amounts[i], 2),
+                           np.round(amounts_to_sell[i], AMOUNT_DECIMAL_PLACES))
+            qty = _round_to_moq(qty, moq_sell)
+        else:
+            qty = _round_to_moq(np.round(amounts_to_sell[i] + available_amounts[i], AMOUNT_DECIMAL_PLACES),
+                                moq_sell)
+        share_idx.append(i)
+        kind_idx.append(np.full(len(i), kind))
+        kind_qty.append(qty)
+
+    share_idx = np.concatenate(share_idx)
+    kind_idx = np.concatenate(kind_idx)
+    kind_qty = np.concatenate(kind_qty)
+    order = np.lexsort((kind_idx, share_idx))
+    share_idx = share_idx[order]
+    kind_idx = kind_idx[order]
+    kind_qty = kind_qty[order]
+
+    symbols = [shares[i] for i in share_idx]  # 股票代码
+    positions = [order_kinds[k][1] for k in kind_idx]  # 持仓类型
+    directions = [order_kinds[k][2] for k in kind_idx]  # 交易方向
+    quantities = list(kind_qty)  # 交易数量
+    quoted_prices = list(prices[share_idx])  # 交易报价
     remarks = []  # 生成交易信号的说明，用于为trader提供提示
-
-    for i, sym in enumerate(shares):
-        # 计算多头买入的数量
-        if cash_to_spend[i] > 0.001:
-            # 计算买入的数量
-            quantity = np.round(cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES)
-            if moq_buy > 0:
-                quantity = np.trunc(quantity / moq_buy) * moq_buy
-            symbols.append(sym)
-            positions.append('long')
-            directions.append('buy')
-            quantities.append(quantity)
-            quoted_prices.append(prices[i])
-            remarks.append(base_remark)
-        # 计算空头买入的数量
-        if (cash_to_spend[i] < -0.001) and allow_sell_short:
-            # 计算买入的数量
-            quantity = np.round(-cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES)
-            if moq_buy > 0:
-                quantity = np.trunc(quantity / moq_buy) * moq_buy
-            symbols.append(sym)
-            positions.append('short')
-            directions.append('buy')
-            quantities.append(quantity)
-            quoted_prices.append(prices[i])
+    for i, k, quantity in zip(share_idx, kind_idx, kind_qty):
+        if (k == 2) and long_short_of_stock[i]:
+            remarks.append(base_remark + f'Not enough available stock({available_amounts[i]}), '
+                                         f'sell qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
+        elif k == 3:
+            remarks.append(base_remark + f'Allow sell short, continue to buy short positions {quantity}')
+        elif (k == 4) and short_short_of_stock[i]:
+            remarks.append(base_remark + f'Not enough short position stock ({-available_amounts[i]}), '
+                                         f'sell short qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
+        elif k == 5:
+            remarks.append(base_remark + f'Allow sell short, continue to buy long positions {quantity}')
+        else:
             remarks.append(base_remark)
-        # 计算多头卖出的数量
-        if amounts_to_sell[i] < -0.001:
-            # 计算卖出的数量，如果可用资产不足，则降低卖出的数量，并增加相反头寸的买入数量，买入剩余的数量
-            if amounts_to_sell[i] < -available_amounts[i]:
-                # 计算卖出的数量
-                quantity = np.round(available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Not enough available stock({available_amounts[i]}), '
-                                             f'sell qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
-                # 如果allow_sell_short，增加反向头寸的买入信号
-                if allow_sell_short:
-                    quantity = np.round(- amounts_to_sell[i] - available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                    if moq_sell > 0:
-                        quantity =np.trunc(quantity / moq_sell) * moq_sell
-                    symbols.append(sym)
-                    positions.append('short')
-                    directions.append('buy')
-                    quantities.append(quantity)
-                    quoted_prices.append(prices[i])
-                    remarks.append(base_remark + f'Allow sell short, continue to buy short positions {quantity}')
-            else:
-                # 计算卖出的数量，如果可用资产足够，则直接卖出
-                quantity = np.round(-amounts_to_sell[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark)
-        # 计算空头卖出的数量
-        if (amounts_to_sell[i] > 0.001) and allow_sell_short:
-            # 计算卖出的数量，如果可用资产不足，则降低卖出的数量，并增加相反头寸的买入数量，买入剩余的数量
-            if amounts_to_sell[i] > available_amounts[i]:
-                # 计算卖出的数量
-                quantity = np.round(- available_amounts[i], 2)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('short')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Not enough short position stock ({-available_amounts[i]}), '
-                                             f'sell short qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
-                # 增加反向头寸的买入信号
-                quantity = np.round(amounts_to_sell[i] + available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('buy')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Allow sell short, continue to buy long positions {quantity}')
-            else:
-                # 计算卖出的数量，如果可用资产足够，则直接卖出
-                quantity = np.round(amounts_to_sell[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('short')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark)
 
     order_elements = (symbols, positions, directions, quantities, quoted_prices, remarks)
     return order_elements
@@ -678,32 +692,117 @@ def submit_order(order_id, data_source):
     # 如果交易方向为buy，则需要检查账户的现金是否足够
     position_id = trade_order['pos_id']
     position = get_position_by_id(position_id, data_source=data_source)
-    pos_type = position['position']
-    if pos_type == 'short':
+    account = None
+    if trade_order['direction'] == 'buy':
+        account = get_account(position['account_id'], data_source=data_source)
+    _check_submitted_order(trade_order, position, account)
+
+    # 将signal的status改为"submitted"，并将trade_signal写入数据库
+    order_id = update_trade_order(order_id=order_id, data_source=data_source, status='submitted')
+    # 检查交易订单
+
+    return order_id
+
+
+def _check_submitted_order(trade_order, position, account=None) -> None:
+    """ 提交交易订单前检查订单的持仓类型和交易方向，并检查可用现金或可用持仓是否足够，不足时仅输出警告信息
+
+    Parameters
+    ----------
+    trade_order: dict
+        交易订单
+    position: dict or pd.Series
+        交易订单所属的持仓
+    account: dict, optional
+        持仓所属的账户，买入订单必须给出
+
+    Raises
+    ------
+    ValueError: 当持仓类型不是long/short，或者交易方向不是buy/sell时
+    NotImplementedError: 当订单属于空头持仓时
+    """
+    if position['position'] not in ('long', 'short'):
+        err = ValueError(f'Invalid position type {position["position"]} of trade order: {trade_order}')
+        raise err
+    if position['position'] == 'short':
         # TODO: position为short时做法不同，需要进一步调整
         raise NotImplementedError('short position orders submission is not realized')
     if trade_order['direction'] == 'buy':
-        account_id = position['account_id']
-        account = get_account(account_id, data_source=data_source)
         # 如果账户的现金不足，则输出警告信息
         if account['available_cash'] < trade_order['qty'] * trade_order['price']:
             logger.warning(f'Available cash {account["available_cash"]} is not enough for trade order: \n'
                            f'{trade_order}'
                            f'trade order might not be executed!')
-
-    # 如果交易方向为sell，则需要检查账户的持仓是否足够
     elif trade_order['direction'] == 'sell':
         # 如果账户的持仓不足，则输出警告信息
         if position['available_qty'] < trade_order['qty']:
             logger.warning(f'Available quantity {position["available_qty"]} is not enough for trade order: \n'
                            f'{trade_order}'
                            f'trade order might not be executed!')
+    else:
+        err = ValueError(f'Invalid direction {trade_order["direction"]} of trade order: {trade_order}')
+        raise err
 
-    # 将signal的status改为"submitted"，并将trade_signal写入数据库
-    order_id = update_trade_order(order_id=order_id, data_source=data_source, status='submitted')
-    # 检查交易订单
 
-    return order_id
+def submit_orders(order_ids, data_source) -> list:
+    """ 批量提交交易订单，效果与逐个调用submit_order()相同
+
+    只读取需要提交的订单及其所属的持仓和账户，且每种信息只读取一次，所有订单的状态在一次写入操作中更新为submitted，
+    适用于一次产生大量交易订单的情形，例如全市场调仓
+
+    Parameters
+    ----------
+    order_ids: list of int
+        交易订单的id
+    data_source: Any
+        数据源的名称
+
+    Returns
+    -------
+    list of int or None, 与order_ids一一对应，成功提交的订单为订单id，状态不为created的订单为None
+    """
+
+    order_ids = list(order_ids)
+    if len(order_ids) == 0:
+        return []
+
+    # 只读取需要提交的订单以及这些订单所属的持仓
+    trade_orders = data_source.read_sys_table_data('sys_op_trade_orders', record_ids=order_ids)
+    pos_ids = [] if trade_orders.empty else list(dict.fromkeys(trade_orders['pos_id']))
+    positions = data_source.read_sys_table_data('sys_op_positions', record_ids=pos_ids)
+    accounts = {}
+
+    submitted_ids = []
+    for order_id in order_ids:
+        if order_id not in trade_orders.index:
+            err = RuntimeError(f'Trade order (order_id = {order_id}) not found!')
+            raise err
+        trade_order = trade_orders.loc[order_id]
+        # 如果交易订单的状态不为created，则说明交易订单已经提交过，不需要再次提交
+        if trade_order['status'] != 'created':
+            submitted_ids.append(None)
+            continue
+
+        position = positions.loc[trade_order['pos_id']]
+        account = None
+        if trade_order['direction'] == 'buy':
+            account_id = position['account_id']
+            if account_id not in accounts:
+                accounts[account_id] = get_account(account_id, data_source=data_source)
+            account = accounts[account_id]
+        _check_submitted_order(trade_order.to_dict(), position, account)
+        submitted_ids.append(order_id)
+
+    # 将所有订单的status改为"submitted"，并一次性写入数据库
+    submit_time = pd.to_datetime('today').strftime('%Y-%m-%d %H:%M:%S')
+    data_source.update_sys_table_records(
+            'sys_op_trade_orders',
+            record_ids=[order_id for order_id in submitted_ids if order_id is not None],
+            submitted_time=submit_time,
+            status='submitted',
+    )
+
+    return submitted_ids
 
 
 def cancel_order(order_id, data_source=None, config=None) -> int:
@@ -1221,6 +1320,39 @@ def calculate_cost_change(prev_qty, prev_unit_cost, qty_change, price, transacti
     return new_cost - prev_unit_cost, new_cost
 
 
+def find_changed_rows(old, new, columns=None) -> list:
+    """ 比较两个DataFrame，找出新增、删除或者数据发生变化的行，用于生成数据变动事件
+
+    Parameters
+    ----------
+    old: pd.DataFrame or None
+        变动前的数据
+    new: pd.DataFrame or None
+        变动后的数据
+    columns: list of str, optional
+        需要比较的数据列，默认比较两个DataFrame中共有的所有列
+
+    Returns
+    -------
+    changed: list
+        数据发生变化的行的index，按照new中的顺序排列，被删除的行排在最后
+    """
+    if old is None or old.empty:
+        return [] if new is None else new.index.tolist()
+    if new is None or new.empty:
+        return old.index.tolist()
+    if columns is None:
+        columns = [col for col in new.columns if col in old.columns]
+    else:
+        columns = [col for col in columns if (col in new.columns) and (col in old.columns)]
+    index = new.index.append(old.index.difference(new.index))
+    old_values = old[columns].reindex(index)
+    new_values = new[columns].reindex(index)
+    # NaN与NaN视为相同
+    unchanged = (old_values == new_values) | (old_values.isna() & new_values.isna())
+    return index[~unchanged.all(axis=1).values].tolist()
+
+
 def get_last_trade_result_summary(account_id, shares=None, data_source=None):
     """ 获取指定账户的最近的交易结果汇总，获取的结果为ndarray，按照shares的顺序排列
 
@@ -1556,30 +1688,21 @@ def get_symbol_names(datasource, symbols, asset_types: list = None, refresh: boo
             raise ValueError(f'invalid asset_types: {asset_types}, must be one of '
                              f'["stock", "index", "fund", "future", "option"]')
 
-    df_s, df_i, df_f, df_ft, df_o = datasource.get_all_basic_table_data(
-            raise_error=False,
-            refresh_cache=refresh,
-    )
-    all_data_types = {
-        'stock':  df_s[['name']] if not df_s.empty else pd.DataFrame(),
-        'index':  df_i[['name']] if not df_i.empty else pd.DataFrame(),
-        'fund':   df_f[['name']] if not df_f.empty else pd.DataFrame(),
-        'future': df_ft[['name']] if not df_ft.empty else pd.DataFrame(),
-        'option': df_o[['name']] if not df_o.empty else pd.DataFrame(),
+    asset_type_codes = {
+        'stock':  'E',
+        'index':  'IDX',
+        'fund':   'FD',
+        'future': 'FT',
+        'option': 'OPT',
     }
-    all_basics = pd.concat(
-            (
-                all_data_types[asset_type.lower()] for asset_type in asset_types
-            ),
-    )
-    if all_basics.empty:
-        return ['N/A'] * len(symbols)
+    symbol_index = datasource.get_symbol_index(refresh_cache=refresh)
     try:
-        names_found = all_basics.reindex(index=symbols)["name"].tolist()
+        names_found = symbol_index.get_names(
+                symbols,
+                asset_types=[asset_type_codes[asset_type] for asset_type in asset_types],
+        )
     except Exception as e:
         raise RuntimeError(f'Error in get_symbol_names(): {e}')
-    # replace all nan with 'N/A'
-    names_found = ['N/A' if pd.isna(name) else name for name in names_found]
 
     return names_found
 
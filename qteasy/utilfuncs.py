@@ -1393,73 +1393,258 @@ def match_ts_code(code: str, asset_types='all', match_full_name=False):
             '601916.SH': '浙商银行'
     """
     from qteasy import QT_DATA_SOURCE
-    ds = QT_DATA_SOURCE
-    df_s, df_i, df_f, df_ft, df_o = ds.get_all_basic_table_data(raise_error=False)
-    asset_type_basics = {k: v for k, v in zip(AVAILABLE_ASSET_TYPES, [df_s, df_i, df_ft, df_f, df_o])}
-
-    if asset_types is None:
-        asset_types = 'all'
-    if isinstance(asset_types, str):
-        asset_types = str_to_list(asset_types)
-    if 'all' in asset_types:
-        asset_types = AVAILABLE_ASSET_TYPES
-    else:
-        asset_types = [item for item in asset_types if item in AVAILABLE_ASSET_TYPES]
+    symbol_index = QT_DATA_SOURCE.get_symbol_index()
+    return symbol_index.match(code, asset_types=asset_types, match_full_name=match_full_name)
 
-    asset_types_with_name = [item for item in asset_types if item in ['E', 'IDX', 'FD', 'FT', 'OPT']]
-    code_matched = {}
-    count = 0
-    import re
-    if re.match(r'[0-9A-Z]+\.[a-zA-Z]+$', code):
-        # if code like "000100.SH"
-        for at in asset_types:
-            basic = asset_type_basics[at]
-            ts_code = basic.loc[basic.index == code].name.to_dict()
-            count += len(ts_code)
-            code_matched.update({at: ts_code})
-    elif re.match(r'[0-9A-Z]+$', code):
-        # if code like all number inputs
-        for at in asset_types:
-            basic = asset_type_basics[at]
-            basic['symbol'] = [item.split('.')[0] for item in basic.index]
-            ts_code = basic.loc[basic.symbol == code].name.to_dict()
-            count += len(ts_code)
-            code_matched.update({at: ts_code})
-    else:
-        for at in asset_types_with_name:
-            basic = asset_type_basics[at]
-            names = basic.name.to_list()
-            full_names = []
-            match_full_name = (at in ['E', 'IDX']) and match_full_name
-            if match_full_name:
-                # 当需要匹配全名时
-                full_names = basic.fullname.to_list()
-            if ('?' in code) or ('*' in code):
-                matched = _wildcard_match(code, names)
-                code_matched[at] = basic.loc[basic.name.isin(matched)].name.to_dict()
-                if match_full_name:
-                    full_name_matched = _wildcard_match(code, full_names)
-                    code_matched[at].update(basic.loc[basic.name.isin(full_name_matched)].name.to_dict())
+
+class SymbolIndex:
+    """ 证券代码及名称的检索索引，基于basic数据表一次性建立，用于快速查找证券代码和证券名称
+
+    索引中包含：
+    - 完整证券代码（如'000001.SZ'）到证券名称的哈希表，用于精确查找和批量查找
+    - 不含后缀的证券代码（如'000001'）到完整证券代码的哈希表
+    - 证券名称（及全名）中每一个字符到所有包含该字符的名称的倒排索引，用于在模糊匹配和通配符
+      匹配时预先筛选候选名称，只对候选名称计算相似度或进行正则匹配
+
+    Parameters
+    ----------
+    basics: dict
+        {asset_type: pd.DataFrame}，各个资产类型的basic数据表，index为ts_code，至少包含name列
+
+    Examples
+    --------
+    >>> index = SymbolIndex({'E': df_stock_basic, 'IDX': df_index_basic})
+    >>> index.get_names(['000001.SZ', '000300.SH', 'no_such_code'])
+    ['平安银行', '沪深300', 'N/A']
+    >>> index.match('000001', asset_types=['E'])
+    {'E': {'000001.SZ': '平安银行'}, 'count': 1}
+    """
+
+    def __init__(self, basics: dict):
+        self._asset_types = []
+        self._codes = {}
+        self._names = {}
+        self._full_names = {}
+        self._name_postings = {}
+        self._full_name_postings = {}
+        self._code_map = {}
+        self._symbol_map = {}
+        for asset_type, basic in basics.items():
+            if basic is None or basic.empty or ('name' not in basic.columns):
+                codes = np.array([], dtype='object')
+                names = np.array([], dtype='object')
+                full_names = np.array([], dtype='object')
             else:
-                match_values = list(map(_partial_lev_ratio, [code] * len(names), names))
-                basic['match_value'] = match_values
-                sort_matched = basic.loc[basic.match_value >= 0.75].sort_values(by='match_value',
-                                                                                ascending=False)
-                code_matched[at] = sort_matched.name.to_dict()
-                if match_full_name:
-                    full_name_match_values = list(map(_partial_lev_ratio, [code] * len(full_names), full_names))
-                    basic['full_name_match_value'] = full_name_match_values
-                    full_name_sort_matched = \
-                        basic.loc[basic.full_name_match_value >= 0.75].sort_values(
-                                by='full_name_match_value',
-                                ascending=False
+                codes = np.array(basic.index.astype(str), dtype='object')
+                names = np.array(basic['name'].fillna('').astype(str), dtype='object')
+                if 'fullname' in basic.columns:
+                    full_names = np.array(basic['fullname'].fillna('').astype(str), dtype='object')
+                else:
+                    full_names = np.array([''] * len(codes), dtype='object')
+            self._asset_types.append(asset_type)
+            self._codes[asset_type] = codes
+            self._names[asset_type] = names
+            self._full_names[asset_type] = full_names
+            self._name_postings[asset_type] = self._build_postings(names)
+            self._full_name_postings[asset_type] = self._build_postings(full_names)
+            for i, code in enumerate(codes):
+                self._code_map.setdefault(code, (asset_type, i))
+                symbol = code.split('.')[0]
+                self._symbol_map.setdefault(symbol, {}).setdefault(asset_type, []).append(i)
+
+    @staticmethod
+    def _build_postings(names) -> dict:
+        """ 建立字符到名称序号的倒排索引，每个字符对应一个(名称序号数组, 字符出现次数数组)"""
+        postings = {}
+        for i, name in enumerate(names):
+            for char, char_count in _char_counts(name.lower()).items():
+                postings.setdefault(char, ([], []))
+                postings[char][0].append(i)
+                postings[char][1].append(char_count)
+        return {char: (np.array(ids, dtype='int64'), np.array(counts, dtype='int64'))
+                for char, (ids, counts) in postings.items()}
+
+    @property
+    def asset_types(self) -> list:
+        """索引中包含的资产类型"""
+        return self._asset_types
+
+    def __len__(self):
+        return len(self._code_map)
+
+    def __contains__(self, code):
+        return code in self._code_map
+
+    def get_name(self, code: str, default='N/A') -> str:
+        """ 根据完整证券代码查找证券名称，找不到时返回default"""
+        found = self._code_map.get(code)
+        if found is None:
+            return default
+        asset_type, i = found
+        return self._names[asset_type][i]
+
+    def get_names(self, codes, asset_types=None, default='N/A') -> list:
+        """ 批量查找证券名称
+
+        Parameters
+        ----------
+        codes: list of str
+            完整的证券代码列表
+        asset_types: list of str, optional
+            限定查找的资产类型，如['E', 'FD']，默认查找所有资产类型
+        default: str, default 'N/A'
+            找不到证券代码时的返回值
+
+        Returns
+        -------
+        list of str, 与codes一一对应的证券名称
+        """
+        if asset_types is None:
+            return [self.get_name(code, default) for code in codes]
+        names = []
+        for code in codes:
+            name = default
+            for asset_type, ids in self._symbol_map.get(code.split('.')[0], {}).items():
+                if asset_type not in asset_types:
+                    continue
+                matched = [i for i in ids if self._codes[asset_type][i] == code]
+                if matched:
+                    name = self._names[asset_type][matched[0]]
+                    break
+            names.append(name)
+        return names
+
+    def get_asset_type(self, code: str, default=None):
+        """ 根据完整证券代码查找资产类型，找不到时返回default"""
+        found = self._code_map.get(code)
+        return default if found is None else found[0]
+
+    def _candidates(self, postings: dict, name_count: int, chars: dict, min_common) -> np.ndarray:
+        """ 利用倒排索引筛选出与chars中的字符相同数量不少于min_common的名称序号
+
+        min_common可以是一个数字或者与名称数量相同的数组
+        """
+        common = np.zeros(shape=(name_count,), dtype='int64')
+        for char, char_count in chars.items():
+            if char not in postings:
+                continue
+            ids, counts = postings[char]
+            common[ids] += np.minimum(counts, char_count)
+        return np.flatnonzero((common >= min_common) & (common > 0))
+
+    def _fuzzy_match(self, code: str, asset_type: str, full_name=False, threshold=0.75) -> list:
+        """ 模糊匹配证券名称，返回按照匹配度从高到低排列的(序号, 匹配度)列表
+
+        两个字符串的局部相似度不低于threshold时，较短字符串中至少有threshold比例的字符同时出现
+        在较长的字符串中，因此先用字符倒排索引筛选出满足这一条件的候选名称，再计算局部相似度，
+        筛选结果与逐个计算所有名称的相似度完全相同
+        """
+        names = self._full_names[asset_type] if full_name else self._names[asset_type]
+        postings = self._full_name_postings[asset_type] if full_name else self._name_postings[asset_type]
+        if len(names) == 0:
+            return []
+        lower_code = code.lower()
+        name_lengths = np.fromiter((len(name) for name in names), dtype='int64', count=len(names))
+        min_common = np.ceil(threshold * np.minimum(name_lengths, len(lower_code)) - 1e-9)
+        candidates = self._candidates(postings, len(names), _char_counts(lower_code), min_common)
+        matched = []
+        for i in candidates:
+            match_value = _partial_lev_ratio(code, names[i])
+            if match_value >= threshold:
+                matched.append((i, match_value))
+        matched.sort(key=lambda item: item[1], reverse=True)
+        return matched
+
+    def _wildcard_match(self, code: str, asset_type: str, full_name=False) -> list:
+        """ 通配符匹配证券名称，返回匹配的名称序号列表
+
+        通配符以外的字符都必须出现在匹配的名称中，因此先通过字符倒排索引筛选候选名称，
+        再进行正则匹配
+        """
+        names = self._full_names[asset_type] if full_name else self._names[asset_type]
+        postings = self._full_name_postings[asset_type] if full_name else self._name_postings[asset_type]
+        literal = code.replace('?', '').replace('*', '')
+        if literal.isalnum():
+            # 倒排索引不区分大小写，因此筛选出的候选名称包含所有区分大小写的正则匹配结果
+            chars = {char: 1 for char in literal.lower()}
+            candidates = self._candidates(postings, len(names), chars, len(chars))
+        else:
+            candidates = np.arange(len(names))
+        candidate_names = names[candidates]
+        matched = set(_wildcard_match(code, candidate_names))
+        return [i for i, name in zip(candidates, candidate_names) if name in matched]
+
+    def match(self, code: str, asset_types='all', match_full_name=False) -> dict:
+        """ 根据输入匹配证券代码或证券名称，输出与match_ts_code()相同格式的字典
+
+        Parameters
+        ----------
+        code: str
+            证券代码、不含后缀的证券代码、证券名称或带通配符的证券名称
+        asset_types: str or list of str, default 'all'
+            返回结果类型，以逗号分隔的资产类型代码，如"E,FD"代表只返回股票和基金代码
+        match_full_name: bool, default False
+            是否匹配股票或指数全名
+
+        Returns
+        -------
+        dict: {asset_type: {ts_code: name}, 'count': count}
+        """
+        if asset_types is None:
+            asset_types = 'all'
+        if isinstance(asset_types, str):
+            asset_types = str_to_list(asset_types)
+        if 'all' in asset_types:
+            asset_types = AVAILABLE_ASSET_TYPES
+        else:
+            asset_types = [item for item in asset_types if item in AVAILABLE_ASSET_TYPES]
+        asset_types = [item for item in asset_types if item in self._asset_types]
+
+        code_matched = {}
+        count = 0
+        if re.match(r'[0-9A-Z]+\.[a-zA-Z]+$', code):
+            # if code like "000100.SH"
+            found = self._code_map.get(code)
+            for at in asset_types:
+                ids = self._symbol_map.get(code.split('.')[0], {}).get(at, []) if found else []
+                code_matched[at] = {self._codes[at][i]: self._names[at][i] for i in ids
+                                    if self._codes[at][i] == code}
+                count += len(code_matched[at])
+        elif re.match(r'[0-9A-Z]+$', code):
+            # if code like all number inputs
+            for at in asset_types:
+                ids = self._symbol_map.get(code, {}).get(at, [])
+                code_matched[at] = {self._codes[at][i]: self._names[at][i] for i in ids}
+                count += len(code_matched[at])
+        else:
+            for at in asset_types:
+                codes = self._codes[at]
+                names = self._names[at]
+                full_name = (at in ['E', 'IDX']) and match_full_name
+                if ('?' in code) or ('*' in code):
+                    ids = self._wildcard_match(code, at)
+                    if full_name:
+                        ids = sorted(set(ids).union(self._wildcard_match(code, at, full_name=True)))
+                    code_matched[at] = {codes[i]: names[i] for i in ids}
+                else:
+                    code_matched[at] = {codes[i]: names[i] for i, _ in self._fuzzy_match(code, at)}
+                    if full_name:
+                        code_matched[at].update(
+                                {codes[i]: names[i] for i, _ in self._fuzzy_match(code, at, full_name=True)}
                         )
-                    code_matched[at].update(full_name_sort_matched.name.to_dict())
-            count += len(code_matched[at])
+                count += len(code_matched[at])
+
+        code_matched.update({'count': count})
+        code_matched = {k: v for k, v in code_matched.items() if v != {}}
+        return code_matched
+
 
-    code_matched.update({'count': count})
-    code_matched = {k: v for k, v in code_matched.items() if v != {}}
-    return code_matched
+def _char_counts(word: str) -> dict:
+    """ 统计字符串中每个字符出现的次数"""
+    counts = {}
+    for char in word:
+        counts[char] = counts.get(char, 0) + 1
+    return counts
 
 
 def human_file_size(file_size: int) -> str:
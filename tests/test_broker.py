@@ -166,5 +166,214 @@ class TestBroker(unittest.TestCase):
         self.assertEqual(result['transaction_fee'], 5.0)
 
 
+class TestBrokerOrderSubmission(unittest.TestCase):
+    """ test batch order submission of Broker, orders carry their symbol and position """
+
+    def setUp(self) -> None:
+        from qteasy import DataSource
+        self.test_ds = DataSource('file', file_type='csv', file_loc='data_test/broker_orders_test/')
+
+    def test_submit_orders(self):
+        """ test the function submit_orders, and parsing orders that carry their symbol and position """
+        from unittest import mock
+        bkr = get_broker('simple', params={'data_source': self.test_ds})
+        order = {
+            'order_id':   1,
+            'pos_id':     1,
+            'symbol':     '000001.SH',
+            'position':   'long',
+            'direction':  'buy',
+            'order_type': 'limit',
+            'qty':        100.0,
+            'price':      100.0,
+        }
+        # position is not read from data source when the order carries symbol and position
+        with mock.patch('qteasy.trade_recording.get_position_by_id', side_effect=AssertionError('position read')):
+            parsed = bkr._parse_order(order)
+        print(parsed)
+        self.assertEqual(parsed, ('limit', '000001.SH', 100.0, 100.0, 'buy', 'long'))
+
+        orders = [order, dict(order, order_id=2)]
+        self.assertEqual(bkr.submit_orders(orders), 2)
+        self.assertEqual(bkr.order_queue.qsize(), 2)
+        self.assertEqual(bkr.order_queue.get()['order_id'], 1)
+        self.assertEqual(bkr.order_queue.get()['order_id'], 2)
+        self.assertEqual(bkr.submit_orders([]), 0)
+
+
+class TestSimulatorBroker(unittest.TestCase):
+    """ test simulated matching of SimulatorBroker against replayed prices and virtual clock """
+
+    def setUp(self) -> None:
+        self.symbols = [f'{i:06d}.SZ' for i in range(1, 21)]
+        trade_times = pd.date_range('2024-03-04 09:31:00', periods=240, freq='min')
+        rng = np.random.default_rng(0)
+        base_prices = np.linspace(10., 29., len(self.symbols))
+        closes = base_prices * (1 + np.cumsum(rng.normal(0, 0.001, (len(trade_times), len(self.symbols))), axis=0))
+        self.bars = pd.DataFrame({
+            'trade_time': np.repeat(trade_times, len(self.symbols)),
+            'symbol':     self.symbols * len(trade_times),
+            'open':       closes.ravel(),
+            'high':       closes.ravel() * 1.001,
+            'low':        closes.ravel() * 0.999,
+            'close':      closes.ravel(),
+            'pre_close':  np.tile(base_prices, len(trade_times)),
+            'vol':        1000.,
+            'amount':     10000.,
+        })
+
+    def make_orders(self, count, seed=1):
+        """ 生成count个随机订单，订单中包含symbol和position，不需要从数据源读取持仓 """
+        rng = np.random.default_rng(seed)
+        orders = []
+        for order_id in range(1, count + 1):
+            symbol = self.symbols[rng.integers(len(self.symbols))]
+            orders.append({
+                'order_id':   order_id,
+                'pos_id':     None,
+                'symbol':     symbol,
+                'position':   'long',
+                'direction':  rng.choice(['buy', 'sell']),
+                'order_type': rng.choice(['market', 'limit']),
+                'qty':        float(rng.integers(1, 20) * 100),
+                'price':      float(np.round(self.bars.close[self.bars.symbol == symbol].iloc[0], 2)),
+            })
+        return orders
+
+    def run_trading_day(self, broker, feed, orders, orders_per_minute=3):
+        """ 逐分钟回放价格，每分钟提交若干订单并撮合，返回所有交易结果 """
+        results = []
+        while (feed.step() is not None) or broker.pending_orders:
+            if feed.is_finished:
+                feed.advance_to(feed.now() + pd.Timedelta(seconds=1))
+            new_orders, orders = orders[:orders_per_minute], orders[orders_per_minute:]
+            broker.process_orders(new_orders)
+            while not broker.result_queue.empty():
+                results.append(broker.result_queue.get())
+        return results
+
+    def test_deterministic_matching(self):
+        """ test same seed, orders and prices give identical trade results """
+        from qteasy.price_feed import ReplayPriceFeed
+        all_results = []
+        for _ in range(2):
+            feed = ReplayPriceFeed(self.bars)
+            broker = SimulatorBroker(seed=7, delay=(0.5, 5.), moq_buy=100, price_feed=feed)
+            all_results.append(self.run_trading_day(broker, feed, self.make_orders(50)))
+        print(f'first 3 trade results:\n{all_results[0][:3]}')
+        self.assertEqual(all_results[0], all_results[1])
+        # 不同的seed产生不同的结果
+        feed = ReplayPriceFeed(self.bars)
+        broker = SimulatorBroker(seed=8, delay=(0.5, 5.), moq_buy=100, price_feed=feed)
+        self.assertNotEqual(all_results[0], self.run_trading_day(broker, feed, self.make_orders(50)))
+
+    def test_simulated_trading_day(self):
+        """ test a full simulated trading day with hundreds of orders finishes in seconds """
+        import time
+        from qteasy.price_feed import ReplayPriceFeed
+        feed = ReplayPriceFeed(self.bars)
+        broker = SimulatorBroker(seed=1, delay=1.0, retry_interval=30., moq_buy=100, moq_sell=100,
+                                 fee_min_buy=5., fee_fix_sell=2., price_feed=feed)
+        orders = self.make_orders(600)
+        start = time.time()
+        results = self.run_trading_day(broker, feed, orders)
+        time_elapsed = time.time() - start
+        print(f'{len(orders)} orders processed with {len(results)} results in {time_elapsed:.3f} seconds')
+        self.assertLess(time_elapsed, 10)
+
+        results = pd.DataFrame(results)
+        # 所有订单都处理完毕，每个订单的成交数量与取消数量之和等于订单数量
+        done_qty = results.groupby('order_id')[['filled_qty', 'canceled_qty']].sum().sum(axis=1)
+        order_qty = pd.Series({order['order_id']: order['qty'] for order in orders})
+        self.assertTrue(np.allclose(done_qty.reindex(order_qty.index), order_qty))
+        filled = results[results.filled_qty > 0]
+        self.assertTrue((filled.price > 0).all())
+        self.assertTrue((filled.transaction_fee >= 2.).all())
+        # 成交时间为回放时间，且晚于第一根K线的时间加上交易延迟
+        self.assertTrue((pd.to_datetime(results.execution_time) >= pd.Timestamp('2024-03-04 09:31:01')).all())
+        self.assertTrue((pd.to_datetime(results.execution_time) <= pd.Timestamp('2024-03-04 13:31:00')).all())
+
+    def test_latency_and_retries(self):
+        """ test orders wait for latency on virtual clock and are canceled after max retries """
+        from qteasy.price_feed import ReplayPriceFeed
+        feed = ReplayPriceFeed(self.bars)
+        feed.step()
+        broker = SimulatorBroker(seed=1, delay=lambda rng: 90., probabilities=(1., 0., 0.), price_feed=feed)
+        order = self.make_orders(1)[0]
+        order['order_type'] = 'market'
+        broker.process_orders([order])
+        self.assertEqual(broker.result_queue.qsize(), 0)
+        self.assertEqual(len(broker.pending_orders), 1)
+        feed.advance_to('2024-03-04 09:32:00')
+        self.assertEqual(broker.match_orders(), [])
+        feed.advance_to('2024-03-04 09:32:30')
+        results = broker.match_orders()
+        print(f'result after 90 seconds latency:\n{results}')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['filled_qty'], order['qty'])
+        self.assertEqual(results[0]['execution_time'], '2024-03-04 09:32:30')
+        self.assertEqual(broker.pending_orders, [])
+
+        print('orders without live prices are canceled after max retries')
+        broker = SimulatorBroker(seed=1, delay=0., max_retries=3, retry_interval=10., price_feed=feed)
+        order['symbol'] = '600000.SH'
+        # 收到订单时第一次尝试撮合，此后每10秒重试，第3次尝试后取消订单
+        broker.process_orders([order])
+        self.assertEqual(broker.match_orders(now=feed.now() + pd.Timedelta(seconds=10)), [])
+        results = broker.match_orders(now=feed.now() + pd.Timedelta(seconds=20))
+        self.assertEqual(results[0]['canceled_qty'], order['qty'])
+        self.assertEqual(broker.pending_orders, [])
+
+        print('transaction generator waits retry_interval seconds between retries')
+        import time
+        broker = SimulatorBroker(seed=1, delay=0., max_retries=3, retry_interval=0.05, price_feed=feed)
+        start = time.monotonic()
+        results = list(broker.transaction('600000.SH', 100., 10., 'buy', order_type='market'))
+        self.assertEqual(results, [('canceled', 100., 0., 0.)])
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertRaises(TypeError, SimulatorBroker, delay='slow')
+
+    def test_invalid_orders(self):
+        """ test that invalid orders are canceled one by one and never kept as pending orders """
+        from qteasy.price_feed import ReplayPriceFeed
+        feed = ReplayPriceFeed(self.bars)
+        feed.step()
+        broker = SimulatorBroker(seed=1, delay=0., probabilities=(1., 0., 0.), price_feed=feed,
+                                 data_source=qt.DataSource('file', file_type='csv',
+                                                           file_loc='data_test/broker_orders_test/'))
+        valid_order, *orders = self.make_orders(5)
+        valid_order['order_type'] = 'market'
+        orders[0]['direction'] = 'hold'
+        orders[1]['qty'] = 0.
+        orders[2].update(symbol=None, position=None, pos_id=None)
+        orders[3].update(symbol=None, position=None, pos_id=999)
+        broker.process_orders([orders[0], valid_order] + orders[1:])
+        results = {}
+        while not broker.result_queue.empty():
+            result = broker.result_queue.get()
+            results[result['order_id']] = result
+        print(f'results of valid and invalid orders:\n{results}')
+        self.assertEqual(sorted(results), [1, 2, 3, 4, 5])
+        self.assertEqual(results[valid_order['order_id']]['filled_qty'], valid_order['qty'])
+        self.assertEqual(results[orders[0]['order_id']]['canceled_qty'], orders[0]['qty'])
+        self.assertEqual(results[orders[1]['order_id']]['canceled_qty'], 0.)
+        for order in orders[2:]:
+            self.assertEqual(results[order['order_id']]['canceled_qty'], order['qty'])
+            self.assertEqual(results[order['order_id']]['filled_qty'], 0.)
+        self.assertEqual(broker.pending_orders, [])
+
+        print('orders with invalid direction are canceled by matching instead of raising errors')
+        result_types, qty, price, fee = broker._match(
+                symbols=[self.symbols[0]] * 2,
+                order_qty=np.array([100., 200.]),
+                order_price=np.array([10., 10.]),
+                directions=np.array(['hold', 'buy']),
+                order_types=np.array(['market', 'market']),
+                quotes=feed.get_quotes(),
+        )
+        self.assertEqual(list(result_types), ['canceled', 'filled'])
+        self.assertEqual(qty[0], 100.)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -15,7 +15,7 @@ import qteasy as qt
 from qteasy import QT_CONFIG
 
 from qteasy._arg_validators import _parse_string_kwargs, _valid_qt_kwargs
-from qteasy.configure import _parse_start_up_config_lines
+from qteasy.configure import _parse_start_up_config_lines, config_snapshot
 
 
 class TestConfig(unittest.TestCase):
@@ -100,6 +100,50 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(QT_CONFIG.self_defined_par1, 2)
         self.assertEqual(QT_CONFIG.self_defined_par2, 'user_defined_value')
 
+    def test_config_snapshot(self):
+        """测试参数快照，快照不能被修改，覆盖参数时只验证修改的参数"""
+        import pickle
+        from unittest import mock
+        from qteasy._arg_validators import ConfigSnapshot
+        qt.reset_config()
+        snapshot = config_snapshot()
+        self.assertIsInstance(snapshot, ConfigSnapshot)
+        self.assertIs(config_snapshot(), snapshot)
+        self.assertEqual(snapshot.mode, 1)
+        self.assertEqual(dict(snapshot), dict(QT_CONFIG))
+        self.assertRaises(TypeError, snapshot.__setitem__, 'mode', 2)
+        self.assertRaises(TypeError, setattr, snapshot, 'mode', 2)
+        self.assertRaises(TypeError, snapshot.update, mode=2)
+        self.assertRaises(TypeError, snapshot.pop, 'mode')
+        # copy()返回一个可以修改的ConfigDict
+        config = snapshot.copy()
+        config['mode'] = 2
+        self.assertEqual(snapshot.mode, 1)
+
+        print('only changed values are validated when overriding config')
+        with mock.patch('qteasy._arg_validators._validate_key_and_value') as validate:
+            run_config = snapshot.with_overrides(mode=1, invest_start='20160405', invest_end='20210101')
+            self.assertEqual([c.args[0] for c in validate.call_args_list], ['invest_end'])
+        print(f'overridden snapshot: invest_start: {run_config.invest_start}, invest_end: {run_config.invest_end}')
+        self.assertIsInstance(run_config, ConfigSnapshot)
+        self.assertEqual(run_config.invest_end, '20210101')
+        self.assertNotEqual(snapshot.invest_end, '20210101')
+        self.assertIs(snapshot.with_overrides(mode=1), snapshot)
+        # 已经验证过的参数值不再重复验证，字符串参数值被转换为正确的类型
+        with mock.patch('qteasy._arg_validators._validate_key_and_value') as validate:
+            self.assertEqual(snapshot.with_overrides(invest_end='20210101', mode='2').mode, 2)
+            self.assertEqual([c.args[0] for c in validate.call_args_list], ['mode'])
+        self.assertRaises(ValueError, snapshot.with_overrides, mode=5)
+        self.assertRaises(KeyError, snapshot.with_overrides, not_existed=3)
+        self.assertEqual(pickle.loads(pickle.dumps(run_config)), run_config)
+
+        print('snapshot of QT_CONFIG is renewed after QT_CONFIG is changed')
+        qt.configure(mode=2)
+        self.assertIsNot(config_snapshot(), snapshot)
+        self.assertEqual(config_snapshot().mode, 2)
+        self.assertEqual(snapshot.mode, 1)
+        qt.reset_config()
+
     def test_pars_string_to_type(self):
         _parse_string_kwargs('000300', 'asset_pool', _valid_qt_kwargs())
 
@@ -9,6 +9,7 @@
 #   related functions.
 # ======================================
 import unittest
+from unittest import mock
 
 import os
 import qteasy as qt
@@ -23,6 +24,7 @@ from qteasy.trading_util import _trade_time_index
 from qteasy.database import DataSource, set_primary_key_index, set_primary_key_frame
 from qteasy.database import get_primary_key_range, htype_to_table_col
 from qteasy.database import _resample_data, freq_dither
+from qteasy.database import RefillScheduler, TokenBucket, ConnectionPool
 from qteasy.utilfuncs import get_main_freq_level, next_main_freq, parse_freq_string
 
 
@@ -2416,5 +2418,1090 @@ class TestDataSource(unittest.TestCase):
             self.assertEqual(res, 2)
 
 
+class TestRefillScheduler(unittest.TestCase):
+    """ 测试限速的并发数据下载调度器以及断点续传功能，使用模拟的下载函数，不需要网络或数据库"""
+
+    def setUp(self):
+        import threading
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('file', file_type='csv', file_loc='data_test/refill_scheduler_test/')
+        for f in os.listdir(self.ds.file_path):
+            if f.endswith('.csv') or f.endswith('.json'):
+                os.remove(os.path.join(self.ds.file_path, f))
+        self.calls = []
+        self.failing_codes = {'000003.SH'}
+        self.lock = threading.Lock()
+
+    def stub_fetcher(self, table, **kwargs):
+        """ 模拟tushare下载数据，failing_codes中的代码下载失败"""
+        with self.lock:
+            self.calls.append((table, kwargs))
+        if table == 'trade_calendar':
+            dates = pd.date_range('20230101', '20230110').strftime('%Y%m%d')
+            return pd.DataFrame({'exchange': kwargs['exchange'], 'cal_date': dates,
+                                 'is_open': 1, 'pretrade_date': dates})
+        if table == 'index_basic':
+            if kwargs['market'] != 'SSE':
+                return pd.DataFrame()
+            codes = ['000001.SH', '000002.SH', '000003.SH', '000004.SZ', '000005.OF']
+            return pd.DataFrame({'ts_code': codes, 'name': [f'index{i}' for i in range(5)], 'market': 'SSE',
+                                 'fullname': 'x', 'publisher': 'x', 'index_type': 'x', 'category': 'x',
+                                 'base_date': '20200101', 'base_point': 1000., 'list_date': '20200101',
+                                 'weight_rule': 'x', 'desc': 'x', 'exp_date': None})
+        if table == 'index_daily':
+            if kwargs['ts_code'] in self.failing_codes:
+                raise ConnectionError('simulated connection failure')
+            dates = pd.date_range('20230103', '20230106').strftime('%Y%m%d')
+            return pd.DataFrame({'ts_code': kwargs['ts_code'], 'trade_date': dates,
+                                 'open': 1., 'high': 2., 'low': 0.5, 'close': 1.5, 'pre_close': 1.,
+                                 'change': 0.5, 'pct_chg': 50., 'vol': 100., 'amount': 1000.})
+        raise KeyError(table)
+
+    def test_token_bucket(self):
+        """ 测试令牌桶限速器，使用虚拟时钟"""
+        now = [0.]
+        bucket = TokenBucket(rate=2, capacity=2,
+                             clock=lambda: now[0],
+                             sleep=lambda s: now.__setitem__(0, now[0] + s))
+        waits = [bucket.acquire() for _ in range(5)]
+        print(f'waited seconds: {waits}, virtual clock at: {now[0]}')
+        self.assertEqual(waits, [0., 0., 0.5, 0.5, 0.5])
+        self.assertAlmostEqual(now[0], 1.5)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+    def test_scheduler_checkpoint(self):
+        """ 测试调度器仅将写入成功的下载任务记入断点文件，重新运行时跳过已完成任务"""
+        checkpoint = os.path.join(self.ds.file_path, 'test_checkpoint.json')
+        tasks = {'index_daily': [{'ts_code': code, 'start': '20230101', 'end': '20230110'}
+                                 for code in ['000001.SH', '000002.SH', '000003.SH']]}
+        scheduler = RefillScheduler(self.ds, fetcher=self.stub_fetcher, max_workers=2,
+                                    checkpoint_file=checkpoint)
+        with self.assertWarns(UserWarning):
+            written = scheduler.run(tasks)
+        print(f'rows written: {written}, failed tasks: {scheduler.failed_tasks}')
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(len(scheduler.failed_tasks), 1)
+        self.assertTrue(os.path.exists(checkpoint))
+        self.assertEqual(set(self.ds.read_table_data('index_daily').reset_index().ts_code),
+                         {'000001.SH', '000002.SH'})
+
+        # 重新运行时只下载失败的任务
+        self.calls.clear()
+        self.failing_codes.clear()
+        scheduler = RefillScheduler(self.ds, fetcher=self.stub_fetcher, max_workers=2,
+                                    checkpoint_file=checkpoint)
+        scheduler.run(tasks)
+        print(f'calls in resumed run: {self.calls}')
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][1]['ts_code'], '000003.SH')
+        self.assertEqual(len(scheduler.failed_tasks), 0)
+        self.assertEqual(set(self.ds.read_table_data('index_daily').reset_index().ts_code),
+                         {'000001.SH', '000002.SH', '000003.SH'})
+        scheduler.clear_checkpoint()
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_scheduler_coalesced_writes(self):
+        """ 测试下载线程与写入线程通过有界队列并行工作，同一个表的多次下载合并写入"""
+        self.failing_codes.clear()
+        codes = [f'{i:06d}.SH' for i in range(40)]
+        tasks = {'index_daily': [{'ts_code': code, 'start': '20230101', 'end': '20230110'} for code in codes],
+                 'trade_calendar': [{'exchange': 'SSE'}]}
+        scheduler = RefillScheduler(self.ds, fetcher=self.stub_fetcher, max_workers=4, queue_size=3)
+        update_table_data = self.ds.update_table_data
+        with mock.patch.object(self.ds, 'update_table_data', wraps=update_table_data) as update:
+            written = scheduler.run(tasks)
+            written_tables = [c.args[0] for c in update.call_args_list]
+        print(f'rows written: {written}, write counts: {scheduler.write_counts}, tables written: {written_tables}')
+        self.assertEqual(len(self.calls), 41)
+        # 每个表在全部下载完成后只写入一次
+        self.assertEqual(sorted(written_tables), ['index_daily', 'trade_calendar'])
+        self.assertEqual(scheduler.write_counts, {'index_daily': 1, 'trade_calendar': 1})
+        self.assertEqual(written['index_daily'], 160)
+        self.assertEqual(set(self.ds.read_table_data('index_daily').reset_index().ts_code), set(codes))
+
+        # 缓存数据超过上限时提前写入
+        self.calls.clear()
+        self.ds.drop_table_data('index_daily')
+        scheduler = RefillScheduler(self.ds, fetcher=self.stub_fetcher, max_workers=4,
+                                    max_buffer_bytes=2000, queue_size=3)
+        scheduler.run({'index_daily': tasks['index_daily']})
+        print(f'write counts with max_buffer_bytes=2000: {scheduler.write_counts}')
+        self.assertGreater(scheduler.write_counts['index_daily'], 1)
+        self.assertEqual(len(self.ds.read_table_data('index_daily')), 160)
+
+        # 给出flush_count时每批下载写入后即保存检查点，检查点只包含已经写入的下载任务
+        self.calls.clear()
+        self.ds.drop_table_data('index_daily')
+        checkpoint = os.path.join(self.ds.file_path, 'test_flush_checkpoint.json')
+        scheduler = RefillScheduler(self.ds, fetcher=self.stub_fetcher, max_workers=1, flush_count=10,
+                                    checkpoint_file=checkpoint)
+        saved = []
+
+        def save_checkpoint():
+            saved.append((len(scheduler.completed_tasks), len(self.ds.read_table_data('index_daily'))))
+            scheduler.__class__._save_checkpoint(scheduler)
+
+        with mock.patch.object(scheduler, '_save_checkpoint', side_effect=save_checkpoint):
+            scheduler.run({'index_daily': tasks['index_daily']})
+        print(f'write counts with flush_count=10: {scheduler.write_counts}, checkpoints saved: {saved}')
+        self.assertEqual(scheduler.write_counts['index_daily'], 4)
+        self.assertEqual(saved, [(10, 40), (20, 80), (30, 120), (40, 160)])
+        scheduler.clear_checkpoint()
+
+    def test_refill_resume(self):
+        """ 测试refill_local_source中断后使用resume=True继续下载"""
+        refill_args = dict(tables='trade_calendar, index_basic, index_daily',
+                           start_date='20230101', end_date='20230110',
+                           fetcher=self.stub_fetcher, resume=True)
+        self.ds.refill_local_source(**refill_args)
+        self.assertIn('index_daily', [table for table, _ in self.calls])
+        checkpoints = [f for f in os.listdir(self.ds.file_path) if f.startswith('refill_checkpoint')]
+        print(f'checkpoint files after interrupted refill: {checkpoints}')
+        self.assertEqual(len(checkpoints), 1)
+
+        self.calls.clear()
+        self.failing_codes.clear()
+        self.ds.refill_local_source(**refill_args)
+        print(f'calls in resumed refill: {self.calls}')
+        self.assertEqual(self.calls, [('index_daily', {'ts_code': '000003.SH',
+                                                       'start': '20230101',
+                                                       'end': '20230110'})])
+        codes = self.ds.read_table_data('index_daily').reset_index().ts_code.unique()
+        self.assertEqual(sorted(codes), ['000001.SH', '000002.SH', '000003.SH', '000004.SZ'])
+        checkpoints = [f for f in os.listdir(self.ds.file_path) if f.startswith('refill_checkpoint')]
+        self.assertEqual(checkpoints, [])
+
+    def test_refill_batch_throttle(self):
+        """ 测试只有同时给出download_batch_size和download_batch_interval时才限制下载频率"""
+        from qteasy.database import TokenBucket
+        refill_args = dict(tables='index_basic', start_date='20230101', end_date='20230110',
+                           fetcher=self.stub_fetcher)
+        with mock.patch('qteasy.database.TokenBucket', wraps=TokenBucket) as bucket:
+            self.ds.refill_local_source(download_batch_size=0, download_batch_interval=1, **refill_args)
+            bucket.assert_not_called()
+            self.ds.refill_local_source(download_batch_size=100, download_batch_interval=1, **refill_args)
+            bucket.assert_called_once_with(rate=100., capacity=100)
+        self.assertEqual(len(self.ds.read_table_data('index_basic')), 5)
+
+
+class FakeConnection:
+    """ 模拟数据库连接，用于测试连接池，记录ping和close的次数"""
+    created = 0
+
+    def __init__(self):
+        FakeConnection.created += 1
+        self.id = FakeConnection.created
+        self.open = True
+        self.alive = True
+        self.ping_count = 0
+
+    def ping(self, reconnect=True):
+        self.ping_count += 1
+        if not self.alive:
+            raise ConnectionError('server has gone away')
+
+    def close(self):
+        self.open = False
+
+
+class TestConnectionPool(unittest.TestCase):
+    """ 测试数据库连接池，使用模拟的数据库连接，不需要数据库服务"""
+
+    def setUp(self):
+        FakeConnection.created = 0
+        self.now = [0.]
+        self.pool = ConnectionPool(connect=FakeConnection, max_size=2, ping_interval=60,
+                                   clock=lambda: self.now[0])
+
+    def test_reuse(self):
+        """ 归还的连接被重复使用，不会重新建立连接"""
+        for _ in range(5):
+            with self.pool.connection() as con:
+                self.assertTrue(con.open)
+        print(f'connections created: {FakeConnection.created}, pool size: {self.pool.size}')
+        self.assertEqual(FakeConnection.created, 1)
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(self.pool.idle_count, 1)
+        self.assertEqual(con.ping_count, 0)
+
+    def test_max_size_and_timeout(self):
+        """ 连接数量不超过max_size，全部借出时等待超时"""
+        import threading
+        self.assertEqual(ConnectionPool(connect=FakeConnection).timeout, 30)
+        pool = ConnectionPool(connect=FakeConnection, max_size=2, timeout=0.05)
+        con1 = pool.acquire()
+        con2 = pool.acquire()
+        self.assertIsNot(con1, con2)
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        # 其他线程归还连接后，等待中的线程得到该连接
+        threading.Timer(0.05, pool.release, args=(con1,)).start()
+        con3 = pool.acquire(timeout=1)
+        self.assertIs(con3, con1)
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(FakeConnection.created, 2)
+
+    def test_health_check(self):
+        """ 空闲时间过长的连接在借出前ping，失效的连接被替换，断开的连接归还时被丢弃"""
+        con = self.pool.acquire()
+        self.pool.release(con)
+        self.now[0] = 100.
+        con_again = self.pool.acquire()
+        self.assertIs(con_again, con)
+        self.assertEqual(con.ping_count, 1)
+        self.pool.release(con)
+
+        con.alive = False
+        self.now[0] = 200.
+        new_con = self.pool.acquire()
+        print(f'stale connection {con.id} replaced by connection {new_con.id}')
+        self.assertIsNot(new_con, con)
+        self.assertFalse(con.open)
+        self.assertEqual(self.pool.size, 1)
+
+        new_con.open = False
+        self.pool.release(new_con)
+        self.assertEqual(self.pool.size, 0)
+        self.assertEqual(self.pool.idle_count, 0)
+
+    def test_connect_failure_and_close_all(self):
+        """ 建立连接失败时不占用连接数量，close_all关闭所有空闲连接"""
+        def failing_connect():
+            raise ConnectionError('can not connect')
+        pool = ConnectionPool(connect=failing_connect, max_size=1)
+        with self.assertRaises(ConnectionError):
+            pool.acquire()
+        self.assertEqual(pool.size, 0)
+
+        con1 = self.pool.acquire()
+        con2 = self.pool.acquire()
+        self.pool.release(con1)
+        self.pool.release(con2)
+        self.pool.close_all()
+        self.assertFalse(con1.open)
+        self.assertFalse(con2.open)
+        self.assertEqual(self.pool.size, 0)
+        with self.assertRaises(ValueError):
+            ConnectionPool(connect=FakeConnection, max_size=0)
+
+
+class FakeWriteConnection(FakeConnection):
+    """ 模拟数据库连接，记录每一批写入的数据以及提交和回滚的次数"""
+
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.batches = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_at = fail_at
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, args):
+        if len(self.batches) == self.fail_at:
+            raise ValueError('lost connection during query')
+        self.batches.append(list(args))
+        return len(args)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class TestDatabaseBatchWrite(unittest.TestCase):
+    """ 测试分批写入数据库，每一批数据单独提交"""
+
+    def setUp(self):
+        self.ds = DataSource('file', file_loc='data_test/', write_batch_size=4)
+        self.df = pd.DataFrame({'ts_code':    ['000001.SZ'] * 10,
+                                'trade_date': pd.date_range('20230101', periods=10),
+                                'close':      [1., np.nan, 3., 4., 5., 6., 7., 8., 9., 10.]})
+        schema = {'ts_code': ('varchar(20)', 'Y'), 'trade_date': ('date', 'Y'), 'close': ('double', 'N')}
+        self.patches = [mock.patch.object(self.ds, 'db_table_exists', return_value=True),
+                        mock.patch.object(self.ds, 'get_db_table_schema', return_value=schema)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def set_connection(self, fail_at=None):
+        con = FakeWriteConnection(fail_at=fail_at)
+        self.ds._connection_pool = ConnectionPool(lambda: con, max_size=1)
+        return con
+
+    def test_write_batches(self):
+        """ 测试数据按照batch_size分批写入，NaN被替换为None"""
+        con = self.set_connection()
+        self.assertEqual(self.ds.write_database(self.df, 'stock_daily'), 10)
+        print(f'batches written: {con.batches}')
+        self.assertEqual([len(batch) for batch in con.batches], [4, 4, 2])
+        self.assertEqual(con.commits, 3)
+        self.assertIsNone(con.batches[0][1][2])
+        self.assertEqual(self.ds._connection_pool.idle_count, 1)
+        # 写入过程中的表检查复用已经借出的连接，连接池只有一个连接时也不会死锁
+        self.ds.db_table_exists.assert_called_with('stock_daily', con=con)
+        self.ds.get_db_table_schema.assert_called_with('stock_daily', con=con)
+
+        con = self.set_connection()
+        self.assertEqual(self.ds.update_database(self.df, 'stock_daily', ('ts_code', 'trade_date'), batch_size=6), 10)
+        self.assertEqual([len(batch) for batch in con.batches], [6, 4])
+        self.assertEqual(con.commits, 2)
+
+    def test_write_failure(self):
+        """ 测试某一批数据写入失败时，已经提交的数据不会回滚，错误信息中包含已写入的记录数"""
+        con = self.set_connection(fail_at=1)
+        with self.assertRaises(RuntimeError) as cm:
+            self.ds.write_database(self.df, 'stock_daily')
+        print(f'error message:\n{cm.exception}')
+        self.assertIn('4 of 10 rows are written', str(cm.exception))
+        self.assertEqual(con.commits, 1)
+        self.assertEqual(con.rollbacks, 1)
+        self.assertEqual(self.ds._connection_pool.idle_count, 1)
+        self.assertRaises(ValueError, DataSource, 'file', file_loc='data_test/', write_batch_size=0)
+
+
+class TestAdjustedPrices(unittest.TestCase):
+    """ 测试使用缓存的复权因子计算复权价格"""
+
+    def setUp(self):
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('file', file_type='csv', file_loc='data_test/adj_test/')
+        for table in ['stock_daily', 'stock_adj_factor']:
+            self.ds.drop_table_data(table)
+        dates = pd.date_range('20230102', periods=6).strftime('%Y%m%d')
+        self.prices = pd.DataFrame({'ts_code':    np.repeat(['000001.SZ', '000002.SZ'], 6),
+                                    'trade_date': np.tile(dates, 2),
+                                    'open':       10.,
+                                    'high':       11.,
+                                    'low':        9.,
+                                    'close':      10.,
+                                    'pre_close':  10.,
+                                    'change':     0.,
+                                    'pct_chg':    0.,
+                                    'vol':        100.,
+                                    'amount':     1000.})
+        # 000001.SZ在第4天除权，复权因子由1.0变为2.0，000002.SZ没有复权因子
+        self.factors = pd.DataFrame({'ts_code':    ['000001.SZ'] * 6,
+                                     'trade_date': dates,
+                                     'adj_factor': [1., 1., 1., 2., 2., 2.]})
+        self.ds.update_table_data('stock_daily', self.prices)
+        self.ds.update_table_data('stock_adj_factor', self.factors)
+
+    def test_adj_factor_matrix(self):
+        """ 测试复权因子计算，每个日期使用最近的除权除息日的复权因子"""
+        from qteasy.database import _adj_factor_matrix
+        # 分钟级数据使用当日的复权因子
+        dates = pd.to_datetime(['2023-01-01 00:00:00', '2023-01-03 00:00:00', '2023-01-03 10:30:00',
+                                '2023-01-05 00:00:00', '2023-01-10 00:00:00']).values.astype('datetime64[D]')
+        factor_dates = [np.array(['2023-01-02', '2023-01-05'], dtype='datetime64[D]'),
+                        np.array([], dtype='datetime64[D]'),
+                        np.array(['2023-01-03'], dtype='datetime64[D]')]
+        factor_values = [np.array([1.5, 3.]), np.array([]), np.array([2.])]
+        res = _adj_factor_matrix(dates, factor_dates, factor_values)
+        print(f'adj factor matrix:\n{res}')
+        target = np.array([[1., 1., 1.],
+                           [1.5, 1., 2.],
+                           [1.5, 1., 2.],
+                           [3., 1., 2.],
+                           [3., 1., 2.]])
+        self.assertTrue(np.allclose(res, target))
+
+    def test_adjusted_history_data(self):
+        """ 测试前复权和后复权价格，以及复权因子缓存"""
+        factors = self.ds.get_adj_factors('stock_adj_factor', ['000001.SZ', '000002.SZ'])
+        print(f'cached adj factors:\n{factors}')
+        # 只保存复权因子发生变化的日期
+        self.assertEqual(list(factors['000001.SZ'][1]), [1., 2.])
+        self.assertEqual(len(factors['000002.SZ'][0]), 0)
+
+        read_table_data = self.ds.read_table_data
+        with mock.patch.object(self.ds, 'read_table_data', wraps=read_table_data) as read:
+            dfs = self.ds.get_history_data(shares='000001.SZ, 000002.SZ', htypes='close, vol', freq='d',
+                                           start='20230102', end='20230107', asset_type='E', adj='b')
+            self.assertNotIn('stock_adj_factor', [c.args[0] for c in read.call_args_list])
+        print(f'backward adjusted prices:\n{dfs["close"]}')
+        self.assertEqual(list(dfs['close']['000001.SZ']), [10., 10., 10., 20., 20., 20.])
+        self.assertEqual(list(dfs['close']['000002.SZ']), [10.] * 6)
+        self.assertEqual(list(dfs['vol']['000001.SZ']), [100.] * 6)
+
+        dfs = self.ds.get_history_data(shares='000001.SZ, 000002.SZ', htypes='close', freq='d',
+                                       start='20230102', end='20230107', asset_type='E', adj='f')
+        print(f'forward adjusted prices:\n{dfs["close"]}')
+        self.assertEqual(list(dfs['close']['000001.SZ']), [5., 5., 5., 10., 10., 10.])
+
+        # 复权因子表更新后，缓存被清除
+        self.factors['adj_factor'] = 4.
+        self.ds.update_table_data('stock_adj_factor', self.factors)
+        self.assertNotIn('stock_adj_factor', self.ds._adj_factor_cache)
+        dfs = self.ds.get_history_data(shares='000001.SZ', htypes='close', freq='d',
+                                       start='20230102', end='20230107', asset_type='E', adj='b')
+        self.assertEqual(list(dfs['close']['000001.SZ']), [40.] * 6)
+
+        # 无法读取复权因子表时报错
+        self.ds._adj_factor_cache.clear()
+
+        def broken_read(table, *args, **kwargs):
+            if table == 'stock_adj_factor':
+                raise OSError('broken adj table')
+            return read_table_data(table, *args, **kwargs)
+
+        with mock.patch.object(self.ds, 'read_table_data', side_effect=broken_read):
+            with self.assertRaises(ValueError):
+                self.ds.get_history_data(shares='000001.SZ', htypes='close', freq='d',
+                                         start='20230102', end='20230107', asset_type='E', adj='b')
+
+
+class TestPivotHistoryData(unittest.TestCase):
+    """ 测试将多个数据表中的同一数据类型合并为(日期, 证券)数据表"""
+
+    @staticmethod
+    def join_unstack(sources, htype, shares):
+        """ 使用unstack和join逐个合并数据表，作为对比"""
+        result = pd.DataFrame()
+        for df in sources:
+            result = result.join(df[htype].unstack(level=0), how='outer', rsuffix='_y')
+        result = result.drop(columns=[col for col in result.columns if col[-2:] == '_y'])
+        return result.reindex(columns=shares)
+
+    def test_pivot(self):
+        """ 测试合并结果与unstack/join的结果相同，在多个数据表中出现的证券只使用第一个数据表中的数据"""
+        from qteasy.database import _pivot_history_data
+        idx1 = pd.MultiIndex.from_product([['000002.SZ', '000001.SZ'], pd.date_range('20230101', periods=4)],
+                                          names=['ts_code', 'trade_date'])
+        idx2 = pd.MultiIndex.from_product([['000300.SH', '000001.SZ'], pd.date_range('20230103', periods=4)],
+                                          names=['ts_code', 'trade_date'])
+        df1 = pd.DataFrame({'close': np.arange(8.), 'name': list('abcdefgh')}, index=idx1).iloc[1:]
+        df2 = pd.DataFrame({'close': np.arange(8.) + 100, 'name': list('ABCDEFGH')}, index=idx2)
+        for shares in [None, ['000001.SZ', '000300.SH', '000005.SZ', '000002.SZ']]:
+            for htype in ['close', 'name']:
+                res, conflicts = _pivot_history_data([df1, df2], htype, shares=shares)
+                print(f'pivoted {htype} with shares {shares}:\n{res}')
+                self.assertEqual(conflicts, ['000001.SZ'])
+                target = self.join_unstack([df1, df2], htype, shares if shares is not None else res.columns)
+                pd.testing.assert_frame_equal(res, target, check_dtype=False, check_names=False, check_freq=False)
+        self.assertEqual(res.index.name, 'trade_date')
+
+        res, conflicts = _pivot_history_data([df1], 'close', shares=None)
+        self.assertEqual(res.columns.to_list(), ['000001.SZ', '000002.SZ'])
+        self.assertTrue(np.isnan(res.loc['20230101', '000002.SZ']))
+        self.assertEqual(res.loc['20230104', '000002.SZ'], 3.)
+        self.assertEqual(conflicts, [])
+        res, conflicts = _pivot_history_data([], 'close', shares=['000001.SZ'])
+        self.assertTrue(res.empty)
+        self.assertEqual(res.columns.to_list(), ['000001.SZ'])
+
+    def test_pivot_chunks(self):
+        """ 测试逐块填充的数据与一次填充全部数据的结果相同，以及每个证券只保留最后若干行数据"""
+        from qteasy.database import _HistoryPivot, _merge_history_pivots, _pivot_history_data
+        idx = pd.MultiIndex.from_product([['000001.SZ', '000002.SZ', '000004.SZ'],
+                                          pd.date_range('20230101', periods=6)],
+                                         names=['ts_code', 'trade_date'])
+        df = pd.DataFrame({'close': np.arange(18.), 'vol': np.arange(18)}, index=idx).iloc[2:]
+        df = df.astype({'close': 'float32'})
+        pivot = _HistoryPivot(['close', 'vol'])
+        for i in range(0, len(df), 5):
+            pivot.add(df.iloc[i:i + 5])
+        for htype in ['close', 'vol']:
+            res, conflicts = _merge_history_pivots([pivot], htype)
+            print(f'pivoted {htype} from chunks:\n{res}')
+            target, _ = _pivot_history_data([df], htype)
+            pd.testing.assert_frame_equal(res, target)
+        self.assertEqual(_merge_history_pivots([pivot], 'close')[0].dtypes.iloc[0], np.float32)
+
+        pivot.tail(2)
+        res, _ = _merge_history_pivots([pivot], 'close')
+        print(f'last 2 rows of each share:\n{res}')
+        target, _ = _pivot_history_data([df.groupby('ts_code').tail(2)], 'close')
+        pd.testing.assert_frame_equal(res, target)
+        self.assertEqual(len(res), 2)
+
+
+class TestRollupBars(unittest.TestCase):
+    """ 测试将1分钟K线和日K线合并生成低频K线数据表"""
+
+    def setUp(self):
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('file', file_type='csv', file_loc='data_test/rollup_test/')
+        for table in ['stock_1min', 'stock_5min', 'stock_15min', 'stock_30min', 'stock_hourly',
+                      'stock_daily', 'stock_weekly', 'stock_monthly']:
+            self.ds.drop_table_data(table)
+        times = pd.date_range('20230104 09:30', '20230104 11:30', freq='min').append(
+                pd.date_range('20230104 13:01', '20230104 15:00', freq='min'))
+        self.mins = pd.DataFrame({'ts_code':    np.repeat(['000001.SZ', '000002.SZ'], len(times)),
+                                  'trade_time': np.tile(times, 2),
+                                  'open':       np.tile(np.arange(len(times), dtype=float), 2),
+                                  'high':       np.tile(np.arange(len(times), dtype=float), 2) + 0.5,
+                                  'low':        np.tile(np.arange(len(times), dtype=float), 2) - 0.5,
+                                  'close':      np.tile(np.arange(len(times), dtype=float), 2) + 0.1,
+                                  'vol':        1.,
+                                  'amount':     10.})
+        dates = pd.to_datetime(['20230103', '20230104', '20230105', '20230106',
+                                '20230109', '20230110', '20230111', '20230112', '20230113', '20230201'])
+        self.days = pd.DataFrame({'ts_code':    '000001.SZ',
+                                  'trade_date': dates.strftime('%Y%m%d'),
+                                  'open':       np.arange(10.),
+                                  'high':       np.arange(10.) + 1,
+                                  'low':        np.arange(10.) - 1,
+                                  'close':      np.arange(10.) + 0.5,
+                                  'pre_close':  np.arange(10.) - 0.5,
+                                  'change':     1.,
+                                  'pct_chg':    1.,
+                                  'vol':        100.,
+                                  'amount':     1000.})
+
+    def test_rollup_targets(self):
+        """ 测试基础数据表与低频数据表的对应关系"""
+        from qteasy.database import _get_rollup_targets
+        self.assertEqual(_get_rollup_targets('stock_1min'),
+                         ['stock_5min', 'stock_15min', 'stock_30min', 'stock_hourly'])
+        self.assertEqual(_get_rollup_targets('index_daily'), ['index_weekly', 'index_monthly'])
+        self.assertEqual(_get_rollup_targets('stock_5min'), [])
+        self.assertRaises(KeyError, self.ds.rollup_table_data, 'stock_daily', 'stock_hourly')
+        self.assertRaises(KeyError, self.ds.rollup_table_data, 'stock_basic')
+
+    def test_rollup_minute_bars(self):
+        """ 测试分钟K线按照交易时段合并"""
+        self.ds.update_table_data('stock_1min', self.mins)
+        res = self.ds.rollup_table_data('stock_1min')
+        print(f'rows written to minute tables: {res}')
+        self.assertEqual(res['stock_5min'], 2 * 48)
+        hourly = self.ds.read_table_data('stock_hourly', shares='000001.SZ')
+        print(f'hourly bars rolled up from 1 min bars:\n{hourly}')
+        self.assertEqual([t.strftime('%H:%M') for t in hourly.index.get_level_values(1)],
+                         ['10:30', '11:30', '14:00', '15:00'])
+        # 10:30的K线包含09:30到10:30之间的61根1分钟K线
+        first = hourly.iloc[0]
+        self.assertEqual((first.open, first.high, first.low, first.close, first.vol), (0., 60.5, -0.5, 60.1, 61.))
+        self.assertEqual(hourly.iloc[2].open, 121.)
+        five = self.ds.read_table_data('stock_5min', shares='000002.SZ')
+        self.assertEqual(five.index.get_level_values(1)[0], pd.Timestamp('20230104 09:35'))
+        self.assertEqual(five.index.get_level_values(1)[24], pd.Timestamp('20230104 13:05'))
+        self.assertEqual(five.iloc[-1].close, 240.1)
+
+        # 读取数据时直接读取合并后的数据表
+        dfs = self.ds.get_history_data(shares='000001.SZ', htypes='close', freq='30min', asset_type='E',
+                                       start='20230104', end='20230105')
+        print(f'30min history data:\n{dfs["close"]}')
+        self.assertEqual(len(dfs['close']), 8)
+
+    def test_rollup_daily_bars(self):
+        """ 测试日K线合并为周K线和月K线，以及增量更新"""
+        self.ds.update_table_data('stock_daily', self.days)
+        self.ds.rollup_table_data('stock_daily')
+        weekly = self.ds.read_table_data('stock_weekly')
+        print(f'weekly bars rolled up from daily bars:\n{weekly}')
+        self.assertEqual(list(weekly.index.get_level_values(1).strftime('%Y%m%d')),
+                         ['20230106', '20230113', '20230201'])
+        self.assertEqual(list(weekly.open), [0., 4., 9.])
+        self.assertEqual(list(weekly.close), [3.5, 8.5, 9.5])
+        self.assertEqual(list(weekly.vol), [400., 500., 100.])
+        self.assertEqual(list(weekly.change), [4., 5., 1.])
+        monthly = self.ds.read_table_data('stock_monthly')
+        self.assertEqual(list(monthly.index.get_level_values(1).strftime('%Y%m%d')), ['20230113', '20230201'])
+
+        # 更新一天的数据后，只重新合并该日期所在的周期
+        self.days.loc[self.days.trade_date == '20230110', 'high'] = 100.
+        self.ds.update_table_data('stock_daily', self.days)
+        res = self.ds.rollup_table_data('stock_daily', targets='stock_weekly', start='20230110', end='20230110')
+        print(f'rows affected: {res}')
+        weekly = self.ds.read_table_data('stock_weekly').sort_index()
+        self.assertEqual(list(weekly.high), [4., 100., 10.])
+        self.assertEqual(len(weekly), 3)
+
+        # 不给出时间段时，只读取并合并低频数据表中最后一个周期之后的数据
+        new_days = self.days.iloc[-2:].assign(trade_date=['20230202', '20230301'])
+        self.ds.update_table_data('stock_daily', new_days)
+        read_table_data = self.ds.read_table_data
+        with mock.patch.object(self.ds, 'read_table_data', wraps=read_table_data) as read:
+            res = self.ds.rollup_table_data('stock_daily')
+            base_reads = [c.kwargs for c in read.call_args_list if c.args == ('stock_daily',)]
+            print(f'rows affected in incremental roll-up: {res}, base table reads: {base_reads}')
+            self.assertEqual(base_reads, [{'start': '20230128', 'end': '20230401'}])
+        weekly = self.ds.read_table_data('stock_weekly').sort_index()
+        self.assertEqual(list(weekly.index.get_level_values(1).strftime('%Y%m%d')),
+                         ['20230106', '20230113', '20230202', '20230301'])
+        self.assertEqual(list(weekly.vol), [400., 500., 200., 100.])
+        monthly = self.ds.read_table_data('stock_monthly').sort_index()
+        self.assertEqual(list(monthly.index.get_level_values(1).strftime('%Y%m%d')),
+                         ['20230113', '20230202', '20230301'])
+
+        # 时间段内没有基础数据时不合并，也不改变已有的低频数据
+        res = self.ds.rollup_table_data('stock_daily', start='20200101', end='20200131')
+        print(f'rows affected in an empty range: {res}')
+        self.assertEqual(res, {'stock_weekly': 0, 'stock_monthly': 0})
+        self.assertEqual(len(self.ds.read_table_data('stock_weekly')), 4)
+
+
+class TestResampleKernel(unittest.TestCase):
+    """ 测试numba编译的降频计算，结果应该与pandas的resample以及reindex相同"""
+
+    def test_resample_kernel(self):
+        """ 测试不同频率和合并方法下降频结果与pandas相同"""
+        from qteasy.database import _resampled_time_index
+        index = pd.date_range('20200101', '20200110 23:59', freq='min')
+        index = index[np.random.rand(len(index)) > 0.3]
+        data = pd.DataFrame(np.random.rand(len(index), 5), index=index, columns=list('ABCDE'))
+        data[data > 0.9] = np.nan
+        data.loc['20200104', 'A'] = np.nan
+        methods = {'last': 'last', 'first': 'first', 'high': 'max', 'low': 'min', 'mean': 'mean', 'sum': 'sum'}
+        for freq in ['15min', 'h', 'd']:
+            for trade_time_only in [True, False]:
+                for method, agg in methods.items():
+                    res = _resample_data(data, target_freq=freq, method=method, b_days_only=False,
+                                         trade_time_only=trade_time_only)
+                    pandas_freq = freq.replace('d', 'D')
+                    target = data.resample(pandas_freq).agg(agg)
+                    expanded_index = _resampled_time_index(target.index[0], target.index[-1], pandas_freq,
+                                                           b_days_only=False, trade_time_only=trade_time_only)
+                    target = target.reindex(index=expanded_index)
+                    pd.testing.assert_frame_equal(res, target, check_freq=False)
+        print(f'resampled data with kernel:\n{res}')
+        # 强制开始和结束时间超出数据范围时，超出部分为NaN
+        res = _resample_data(data, target_freq='d', method='sum', b_days_only=False, trade_time_only=False,
+                             forced_start='20191230', forced_end='20200112')
+        self.assertEqual(len(res), 14)
+        self.assertTrue(res.loc['20191230'].isna().all())
+        self.assertFalse(res.loc['20200101'].isna().any())
+
+
+class TestDtypeProfile(unittest.TestCase):
+    """ 测试compact数据类型方案，价格数据使用float32类型保存和读取"""
+
+    def setUp(self):
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('file', file_type='fth', file_loc='data_test/dtype_test/', dtype_profile='compact')
+        self.default_ds = DataSource('file', file_type='fth', file_loc='data_test/dtype_test/')
+        self.ds.drop_table_data('stock_daily')
+        dates = pd.date_range('20230101', periods=100).strftime('%Y%m%d')
+        self.df = pd.DataFrame({'ts_code':    np.repeat(['000001.SZ', '000002.SZ'], 100),
+                                'trade_date': np.tile(dates, 2),
+                                'open':       np.random.rand(200) + 10.,
+                                'high':       np.random.rand(200) + 11.,
+                                'low':        np.random.rand(200) + 9.,
+                                'close':      np.random.rand(200) + 10.,
+                                'pre_close':  np.random.rand(200) + 10.,
+                                'change':     0.5,
+                                'pct_chg':    1.,
+                                'vol':        123456789.,
+                                'amount':     987654321.})
+
+    def test_compact_profile(self):
+        """ 测试读取和保存数据时的数据类型"""
+        self.assertRaises(ValueError, DataSource, 'file', file_loc='data_test/dtype_test/', dtype_profile='tiny')
+        self.ds.update_table_data('stock_daily', self.df)
+        # feather文件中的价格数据以float32类型保存
+        raw = pd.read_feather(self.ds.get_file_path_name('stock_daily'))
+        print(f'dtypes saved in feather file:\n{raw.dtypes}')
+        self.assertEqual(raw.close.dtype, np.float32)
+        self.assertEqual(raw.vol.dtype, np.float64)
+
+        compact = self.ds.read_table_data('stock_daily')
+        default = self.default_ds.read_table_data('stock_daily')
+        print(f'memory usage of compact and default data: '
+              f'{compact.memory_usage().sum()} / {default.memory_usage().sum()}')
+        self.assertEqual(compact.close.dtype, np.float32)
+        self.assertEqual(compact.amount.dtype, np.float64)
+        self.assertEqual(default.close.dtype, np.float64)
+        self.assertLess(compact.memory_usage().sum(), default.memory_usage().sum())
+        self.assertTrue(np.allclose(compact.close.values, self.df.close.values, rtol=1e-6))
+        # 系统数据表的数据类型不变
+        from qteasy.database import _apply_dtype_profile
+        sys_df = pd.DataFrame({'cash_amount': [1.5]})
+        self.assertIs(_apply_dtype_profile(sys_df, 'sys_op_live_accounts', 'compact'), sys_df)
+
+        dfs = self.ds.get_history_data(shares='000001.SZ, 000002.SZ', htypes='close, vol', freq='d',
+                                       start='20230101', end='20230201', asset_type='E')
+        self.assertEqual(dfs['close'].values.dtype, np.float32)
+        self.assertEqual(dfs['vol'].values.dtype, np.float64)
+        from qteasy.history import stack_dataframes
+        hp = stack_dataframes(dfs, dataframe_as='htypes', dtype='float32')
+        self.assertEqual(hp.values.dtype, np.float32)
+        self.assertEqual(stack_dataframes(dfs, dataframe_as='htypes').values.dtype, np.float64)
+
+    def test_read_dtypes(self):
+        """ 测试compact方案读取csv文件和数据库时直接生成float32类型的数据"""
+        from qteasy.database import _read_dtypes, _records_to_frame
+        dtypes = _read_dtypes('stock_daily', 'compact')
+        self.assertEqual(dtypes['close'], 'float32')
+        self.assertNotIn('amount', dtypes)
+        self.assertEqual(_read_dtypes('stock_daily', 'default'), {})
+        self.assertEqual(_read_dtypes('sys_op_live_accounts', 'compact'), {})
+        rows = [('000001.SZ', 1.5, 10.), ('000002.SZ', None, 20.)]
+        df = _records_to_frame(rows, ['ts_code', 'close', 'amount'], dtypes=dtypes)
+        print(f'data frame built from records:\n{df}\n{df.dtypes}')
+        self.assertEqual(df.columns.tolist(), ['ts_code', 'close', 'amount'])
+        self.assertEqual(df.close.dtype, np.float32)
+        self.assertTrue(np.isnan(df.close.iloc[1]))
+        self.assertEqual(df.amount.dtype, np.float64)
+
+        csv_ds = DataSource('file', file_type='csv', file_loc='data_test/dtype_test/', dtype_profile='compact')
+        csv_ds.drop_table_data('stock_daily')
+        csv_ds.update_table_data('stock_daily', self.df)
+        with mock.patch('pandas.read_csv', wraps=pd.read_csv) as read_csv:
+            compact = csv_ds.read_table_data('stock_daily')
+            self.assertEqual(read_csv.call_args.kwargs['dtype'], dtypes)
+        self.assertEqual(compact.close.dtype, np.float32)
+        self.assertEqual(compact.amount.dtype, np.float64)
+        csv_ds.drop_table_data('stock_daily')
+
+        sqlite_ds = DataSource('sqlite', file_loc='data_test/dtype_test/', db_name='test_dtype',
+                               dtype_profile='compact')
+        sqlite_ds.drop_table_data('stock_daily')
+        sqlite_ds.update_table_data('stock_daily', self.df)
+        chunks = list(sqlite_ds.read_table_data_chunks('stock_daily', columns=['close', 'amount'], chunk_size=64))
+        self.assertTrue(all(chunk.close.dtype == np.float32 for chunk in chunks))
+        compact = pd.concat(chunks).sort_index()
+        self.assertEqual(compact.amount.dtype, np.float64)
+        self.assertTrue(np.allclose(compact.close.values, self.df.close.values, rtol=1e-6))
+        sqlite_ds.drop_table_data('stock_daily')
+
+        # 分块数据中的字符串不转换为category类型，合并后的数据类型与整体读取后再转换的结果相同
+        from qteasy.database import _apply_dtype_profile
+        sqlite_ds.drop_table_data('stock_basic')
+        basic = pd.DataFrame({'ts_code':     [f'{i:06d}.SZ' for i in range(40)],
+                              'symbol':      [f'{i:06d}' for i in range(40)],
+                              'name':        [f'stock{i}' for i in range(40)],
+                              'area':        '深圳',
+                              'industry':    '银行',
+                              'fullname':    [f'stock{i} co.' for i in range(40)],
+                              'enname':      [f'stock{i} co.' for i in range(40)],
+                              'cnspell':     'gp',
+                              'market':      np.tile(['主板', '创业板', '科创板', '北交所'], 10),
+                              'exchange':    np.repeat(['SZSE', 'SSE'], 20),
+                              'curr_type':   'CNY',
+                              'list_status': 'L',
+                              'list_date':   '20200101',
+                              'delist_date': None,
+                              'is_hs':       'N'})
+        sqlite_ds.update_table_data('stock_basic', basic)
+        chunks = list(sqlite_ds.read_table_data_chunks('stock_basic', columns=['market', 'exchange'],
+                                                       chunk_size=10))
+        self.assertTrue(all(chunk.market.dtype == object for chunk in chunks))
+        combined = _apply_dtype_profile(pd.concat(chunks), 'stock_basic', 'compact')
+        print(f'dtypes of combined chunks:\n{combined.dtypes}')
+        self.assertEqual(combined.market.dtype, 'category')
+        self.assertEqual(combined.exchange.dtype, 'category')
+        self.assertEqual(sorted(combined.market.cat.categories), ['主板', '创业板', '北交所', '科创板'])
+        whole = sqlite_ds.read_table_data('stock_basic')
+        self.assertEqual(whole.market.dtype, 'category')
+        sqlite_ds.drop_table_data('stock_basic')
+
+
+class TestSQLiteDataSource(unittest.TestCase):
+    """ 测试嵌入式sqlite数据源，读取的数据应该与文件数据源相同"""
+
+    def setUp(self):
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('sqlite', file_loc='data_test/sqlite_test/', db_name='test_sqlite')
+        self.fs = DataSource('file', file_type='csv', file_loc='data_test/sqlite_test/')
+        for table in ['index_daily', 'trade_calendar', 'sys_op_live_accounts']:
+            self.ds.drop_table_data(table)
+            self.fs.drop_table_data(table)
+        dates = pd.date_range('20230101', '20230110').strftime('%Y%m%d')
+        self.df = pd.DataFrame({'ts_code':    np.repeat(['000001.SH', '000002.SH', '000003.SZ'], 10),
+                                'trade_date': np.tile(dates, 3),
+                                'open':       np.arange(30.),
+                                'high':       np.arange(30.) + 1.,
+                                'low':        np.arange(30.) - 1.,
+                                'close':      np.arange(30.) + 0.5,
+                                'pre_close':  np.nan,
+                                'change':     0.5,
+                                'pct_chg':    1.,
+                                'vol':        100.,
+                                'amount':     1000.})
+
+    def test_read_write(self):
+        """ 测试写入数据以及按照证券代码和日期范围读取数据"""
+        self.assertEqual(str(self.ds), 'sqlite://qt_root/data_test/sqlite_test/test_sqlite.sqlite')
+        self.assertFalse(self.ds.table_data_exists('index_daily'))
+        self.assertEqual(self.ds.update_table_data('index_daily', self.df), 30)
+        self.fs.update_table_data('index_daily', self.df)
+        self.assertTrue(self.ds.table_data_exists('index_daily'))
+
+        for shares, start, end in [(None, None, None),
+                                   ('000001.SH, 000003.SZ', '20230103', '20230105'),
+                                   ('000002.SH', None, None),
+                                   (None, '20230108', '20230120')]:
+            sqlite_data = self.ds.read_table_data('index_daily', shares=shares, start=start, end=end)
+            file_data = self.fs.read_table_data('index_daily', shares=shares, start=start, end=end)
+            print(f'data read from sqlite with shares={shares}, start={start}, end={end}:\n{sqlite_data}')
+            self.assertEqual(sqlite_data.index.names, ['ts_code', 'trade_date'])
+            self.assertEqual(sqlite_data.pre_close.dtype, float)
+            pd.testing.assert_frame_equal(sqlite_data.sort_index(), file_data.sort_index())
+
+    def test_upsert(self):
+        """ 测试重复数据的忽略和更新"""
+        self.ds.update_table_data('index_daily', self.df)
+        new_data = self.df.iloc[:3].copy()
+        new_data['close'] = -1.
+        self.ds.update_table_data('index_daily', new_data, merge_type='ignore')
+        res = self.ds.read_table_data('index_daily', shares='000001.SH')
+        self.assertEqual(res.close.iloc[:3].tolist(), [0.5, 1.5, 2.5])
+        self.ds.update_table_data('index_daily', new_data, merge_type='update')
+        res = self.ds.read_table_data('index_daily', shares='000001.SH')
+        self.assertEqual(res.close.iloc[:3].tolist(), [-1., -1., -1.])
+        self.assertEqual(len(self.ds.read_table_data('index_daily')), 30)
+
+    def test_table_info(self):
+        """ 测试数据表覆盖范围和数据量"""
+        self.ds.update_table_data('index_daily', self.df)
+        self.assertEqual(self.ds.get_table_data_coverage('index_daily', 'trade_date', min_max_only=True),
+                         ['20230101', '20230110', 10])
+        self.assertEqual(self.ds.get_table_data_coverage('index_daily', 'ts_code'),
+                         ['000001.SH', '000002.SH', '000003.SZ'])
+        size, rows = self.ds.get_data_table_size('index_daily', string_form=False)
+        print(f'sqlite table index_daily size: {size}, rows: {rows}')
+        self.assertEqual(rows, 30)
+        self.assertGreater(size, 0)
+        self.ds.drop_table_data('index_daily')
+        self.assertFalse(self.ds.table_data_exists('index_daily'))
+        self.assertEqual(self.ds.get_table_data_coverage('index_daily', 'ts_code'), [])
+
+    def test_read_chunks(self):
+        """ 测试分块读取数据，以及get_history_data从分块数据组装历史数据"""
+        self.ds.update_table_data('index_daily', self.df)
+        self.fs.update_table_data('index_daily', self.df)
+        chunks = list(self.ds.read_table_data_chunks('index_daily', shares='000001.SH, 000002.SH',
+                                                     start='20230102', end='20230108',
+                                                     columns=['close', 'vol'], chunk_size=4))
+        print(f'got {len(chunks)} chunks, first chunk:\n{chunks[0]}')
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 4, 2])
+        self.assertEqual(chunks[0].columns.tolist(), ['close', 'vol'])
+        self.assertEqual(chunks[0].index.names, ['ts_code', 'trade_date'])
+        expected = self.fs.read_table_data('index_daily', shares='000001.SH, 000002.SH',
+                                           start='20230102', end='20230108')[['close', 'vol']]
+        pd.testing.assert_frame_equal(pd.concat(chunks).sort_index(), expected.sort_index())
+        file_chunks = list(self.fs.read_table_data_chunks('index_daily', shares='000003.SZ', columns=['open']))
+        self.assertEqual(len(file_chunks), 1)
+        self.assertEqual(file_chunks[0].columns.tolist(), ['open'])
+        self.assertEqual(list(self.ds.read_table_data_chunks('index_weekly')), [])
+
+        # 中途停止读取时，连接仍然可以正常使用
+        chunk_iter = self.ds.read_table_data_chunks('index_daily', chunk_size=5)
+        next(chunk_iter)
+        chunk_iter.close()
+        self.assertEqual(len(self.ds.read_table_data('index_daily')), 30)
+
+        sqlite_hist = self.ds.get_history_data(shares='000001.SH, 000003.SZ', htypes='close, open',
+                                               freq='d', start='20230103', end='20230108', asset_type='IDX')
+        file_hist = self.fs.get_history_data(shares='000001.SH, 000003.SZ', htypes='close, open',
+                                             freq='d', start='20230103', end='20230108', asset_type='IDX')
+        for htype in ['close', 'open']:
+            print(f'history data of {htype}:\n{sqlite_hist[htype]}')
+            pd.testing.assert_frame_equal(sqlite_hist[htype], file_hist[htype])
+
+    def test_read_many_shares(self):
+        """ 测试证券代码数量超过sqlite变量数量限制时分组读取数据"""
+        from qteasy.database import SQLITE_MAX_VARIABLES
+        self.ds.update_table_data('index_daily', self.df)
+        shares = [f'{i:06d}.SH' for i in range(4, 2 * SQLITE_MAX_VARIABLES + 4)] + ['000001.SH', '000003.SZ']
+        print(f'reading data with {len(shares)} shares')
+        res = self.ds.read_table_data('index_daily', shares=shares, start='20230103', end='20230105')
+        self.assertEqual(len(res), 6)
+        self.assertEqual(sorted(res.index.get_level_values('ts_code').unique()), ['000001.SH', '000003.SZ'])
+        chunks = list(self.ds.read_table_data_chunks('index_daily', shares=shares, chunk_size=4))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 20)
+        self.assertTrue(self.ds.read_table_data('index_daily', shares=shares[:-2]).empty)
+
+    def test_read_database_sql(self):
+        """ 测试数据库查询语句，只读取需要的字段"""
+        sql = DataSource._read_database_sql('stock_daily', 'ts_code', ['000001.SZ', '000002.SZ'],
+                                            'trade_date', '20230101', '20230110', columns=['ts_code', 'close'])
+        print(sql)
+        self.assertEqual(sql, "SELECT `ts_code`, `close` FROM stock_daily\n"
+                              "WHERE ts_code in ('000001.SZ', '000002.SZ') "
+                              "AND trade_date BETWEEN \"20230101\" AND \"20230110\"\n")
+        sql = DataSource._read_database_sql('stock_daily')
+        self.assertEqual(sql, "SELECT * FROM stock_daily\n")
+
+    def test_sys_tables(self):
+        """ 测试系统数据表的插入、读取、修改和删除"""
+        table = 'sys_op_live_accounts'
+        self.assertEqual(self.ds.get_sys_table_last_id(table), 0)
+        for i in range(1, 4):
+            record_id = self.ds.insert_sys_table_data(table,
+                                                      user_name=f'user{i}',
+                                                      created_time=pd.Timestamp(f'2023010{i} 10:30:00'),
+                                                      cash_amount=100. * i,
+                                                      available_cash=100. * i,
+                                                      total_invest=100. * i)
+            self.assertEqual(record_id, i)
+        self.assertEqual(self.ds.get_sys_table_last_id(table), 3)
+        self.ds.update_sys_table_data(table, record_id=2, cash_amount=50.)
+        record = self.ds.read_sys_table_record(table, record_id=2)
+        print(f'record 2 in {table}: {record}')
+        self.assertEqual(record['cash_amount'], 50.)
+        self.assertEqual(record['created_time'], pd.Timestamp('20230102 10:30:00'))
+        self.assertEqual(self.ds.delete_sys_table_data(table, [1, 3]), 2)
+        res = self.ds.read_sys_table_data(table)
+        self.assertEqual(res.index.tolist(), [2])
+        self.assertEqual(self.ds.read_sys_table_data(table, user_name='user2').index.tolist(), [2])
+
+
+class TestTableCatalog(unittest.TestCase):
+    """ 测试数据表目录，数据表的数据量和主键覆盖范围应该从目录中读取"""
+
+    def setUp(self):
+        # 使用单独的文件夹，目录文件不会写入其他测试共用的文件夹，测试前后都删除整个文件夹
+        import shutil
+        from qteasy import QT_ROOT_PATH
+        shutil.rmtree(os.path.join(QT_ROOT_PATH, 'data_test/catalog_test/'), ignore_errors=True)
+        self.fs = DataSource('file', file_type='csv', file_loc='data_test/catalog_test/')
+        self.ds = DataSource('sqlite', file_loc='data_test/catalog_test/', db_name='test_catalog')
+        dates = pd.date_range('20230101', '20230110').strftime('%Y%m%d')
+        self.df = pd.DataFrame({'ts_code':    np.repeat(['000001.SH', '000002.SH', '000003.SZ'], 10),
+                                'trade_date': np.tile(dates, 3),
+                                'open':       np.arange(30.),
+                                'high':       np.arange(30.) + 1.,
+                                'low':        np.arange(30.) - 1.,
+                                'close':      np.arange(30.) + 0.5,
+                                'pre_close':  np.nan,
+                                'change':     0.5,
+                                'pct_chg':    1.,
+                                'vol':        100.,
+                                'amount':     1000.})
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.fs.file_path, ignore_errors=True)
+
+    def test_file_catalog(self):
+        """ 测试文件数据源写入数据后更新目录，并且查询数据表信息时不需要读取数据文件"""
+        self.assertIsNone(self.fs.get_table_catalog('index_daily'))
+        # 查询不存在的数据表时不生成目录文件
+        self.assertFalse(os.path.exists(self.fs.table_catalog_file))
+        self.fs.update_table_data('index_daily', self.df)
+        entry = self.fs.get_table_catalog('index_daily')
+        print(f'catalog entry of index_daily:\n{entry}')
+        self.assertEqual(entry['rows'], 30)
+        self.assertEqual(entry['coverage']['ts_code'], ['000001.SH', '000003.SZ', 3])
+        self.assertEqual(entry['coverage']['trade_date'], ['20230101', '20230110', 10])
+        self.assertTrue(os.path.exists(self.fs.table_catalog_file))
+
+        def no_read(*args, **kwargs):
+            raise AssertionError('data file should not be read')
+
+        with mock.patch.object(self.fs, 'read_file', no_read):
+            self.assertEqual(self.fs.get_data_table_size('index_daily', string_form=False)[1], 30)
+            self.assertEqual(self.fs.get_table_data_coverage('index_daily', 'trade_date', min_max_only=True),
+                             ['20230101', '20230110', 10])
+            info = self.fs.get_table_info('index_daily', print_info=False)
+            print(f'table info read from catalog:\n{info}')
+            self.assertEqual(info[10], '20230101')
+
+        # 新的数据源对象从文件中读取目录
+        new_fs = DataSource('file', file_type='csv', file_loc='data_test/catalog_test/')
+        with mock.patch.object(new_fs, 'read_file', no_read):
+            self.assertEqual(new_fs.get_table_catalog('index_daily'), entry)
+
+        # 数据文件被其他程序修改后，重新统计数据表
+        file_path_name = self.fs.get_file_path_name('index_daily')
+        self.df.iloc[:20].to_csv(file_path_name, index=False)
+        os.utime(file_path_name, (entry['modified'] + 10, entry['modified'] + 10))
+        entry = self.fs.get_table_catalog('index_daily')
+        print(f'catalog entry after data file changed:\n{entry}')
+        self.assertEqual(entry['rows'], 20)
+        self.assertEqual(entry['coverage']['ts_code'], ['000001.SH', '000002.SH', 2])
+
+        self.fs.drop_table_data('index_daily')
+        self.assertIsNone(self.fs.get_table_catalog('index_daily'))
+        self.assertNotIn('index_daily', self.fs._table_catalog)
+        self.assertRaises(KeyError, self.fs.get_table_catalog, 'sys_op_live_accounts')
+
+    def test_sqlite_catalog(self):
+        """ 测试sqlite数据源写入数据后重新统计目录"""
+        self.ds.update_table_data('index_daily', self.df.iloc[:10])
+        entry = self.ds.get_table_catalog('index_daily')
+        print(f'catalog entry of index_daily:\n{entry}')
+        self.assertEqual(entry['rows'], 10)
+        self.assertEqual(entry['coverage']['ts_code'], ['000001.SH', '000001.SH', 1])
+        self.assertEqual(entry['coverage']['trade_date'], ['20230101', '20230110', 10])
+
+        self.ds.update_table_data('index_daily', self.df)
+        self.assertEqual(self.ds.get_table_data_coverage('index_daily', 'ts_code', min_max_only=True),
+                         ['000001.SH', '000003.SZ', 3])
+        self.assertEqual(self.ds.get_data_table_size('index_daily', string_form=False)[1], 30)
+        self.ds.refresh_table_catalog('index_daily')
+        self.assertEqual(self.ds.get_table_catalog('index_daily')['rows'], 30)
+
+
+class TestLastPrices(unittest.TestCase):
+    """ 测试最新已知价格，写入K线数据后更新，没有价格时只从数据表中读取一次最后一个月的数据"""
+
+    def setUp(self):
+        # 使用单独的文件夹，避免删除其他测试使用的数据
+        self.ds = DataSource('file', file_type='csv', file_loc='data_test/last_price_test/')
+        self.ds.drop_table_data('stock_daily')
+        dates = pd.date_range('20230101', periods=60).strftime('%Y%m%d')
+        self.df = pd.DataFrame({'ts_code':    np.repeat(['000001.SZ', '000002.SZ'], 60),
+                                'trade_date': np.tile(dates, 2),
+                                'open':       10.,
+                                'high':       11.,
+                                'low':        9.,
+                                'close':      np.r_[np.arange(60.), np.arange(60.) + 100.],
+                                'pre_close':  10.,
+                                'change':     0.,
+                                'pct_chg':    0.,
+                                'vol':        100.,
+                                'amount':     1000.})
+
+    def test_last_prices(self):
+        """ 测试写入数据后更新最新价格，以及从数据表中读取最新价格"""
+        self.ds.update_table_data('stock_daily', self.df)
+        prices = self.ds.last_prices.get(['000001.SZ', '000002.SZ'], freq='d')
+        print(f'last prices recorded after writing stock_daily:\n{prices}')
+        self.assertEqual(prices.tolist(), [59., 159.])
+        # 文件数据源写入的是合并后的全部数据，只用新写入的数据更新最新价格
+        new_bar = self.df.iloc[[59]].assign(trade_date='20230302', close=70.)
+        update_bars = self.ds.last_prices.update_bars
+        with mock.patch.object(self.ds.last_prices, 'update_bars', wraps=update_bars) as update:
+            self.ds.update_table_data('stock_daily', new_bar)
+            self.assertEqual(len(update.call_args.args[1]), 1)
+        self.assertEqual(self.ds.last_prices.get(['000001.SZ', '000002.SZ'], freq='d').tolist(), [70., 159.])
+
+        # 新的数据源对象从数据表中读取最后一个月的数据，此后不再读取数据表
+        new_ds = DataSource('file', file_type='csv', file_loc='data_test/last_price_test/')
+        read_table_data = new_ds.read_table_data
+        with mock.patch.object(new_ds, 'read_table_data', wraps=read_table_data) as read:
+            prices = new_ds.get_last_prices('000001.SZ, 000002.SZ, 000003.SZ', freq='d')
+            print(f'last prices read from stock_daily:\n{prices}')
+            self.assertEqual(prices.iloc[:2].tolist(), [70., 159.])
+            self.assertTrue(np.isnan(prices['000003.SZ']))
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual(read.call_args.kwargs['start'], '20230130')
+            # 已经读取过的证券，不论是否读取到价格，在数据表写入新数据之前都不再读取
+            new_ds.get_last_prices(['000001.SZ', '000003.SZ'], freq='d')
+            self.assertEqual(read.call_count, 1)
+            # 数据表写入新数据后，没有价格的证券再次从数据表中读取
+            new_ds.update_table_data('stock_daily', self.df.iloc[[59]].assign(trade_date='20230303', close=71.))
+            read.reset_mock()
+            prices = new_ds.get_last_prices(['000001.SZ', '000003.SZ'], freq='d')
+            self.assertEqual(prices.iloc[0], 71.)
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual(read.call_args.kwargs['shares'], ['000003.SZ'])
+
+        # 无法读取数据表目录时跳过该数据表，不读取整个数据表
+        other_ds = DataSource('file', file_type='csv', file_loc='data_test/last_price_test/')
+        with mock.patch.object(other_ds, 'get_table_catalog', side_effect=RuntimeError('broken catalog')), \
+                mock.patch.object(other_ds, 'read_table_data') as read:
+            with self.assertWarns(UserWarning):
+                prices = other_ds.get_last_prices('000001.SZ', freq='d')
+            self.assertTrue(np.isnan(prices['000001.SZ']))
+            read.assert_not_called()
+
+        # 实时价格比日K线更新时使用实时价格
+        new_ds.last_prices.update('live', ['000001.SZ'], [60.5], ['2023-03-04 10:30:00'])
+        self.assertEqual(new_ds.get_last_prices('000001.SZ').tolist(), [60.5])
+
+    def tearDown(self):
+        self.ds.drop_table_data('stock_daily')
+
+
 if __name__ == '__main__':
     unittest.main()
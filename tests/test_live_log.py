@@ -0,0 +1,218 @@
+# coding=utf-8
+# ======================================
+# File:     test_live_log.py
+# Author:   Jackie PENG
+# Contact:  jackie.pengzhao@gmail.com
+# Created:  2026-10-19
+# Desc:
+#   Unittest for buffered, segmented
+# and indexed live trading log files
+# ======================================
+
+import csv
+import logging
+import os
+import shutil
+import time
+import unittest
+
+import pandas as pd
+
+from qteasy import QT_ROOT_PATH
+from qteasy.live_log import TradeLogFile, SegmentedFileHandler, parse_log_rotation, log_segment_files
+from qteasy.live_log import read_last_lines, read_log_tail, remove_log_files
+
+HEADERS = ['datetime', 'reason', 'position_id', 'symbol', 'qty_change', 'qty']
+
+
+class TestLiveLog(unittest.TestCase):
+
+    def setUp(self):
+        self.log_path = os.path.join(QT_ROOT_PATH, 'data_test/live_log_test/')
+        os.makedirs(self.log_path, exist_ok=True)
+        self.file_path = os.path.join(self.log_path, 'trade_log.csv')
+        self.renew_log_file()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_path, ignore_errors=True)
+
+    def renew_log_file(self):
+        """ 创建只包含header的交易记录文件，格式与Trader.renew_trade_log_file()相同 """
+        remove_log_files(self.file_path)
+        with open(self.file_path, mode='w', encoding='utf-8') as f:
+            csv.writer(f).writerow(HEADERS)
+
+    @staticmethod
+    def make_rows(start='2024-03-04 09:30:00', days=3, rows_per_day=4):
+        rows = []
+        for d in range(days):
+            for r in range(rows_per_day):
+                row_time = pd.Timestamp(start) + pd.Timedelta(days=d, minutes=r)
+                qty = 100. * (d * rows_per_day + r)
+                rows.append([row_time.strftime('%Y-%m-%d %H:%M:%S'), 'order', d, '000001.SZ',
+                             f'{100.:.3f}', f'{qty:.3f}'])
+        return rows
+
+    def test_parse_log_rotation(self):
+        """ test parsing log rotation rules """
+        self.assertEqual(parse_log_rotation('none'), (0, None))
+        self.assertEqual(parse_log_rotation('Daily'), (0, '%Y%m%d'))
+        self.assertEqual(parse_log_rotation('monthly'), (0, '%Y%m'))
+        self.assertEqual(parse_log_rotation('10MB'), (10 * 1024 ** 2, None))
+        self.assertEqual(parse_log_rotation('1.5 kb'), (1536, None))
+        self.assertRaises(ValueError, parse_log_rotation, 'weekly')
+        self.assertRaises(ValueError, parse_log_rotation, '0KB')
+
+    def test_write_and_read(self):
+        """ test writing trade log rows and reading last rows and date ranges """
+        log = TradeLogFile(self.file_path, HEADERS)
+        rows = self.make_rows()
+        for row in rows:
+            log.write(row)
+        print(f'trade log file written: {log}')
+        self.assertEqual(log.row_count, 12)
+
+        # 写入的文件内容与csv.DictWriter写入的内容完全相同
+        with open(self.file_path, 'r', newline='') as f:
+            content = f.read()
+        self.assertTrue(content.startswith(','.join(HEADERS) + '\r\n'))
+        self.assertTrue(content.endswith(','.join(str(item) for item in rows[-1]) + '\r\n'))
+        self.assertTrue(log.read().equals(pd.read_csv(self.file_path)))
+
+        tail = log.tail(3)
+        print(f'last 3 rows of trade log:\n{tail}')
+        self.assertEqual(tail['qty'].tolist(), [900., 1000., 1100.])
+        self.assertEqual(len(log.tail(100)), 12)
+
+        day = log.read(start='2024-03-05', end='2024-03-05')
+        print(f'trade log of 2024-03-05:\n{day}')
+        self.assertEqual(day['position_id'].tolist(), [1, 1, 1, 1])
+        self.assertEqual(len(log.read(start='2024-03-05 09:31:00')), 7)
+        self.assertEqual(len(log.read(end='2024-03-04 09:31:00')), 2)
+        self.assertTrue(log.read(start='2025-01-01').empty)
+        self.assertEqual(list(log.read(start='2025-01-01').columns), HEADERS)
+
+        print('reopen existing trade log file and build the index again')
+        log.close()
+        log = TradeLogFile(self.file_path, HEADERS)
+        self.assertEqual(log.row_count, 12)
+        self.assertEqual(log.tail(1)['qty'].tolist(), [1100.])
+        log.close()
+
+    def test_buffered_write(self):
+        """ test buffered writing with periodic flush """
+        log = TradeLogFile(self.file_path, HEADERS, flush_interval=0.2)
+        rows = self.make_rows(days=1)
+        for row in rows:
+            log.write(row)
+        self.assertEqual(len(pd.read_csv(self.file_path)), 0)
+        log.maybe_flush()
+        self.assertEqual(len(pd.read_csv(self.file_path)), 0)
+        # 读取时先写入缓冲区的内容
+        self.assertEqual(len(log.tail(2)), 2)
+        self.assertEqual(len(pd.read_csv(self.file_path)), 4)
+
+        log.write(rows[0])
+        time.sleep(0.25)
+        log.maybe_flush()
+        self.assertEqual(len(pd.read_csv(self.file_path)), 5)
+        log.write(rows[0])
+        log.close()
+        self.assertEqual(len(pd.read_csv(self.file_path)), 6)
+
+    def test_rotation(self):
+        """ test rotating trade log into daily and size based segments """
+        log = TradeLogFile(self.file_path, HEADERS, rotation='daily')
+        for row in self.make_rows(days=3):
+            log.write(row)
+        segments = log_segment_files(self.file_path)
+        print(f'segments of daily rotated trade log: {segments}')
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(all(os.path.exists(segment + '.idx.npy') for segment in segments))
+        self.assertEqual(len(pd.read_csv(segments[0])), 4)
+        self.assertEqual(len(pd.read_csv(self.file_path)), 4)
+        self.assertEqual(log.row_count, 12)
+        self.assertEqual(log.tail(6)['qty'].tolist(), [600., 700., 800., 900., 1000., 1100.])
+        self.assertEqual(log.read(start='2024-03-05 09:32:00', end='2024-03-06 09:30:00')['qty'].tolist(),
+                         [600., 700., 800.])
+        self.assertEqual(len(log.read()), 12)
+        log.close()
+
+        print('segment index is rebuilt if index file is missing')
+        os.remove(segments[0] + '.idx.npy')
+        log = TradeLogFile(self.file_path, HEADERS, rotation='daily')
+        self.assertEqual(len(log.read(end='2024-03-04')), 4)
+        self.assertTrue(os.path.exists(segments[0] + '.idx.npy'))
+        log.close()
+
+        self.renew_log_file()
+        self.assertEqual(log_segment_files(self.file_path), [])
+        log = TradeLogFile(self.file_path, HEADERS, rotation='1KB')
+        for row in self.make_rows(days=10, rows_per_day=5):
+            log.write(row)
+        segments = log_segment_files(self.file_path)
+        print(f'segments of size rotated trade log: {segments}')
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(os.path.getsize(segment) <= 1024 for segment in segments))
+        self.assertEqual(log.row_count, 50)
+        self.assertEqual(log.read()['qty'].tolist(), [100. * i for i in range(50)])
+        log.close()
+
+    def test_index_growth_and_line_breaks(self):
+        """ test growing the row index in place and rejecting rows with line breaks """
+        log = TradeLogFile(self.file_path, HEADERS)
+        rows = self.make_rows(days=300, rows_per_day=5)
+        for row in rows:
+            log.write(row)
+        self.assertEqual(log.row_count, 1500)
+        # 读取时直接使用索引数组的切片，不复制索引
+        offsets, times, size = log._file_index(self.file_path)
+        self.assertEqual(len(offsets), 1500)
+        import numpy as np
+        self.assertTrue(np.shares_memory(offsets, log._offsets))
+        self.assertEqual(log.tail(2)['qty'].tolist(), [149800., 149900.])
+
+        # 包含换行符的数据会破坏行索引，不能写入
+        bad_row = rows[0][:1] + ['order\nsplit'] + rows[0][2:]
+        self.assertRaises(ValueError, log.write, bad_row)
+        self.assertRaises(ValueError, log.write, rows[0][:1] + ['order\r'] + rows[0][2:])
+        self.assertEqual(log.row_count, 1500)
+        log.close()
+        log = TradeLogFile(self.file_path, HEADERS)
+        self.assertEqual(log.row_count, 1500)
+        self.assertTrue(log.read().equals(pd.read_csv(self.file_path)))
+        log.close()
+
+    def test_sys_log_tail_and_rotation(self):
+        """ test reading last lines of system log and rotating system log by size """
+        file_path = os.path.join(self.log_path, 'sys_log.log')
+        handler = SegmentedFileHandler(file_path, rotation='1KB')
+        logger = logging.getLogger('test_live_log')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            for i in range(100):
+                logger.info(f'system log message line {i:03d}')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        segments = log_segment_files(file_path)
+        print(f'segments of system log: {segments}')
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(os.path.getsize(segment) <= 1024 for segment in segments))
+
+        lines = read_last_lines(file_path, 2, block_size=16)
+        self.assertEqual(lines, ['system log message line 098\n', 'system log message line 099\n'])
+        lines = read_log_tail(file_path, 80)
+        self.assertEqual(len(lines), 80)
+        self.assertEqual(lines[0], 'system log message line 020\n')
+        self.assertEqual(len(read_log_tail(file_path, 1000)), 100)
+
+        remove_log_files(file_path)
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(log_segment_files(file_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,7 @@ import qteasy as qt
 import pandas as pd
 import numpy as np
 
-from qteasy.backtest import apply_loop, process_loop_results
+from qteasy.backtest import apply_loop, process_loop_results, _get_complete_hist, read_trade_log_files
 from qteasy.finance import get_cost_pamams
 from qteasy.history import stack_dataframes, dataframe_to_hp
 
@@ -3871,6 +3871,75 @@ class TestLoop(unittest.TestCase):
         self.assertIsInstance(res, pd.DataFrame)
         print(f'in test_loop:\nresult of loop test is \n{res}')
 
+    def test_get_complete_hist(self):
+        """ Test filling complete history values with the array based kernel"""
+        hdates = pd.date_range('2020-01-01', periods=6)
+        shares = ['a', 'b']
+        prices = np.array([[[1., 10.], [2., 20.], [3., 30.], [4., 40.], [5., 50.], [6., 60.]],
+                           [[1., 1.], [1., 1.], [np.nan, np.nan], [1., 1.], [1., 1.], [1., 1.]]])
+        hp = qt.HistoryPanel(prices, levels=shares, rows=hdates, columns=['open', 'close'])
+        looped_value = pd.DataFrame([[100., 0., 50., 1., 0.],
+                                     [0., 200., 20., 2., 0.]],
+                                    index=[hdates[1], hdates[3]],
+                                    columns=shares + ['cash', 'fee', 'value'])
+        benchmark = pd.Series(np.arange(6.), index=hdates)
+        res = _get_complete_hist(looped_value, hp, benchmark)
+        print(f'complete history:\n{res}')
+        self.assertEqual(list(res.columns), shares + ['cash', 'fee', 'value', 'reference'])
+        self.assertEqual(list(res.index), list(hdates[1:]))
+        self.assertTrue(np.allclose(res['a'], [100., 100., 0., 0., 0.]))
+        self.assertTrue(np.allclose(res['b'], [0., 0., 200., 200., 200.]))
+        self.assertTrue(np.allclose(res['cash'], [50., 50., 20., 20., 20.]))
+        self.assertTrue(np.allclose(res['fee'], [1., 0., 2., 0., 0.]))
+        # 价格为nan时不计入资产总值，与pandas.DataFrame.sum()的处理方式相同
+        self.assertTrue(np.allclose(res['value'], [2050., 3050., 220., 220., 220.]))
+        self.assertTrue(np.allclose(res['reference'], [1., 2., 3., 4., 5.]))
+
+        res = _get_complete_hist(looped_value, hp, benchmark, with_price=True)
+        self.assertTrue(np.allclose(res['a_p'], [20., 30., 40., 50., 60.]))
+
+    def test_trade_log_files(self):
+        """ Test writing and reading trade log files in csv and feather formats"""
+        loop_results, op_log_matrix, op_summary_matrix, op_list_bt_indices = apply_loop(
+                operator=self.op_pt_batch,
+                trade_price_list=self.history_list,
+                cash_plan=self.cash,
+                cost_rate=self.rate,
+                moq_buy=0,
+                moq_sell=0,
+                inflation_rate=0,
+                pt_signal_timing='aggressive',
+                trade_log=True,
+                price_priority_list=[0]
+        )
+        for file_type in ['csv', 'feather']:
+            print(f'test trade log files in {file_type} format')
+            process_loop_results(
+                    operator=self.op_pt_batch,
+                    loop_results=loop_results,
+                    op_log_matrix=op_log_matrix,
+                    op_summary_matrix=op_summary_matrix,
+                    op_list_bt_indices=op_list_bt_indices,
+                    trade_log=True,
+                    trade_log_file_type=file_type,
+            )
+            trade_log, trade_records = read_trade_log_files(file_type)
+            print(f'trade log:\n{trade_log.head(10)}\ntrade records:\n{trade_records.head(10)}')
+            self.assertEqual(len(trade_log), len(op_log_matrix))
+            self.assertTrue(np.allclose(trade_log['share1'].values, np.array(op_log_matrix)[:, 0]))
+            self.assertTrue(all(trade_records['2, traded amounts'] != 0))
+            self.assertEqual(list(trade_records.columns[:9]),
+                             ['date', 'trade_on', 'item', 'add. invest', 'own cash', 'available cash', 'value',
+                              'code', 'name'])
+            traded = np.array(op_log_matrix)[2::8]
+            self.assertEqual(len(trade_records), np.count_nonzero(traded))
+            # 交易摘要按照日期、交易价格类型排序，同一日期的记录按照股票的顺序排列
+            share_order = {share: i for i, share in enumerate(trade_log.columns[7:])}
+            record_keys = list(zip(pd.to_datetime(trade_records['date']),
+                                   trade_records['trade_on'],
+                                   [share_order[code] for code in trade_records['code']]))
+            self.assertEqual(record_keys, sorted(record_keys))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1875,6 +1875,44 @@ class TestOperatorAndStrategy(unittest.TestCase):
         # TODO: implement this test
         pass
 
+    def test_operator_generate_with_executor(self):
+        """ 测试operator对象使用线程池并行运行策略生成交易信号，结果与依次运行策略相同 """
+        from concurrent.futures import ThreadPoolExecutor
+        test_ls = TestLSStrategy()
+        test_sel = TestSelStrategy()
+        self.op = qt.Operator(strategies=[test_ls, test_sel])
+        self.op.set_parameter(stg_id='custom',
+                              pars={'000010': (5, 10.),
+                                    '000030': (5, 10.),
+                                    '000039': (5, 6.)})
+        self.op.set_parameter(stg_id=1, pars=())
+        self.op.set_blender('s0*s1')
+        self.op.assign_hist_data(
+                hist_data=self.hp1,
+                cash_plan=qt.CashPlan(dates='2016-07-08', amounts=10000),
+        )
+        print('--test operation signal created in batch mode with and without executor--')
+        serial_signal = self.op.create_signal()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel_signal = self.op.create_signal(executor=executor)
+        print(f'serial signal:\n{serial_signal.squeeze().T}\nparallel signal:\n{parallel_signal.squeeze().T}')
+        self.assertEqual(serial_signal.shape, (3, 45, 1))
+        self.assertTrue(np.allclose(serial_signal, parallel_signal, equal_nan=True))
+
+        print('--test operation signal created in live mode with and without executor--')
+        self.op.assign_hist_data(
+                hist_data=self.hp1,
+                cash_plan=qt.CashPlan(dates='2016-07-08', amounts=10000),
+                live_mode=True,
+                live_running_stgs=self.op.strategy_ids,
+        )
+        serial_signal = self.op.create_signal(sample_idx=0, price_type_idx=0)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel_signal = self.op.create_signal(sample_idx=0, price_type_idx=0, executor=executor)
+        print(f'serial signal: {serial_signal}\nparallel signal: {parallel_signal}')
+        self.assertEqual(serial_signal.shape, (3,))
+        self.assertTrue(np.allclose(serial_signal, parallel_signal, equal_nan=True))
+
     def test_stg_parameter_setting(self):
         """ test setting parameters of strategies
         test the method set_parameters
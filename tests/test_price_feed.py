@@ -0,0 +1,261 @@
+# coding=utf-8
+# ======================================
+# File:     test_price_feed.py
+# Author:   Jackie PENG
+# Contact:  jackie.pengzhao@gmail.com
+# Created:  2026-10-19
+# Desc:
+#   Unittest for price feeds and the
+# in-memory quote book
+# ======================================
+
+import os
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qteasy.price_feed import QuoteBook, LastPriceStore, PriceFeed, LivePriceFeed, ReplayPriceFeed, QUOTE_COLUMNS
+
+
+def make_minute_bars(symbols=('000001.SZ', '000002.SZ'), days=('2024-03-04', '2024-03-05'), minutes=5):
+    """ 生成测试用的分钟K线，每个symbol每天minutes根K线，价格每分钟上涨0.1 """
+    rows = []
+    for d, day in enumerate(days):
+        for m in range(minutes):
+            trade_time = pd.Timestamp(f'{day} 09:31:00') + pd.Timedelta(minutes=m)
+            for s, symbol in enumerate(symbols):
+                price = 10. * (s + 1) + d + 0.1 * m
+                rows.append({'trade_time': trade_time, 'symbol': symbol,
+                             'open': price, 'high': price + 0.05, 'low': price - 0.05, 'close': price + 0.02,
+                             'vol': 100. * (m + 1), 'amount': 1000. * (m + 1)})
+    return pd.DataFrame(rows)
+
+
+class TestQuoteBook(unittest.TestCase):
+
+    def test_update_and_snapshot(self):
+        """ test replacing quotes and reading snapshots from quote book """
+        book = QuoteBook(max_ticks=3)
+        quotes = pd.DataFrame({'close': [10., 20.], 'pre_close': [9.5, 21.]}, index=['000001.SZ', '000002.SZ'])
+        self.assertEqual(book.update(quotes), ['000001.SZ', '000002.SZ'])
+        snapshot = book.snapshot()
+        print(f'snapshot of quote book:\n{snapshot}')
+        self.assertEqual(list(snapshot.columns), QUOTE_COLUMNS)
+        self.assertEqual(list(snapshot.index), ['000001.SZ', '000002.SZ'])
+        self.assertEqual(book.last_price('000002.SZ'), 20.)
+        self.assertTrue(np.isnan(book.last_price('000003.SZ')))
+        # symbols without quotes are not included in the snapshot
+        self.assertEqual(list(book.snapshot('000002.SZ, 000003.SZ').index), ['000002.SZ'])
+
+        print('only the latest max_ticks quotes are kept in history')
+        for price in [11., 12., 13., 14.]:
+            book.update(pd.DataFrame({'close': [price]}, index=['000001.SZ']))
+        history = book.history('000001.SZ')
+        print(f'history of 000001.SZ:\n{history}')
+        self.assertEqual(history['close'].tolist(), [12., 13., 14.])
+        self.assertEqual(book.last_price('000001.SZ'), 14.)
+        book.clear()
+        self.assertEqual(len(book), 0)
+        self.assertTrue(book.snapshot().empty)
+
+    def test_merge_bars(self):
+        """ test merging minute bars into intraday daily quotes """
+        book = QuoteBook()
+        bars = make_minute_bars(symbols=['000001.SZ'])
+        first_day = bars[bars.trade_time < '2024-03-05']
+        second_day = bars[bars.trade_time >= '2024-03-05']
+        book.merge_bars(first_day)
+        quote = book.snapshot().loc['000001.SZ']
+        print(f'quote merged from minute bars of first day:\n{quote}')
+        self.assertEqual(quote['trade_time'], pd.Timestamp('2024-03-04 09:35:00'))
+        self.assertAlmostEqual(quote['open'], 10.)
+        self.assertAlmostEqual(quote['high'], 10.45)
+        self.assertAlmostEqual(quote['low'], 9.95)
+        self.assertAlmostEqual(quote['close'], 10.42)
+        self.assertAlmostEqual(quote['vol'], 1500.)
+        self.assertAlmostEqual(quote['amount'], 15000.)
+        self.assertTrue(np.isnan(quote['pre_close']))
+
+        book.merge_bars(second_day.iloc[:1])
+        quote = book.snapshot().loc['000001.SZ']
+        print(f'quote merged from minute bars of second day:\n{quote}')
+        self.assertAlmostEqual(quote['pre_close'], 10.42)
+        self.assertAlmostEqual(quote['open'], 11.)
+        self.assertAlmostEqual(quote['vol'], 100.)
+
+
+class TestLastPriceStore(unittest.TestCase):
+
+    def test_update_and_get(self):
+        """ test keeping the latest price of each symbol in each freq """
+        store = LastPriceStore()
+        updated = store.update('d', ['000001.SZ', '000002.SZ', '000001.SZ'], [10., 20., 10.5],
+                               ['2024-03-04', '2024-03-04', '2024-03-05'])
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(store), 2)
+        self.assertIn('000001.SZ', store)
+        self.assertNotIn('000003.SZ', store)
+        prices = store.get(['000001.SZ', '000002.SZ', '000003.SZ'])
+        print(f'last prices in store:\n{prices}')
+        self.assertEqual(prices.iloc[:2].tolist(), [10.5, 20.])
+        self.assertTrue(np.isnan(prices.iloc[2]))
+
+        print('older prices do not replace newer prices, NaN prices are ignored')
+        self.assertEqual(store.update('d', ['000001.SZ', '000002.SZ'], [9., np.nan], ['2024-03-01', '2024-03-06']), 0)
+        self.assertEqual(store.last_price('000001.SZ'), 10.5)
+        self.assertEqual(store.last_price('000002.SZ'), 20.)
+
+        print('latest price across all freqs is returned if freq is not given')
+        store.update('live', ['000002.SZ'], [21.], ['2024-03-05 10:30:00'])
+        self.assertEqual(store.last_price('000002.SZ'), 21.)
+        self.assertEqual(store.last_price('000002.SZ', freq='d'), 20.)
+        self.assertEqual(sorted(store.freqs), ['d', 'live'])
+        store.clear('live')
+        self.assertEqual(store.last_price('000002.SZ'), 20.)
+        store.clear()
+        self.assertEqual(len(store), 0)
+
+    def test_update_bars(self):
+        """ test updating last prices from bars with primary key index """
+        store = LastPriceStore()
+        bars = make_minute_bars().rename(columns={'symbol': 'ts_code'}).set_index(['ts_code', 'trade_time'])
+        self.assertEqual(store.update_bars('1min', bars), 2)
+        prices = store.get('000001.SZ, 000002.SZ', freq='1min')
+        print(f'last prices from minute bars:\n{prices}')
+        self.assertAlmostEqual(prices['000001.SZ'], 11.42)
+        self.assertAlmostEqual(prices['000002.SZ'], 21.42)
+        self.assertEqual(store.update_bars('1min', bars[['vol']]), 0)
+
+
+class TestPriceFeed(unittest.TestCase):
+
+    def test_subscription(self):
+        """ test subscribing and unsubscribing quotes of a price feed """
+        feed = ReplayPriceFeed(make_minute_bars(symbols=['000001.SZ', '000002.SZ', '000004.SZ']))
+        self.assertIsInstance(feed, PriceFeed)
+        received = []
+        sub_1 = feed.subscribe('000001.SZ, 000002.SZ', callback=received.append)
+        sub_2 = feed.subscribe(['000004.SZ'])
+        self.assertEqual(feed.symbols, ['000001.SZ', '000002.SZ', '000004.SZ'])
+        self.assertRaises(TypeError, feed.subscribe, '000001.SZ', 'not_callable')
+
+        feed.step()
+        self.assertEqual(len(received), 1)
+        print(f'quotes pushed to subscriber:\n{received[0]}')
+        self.assertEqual(list(received[0].index), ['000001.SZ', '000002.SZ'])
+
+        feed.unsubscribe(sub_1)
+        feed.unsubscribe(sub_2)
+        feed.step()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(feed.symbols, [])
+        # quotes are still updated in the quote book without subscribers
+        self.assertEqual(len(feed.get_quotes()), 3)
+
+    def test_replay_price_feed(self):
+        """ test replaying minute bars step by step and by advancing the replay clock """
+        bars = make_minute_bars()
+        feed = ReplayPriceFeed(bars.rename(columns={'symbol': 'ts_code'}).set_index(['ts_code', 'trade_time']))
+        print(f'replay feed created: {feed}')
+        self.assertEqual(feed.now(), pd.Timestamp('2024-03-04 09:31:00'))
+        self.assertEqual(feed.end_time, pd.Timestamp('2024-03-05 09:35:00'))
+        self.assertTrue(feed.get_quotes().empty)
+
+        self.assertEqual(feed.step(), pd.Timestamp('2024-03-04 09:31:00'))
+        self.assertEqual(feed.advance_to('2024-03-04 09:33:30'), 4)
+        self.assertEqual(feed.now(), pd.Timestamp('2024-03-04 09:33:30'))
+        quotes = feed.fetch_quotes(['000001.SZ', '000002.SZ'])
+        print(f'quotes at {feed.now()}:\n{quotes}')
+        self.assertTrue(np.allclose(quotes['close'], [10.22, 20.22]))
+        self.assertTrue(np.allclose(quotes['vol'], [600., 600.]))
+
+        self.assertEqual(feed.advance_to('2024-03-06'), 14)
+        self.assertTrue(feed.is_finished)
+        self.assertIsNone(feed.step())
+        quotes = feed.get_quotes()
+        self.assertTrue(np.allclose(quotes['pre_close'], [10.42, 20.42]))
+        self.assertTrue(np.allclose(quotes['close'], [11.42, 21.42]))
+
+        print('replay can start later than the first bar, earlier bars are loaded in quote book')
+        feed = ReplayPriceFeed(bars, start_time='2024-03-05 09:00:00')
+        self.assertEqual(feed.now(), pd.Timestamp('2024-03-05 09:00:00'))
+        self.assertTrue(np.allclose(feed.get_quotes()['close'], [10.42, 20.42]))
+
+        self.assertRaises(KeyError, ReplayPriceFeed, bars.drop(columns=['vol']))
+        self.assertRaises(ValueError, ReplayPriceFeed, bars, speed=0)
+        self.assertRaises(FileNotFoundError, ReplayPriceFeed, 'not_existing_replay_file.csv')
+
+    def test_replay_from_file_at_high_speed(self):
+        """ test replaying recorded bars from a file with accelerated replay clock """
+        file_path = 'test_replay_bars.csv'
+        make_minute_bars().to_csv(file_path, index=False)
+        try:
+            feed = ReplayPriceFeed(file_path, speed=600.)
+        finally:
+            os.remove(file_path)
+        received = []
+        feed.subscribe('000001.SZ', callback=received.append)
+        feed.start()
+        # 600倍速回放，回放的5分钟数据只需要0.5秒
+        time.sleep(0.8)
+        print(f'replay time after 0.8 second: {feed.now()}, bars pushed {len(received)} times')
+        self.assertGreaterEqual(feed.now(), pd.Timestamp('2024-03-04 09:37:00'))
+        self.assertEqual(len(received), 5)
+        self.assertAlmostEqual(feed.get_quotes().loc['000001.SZ', 'close'], 10.42)
+        feed.stop()
+        stopped_at = feed.now()
+        time.sleep(0.1)
+        self.assertEqual(feed.now(), stopped_at)
+        self.assertEqual(feed.status, 'stopped')
+
+    def test_stop_replay_while_reading_clock(self):
+        """ test stopping replay clock while other threads keep reading the replay time """
+        import threading
+        feed = ReplayPriceFeed(make_minute_bars(), speed=60.)
+        errors = []
+        reading = threading.Event()
+        reading.set()
+
+        def read_clock():
+            try:
+                while reading.is_set():
+                    feed.now()
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read_clock) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        feed.start()
+        time.sleep(0.05)
+        clock_thread = feed._clock_thread
+        feed.stop()
+        stopped_at = feed.now()
+        reading.clear()
+        for reader in readers:
+            reader.join()
+        print(f'replay stopped at {stopped_at}, errors: {errors}')
+        self.assertEqual(errors, [])
+        self.assertFalse(clock_thread.is_alive())
+        self.assertIsNone(feed._clock_thread)
+        self.assertEqual(feed.now(), stopped_at)
+        # stopping a stopped replay clock does nothing
+        feed.stop()
+        self.assertEqual(feed.now(), stopped_at)
+
+    def test_live_price_feed(self):
+        """ test live price feed fetching quotes, skipped without network connection """
+        feed = LivePriceFeed(parallel=False)
+        self.assertIsNone(feed.now())
+        quotes = feed.fetch_quotes(['000001.SZ'])
+        print(f'live quotes fetched:\n{quotes}')
+        if quotes.empty:
+            self.skipTest('live prices can not be acquired at the moment')
+        self.assertEqual(list(quotes.columns), QUOTE_COLUMNS)
+        self.assertIn('000001.SZ', feed.quote_book)
+
+
+if __name__ == '__main__':
+    unittest.main()
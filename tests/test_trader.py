@@ -19,6 +19,7 @@ import numpy as np
 
 from qteasy import DataSource, Operator, BaseStrategy
 from qteasy.trade_recording import new_account, get_or_create_position, update_position, save_parsed_trade_orders
+from qteasy.trade_recording import update_trade_order
 from qteasy.trading_util import submit_order, process_trade_result, cancel_order, process_account_delivery
 from qteasy.trading_util import deliver_trade_result
 from qteasy.trading_util import sys_log_file_path_name, trade_log_file_path_name, break_point_file_path_name
@@ -516,6 +517,17 @@ class TestTrader(unittest.TestCase):
         self.assertIsInstance(df, pd.DataFrame)
         print(f'trade log dataframe: \n{df}')
 
+        print(f'test reading last rows and date range from trade log files')
+        for qty in range(5):
+            ts.write_trade_log_file(reason='test', symbol='000001.SZ', qty=float(qty))
+        df = ts.read_trade_log(row_count=2)
+        print(f'last 2 rows of trade log: \n{df}')
+        self.assertEqual(df['qty'].tolist(), [3., 4.])
+        today = ts.get_current_tz_datetime().strftime('%Y-%m-%d')
+        self.assertEqual(len(ts.read_trade_log(start=today, end=today)), 5)
+        self.assertTrue(ts.read_trade_log(start='2000-01-01', end='2000-01-02').empty)
+        self.assertTrue(ts.read_trade_log().equals(pd.read_csv(log_file_path_name)))
+
         # remove the log file and check if it is removed
         os.remove(log_file_path_name)
 
@@ -1041,6 +1053,221 @@ class TestTrader(unittest.TestCase):
 
         ts.info()
 
+    def test_account_state_cache(self):
+        """ test in-memory account state of Trader and its write-through updates """
+        from unittest import mock
+        ts = self.ts
+        ts.renew_trade_log_file()
+        ds = ts.datasource
+
+        print('before loading, account cash and positions are read from sys tables')
+        self.assertIsNone(ts._get_position_records())
+        self.assertEqual(ts.account_cash, (73905.0, 73905.0, 100000.0))
+
+        ts.reload_account_state()
+        self.assertIsInstance(ts._get_position_records(), pd.DataFrame)
+        # once loaded, reading cash and positions does not touch the sys tables anymore
+        with mock.patch.object(ds, 'read_sys_table_data', side_effect=AssertionError('sys table read')):
+            print(f'cash: {ts.account_cash}\npositions: \n{ts.account_positions}')
+            self.assertEqual(ts.account_cash, (73905.0, 73905.0, 100000.0))
+            self.assertTrue(np.allclose(ts.account_positions['qty'], [100.0, 100.0, 200.0, 200.0, 400.0, 200.0]))
+            self.assertTrue(np.allclose(ts.account_positions['available_qty'],
+                                        [100.0, 100.0, 200.0, 100.0, 400.0, 200.0]))
+            self.assertTrue(np.allclose(ts.non_zero_positions['qty'], [100.0, 100.0, 200.0, 200.0, 400.0, 200.0]))
+
+        print('changes made through Trader are written to sys tables and to the in-memory state')
+        ts.manual_change_cash(10000.0)
+        self.assertEqual(ts.account_cash, (83905.0, 83905.0, 110000.0))
+        ts.manual_change_position('000001.SZ', 200.0, 10.0)
+        self.assertTrue(np.allclose(ts.account_positions['qty'], [300.0, 100.0, 200.0, 200.0, 400.0, 200.0]))
+        # a new position is created and appears in the in-memory state as well
+        ts.manual_change_position('000006.SZ', 100.0, 10.0)
+        self.assertTrue(np.allclose(ts.account_positions['qty'], [300.0, 100.0, 200.0, 200.0, 500.0, 200.0]))
+        ts.reload_account_state()
+        self.assertEqual(ts.account_cash, (83905.0, 83905.0, 110000.0))
+        self.assertTrue(np.allclose(ts.account_positions['qty'], [300.0, 100.0, 200.0, 200.0, 500.0, 200.0]))
+
+        print('changes written through the same datasource are applied to the in-memory state without reloading')
+        update_position(position_id=2, data_source=ds, qty_change=100, available_qty_change=100)
+        with mock.patch.object(ds, 'read_sys_table_data', side_effect=AssertionError('sys table read')):
+            self.assertTrue(np.allclose(ts.account_positions['qty'], [300.0, 200.0, 200.0, 200.0, 500.0, 200.0]))
+        ts.reload_account_state()
+        self.assertTrue(np.allclose(ts.account_positions['qty'], [300.0, 200.0, 200.0, 200.0, 500.0, 200.0]))
+
+        print('open orders are kept in memory and updated from the written order records')
+        order = ts.submit_trade_order('000002.SZ', 'long', 'buy', 'market', 100, 10.)
+        with mock.patch.object(ds, 'read_sys_table_data', side_effect=AssertionError('sys table read')):
+            submitted = ts._open_orders('submitted')
+            self.assertIn(order['order_id'], submitted.index)
+        update_trade_order(order['order_id'], data_source=ds, status='canceled')
+        self.assertNotIn(order['order_id'], ts._open_orders('submitted').index)
+
+        ts._release_account_state()
+        self.assertIsNone(ts._get_position_records())
+        self.assertFalse(any(ds._sys_table_listeners.values()))
+
+    def test_compiled_task_schedule(self):
+        """ test that daily task schedule is kept sorted and due tasks are taken from its head """
+        import datetime as dt
+        ts = self.ts
+        ts.task_queue.queue.clear()
+        ts.task_daily_schedule = [
+            ('10:30:00', 'run_strategy', ['stg_1']),
+            ('09:30:00', 'open_market'),
+            ('10:00:05', 'acquire_live_price'),
+            ('09:15:00', 'pre_open'),
+            ('10:30:00', 'acquire_live_price'),
+        ]
+        print(f'schedule is sorted by task time when assigned:\n{ts.task_daily_schedule}')
+        self.assertEqual(ts.task_daily_schedule,
+                         [('09:15:00', 'pre_open'),
+                          ('09:30:00', 'open_market'),
+                          ('10:00:05', 'acquire_live_price'),
+                          ('10:30:00', 'run_strategy', ['stg_1']),
+                          ('10:30:00', 'acquire_live_price')])
+        self.assertEqual(ts._task_schedule_seconds, [33300.0, 34200.0, 36005.0, 37800.0, 37800.0])
+
+        print('no task is due before the first task time, count down goes to the first task')
+        ts._add_task_from_schedule(dt.time(9, 0, 0))
+        self.assertEqual(ts.task_queue.qsize(), 0)
+        self.assertEqual(ts.next_task, ('09:15:00', 'pre_open'))
+        self.assertEqual(ts.count_down_to_next_task, 900.0)
+
+        print('all tasks due are added to task queue in order of their time')
+        ts._add_task_from_schedule(dt.time(10, 0, 4, 500000))
+        self.assertEqual(ts.task_queue.get(), 'pre_open')
+        self.assertEqual(ts.task_queue.get(), 'open_market')
+        self.assertTrue(ts.task_queue.empty())
+        self.assertEqual(ts.next_task, ('10:00:05', 'acquire_live_price'))
+        self.assertEqual(ts.count_down_to_next_task, 0.5)
+        self.assertEqual(len(ts.task_daily_schedule), 3)
+
+        print('tasks at the same time are all added, tasks with arguments are added with their arguments')
+        ts._add_task_from_schedule(dt.time(11, 0, 0))
+        self.assertEqual(ts.task_queue.get(), 'acquire_live_price')
+        self.assertEqual(ts.task_queue.get(), ('run_strategy', ['stg_1']))
+        self.assertEqual(ts.task_queue.get(), 'acquire_live_price')
+        self.assertEqual(ts.task_daily_schedule, [])
+        self.assertEqual(ts.next_task, 'None')
+
+    def test_trader_with_replay_price_feed(self):
+        """ test trader reading live prices and current time from a replayed price feed """
+        from qteasy.price_feed import ReplayPriceFeed, LivePriceFeed
+        self.assertIsInstance(self.ts.price_feed, LivePriceFeed)
+        symbols = self.ts.asset_pool
+        bars = pd.DataFrame({
+            'trade_time': np.repeat(pd.date_range('2024-03-04 09:31:00', periods=3, freq='min'), len(symbols)),
+            'symbol':     symbols * 3,
+            'open':       10.,
+            'high':       11.,
+            'low':        9.,
+            'close':      np.repeat([10., 10.5, 10.8], len(symbols)),
+            'pre_close':  10.,
+            'vol':        100.,
+            'amount':     1000.,
+        })
+        feed = ReplayPriceFeed(bars)
+        ts = Trader(
+                account_id=1,
+                operator=self.ts.operator,
+                broker=self.ts.broker,
+                config=self.ts.get_config(),
+                datasource=self.ts.datasource,
+                price_feed=feed,
+        )
+        self.assertRaises(TypeError, Trader, 1, self.ts.operator, self.ts.broker, self.ts.get_config(),
+                          self.ts.datasource, False, 'not_a_price_feed')
+        self.assertIs(ts.price_feed, feed)
+        self.assertEqual(ts.get_current_tz_datetime(), pd.Timestamp('2024-03-04 09:31:00'))
+
+        feed.advance_to('2024-03-04 09:32:10')
+        self.assertEqual(ts.get_current_tz_datetime(), pd.Timestamp('2024-03-04 09:32:10'))
+        ts._update_live_price()
+        print(f'live prices updated from replay feed:\n{ts.live_price}')
+        self.assertEqual(list(ts.live_price.index), symbols)
+        self.assertTrue(np.allclose(ts.live_price['close'], 10.5))
+        self.assertTrue(np.allclose(ts.live_price['vol'], 200.))
+
+        feed.advance_to('2024-03-04 09:33:00')
+        ts.watch_list = symbols[:2]
+        watched = ts.update_watched_prices()
+        print(f'watched prices updated from replay feed:\n{watched}')
+        self.assertTrue(np.allclose(watched['change'], 0.08))
+
+        print('positions are valued with last known prices without reading history data')
+        from unittest import mock
+        ts.live_price = None
+        with mock.patch.object(ts.datasource, 'get_history_data', side_effect=AssertionError('history read')):
+            positions = ts.account_position_info
+        print(f'positions valued with last known prices:\n{positions}')
+        expected = pd.Series([10.8, 10.8] + [10.5] * (len(symbols) - 2), index=symbols)
+        held = [symbol for symbol in positions.index if symbol in symbols]
+        self.assertTrue(len(held) > 0)
+        self.assertTrue(np.allclose(positions.loc[held, 'current_price'], expected[held]))
+
+    def test_trader_change_events(self):
+        """ test publishing position, order, price and trade log change events to subscribers """
+        from qteasy.price_feed import ReplayPriceFeed
+        ts = self.ts
+        events = []
+        sub_id = ts.subscribe_events(lambda event_type, data: events.append((event_type, data)))
+        price_events = []
+        ts.subscribe_events(lambda event_type, data: price_events.append(data), event_types='prices')
+        self.assertRaises(TypeError, ts.subscribe_events, 'not_callable')
+        self.assertRaises(ValueError, ts.subscribe_events, print, 'not_an_event')
+
+        print('position events are published only after account state is loaded')
+        ts.manual_change_cash(1000)
+        self.assertEqual([event_type for event_type, _ in events], ['trade_log'])
+        self.assertEqual(events[0][1]['cash_change'], '1000.000')
+        events.clear()
+        ts.reload_account_state()
+        ts.manual_change_position('000001.SZ', 100, 10.0, 'long')
+        print(f'events published after changing position manually:\n{events}')
+        self.assertEqual(events[0], ('positions', ['000001.SZ']))
+        self.assertEqual(events[1][0], 'trade_log')
+        self.assertEqual(events[1][1]['symbol'], '000001.SZ')
+
+        print('order events include ids of submitted orders, cash changes do not publish position events')
+        events.clear()
+        order = ts.submit_trade_order('000002.SZ', 'long', 'buy', 'market', 100, 10.)
+        self.assertEqual(events, [('orders', [order['order_id']])])
+        orders = ts.history_orders(order_ids=[order['order_id']])
+        self.assertEqual(orders.index.tolist(), [order['order_id']])
+        self.assertEqual(orders.loc[order['order_id'], 'symbol'], '000002.SZ')
+
+        print('price events include only symbols whose quotes have changed')
+        symbols = ts.asset_pool[:3]
+        bars = pd.DataFrame({
+            'trade_time': np.repeat(pd.date_range('2024-03-04 09:31:00', periods=2, freq='min'), 3),
+            'symbol':     symbols * 2,
+            'open':       10.,
+            'high':       11.,
+            'low':        9.,
+            'close':      [10., 10., 10., 10., 10.5, 10.],
+            'vol':        100.,
+            'amount':     1000.,
+        })
+        feed = ReplayPriceFeed(bars)
+        ts._price_feed = feed
+        ts.watch_list = symbols
+        feed.advance_to('2024-03-04 09:31:00')
+        ts.update_watched_prices()
+        self.assertEqual(price_events[-1].index.tolist(), symbols)
+        feed.advance_to('2024-03-04 09:32:00')
+        ts.update_watched_prices()
+        print(f'quotes published in price event:\n{price_events[-1]}')
+        self.assertEqual(len(price_events), 2)
+        self.assertAlmostEqual(price_events[-1].loc[symbols[1], 'close'], 10.5)
+        # 报价没有变化时不推送价格变动事件
+        ts.update_watched_prices()
+        self.assertEqual(len(price_events), 2)
+
+        ts.unsubscribe_events(sub_id)
+        events.clear()
+        ts.manual_change_cash(-1000)
+        self.assertEqual(events, [])
+
     def test_trader_run(self):
         """Test full-fledged run with all tasks manually added"""
         ts = self.ts
@@ -21,7 +21,7 @@ from qteasy.database import DataSource
 from qteasy.trading_util import _parse_pt_signals, _parse_ps_signals, _parse_vs_signals, _signal_to_order_elements
 from qteasy.trading_util import parse_trade_signal, submit_order, get_last_trade_result_summary, get_symbol_names
 from qteasy.trading_util import process_trade_result, process_account_delivery, create_daily_task_schedule
-from qteasy.trading_util import calculate_cost_change
+from qteasy.trading_util import calculate_cost_change, submit_orders
 
 from qteasy.trade_recording import new_account, get_account, update_account, update_account_balance
 from qteasy.trade_recording import update_position, get_account_positions, get_or_create_position
@@ -31,6 +31,7 @@ from qteasy.trade_recording import get_position_ids, read_trade_order_detail, sa
 from qteasy.trade_recording import get_account_cash_availabilities, get_account_position_availabilities
 from qteasy.trade_recording import write_trade_result, get_account_position_details, read_trade_result_by_id
 from qteasy.trade_recording import read_trade_results_by_order_id, delete_account
+from qteasy.trade_recording import get_or_create_positions, record_trade_orders
 
 
 class TestTradeRecording(unittest.TestCase):
@@ -1574,6 +1575,86 @@ class TestTradeRecording(unittest.TestCase):
             delete_account(3, data_source=self.test_ds)
 
 
+class TestBatchOrderSubmission(unittest.TestCase):
+    """ 批量记录和提交交易订单，使用专用的csv文件数据源，不依赖测试数据库"""
+
+    def setUp(self) -> None:
+        """ execute before each test"""
+        self.test_ds = DataSource('file', file_type='csv', file_loc='data_test/batch_orders_test/')
+        for table in ['sys_op_live_accounts', 'sys_op_positions', 'sys_op_trade_orders']:
+            if self.test_ds.table_data_exists(table):
+                self.test_ds.drop_table_data(table)
+
+    def test_batch_order_submission(self):
+        """ test get_or_create_positions, record_trade_orders and submit_orders functions """
+        from unittest import mock
+        new_account('test_user1', 100000, self.test_ds)
+        get_or_create_position(1, 'GOOG', 'long', self.test_ds)  # pos_id = 1
+        update_position(1, self.test_ds, qty_change=300, available_qty_change=300)
+
+        # existing positions are reused and missing ones are created in one go, duplicated symbols share ids
+        pos_ids = get_or_create_positions(1, ['AAPL', 'GOOG', 'MSFT', 'AAPL'], ['long'] * 4, data_source=self.test_ds)
+        print(f'position ids: {pos_ids}')
+        self.assertEqual(pos_ids, [2, 1, 3, 2])
+        self.assertEqual(get_or_create_positions(1, ['MSFT', 'GOOG'], ['long', 'long'], self.test_ds), [3, 1])
+        self.assertEqual(get_account_positions(1, data_source=self.test_ds).index.tolist(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            get_or_create_positions(1, ['MSFT'], ['long', 'short'], self.test_ds)
+
+        orders = [
+            {'pos_id': pos_id, 'direction': direction, 'order_type': 'market', 'qty': qty, 'price': price,
+             'submitted_time': None, 'status': 'created'}
+            for pos_id, direction, qty, price in zip([2, 1, 3], ['buy', 'sell', 'buy'], [100, 200, 300],
+                                                     [10.0, 20.0, 30.0])
+        ]
+        order_ids = record_trade_orders(orders, data_source=self.test_ds)
+        print(f'order ids: {order_ids}')
+        self.assertEqual(order_ids, [1, 2, 3])
+        self.assertEqual(read_trade_order(2, data_source=self.test_ds)['qty'], 200)
+        # invalid orders are refused before anything is written
+        bad_orders = [dict(orders[0]), dict(orders[1], qty=0)]
+        with self.assertRaises(RuntimeError):
+            record_trade_orders(bad_orders, data_source=self.test_ds)
+        self.assertEqual(len(query_trade_orders(1, data_source=self.test_ds)), 3)
+
+        # orders that are already submitted are skipped, results are aligned with the given ids
+        self.assertEqual(submit_order(1, data_source=self.test_ds), 1)
+        submitted = submit_orders([1, 2, 3], data_source=self.test_ds)
+        print(f'submitted orders: {submitted}')
+        self.assertEqual(submitted, [None, 2, 3])
+        for order_id in [1, 2, 3]:
+            order = read_trade_order(order_id, data_source=self.test_ds)
+            self.assertEqual(order['status'], 'submitted')
+            self.assertIsNotNone(order['submitted_time'])
+        self.assertEqual(submit_orders([2, 3], data_source=self.test_ds), [None, None])
+        self.assertEqual(submit_orders([], data_source=self.test_ds), [])
+
+        # only the given orders and their positions are read
+        orders = [dict(orders[0], pos_id=2), dict(orders[2], pos_id=3)]
+        order_ids = record_trade_orders(orders, data_source=self.test_ds)
+        self.assertEqual(order_ids, [4, 5])
+        read_sys_table_data = self.test_ds.read_sys_table_data
+        with mock.patch.object(self.test_ds, 'read_sys_table_data', wraps=read_sys_table_data) as read:
+            self.assertEqual(submit_orders(order_ids, data_source=self.test_ds), [4, 5])
+        record_ids = {c.args[0]: c.kwargs.get('record_ids') for c in read.call_args_list}
+        print(f'records read from sys tables: {record_ids}')
+        self.assertEqual(record_ids['sys_op_trade_orders'], [4, 5])
+        self.assertEqual(record_ids['sys_op_positions'], [2, 3])
+        self.assertEqual(read_trade_order(5, data_source=self.test_ds)['status'], 'submitted')
+        self.assertEqual(len(self.test_ds.read_sys_table_data('sys_op_trade_orders', record_ids=[2, 5])), 2)
+        self.assertTrue(self.test_ds.read_sys_table_data('sys_op_trade_orders', record_ids=[]).empty)
+
+        # orders of short positions are not submitted, neither one by one nor in batch
+        short_ids = get_or_create_positions(1, ['TSLA'], ['short'], data_source=self.test_ds)
+        self.assertEqual(short_ids, [4])
+        order_ids = record_trade_orders([dict(orders[0], pos_id=4)], data_source=self.test_ds)
+        self.assertEqual(order_ids, [6])
+        with self.assertRaises(NotImplementedError):
+            submit_order(6, data_source=self.test_ds)
+        with self.assertRaises(NotImplementedError):
+            submit_orders([6], data_source=self.test_ds)
+        self.assertEqual(read_trade_order(6, data_source=self.test_ds)['status'], 'created')
+
 class TestTradingUtilFuncs(unittest.TestCase):
     """ test trading util funcs """
 
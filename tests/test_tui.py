@@ -8,11 +8,14 @@
 #   Unittest for the TUI
 # ======================================
 
+import asyncio
 import unittest
 
+from textual.app import App
+
 import qteasy.trader
 from qteasy import Operator, DataSource
-from qteasy.trader_tui import TraderApp
+from qteasy.trader_tui import TraderApp, WatchTable
 from qteasy.broker import SimulatorBroker
 
 
@@ -74,6 +77,47 @@ class TestTUI(unittest.TestCase):
         self.assertEqual(app.dark, True)
 
 
+class TestLiveTable(unittest.TestCase):
+
+    def test_patch_rows(self):
+        ''' test patching only changed cells of rows in live tables '''
+
+        class TableApp(App):
+            def compose(self):
+                yield WatchTable(id='watches')
+
+        updated_cells = []
+
+        async def run_app():
+            app = TableApp()
+            async with app.run_test():
+                table = app.query_one(WatchTable)
+                table.add_keyed_columns()
+                table.patch_row('000001.SZ', table.render_row(['PA', 10., 9., 9.5, 10.2, 9.1, 100, 1000, 0.05]))
+                table.patch_row('000002.SZ', table.render_row(['WK', 10., 9., 9.5, 10.2, 9.1, 100, 1000, -0.05]))
+                update_cell = table.update_cell
+
+                def record_update(row_key, column_key, value, **kwargs):
+                    updated_cells.append((row_key, column_key))
+                    update_cell(row_key, column_key, value, **kwargs)
+
+                table.update_cell = record_update
+                table.patch_row('000001.SZ', table.render_row(['PA', 10.5, 9., 9.5, 10.6, 9.1, 200, 2000, 0.05]))
+                # 涨跌方向改变时，所有带颜色的单元格都需要更新
+                table.patch_row('000002.SZ', table.render_row(['WK', 10., 9., 9.5, 10.2, 9.1, 100, 1000, 0.]))
+                table.remove_rows(['000001.SZ', '000003.SZ'])
+                return table.row_keys, table.row_count, table.get_row_at(0)
+
+        row_keys, row_count, first_row = asyncio.run(run_app())
+        print(f'cells updated: {updated_cells}')
+        self.assertEqual(updated_cells[:4], [('000001.SZ', 'close'), ('000001.SZ', 'high'),
+                                             ('000001.SZ', 'vol'), ('000001.SZ', 'amount')])
+        self.assertEqual(len(updated_cells), 12)
+        self.assertEqual(row_keys, ['000002.SZ'])
+        self.assertEqual(row_count, 1)
+        self.assertEqual(first_row[-1].plain, '0.00%')
+
+
 if __name__ == '__main__':
     # unittest.main()
     pass
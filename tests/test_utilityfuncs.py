@@ -21,7 +21,7 @@ from qteasy.utilfuncs import next_market_trade_day, unify, list_or_slice, labels
 from qteasy.utilfuncs import weekday_name, nearest_market_trade_day, is_number_like, list_truncate, input_to_list
 from qteasy.utilfuncs import match_ts_code, _lev_ratio, _partial_lev_ratio, _wildcard_match, rolling_window
 from qteasy.utilfuncs import reindent, adjust_string_length, is_float_like, is_integer_like
-from qteasy.utilfuncs import is_cn_stock_symbol_like, is_complete_cn_stock_symbol_like
+from qteasy.utilfuncs import is_cn_stock_symbol_like, is_complete_cn_stock_symbol_like, SymbolIndex
 
 
 class RetryableError(Exception):
@@ -540,6 +540,48 @@ class TestUtilityFuncs(unittest.TestCase):
         print(f"matching {'招商银行'} with asset_type = 'E, FD': \n{match_ts_code('招商银行', asset_types='E, FD')}")
         print(f"matching {'贵阳银行'} with asset_type = 'E, FT': \n{match_ts_code('贵阳银行', asset_types='E, FT')}")
 
+    def test_symbol_index(self):
+        """ 测试证券代码及名称检索索引"""
+        df_s = pd.DataFrame({'name':     ['平安银行', '招商银行', '中集集团', '中金黄金', '工商银行'],
+                             'fullname': ['平安银行股份有限公司', '招商银行股份有限公司', '中国国际海运集装箱股份有限公司',
+                                          '中金黄金股份有限公司', '中国工商银行股份有限公司']},
+                            index=['000001.SZ', '600036.SH', '000039.SZ', '600489.SH', '601398.SH'])
+        df_i = pd.DataFrame({'name':     ['上证指数', '沪深300'],
+                             'fullname': ['上证综合指数', '沪深300指数']},
+                            index=['000001.SH', '000300.SH'])
+        df_f = pd.DataFrame({'name': ['华夏成长']}, index=['000001.OF'])
+        index = SymbolIndex({'E': df_s, 'IDX': df_i, 'FT': pd.DataFrame(), 'FD': df_f, 'OPT': pd.DataFrame()})
+        print(f'symbol index created with {len(index)} symbols')
+        self.assertEqual(len(index), 8)
+        self.assertIn('000001.SZ', index)
+        self.assertNotIn('000001.CZC', index)
+
+        self.assertEqual(index.get_names(['000001.SZ', '000300.SH', 'no_such_code']),
+                         ['平安银行', '沪深300', 'N/A'])
+        self.assertEqual(index.get_names(['000001.SZ', '000001.OF'], asset_types=['FD']),
+                         ['N/A', '华夏成长'])
+        self.assertEqual(index.get_asset_type('000001.OF'), 'FD')
+
+        self.assertEqual(index.match('000001.SZ'), {'E': {'000001.SZ': '平安银行'}, 'count': 1})
+        self.assertEqual(index.match('000001'),
+                         {'E': {'000001.SZ': '平安银行'}, 'IDX': {'000001.SH': '上证指数'},
+                          'FD': {'000001.OF': '华夏成长'}, 'count': 3})
+        self.assertEqual(index.match('000001', asset_types='E, FD'),
+                         {'E': {'000001.SZ': '平安银行'}, 'FD': {'000001.OF': '华夏成长'}, 'count': 2})
+        self.assertEqual(index.match('中?集团'), {'E': {'000039.SZ': '中集集团'}, 'count': 1})
+        self.assertEqual(index.match('中*金'), {'E': {'600489.SH': '中金黄金'}, 'count': 1})
+        matched = index.match('工商银行')
+        print(f'matching 工商银行: {matched}')
+        self.assertEqual(list(matched['E'].keys()), ['601398.SH', '600036.SH'])
+        self.assertEqual(index.match('中国国际海运'), {'count': 0})
+        self.assertEqual(index.match('中国国际海运', match_full_name=True),
+                         {'E': {'000039.SZ': '中集集团'}, 'count': 1})
+
+        # 索引的模糊匹配结果与逐个计算相似度的结果相同
+        for word in ['平安', '招商', '中金黄金', '沪深', '银行']:
+            expected = [code for code, name in zip(df_s.index, df_s.name) if _partial_lev_ratio(word, name) >= 0.75]
+            self.assertEqual(sorted(index.match(word, asset_types='E').get('E', {}).keys()), sorted(expected))
+
     def test_rolling_window(self):
         """ 测试含税rolling_window()"""
         # test 1d array